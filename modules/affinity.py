@@ -0,0 +1,156 @@
+import os
+import re
+import threading
+
+from modules.utils import log_info, log_debug
+from modules.config import CONFIG
+
+# ==============================================================================
+# CPU AFFINITY
+# ==============================================================================
+# Places vspipe and FFmpeg on CPU sets derived from the L3 cache topology in
+# /sys/devices/system/cpu (one L3 domain = one CCD on Ryzen). On X3D parts the
+# CCD with the largest L3 (V-Cache) holds QTGMC's temporal working set; with
+# 'split' the encoders get the other CCDs. core.num_threads and the encoder
+# thread counts follow the CPU sets. Linux only (sched_setaffinity).
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+POLICIES = ("off", "split", "vcache")
+
+_PLAN = {"loaded": False, "plan": None}
+_PLAN_LOCK = threading.Lock()
+
+
+def parse_cpu_list(text) -> list:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus: list = []
+    for part in str(text).strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def _parse_size_kb(text) -> int:
+    match = re.match(r"(\d+)\s*([KMG]?)", str(text).strip().upper())
+    if not match:
+        return 0
+    value, unit = int(match.group(1)), match.group(2)
+    if not unit:
+        return value // 1024  # plain bytes
+    return value * {"K": 1, "M": 1024, "G": 1024 ** 2}[unit]
+
+
+def _read(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def read_topology(root=SYSFS_CPU) -> list:
+    """
+    L3 domains of the online CPUs: [{"cpus": [...], "l3_kb": n, "package": id}], in CPU order.
+    Without cache information every package is one domain.
+    """
+    domains: dict = {}
+    try:
+        names = sorted((n for n in os.listdir(root) if re.fullmatch(r"cpu\d+", n)), key=lambda n: int(n[3:]))
+    except OSError:
+        return []
+    for name in names:
+        cpu = int(name[3:])
+        base = os.path.join(root, name)
+        if _read(os.path.join(base, "online"), "1") != "1":
+            continue
+        package = _read(os.path.join(base, "topology", "physical_package_id"), "0")
+        key, size_kb = ("package", package), 0
+        cache_dir = os.path.join(base, "cache")
+        for index in sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []:
+            index_dir = os.path.join(cache_dir, index)
+            if _read(os.path.join(index_dir, "level")) == "3":
+                shared = _read(os.path.join(index_dir, "shared_cpu_list"))
+                if shared:
+                    key = tuple(parse_cpu_list(shared))
+                size_kb = _parse_size_kb(_read(os.path.join(index_dir, "size"), "0"))
+                break
+        domain = domains.setdefault(key, {"cpus": [], "l3_kb": size_kb, "package": int(package)})
+        domain["cpus"].append(cpu)
+    return list(domains.values())
+
+
+def plan_affinity(domains, policy):
+    """{"vspipe": [cpus] or None, "ffmpeg": [cpus] or None}, or None when the policy does not apply."""
+    if policy not in POLICIES or policy == "off" or len(domains) < 2:
+        return None
+    # The V-Cache CCD (largest L3); on equal caches the first domain
+    vcache = max(domains, key=lambda d: (d["l3_kb"], -d["cpus"][0]))
+    others = sorted(cpu for d in domains if d is not vcache for cpu in d["cpus"])
+    return {"vspipe": list(vcache["cpus"]), "ffmpeg": others if policy == "split" else None}
+
+
+def get_affinity_plan(policy=None, root=SYSFS_CPU):
+    """The configured plan ('cpu_affinity'), read once. An explicit policy is planned fresh."""
+    if policy is not None:
+        return plan_affinity(read_topology(root), policy) if hasattr(os, "sched_setaffinity") else None
+    with _PLAN_LOCK:
+        if not _PLAN["loaded"]:
+            _PLAN["loaded"] = True
+            configured = str(CONFIG.get("cpu_affinity", "off")).lower()
+            if configured != "off":
+                if not hasattr(os, "sched_setaffinity"):
+                    log_info("  > CPU affinity: not supported on this OS. Placement left to the scheduler.")
+                else:
+                    _PLAN["plan"] = plan_affinity(read_topology(root), configured)
+                    _log_plan(configured, _PLAN["plan"])
+        return _PLAN["plan"]
+
+
+def _log_plan(policy, plan):
+    if plan is None:
+        log_info(f"  > CPU affinity '{policy}': needs at least two L3 domains (CCDs). Not pinning.")
+        return
+    ffmpeg = f"{len(plan['ffmpeg'])} CPUs" if plan["ffmpeg"] else "unpinned"
+    log_info(f"  > CPU affinity '{policy}': vspipe on {len(plan['vspipe'])} CPUs "
+             f"({_format_cpus(plan['vspipe'])}), FFmpeg {ffmpeg}")
+
+
+def _format_cpus(cpus) -> str:
+    ranges, start = [], None
+    for i, cpu in enumerate(cpus):
+        if start is None:
+            start = cpu
+        if i + 1 == len(cpus) or cpus[i + 1] != cpu + 1:
+            ranges.append(f"{start}-{cpu}" if cpu != start else str(cpu))
+            start = None
+    return ",".join(ranges)
+
+
+def get_stage_threads(stage, plan=None):
+    """Thread count matching a stage's CPU set, or None if the stage is not pinned."""
+    plan = plan if plan is not None else get_affinity_plan()
+    cpus = plan.get(stage) if plan else None
+    return len(cpus) if cpus else None
+
+
+def pin_process(stage, pid, plan=None) -> bool:
+    """Pins every thread of a child to its stage's CPU set (threads created later inherit it)."""
+    plan = plan if plan is not None else get_affinity_plan()
+    cpus = plan.get(stage) if plan else None
+    if not cpus:
+        return False
+    tids = [pid]
+    try:
+        tids += [int(t) for t in os.listdir(f"/proc/{pid}/task") if int(t) != pid]
+    except OSError:
+        pass
+    try:
+        for tid in tids:
+            os.sched_setaffinity(tid, cpus)
+    except OSError as e:
+        log_debug(f"[AFFINITY] Could not pin {stage} ({pid}): {e}")
+        return False
+    log_debug(f"[AFFINITY] {stage} {pid} -> {_format_cpus(cpus)}")
+    return True
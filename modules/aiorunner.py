@@ -0,0 +1,182 @@
+import os
+import time
+import asyncio
+import threading
+import subprocess
+
+from modules.utils import log_info, log_debug, log_error
+from modules.supervisor import READ_SIZE, _split_lines
+
+# ==============================================================================
+# ASYNC JOB RUNNER
+# ==============================================================================
+# 'concurrent_jobs' > 1 runs several process_video jobs from one asyncio event
+# loop. The short preparation steps of each job (script generation, probes) run
+# in a worker thread; the long-running vspipe | FFmpeg pair is started with
+# asyncio.create_subprocess_exec and all of its streams are read by the loop, so
+# the number of threads does not grow with the number of pipes. Ctrl+C cancels
+# every job and terminates the child processes.
+
+_LOCAL = threading.local()
+_STATE = {"cancelled": False}
+
+
+def in_async_runner() -> bool:
+    """True inside a job started by run_jobs()."""
+    return getattr(_LOCAL, "loop", None) is not None
+
+
+async def _read_lines(stream, handler):
+    buffer = b""
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            break
+        if handler is None:
+            continue
+        lines, buffer = _split_lines(buffer + data)
+        for line in lines:
+            handler(line.decode("utf-8", errors="replace").strip())
+    if buffer and handler:
+        handler(buffer.decode("utf-8", errors="replace").strip())
+
+
+class AsyncPipeline:
+    """vspipe | FFmpeg on the runner's event loop. Same watchdog semantics as StreamSupervisor."""
+
+    def __init__(self, stall_timeout=None, terminate_timeout=5.0, on_process=None):
+        self.stall_timeout = stall_timeout
+        self.terminate_timeout = terminate_timeout
+        self.on_process = on_process  # on_process(name, pid) for every child started
+        self.stalled = False
+        self.failed = None
+        self.processes = []
+        self._last_progress = time.monotonic()
+
+    def progress(self):
+        self._last_progress = time.monotonic()
+
+    async def terminate(self):
+        for _, process in self.processes:
+            if process.returncode is None:
+                try:
+                    process.terminate()
+                except ProcessLookupError:
+                    pass
+        for _, process in self.processes:
+            try:
+                await asyncio.wait_for(process.wait(), self.terminate_timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+
+    async def _wait(self, name, process):
+        code = await process.wait()
+        if code != 0 and self.failed is None:
+            self.failed = name
+            log_debug(f"[RUNNER] {name} exited with code {code}. Stopping the other processes.")
+            await self.terminate()
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(min(self.stall_timeout / 4, 1.0))
+            if time.monotonic() - self._last_progress > self.stall_timeout:
+                self.stalled = True
+                log_error(f"\n[ERROR] No progress for {self.stall_timeout:.0f}s. Stopping the encode.")
+                await self.terminate()
+                return
+
+    def _started(self, name, process):
+        self.processes.append((name, process))
+        if self.on_process:
+            self.on_process(name, process.pid)
+
+    async def run(self, vspipe_cmd, vspipe_env, ffmpeg_cmd, on_vspipe_line=None, on_ffmpeg_line=None):
+        """
+        Runs the pair to completion. Returns FFmpeg's exit code; a failed or stalled
+        vspipe only shows in failed/stalled, since FFmpeg ends cleanly on a short stream.
+        """
+        if _STATE["cancelled"]:
+            raise asyncio.CancelledError()
+        stdin = subprocess.DEVNULL
+        read_fd = write_fd = None
+        watchdog = None
+        try:
+            tasks = []
+            if vspipe_cmd:
+                read_fd, write_fd = os.pipe()
+                p_vspipe = await asyncio.create_subprocess_exec(
+                    *vspipe_cmd, stdout=write_fd, stderr=subprocess.PIPE, env=vspipe_env)
+                self._started("vspipe", p_vspipe)
+                os.close(write_fd)
+                write_fd = None
+                stdin = read_fd
+                tasks.append(_read_lines(p_vspipe.stderr, on_vspipe_line))
+            p_ffmpeg = await asyncio.create_subprocess_exec(
+                *ffmpeg_cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self._started("ffmpeg", p_ffmpeg)
+            if read_fd is not None:
+                os.close(read_fd)
+                read_fd = None
+            tasks += [_read_lines(p_ffmpeg.stdout, None), _read_lines(p_ffmpeg.stderr, on_ffmpeg_line)]
+            tasks += [self._wait(name, process) for name, process in self.processes]
+
+            self.progress()
+            if self.stall_timeout:
+                watchdog = asyncio.ensure_future(self._watchdog())
+            await asyncio.gather(*tasks)
+            return p_ffmpeg.returncode
+        except asyncio.CancelledError:
+            await self.terminate()
+            raise
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            for fd in (read_fd, write_fd):
+                if fd is not None:
+                    os.close(fd)
+
+    def run_in_job_loop(self, *args, **kwargs):
+        """Called from a job thread: runs run() on the runner loop and waits for it."""
+        if _STATE["cancelled"]:
+            raise RuntimeError("Runner was cancelled")
+        return asyncio.run_coroutine_threadsafe(self.run(*args, **kwargs), _LOCAL.loop).result()
+
+
+async def _run_jobs(items, job, concurrency):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def _in_thread(item):
+        _LOCAL.loop = loop
+        try:
+            return job(item)
+        finally:
+            _LOCAL.loop = None
+
+    async def _one(item):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(_in_thread, item)
+            except Exception as e:
+                log_error(f"[ERROR] Job failed for {item}: {e}")
+                return None
+
+    try:
+        return await asyncio.gather(*(_one(item) for item in items))
+    except asyncio.CancelledError:
+        # Ctrl+C: job threads still in preparation must not start new encodes
+        _STATE["cancelled"] = True
+        raise
+
+
+def run_jobs(items, job, concurrency):
+    """Runs job(item) for every item, at most `concurrency` at a time, from one event loop."""
+    _STATE["cancelled"] = False
+    log_info(f">> Running up to {concurrency} jobs at once")
+    try:
+        return asyncio.run(_run_jobs(list(items), job, max(int(concurrency), 1)))
+    except KeyboardInterrupt:
+        _STATE["cancelled"] = True
+        log_error("\n[CANCELLED] Stopping all jobs...")
+        raise
@@ -0,0 +1,166 @@
+import os
+import shutil
+import platform
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from modules.utils import log_info, log_debug, log_error, run_command, ACTIVE_PROCS
+from modules.config import CONFIG, AUDIO_CODEC, AUDIO_BITRATE, AUDIO_OFFSET
+from modules.probe import probe_media
+
+# ==============================================================================
+# SEPARATE AUDIO STAGE
+# ==============================================================================
+# In 'audio_mode: separate' the video FFmpeg process never touches audio. The source
+# audio is either stream-copied at mux time or encoded by its own low-priority
+# FFmpeg process running in parallel with the video encode, then muxed with -c copy.
+
+LOSSLESS_AUDIO_CODECS = {
+    "flac", "alac", "pcm_s16le", "pcm_s16be", "pcm_s24le", "pcm_s24be",
+    "pcm_s32le", "pcm_f32le", "pcm_u8",
+}
+
+# Audio codecs each output container can carry without re-encoding (None = anything)
+CONTAINER_AUDIO_CODECS = {
+    ".mov": {"aac", "alac", "mp3", "ac3", "pcm_s16le", "pcm_s16be", "pcm_s24le", "pcm_s24be",
+             "pcm_s32le", "pcm_f32le", "pcm_u8"},
+    ".mkv": None,
+    ".mka": None,
+}
+
+
+def audio_mode_separate():
+    return CONFIG.get("audio_mode", "inline") == "separate"
+
+
+def can_copy_audio(source_codec, atempo, containers):
+    """
+    True if the source audio can be muxed as-is: no tempo change, the codec matches the
+    configured one (or both are lossless) and every target container accepts it.
+    """
+    if not source_codec or atempo != 1.0:
+        return False
+    if source_codec != AUDIO_CODEC:
+        both_lossless = source_codec in LOSSLESS_AUDIO_CODECS and AUDIO_CODEC in LOSSLESS_AUDIO_CODECS
+        if not (both_lossless and CONFIG.get("audio_copy_lossless", True)):
+            return False
+    for ext in containers:
+        allowed = CONTAINER_AUDIO_CODECS.get(str(ext).lower(), set())
+        if allowed is not None and source_codec not in allowed:
+            return False
+    return True
+
+
+def plan_audio_stage(input_path: Path, atempo: float, output_files: list) -> bool:
+    """Decides between stream copy (True) and a parallel encode (False) and logs it."""
+    source_codec = probe_media(input_path)["audio_codec"]
+    copy = can_copy_audio(source_codec, atempo, [Path(f).suffix for f in output_files])
+    if copy:
+        log_info(f"   [AUDIO] Stream copy: source is already {source_codec}. No audio encode needed.")
+    else:
+        log_info(f"   [AUDIO] Encoding {source_codec or 'unknown'} -> {AUDIO_CODEC} in a parallel process.")
+    return copy
+
+
+def get_audio_temp_path(work_dir: Path, stem: str) -> Path:
+    # Matroska audio holds any codec, so the encoded track can go to .mov or .mkv later
+    return work_dir / f"{stem}_temp_audio.mka"
+
+
+def get_video_temp_path(output_file: Path) -> Path:
+    """Video-only temp output awaiting the audio mux."""
+    return output_file.with_name(f"{output_file.stem}_temp_video{output_file.suffix}")
+
+
+def get_video_keep_path(output_file: Path) -> Path:
+    """Finished video-only render kept after a failed audio stage; the next attempt only redoes audio and mux."""
+    return output_file.with_name(f"{output_file.stem}_video_only{output_file.suffix}")
+
+
+def build_audio_encode_cmd(input_path: Path, audio_file: Path, atempo: float, tempo_filter: Optional[str] = None) -> list:
+    """Encodes the first source audio track (tempo-corrected) into its own file."""
+    # Nothing reads stderr until the encode ends: only errors, so the pipe never fills up
+    cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-nostats", "-v", "error",
+           "-i", str(input_path), "-map", "0:a:0", "-vn"]
+    if tempo_filter:
+        cmd.extend(["-af", tempo_filter])
+    elif atempo != 1.0:
+        cmd.extend(["-af", f"atempo={atempo:.6f}"])
+    cmd.extend(["-c:a", AUDIO_CODEC, "-b:a", str(AUDIO_BITRATE), str(audio_file)])
+    return cmd
+
+
+def build_mux_cmd(video_file: Path, audio_source: Path, output_file: Path, offset: Optional[float] = None) -> list:
+    """
+    Muxes a finished video with an audio track using stream copy only.
+    The sync offset is applied with -itsoffset, which works for delays and advances
+    without touching the samples.
+    """
+    offset = AUDIO_OFFSET if offset is None else offset
+    cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-i", str(video_file)]
+    if offset != 0:
+        cmd.extend(["-itsoffset", f"{offset:.3f}"])
+    cmd.extend([
+        "-i", str(audio_source),
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c", "copy", str(output_file)
+    ])
+    return cmd
+
+
+def _low_priority_kwargs():
+    """Popen kwargs that keep audio work from competing with the video encoder (Windows)."""
+    if platform.system() == "Windows":
+        return {"creationflags": getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0)}
+    return {}
+
+
+def _lower_priority(p):
+    """
+    POSIX: renices the started process. Done from the parent, preexec_fn is not safe
+    while other threads (staging mover, verifier) are running.
+    """
+    if platform.system() == "Windows" or not hasattr(os, "setpriority"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, p.pid, 10)
+    except OSError as e:
+        log_debug(f"   [AUDIO] Could not lower priority: {e}")
+
+
+def start_audio_encode(input_path: Path, audio_file: Path, atempo: float, tempo_filter: Optional[str] = None):
+    """Starts the audio encode in the background. Returns the Popen handle."""
+    cmd = build_audio_encode_cmd(input_path, audio_file, atempo, tempo_filter)
+    log_debug(f"   [DEBUG] AUDIO CMD: {cmd}")
+    p_audio = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, **_low_priority_kwargs())
+    _lower_priority(p_audio)
+    ACTIVE_PROCS.append(p_audio)
+    return p_audio
+
+
+def finish_audio_encode(p_audio) -> bool:
+    """Waits for a background audio encode and reports its result."""
+    try:
+        _, err = p_audio.communicate()
+    finally:
+        if p_audio in ACTIVE_PROCS:
+            ACTIVE_PROCS.remove(p_audio)
+    if p_audio.returncode != 0:
+        log_error(f"[ERROR] Audio encode failed with exit code {p_audio.returncode}")
+        for err_line in (err or b"").decode("utf-8", errors="replace").splitlines()[-10:]:
+            log_error(f"   {err_line}")
+        return False
+    return True
+
+
+def mux_audio(video_file: Path, audio_source: Path, output_file: Path, offset: Optional[float] = None) -> bool:
+    """Runs the stream-copy mux into output_file (normally a _part path)."""
+    cmd = build_mux_cmd(video_file, audio_source, output_file, offset)
+    log_debug(f"   [DEBUG] MUX CMD: {cmd}")
+    p = run_command(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if p.returncode != 0:
+        log_error(f"[ERROR] Audio mux failed for {output_file.name} (exit code {p.returncode})")
+        return False
+    return True
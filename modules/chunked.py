@@ -0,0 +1,180 @@
+import math
+import shutil
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.utils import log_info, log_debug, log_error, run_command
+from modules.config import CONFIG, HW_SETTINGS
+from modules.encoders import get_codec_args
+
+# ==============================================================================
+# CHUNKED AV1
+# ==============================================================================
+# One SVT-AV1 instance does not scale to 32 threads and ends up slower than QTGMC.
+# With 'av1_chunked' the main pass writes the deinterlaced stream losslessly (FFV1,
+# intra-only, so any frame can be sought exactly), the stream is split at scene
+# cuts and the chunks are encoded by several smaller SVT-AV1 workers at once.
+# The finished chunks are joined with the concat demuxer (-c copy, bit-exact) and
+# the audio is muxed once in the same step.
+
+
+def chunked_av1_enabled():
+    return bool(CONFIG.get("av1_chunked", False))
+
+
+def get_chunk_workers() -> int:
+    configured = int(CONFIG.get("av1_chunk_workers", 0) or 0)
+    if configured > 0:
+        return configured
+    # SVT-AV1 scales well up to about 8 threads per instance
+    return max(int(HW_SETTINGS.get("cpu_threads", 16)) // 8, 2)
+
+
+def build_scene_cmd(source, threshold) -> list:
+    # Scene scores do not need full resolution; the downscale keeps the pass cheap
+    return [
+        shutil.which("ffmpeg") or "ffmpeg", "-nostdin", "-i", str(source), "-map", "0:v:0", "-an",
+        "-vf", f"scale=320:-2,select='gt(scene,{threshold})',showinfo", "-f", "null", "-"
+    ]
+
+
+def parse_scene_cuts(output: str, fps: float) -> list:
+    """Frame numbers of the cuts reported by showinfo (pts_time:<seconds>)."""
+    cuts = []
+    for line in output.splitlines():
+        if "showinfo" not in line or "pts_time:" not in line:
+            continue
+        try:
+            seconds = float(line.split("pts_time:")[1].split()[0])
+        except (IndexError, ValueError):
+            continue
+        cuts.append(int(round(seconds * fps)))
+    return sorted(set(cuts))
+
+
+def detect_scene_cuts(source, fps) -> list:
+    """Runs the scene detection pass. An empty list (no cuts or failure) just means fixed-length chunks."""
+    threshold = float(CONFIG.get("av1_scene_threshold", 0.3))
+    cmd = build_scene_cmd(source, threshold)
+    log_debug(f"[CHUNKS] Scene CMD: {cmd}")
+    try:
+        p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        log_error(f"   [WARNING] Scene detection failed: {e}")
+        return []
+    return parse_scene_cuts(p.stderr.decode("utf-8", errors="replace"), fps)
+
+
+def plan_chunks(cuts, total_frames, fps, min_seconds=None, max_seconds=None) -> list:
+    """
+    Chunk ranges [(start, end)), end exclusive. Chunks start at scene cuts where
+    possible; cuts closer than min_seconds are ignored and longer scenes are split
+    evenly so that no chunk exceeds max_seconds.
+    """
+    min_seconds = float(min_seconds if min_seconds is not None else CONFIG.get("av1_chunk_min_seconds", 10))
+    max_seconds = float(max_seconds if max_seconds is not None else CONFIG.get("av1_chunk_max_seconds", 120))
+    min_len = max(int(min_seconds * fps), 1)
+    max_len = max(int(max_seconds * fps), min_len)
+
+    bounds = [0]
+    for cut in cuts:
+        if cut - bounds[-1] >= min_len and total_frames - cut >= min_len:
+            bounds.append(cut)
+    bounds.append(total_frames)
+
+    chunks = []
+    for start, end in zip(bounds, bounds[1:]):
+        parts = math.ceil((end - start) / max_len)
+        step = math.ceil((end - start) / parts)
+        for chunk_start in range(start, end, step):
+            chunks.append((chunk_start, min(chunk_start + step, end)))
+    return chunks
+
+
+def build_chunk_cmd(source, chunk_file, start, end, fps, threads) -> list:
+    """
+    Encodes frames [start, end) of the intra-only source. The seek target lies half a
+    frame before 'start', so accurate seeking drops exactly the frames before it.
+    """
+    cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-v", "error"]
+    if start > 0:
+        cmd += ["-ss", f"{(start - 0.5) / fps:.6f}"]
+    cmd += ["-i", str(source), "-map", "0:v:0", "-an", "-frames:v", str(end - start)]
+    cmd += get_codec_args("av1", threads=0) + ["-svtav1-params", f"lp={threads}", str(chunk_file)]
+    return cmd
+
+
+def build_concat_cmd(list_file, output_file, audio_source=None, audio_args=None) -> list:
+    """Joins the chunks without re-encoding; the audio (if any) is added in the same pass."""
+    cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-v", "error",
+           "-f", "concat", "-safe", "0", "-i", str(list_file)]
+    if audio_source:
+        cmd += ["-i", str(audio_source), "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy"]
+        cmd += list(audio_args or ["-c:a", "copy"])
+    else:
+        cmd += ["-map", "0:v:0", "-an", "-c:v", "copy"]
+    return cmd + [str(output_file)]
+
+
+def write_concat_list(files, list_file):
+    """Concat demuxer list of the files, with quotes in the paths escaped."""
+    with open(list_file, "w", encoding="utf-8") as f:
+        for path in files:
+            f.write("file '{}'\n".format(str(Path(path).resolve()).replace("\\", "/").replace("'", "'\\''")))
+    return list_file
+
+
+def _run(cmd) -> bool:
+    p = run_command(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        error = p.stderr.read().decode("utf-8", errors="replace").strip() if p.stderr else ""
+        log_error(f"   [ERROR] FFmpeg failed: {error.splitlines()[-1] if error else p.returncode}")
+        return False
+    return True
+
+
+def encode_chunked_av1(source, output_file, total_frames, fps, audio_source=None, audio_args=None) -> bool:
+    """
+    Encodes the lossless deinterlaced 'source' to output_file (AV1 .mkv) in parallel
+    chunks. audio_source/audio_args add the audio during the final concat.
+    """
+    output_file = Path(output_file)
+    chunk_dir = output_file.with_name(f"{output_file.stem}_chunks")
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    chunk_dir.mkdir(parents=True)
+    try:
+        log_info(">> [AV1] Detecting scene cuts...")
+        cuts = detect_scene_cuts(source, fps)
+        chunks = plan_chunks(cuts, total_frames, fps)
+        workers = min(get_chunk_workers(), len(chunks))
+        threads = max(int(HW_SETTINGS.get("cpu_threads", 16)) // workers, 1)
+        log_info(f">> [AV1] {len(chunks)} chunks ({len(cuts)} cuts found), {workers} workers x {threads} threads")
+
+        chunk_files = [chunk_dir / f"chunk_{i:05d}.mkv" for i in range(len(chunks))]
+        done: list = []
+        failed: list = []
+
+        def _encode(index):
+            if failed:
+                return False
+            start, end = chunks[index]
+            cmd = build_chunk_cmd(source, chunk_files[index], start, end, fps, threads)
+            log_debug(f"[CHUNKS] CMD: {cmd}")
+            ok = _run(cmd)
+            if not ok:
+                failed.append(index)
+                return False
+            done.append(index)
+            log_info(f"   [AV1] Chunk {len(done)}/{len(chunks)} done (frames {start}-{end - 1})")
+            return True
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if not all(pool.map(_encode, range(len(chunks)))):
+                return False
+
+        list_file = write_concat_list(chunk_files, chunk_dir / "chunks.txt")
+        log_info(">> [AV1] Joining chunks...")
+        return _run(build_concat_cmd(list_file, output_file, audio_source, audio_args))
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
@@ -3,7 +3,7 @@ import sys
 import yaml
 import shutil
 import subprocess
-from modules.utils import log_info, log_error
+from modules.utils import log_info, log_error, get_project_root
 
 # ==============================================================================
 #  CONFIGURATION & HARDWARE
@@ -36,7 +36,20 @@ CONFIG = load_config()
 INPUT_FILE = CONFIG.get("input_file", r"C:\Videos\My_Capture.mp4")
 OUTPUT_FILE = CONFIG.get("output_file", r"C:\Videos\Restored_Master.mp4")
 DEINTERLACE_MODE = CONFIG.get("deinterlace_mode", "QTGMC")
-ENCODER = CONFIG.get("encoder", "prores")
+
+
+def _parse_encoders(setting):
+    """
+    'encoder' accepts a single name or a list; a list fans one QTGMC pass out to several
+    outputs. Duplicates are dropped (order kept), they would render the same output twice.
+    """
+    if isinstance(setting, (list, tuple)):
+        return list(dict.fromkeys(setting))
+    return [setting]
+
+
+ENCODERS = _parse_encoders(CONFIG.get("encoder", "prores"))
+ENCODER = ENCODERS[0] if ENCODERS else "prores"  # Primary encoder (naming, banner, GPU hints)
 PERF_PROFILE = CONFIG.get("performance_profile", "auto")
 AUDIO_CODEC = CONFIG.get("audio_codec", "aac")
 AUDIO_BITRATE = CONFIG.get("audio_bitrate", "320k")
@@ -46,6 +59,14 @@ TV_STANDARD = CONFIG.get("tv_standard", "ntsc").lower()
 DEBUG_MODE = CONFIG.get("debug_logging", False)
 
 
+def get_cache_dir(*parts):
+    """Returns (and creates) a folder below the local cache root ('cache_dir' in config)."""
+    root = CONFIG.get("cache_dir") or os.path.join(get_project_root(), ".cache")
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
 def _get_ram_cache_mb(total_ram_gb):
     """Calculates RAM cache size based on total RAM."""
     if total_ram_gb > 48:
@@ -103,7 +124,7 @@ def _detect_gpu_settings(settings):
                 log_info(f"  > NVIDIA GPU Found (Index {nvidia_index}): {gpu_name}")
                 settings["use_gpu_opencl"] = True
                 settings["gpu_device_index"] = nvidia_index
-                if ENCODER == "av1":
+                if "av1" in ENCODERS:
                     log_info("  > GPU Acceleration: ENABLED (OpenCL + NVENC)")
                 else:
                     log_info("  > GPU Acceleration: ENABLED (OpenCL for QTGMC)")
@@ -114,7 +135,9 @@ def _detect_gpu_settings(settings):
         except Exception:
             pass
     
-    # Fallback if no NVIDIA or smi fails
+    # Fallback if no NVIDIA or smi fails: CPU interpolation unless a probe finds a
+    # working OpenCL device (see modules/interpolation.py)
+    settings["use_gpu_opencl"] = False
     settings["gpu_device_index"] = 0
 
 
@@ -126,7 +149,7 @@ def detect_hardware_settings():
         "tile_y": 0,  # Default: Full frame (ULTRA)
         "cpu_threads": os.cpu_count() or 16,
         "ram_cache_mb": 4000,  # Default safe value for low-RAM systems
-        "use_gpu_opencl": True,  # Optimistic: Default to Hardware Acceleration
+        "use_gpu_opencl": True,  # Manual profile default; auto detection only keeps it for NVIDIA
         "gpu_device_index": 0,    # Default device index
     }
 
@@ -155,12 +178,3 @@ def detect_hardware_settings():
 
 
 HW_SETTINGS = detect_hardware_settings()
-
-
-# Validate Encoder
-VALID_ENCODERS = ["prores", "av1"]
-if ENCODER not in VALID_ENCODERS:
-    log_error(
-        f"ERROR: Invalid encoder '{ENCODER}' in config. Must be one of: {VALID_ENCODERS}"
-    )
-    sys.exit(1)
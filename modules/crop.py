@@ -0,0 +1,189 @@
+import re
+import shutil
+import subprocess
+
+from modules.utils import log_info, log_debug, file_fingerprint
+from modules.config import CONFIG
+from modules.probe import load_probe_entry, update_probe_entry, probe_media
+
+# ==============================================================================
+# ACTIVE-AREA CROP
+# ==============================================================================
+# VHS captures carry black side borders (overscan) and head-switching noise in
+# the bottom lines. QTGMC would process those pixels at full preset cost and the
+# encoders would spend bits on them. FFmpeg cropdetect runs on a few short
+# samples spread over the tape; the union of the detected areas (never smaller
+# than what any sample showed) plus the configured head-switching lines is
+# cropped before QTGMC. The script works in 4:2:0 and the source is interlaced,
+# so offsets are mod 2 horizontally and mod 4 vertically (2 per field).
+# 'auto_crop_restore' pads the result back to the capture geometry, either with
+# black ('pad') or with a cheap bob of the original borders ('mask').
+
+CROP_VERSION = 1
+MOD_X, MOD_Y = 2, 4
+RESTORE_MODES = ("none", "pad", "mask")
+
+_CROPDETECT_RE = re.compile(r"crop=(\d+):(\d+):(\d+):(\d+)")
+
+
+def auto_crop_enabled():
+    return bool(CONFIG.get("auto_crop", False))
+
+
+def get_restore_mode():
+    mode = str(CONFIG.get("auto_crop_restore", "none")).lower()
+    return mode if mode in RESTORE_MODES else "none"
+
+
+def get_crop_settings():
+    """Every setting that changes the crop (part of the mezzanine key and settings hash)."""
+    return {
+        "version": CROP_VERSION,
+        "samples": int(CONFIG.get("auto_crop_samples", 6)),
+        "sample_frames": int(CONFIG.get("auto_crop_sample_frames", 25)),
+        "limit": int(CONFIG.get("auto_crop_limit", 24)),
+        "head_switching_lines": int(CONFIG.get("crop_head_switching_lines", 8)),
+        "min_area": float(CONFIG.get("auto_crop_min_area", 0.5)),
+        "restore": get_restore_mode(),
+    }
+
+
+def build_cropdetect_cmd(input_path, start, frames, limit):
+    ffmpeg_exe = shutil.which("ffmpeg") or "ffmpeg"
+    return [ffmpeg_exe, "-hide_banner", "-nostdin", "-ss", f"{start:.3f}", "-i", str(input_path),
+            "-map", "0:v:0", "-an", "-vf", f"cropdetect=limit={limit}:round=2:reset=0",
+            "-frames:v", str(frames), "-f", "null", "-"]
+
+
+def parse_cropdetect(output):
+    """Last crop=w:h:x:y of a cropdetect run (it accumulates with reset=0), or None."""
+    matches = _CROPDETECT_RE.findall(output or "")
+    return tuple(int(v) for v in matches[-1]) if matches else None
+
+
+def _probe_size(input_path):
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+           "-of", "csv=p=0", str(input_path)]
+    try:
+        width, height = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode().strip().split(",")[:2]
+        return int(width), int(height)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def _align_up(value, mod):
+    return -(-value // mod) * mod
+
+
+def plan_crop(frame_size, areas, params):
+    """
+    Crop offsets {"left", "right", "top", "bottom", "width", "height"} from cropdetect
+    areas (w, h, x, y), or None if there is nothing worth cropping.
+    Offsets are rounded up (cropping a few more lines never leaves garbage behind).
+    """
+    width, height = frame_size
+    # Dark scenes make cropdetect report tiny areas; they say nothing about the borders
+    plausible = [a for a in areas if a[0] * a[1] >= params["min_area"] * width * height]
+    if not plausible:
+        return None
+    left = min(a[2] for a in plausible)
+    top = min(a[3] for a in plausible)
+    right = width - max(a[2] + a[0] for a in plausible)
+    bottom = height - max(a[3] + a[1] for a in plausible)
+    bottom = max(bottom, params["head_switching_lines"])
+
+    crop = {
+        "left": _align_up(max(left, 0), MOD_X), "right": _align_up(max(right, 0), MOD_X),
+        "top": _align_up(max(top, 0), MOD_Y), "bottom": _align_up(max(bottom, 0), MOD_Y),
+    }
+    crop["width"] = width - crop["left"] - crop["right"]
+    crop["height"] = height - crop["top"] - crop["bottom"]
+    if crop["width"] * crop["height"] < params["min_area"] * width * height:
+        return None
+    if not any(crop[side] for side in ("left", "right", "top", "bottom")):
+        return None
+    crop["source_width"], crop["source_height"] = width, height
+    return crop
+
+
+def get_saved_percent(crop):
+    total = crop["source_width"] * crop["source_height"]
+    return 100.0 * (1 - crop["width"] * crop["height"] / total)
+
+
+def detect_crop(input_path, params=None):
+    """Samples the source with cropdetect and plans the crop (see plan_crop)."""
+    params = params or get_crop_settings()
+    frame_size = _probe_size(input_path)
+    duration = probe_media(input_path)["duration_v"]
+    if not frame_size or duration <= 0:
+        return None
+
+    samples = max(params["samples"], 1)
+    areas = []
+    for i in range(samples):
+        start = duration * (i + 1) / (samples + 1)
+        cmd = build_cropdetect_cmd(input_path, start, params["sample_frames"], params["limit"])
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log_debug(f"[CROP] cropdetect failed at {start:.1f}s: {e}")
+            continue
+        area = parse_cropdetect(result.stderr.decode("utf-8", errors="replace"))
+        log_debug(f"[CROP] {start:.1f}s: {area}")
+        if area:
+            areas.append(area)
+    return plan_crop(frame_size, areas, params)
+
+
+def get_auto_crop(input_path):
+    """detect_crop() cached next to the probe data of the source. Logs the pixels saved."""
+    params = get_crop_settings()
+    fingerprint = file_fingerprint(str(input_path))
+    cached = load_probe_entry(fingerprint).get("crop")
+    if cached is not None and cached.get("params") == params:
+        crop = cached.get("result")
+    else:
+        crop = detect_crop(input_path, params)
+        update_probe_entry(fingerprint, crop={"params": params, "result": crop})
+
+    if crop:
+        log_info(f"  > Auto crop: {crop['source_width']}x{crop['source_height']} -> {crop['width']}x{crop['height']} "
+                 f"(L{crop['left']} R{crop['right']} T{crop['top']} B{crop['bottom']}), "
+                 f"{get_saved_percent(crop):.1f}% fewer pixels for QTGMC")
+    else:
+        log_info("  > Auto crop: no stable border found. Processing the full frame.")
+    return crop
+
+
+def get_crop_lines(crop, restore="none", tff=True):
+    """
+    VapourSynth lines around QTGMC: (before, after). 'pad' restores the capture
+    geometry with black borders, 'mask' with the original borders (cheap bob).
+    """
+    sides = f"left={crop['left']}, right={crop['right']}, top={crop['top']}, bottom={crop['bottom']}"
+    before = [f"clip = core.std.Crop(clip, {sides})"]
+    if restore == "pad":
+        return before, [f"clip = core.std.AddBorders(clip, {sides})"]
+    if restore != "mask":
+        return before, []
+
+    before.insert(0, "source = clip")
+    after = [
+        f"bob = core.resize.Spline36(core.std.SeparateFields(source, tff={tff}), height=source.height)",
+        "bob = core.std.AssumeFPS(bob, src=clip)",
+    ]
+    row = []
+    if crop["left"]:
+        row.append(f"core.std.Crop(bob, right=bob.width - {crop['left']}, top={crop['top']}, bottom={crop['bottom']})")
+    row.append("clip")
+    if crop["right"]:
+        row.append(f"core.std.Crop(bob, left=bob.width - {crop['right']}, top={crop['top']}, bottom={crop['bottom']})")
+    column = []
+    if crop["top"]:
+        column.append(f"core.std.Crop(bob, bottom=bob.height - {crop['top']})")
+    column.append(f"core.std.StackHorizontal([{', '.join(row)}])" if len(row) > 1 else "clip")
+    if crop["bottom"]:
+        column.append(f"core.std.Crop(bob, top=bob.height - {crop['bottom']})")
+    after.append(f"clip = core.std.StackVertical([{', '.join(column)}])" if len(column) > 1 else f"clip = {column[0]}")
+    return before, after
@@ -0,0 +1,288 @@
+import shutil
+import threading
+import subprocess
+
+from modules.utils import (
+    log_info, log_debug, update_progress, file_fingerprint, ACTIVE_PROCS
+)
+from modules.config import CONFIG
+from modules.probe import load_probe_entry, update_probe_entry, probe_media
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore
+
+# ==============================================================================
+# STREAMING DRIFT ANALYZER
+# ==============================================================================
+# Measures A/V drift directly instead of inferring it from container durations.
+# Audio (8 kHz mono) and video luma (64x48) are decoded by FFmpeg and streamed
+# through NumPy in blocks. Each stream is reduced to a 100 Hz event track
+# (audio onsets, picture cuts), so a 6-hour tape needs ~17 MB instead of the
+# raw samples. Windows of both tracks are cross-correlated to get a lag per
+# window; together they form a piecewise drift map.
+
+ANALYSIS_RATE = 100          # Hz, shared event grid
+AUDIO_SAMPLE_RATE = 8000     # Decimated mono PCM for onset detection
+LUMA_WIDTH, LUMA_HEIGHT = 64, 48
+BLOCK_SECONDS = 30           # Decode block size (bounds memory per read)
+ANALYZER_VERSION = 1
+
+
+def drift_analysis_available():
+    return np is not None
+
+
+def _get_params():
+    return {
+        "version": ANALYZER_VERSION,
+        "window": float(CONFIG.get("drift_window_seconds", 120)),
+        "max_lag": float(CONFIG.get("drift_max_lag_seconds", 2.0)),
+        "min_confidence": float(CONFIG.get("drift_min_confidence", 4.0)),
+    }
+
+
+def _read_block(stream, size):
+    """Reads up to size bytes (short only at EOF)."""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+    return b"".join(chunks)
+
+
+def _audio_onset_blocks(stream):
+    """Yields half-wave rectified log-energy differences on the analysis grid."""
+    hop = AUDIO_SAMPLE_RATE // ANALYSIS_RATE
+    block_bytes = hop * 4 * ANALYSIS_RATE * BLOCK_SECONDS
+    prev_energy = None
+    while True:
+        data = _read_block(stream, block_bytes)
+        hops = len(data) // (hop * 4)
+        if hops == 0:
+            return
+        samples = np.frombuffer(data[:hops * hop * 4], dtype="<f4").reshape(hops, hop)
+        energy = np.log(np.sqrt(np.mean(np.square(samples, dtype=np.float64), axis=1)) + 1e-4)
+        first = energy[0] if prev_energy is None else prev_energy
+        prev_energy = energy[-1]
+        yield np.maximum(np.diff(energy, prepend=first), 0.0).astype(np.float32)
+
+
+def _video_cut_blocks(stream, fps):
+    """Yields (frame_indices, mean absolute luma difference to the previous frame)."""
+    frame_bytes = LUMA_WIDTH * LUMA_HEIGHT
+    frames_per_block = max(int(fps * BLOCK_SECONDS), 1)
+    prev_frame = None
+    index = 0
+    while True:
+        data = _read_block(stream, frame_bytes * frames_per_block)
+        count = len(data) // frame_bytes
+        if count == 0:
+            return
+        frames = np.frombuffer(data[:count * frame_bytes], dtype=np.uint8).reshape(count, frame_bytes).astype(np.int16)
+        first = frames[:1] if prev_frame is None else prev_frame[None, :]
+        diffs = np.abs(np.diff(np.concatenate((first, frames)), axis=0)).mean(axis=1)
+        prev_frame = frames[-1]
+        yield np.arange(index, index + count), diffs.astype(np.float32)
+        index += count
+
+
+def _emphasize_events(track, seconds=1.0):
+    """Removes the slowly varying part so only spikes (cuts, onsets) remain."""
+    width = max(int(seconds * ANALYSIS_RATE), 1)
+    kernel = np.ones(width, dtype=np.float64) / width
+    baseline = np.convolve(track, kernel, mode="same")
+    return np.maximum(track - baseline, 0.0)
+
+
+def video_events_to_grid(indices, values, fps, length=None):
+    """Places per-frame cut strengths on the analysis grid (max per grid slot)."""
+    slots = np.round(indices / fps * ANALYSIS_RATE).astype(np.int64)
+    size = int(length if length is not None else (slots.max() + 1 if len(slots) else 0))
+    grid = np.zeros(size, dtype=np.float32)
+    valid = slots < size
+    np.maximum.at(grid, slots[valid], values[valid])
+    return grid
+
+
+def window_lag(video_events, audio_events, max_lag):
+    """
+    Cross-correlates one window. audio_events must cover the video window plus max_lag
+    grid slots on each side. Returns (lag_slots, confidence); a positive lag means the
+    audio event happens after the matching picture event.
+    """
+    v = video_events - video_events.mean()
+    a = audio_events - audio_events.mean()
+    v_std, a_std = v.std(), a.std()
+    if v_std <= 0 or a_std <= 0:
+        return 0, 0.0
+    corr = np.correlate(a / a_std, v / v_std, mode="valid")
+    peak = int(np.argmax(corr))
+    spread = corr.std()
+    confidence = float((corr[peak] - np.median(corr)) / spread) if spread > 0 else 0.0
+    return peak - max_lag, confidence
+
+
+def build_drift_map(video_grid, audio_grid, params):
+    """Returns [{'t', 'lag', 'confidence'}] for every window with a confident match."""
+    window = int(params["window"] * ANALYSIS_RATE)
+    max_lag = int(params["max_lag"] * ANALYSIS_RATE)
+    video_track = _emphasize_events(video_grid)
+    audio_track = _emphasize_events(audio_grid)
+    points = []
+    for start in range(max_lag, min(len(video_track), len(audio_track) - max_lag) - window + 1, window):
+        v = video_track[start:start + window]
+        a = audio_track[start - max_lag:start + window + max_lag]
+        lag, confidence = window_lag(v, a, max_lag)
+        if confidence >= params["min_confidence"]:
+            points.append({
+                "t": (start + window / 2) / ANALYSIS_RATE,
+                "lag": lag / ANALYSIS_RATE,
+                "confidence": round(confidence, 2),
+            })
+    return points
+
+
+def fit_drift(points):
+    """
+    Robust weighted linear fit of lag over time. Returns (tempo, offset, inliers).
+    tempo is the atempo factor (1 + drift rate), offset the lag at t=0.
+    """
+    if len(points) < 2:
+        return None
+    t = np.array([p["t"] for p in points])
+    lag = np.array([p["lag"] for p in points])
+    w = np.array([p["confidence"] for p in points])
+    slope, intercept = np.polyfit(t, lag, 1, w=w)
+
+    residual = np.abs(lag - (slope * t + intercept))
+    limit = max(3 * 1.4826 * float(np.median(residual)), 2.0 / ANALYSIS_RATE)
+    keep = residual <= limit
+    if 2 <= keep.sum() < len(points):
+        slope, intercept = np.polyfit(t[keep], lag[keep], 1, w=w[keep])
+    inliers = [p for p, k in zip(points, keep) if k]
+    return 1.0 + float(slope), float(intercept), inliers
+
+
+def build_tempo_filter(points, tempo, min_deviation):
+    """
+    Returns an asendcmd+atempo chain that follows the piecewise drift map, or None when
+    a single global atempo stays within min_deviation seconds of every point.
+    """
+    if len(points) < 3:
+        return None
+    t = np.array([p["t"] for p in points])
+    lag = np.array([p["lag"] for p in points])
+    slope = tempo - 1.0
+    intercept = float(np.mean(lag - slope * t))
+    if np.max(np.abs(lag - (slope * t + intercept))) < min_deviation:
+        return None
+
+    audio_t = t + lag
+    rates = np.clip(np.diff(audio_t) / np.diff(t), 0.5, 2.0)
+    commands = ";".join(f"{a:.3f} atempo tempo {r:.6f}" for a, r in zip(audio_t[1:-1], rates[1:]))
+    chain = f"atempo={rates[0]:.6f}"
+    return f"asendcmd=c='{commands}',{chain}" if commands else chain
+
+
+def _start_decoder(cmd):
+    p = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    ACTIVE_PROCS.append(p)
+    return p
+
+
+def _release_decoder(p):
+    try:
+        if p.poll() is None:
+            p.kill()
+        p.wait()
+    finally:
+        if p in ACTIVE_PROCS:
+            ACTIVE_PROCS.remove(p)
+
+
+def _stream_event_grids(input_path, fps, audio_duration):
+    """Decodes both streams concurrently and returns (video_grid, audio_grid)."""
+    ffmpeg_exe = shutil.which("ffmpeg") or "ffmpeg"
+    audio_cmd = [ffmpeg_exe, "-v", "error", "-nostdin", "-i", str(input_path), "-map", "0:a:0",
+                 "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), "-f", "f32le", "-"]
+    video_cmd = [ffmpeg_exe, "-v", "error", "-nostdin", "-i", str(input_path), "-map", "0:v:0",
+                 "-vf", f"scale={LUMA_WIDTH}:{LUMA_HEIGHT},format=gray", "-f", "rawvideo", "-"]
+
+    p_audio = _start_decoder(audio_cmd)
+    p_video = _start_decoder(video_cmd)
+    video_chunks = []
+
+    def _read_video():
+        for chunk in _video_cut_blocks(p_video.stdout, fps):
+            video_chunks.append(chunk)
+
+    t_video = threading.Thread(target=_read_video, daemon=True)
+    t_video.start()
+    try:
+        audio_chunks = []
+        done = 0
+        for block in _audio_onset_blocks(p_audio.stdout):
+            audio_chunks.append(block)
+            done += len(block)
+            if audio_duration > 0:
+                pct = min(done / ANALYSIS_RATE / audio_duration * 100, 100.0)
+                update_progress(pct, "Analyzing", process_name="Drift")
+        t_video.join()
+    finally:
+        _release_decoder(p_audio)
+        _release_decoder(p_video)
+
+    audio_grid = np.concatenate(audio_chunks) if audio_chunks else np.zeros(0, dtype=np.float32)
+    if not video_chunks:
+        return np.zeros(0, dtype=np.float32), audio_grid
+    indices = np.concatenate([c[0] for c in video_chunks])
+    values = np.concatenate([c[1] for c in video_chunks])
+    return video_events_to_grid(indices, values, fps), audio_grid
+
+
+def analyze_drift(input_path, params=None):
+    """Runs the full analysis. Returns a result dict (tempo/offset/filter/points) or None."""
+    params = params or _get_params()
+    media = probe_media(input_path)
+    fps, audio_duration = media["fps"], media["duration_a"]
+    log_info(">> Measuring audio drift (streaming A/V event correlation)...")
+    video_grid, audio_grid = _stream_event_grids(input_path, fps, audio_duration)
+    points = build_drift_map(video_grid, audio_grid, params)
+    fit = fit_drift(points)
+    if fit is None:
+        log_info(f"\n   [SYNC] Drift analysis: only {len(points)} confident window(s). Falling back.")
+        return None
+
+    tempo, offset, inliers = fit
+    min_dev = float(CONFIG.get("drift_piecewise_min_ms", 40)) / 1000.0
+    return {
+        "params": params,
+        "tempo": tempo,
+        "offset": offset,
+        "filter": build_tempo_filter(inliers, tempo, min_dev),
+        "points": points,
+        "inliers": len(inliers),
+    }
+
+
+def analyze_drift_cached(input_path):
+    """analyze_drift() with results stored next to the probe data of the source."""
+    if not drift_analysis_available():
+        log_info("   [SYNC] Drift analysis needs NumPy. Using duration-based correction.")
+        return None
+    params = _get_params()
+    fingerprint = file_fingerprint(str(input_path))
+    cached = load_probe_entry(fingerprint).get("drift")
+    if cached is not None and cached.get("params") == params:
+        log_debug("   [SYNC] Using cached drift analysis.")
+        return cached.get("result")
+
+    result = analyze_drift(input_path, params)
+    update_probe_entry(fingerprint, drift={"params": params, "result": result})
+    return result
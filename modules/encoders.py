@@ -0,0 +1,304 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional
+
+from modules.utils import log_info, log_debug, log_error, get_duration, parse_ffmpeg_frame
+from modules.config import CONFIG, HW_SETTINGS, ENCODERS, get_cache_dir
+from modules.affinity import get_stage_threads
+
+# ==============================================================================
+# ENCODER BACKENDS
+# ==============================================================================
+# Every output codec is described once here: FFmpeg arguments, container, file
+# suffix, relative encode cost and an output size estimate. Software encoders get
+# their thread count from HW_SETTINGS ('encoder_threads' overrides it).
+# '--benchmark' encodes the same raw sample with each backend and compares speed
+# and size, so the archival codec can be picked per machine.
+
+# Slice counts FFV1 level 3 accepts for SD frames (grid of horizontal x vertical slices)
+FFV1_SLICES = (4, 6, 9, 12, 16, 24)
+
+# Pixel format of the raw sample (same as the vspipe output)
+SAMPLE_PIX_FMT = "yuv420p16le"
+
+
+def get_encoder_threads() -> int:
+    configured = int(CONFIG.get("encoder_threads", 0) or 0)
+    if configured > 0:
+        return configured
+    # Pinned encoders get one thread per CPU of their set
+    return get_stage_threads("ffmpeg") or max(int(HW_SETTINGS.get("cpu_threads", 16)), 1)
+
+
+def get_ffv1_slices(threads: int) -> int:
+    """Smallest valid slice count that keeps every thread busy ('ffv1_slices' overrides it)."""
+    configured = int(CONFIG.get("ffv1_slices", 0) or 0)
+    if configured > 0:
+        return configured
+    for count in FFV1_SLICES:
+        if count >= threads:
+            return count
+    return FFV1_SLICES[-1]
+
+
+def _lossless_pix_fmt(encoder: str) -> str:
+    """'lossless_pix_fmt', or the deepest format the encoder holds losslessly."""
+    return CONFIG.get("lossless_pix_fmt") or ENCODER_BACKENDS[encoder]["pix_fmt"]
+
+
+def _pix_fmt_bits(pix_fmt: str) -> int:
+    match = re.search(r"p(\d+)(le|be)?$", pix_fmt)
+    return int(match.group(1)) if match else 8
+
+
+def _intra_args() -> list:
+    return ["-g", "1"] if CONFIG.get("lossless_intra_only", False) else []
+
+
+def _thread_args(threads) -> list:
+    return ["-threads", str(threads)] if threads else []
+
+
+def _prores_args(threads):
+    return [
+        "-c:v", "prores_ks", "-profile:v", "3", "-vendor", "apl0",
+        "-bits_per_mb", "8000", "-pix_fmt", "yuv422p10le"
+    ] + _thread_args(threads)
+
+
+def _av1_args(threads):
+    # SVT-AV1 sizes its own thread pool from the logical core count
+    return ["-c:v", "libsvtav1", "-preset", "6", "-crf", "22", "-pix_fmt", "yuv420p10le"]
+
+
+def _ffv1_args(threads):
+    args = [
+        "-c:v", "ffv1", "-level", "3", "-coder", "1", "-context", "1", "-g", "1",
+        "-slicecrc", "1", "-pix_fmt", _lossless_pix_fmt("ffv1")
+    ]
+    if threads:
+        args += ["-slices", str(get_ffv1_slices(threads))]
+    return args + _thread_args(threads)
+
+
+def _x264_args(threads):
+    # qp 0 on a 10-bit format selects the High 4:4:4 Predictive (lossless) profile.
+    # x264 stops at 10 bits, so the 16-bit QTGMC output is rounded first.
+    return [
+        "-c:v", "libx264", "-preset", CONFIG.get("x264_preset", "veryfast"), "-qp", "0",
+        "-pix_fmt", _lossless_pix_fmt("x264")
+    ] + _intra_args() + _thread_args(threads)
+
+
+def _x265_args(threads):
+    params = ["lossless=1", "log-level=error"]
+    if threads:
+        params.append(f"pools={threads}")
+    return [
+        "-c:v", "libx265", "-preset", CONFIG.get("x265_preset", "fast"),
+        "-pix_fmt", _lossless_pix_fmt("x265")
+    ] + _intra_args() + ["-x265-params", ":".join(params)]
+
+
+def _dnxhr_args(threads):
+    return ["-c:v", "dnxhd", "-profile:v", "dnxhr_hqx", "-pix_fmt", "yuv422p10le"] + _thread_args(threads)
+
+
+# cost: relative encode time per frame (slowest output is fed first).
+# bits_per_pixel: rough output size for space checks.
+# pix_fmt (lossless backends): default 'lossless_pix_fmt', the deepest format the encoder holds.
+ENCODER_BACKENDS: Dict[str, dict] = {
+    "prores": {"args": _prores_args, "ext": ".mov", "suffix_key": "output_suffix",
+               "suffix": "_deinterlaced_prores", "cost": 1, "bits_per_pixel": 3.6, "lossless": False},
+    "av1": {"args": _av1_args, "ext": ".mkv", "suffix_key": "output_suffix_av1",
+            "suffix": "_deinterlaced_av1", "cost": 3, "bits_per_pixel": 0.15, "lossless": False},
+    "ffv1": {"args": _ffv1_args, "ext": ".mkv", "suffix_key": "output_suffix_ffv1",
+             "suffix": "_deinterlaced_ffv1", "cost": 1, "bits_per_pixel": 12.0, "lossless": True,
+             "pix_fmt": "yuv420p16le"},
+    "x264": {"args": _x264_args, "ext": ".mkv", "suffix_key": "output_suffix_x264",
+             "suffix": "_deinterlaced_x264", "cost": 2, "bits_per_pixel": 7.0, "lossless": True,
+             "pix_fmt": "yuv420p10le"},
+    "x265": {"args": _x265_args, "ext": ".mkv", "suffix_key": "output_suffix_x265",
+             "suffix": "_deinterlaced_x265", "cost": 4, "bits_per_pixel": 6.5, "lossless": True,
+             "pix_fmt": "yuv420p10le"},
+    "dnxhr": {"args": _dnxhr_args, "ext": ".mov", "suffix_key": "output_suffix_dnxhr",
+              "suffix": "_deinterlaced_dnxhr", "cost": 1, "bits_per_pixel": 3.6, "lossless": False},
+}
+
+
+VALID_ENCODERS = list(ENCODER_BACKENDS)
+
+# Validate Encoder (here and not in config, which is imported before this registry)
+if not ENCODERS:
+    log_error(f"ERROR: No encoder configured. Must be one of: {VALID_ENCODERS}")
+    sys.exit(1)
+for _encoder in ENCODERS:
+    if _encoder not in VALID_ENCODERS:
+        log_error(
+            f"ERROR: Invalid encoder '{_encoder}' in config. Must be one of: {VALID_ENCODERS}"
+        )
+        sys.exit(1)
+
+
+def get_backend(encoder: str) -> dict:
+    """Registry entry of an encoder. Raises KeyError for unknown names."""
+    return ENCODER_BACKENDS[encoder]
+
+
+def get_lossless_label(encoder: str) -> str:
+    """'yes' if the full 16-bit output is kept, '<n>-bit' if lossless after rounding, else 'no'."""
+    backend = get_backend(encoder)
+    if not backend["lossless"]:
+        return "no"
+    bits = _pix_fmt_bits(_lossless_pix_fmt(encoder))
+    return "yes" if bits >= _pix_fmt_bits(SAMPLE_PIX_FMT) else f"{bits}-bit"
+
+
+def get_codec_args(encoder: str, threads=None) -> list:
+    """
+    FFmpeg video arguments for one output. threads=None uses get_encoder_threads();
+    threads=0 leaves out every threading option (used for settings hashes, so the
+    same output on a machine with another core count is not considered stale).
+    """
+    if threads is None:
+        threads = get_encoder_threads()
+    return get_backend(encoder)["args"](threads)
+
+
+def get_output_name(stem: str, encoder: str) -> str:
+    backend = get_backend(encoder)
+    return f"{stem}{CONFIG.get(backend['suffix_key'], backend['suffix'])}{backend['ext']}"
+
+
+# ------------------------------------------------------------------------------
+# BENCHMARK
+# ------------------------------------------------------------------------------
+
+
+def get_benchmark_encoders() -> list:
+    configured = CONFIG.get("benchmark_encoders") or list(ENCODER_BACKENDS)
+    return [name for name in configured if name in ENCODER_BACKENDS]
+
+
+def build_sample_cmd(source, sample_path, frames, start=0.0) -> list:
+    """Decodes 'frames' frames to raw video in NUT, so the encode runs do not pay for decoding."""
+    cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-v", "error"]
+    if source:
+        cmd += ["-ss", f"{start:.3f}", "-i", str(source), "-map", "0:v:0"]
+    else:
+        # Noise keeps the synthetic pattern from compressing unrealistically well
+        cmd += ["-f", "lavfi", "-i", "testsrc2=size=720x576:rate=25,noise=alls=12:allf=t"]
+    cmd += ["-frames:v", str(frames), "-an", "-c:v", "rawvideo", "-pix_fmt", SAMPLE_PIX_FMT, str(sample_path)]
+    return cmd
+
+
+def build_benchmark_cmd(encoder, sample_path, output_path, threads=None) -> list:
+    return [shutil.which("ffmpeg") or "ffmpeg", "-y", "-i", str(sample_path)] + \
+        get_codec_args(encoder, threads) + [str(output_path)]
+
+
+def _run_encode(encoder, sample_path, output_path):
+    """Encodes the sample once. Returns (seconds, frames) or None if FFmpeg failed."""
+    cmd = build_benchmark_cmd(encoder, sample_path, output_path)
+    log_debug(f"[BENCHMARK] CMD: {cmd}")
+    started = time.monotonic()
+    try:
+        p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        log_error(f"   [ERROR] {encoder}: {e}")
+        return None
+    seconds = time.monotonic() - started
+    output = p.stderr.decode("utf-8", errors="replace")
+    if p.returncode != 0:
+        log_error(f"   [ERROR] {encoder} failed (encoder missing from this FFmpeg build?)")
+        for line in output.strip().splitlines()[-3:]:
+            log_debug(f"[BENCHMARK] {line}")
+        return None
+    frames = [n for n in (parse_ffmpeg_frame(line) for line in output.replace("\r", "\n").splitlines()) if n]
+    return seconds, (frames[-1] if frames else None)
+
+
+def run_benchmark(source=None, frames=None, encoders=None) -> Optional[dict]:
+    """
+    Encodes one raw sample (middle of 'source', or a synthetic noisy test pattern)
+    with every backend. Returns the report dict, or None if no sample could be made.
+    """
+    frames = int(frames or CONFIG.get("benchmark_frames", 250))
+    encoders = encoders or get_benchmark_encoders()
+    bench_dir = Path(get_cache_dir("benchmarks"))
+    sample_path = bench_dir / "sample.nut"
+    start = 0.0
+    if source:
+        duration = get_duration(str(source))
+        start = max(duration * 0.4, 0.0) if duration else 0.0
+
+    log_info(f">> Preparing a {frames}-frame raw sample ({Path(source).name if source else 'test pattern'})...")
+    try:
+        p = subprocess.run(build_sample_cmd(source, sample_path, frames, start),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        log_error(f"[ERROR] Sample could not be created: {e}")
+        return None
+    if p.returncode != 0 or not sample_path.exists():
+        log_error(f"[ERROR] Sample could not be created: {p.stderr.decode('utf-8', errors='replace').strip()}")
+        return None
+
+    results = []
+    try:
+        for encoder in encoders:
+            output_path = bench_dir / f"sample_{encoder}{get_backend(encoder)['ext']}"
+            log_info(f"   Encoding with {encoder}...")
+            measured = _run_encode(encoder, sample_path, output_path)
+            size = output_path.stat().st_size if output_path.exists() else 0
+            if output_path.exists():
+                os.remove(output_path)
+            if measured is None:
+                results.append({"encoder": encoder, "ok": False})
+                continue
+            seconds, encoded = measured
+            encoded = encoded or frames
+            results.append({
+                "encoder": encoder, "ok": True, "lossless": get_lossless_label(encoder),
+                "seconds": round(seconds, 3), "frames": encoded,
+                "fps": round(encoded / seconds, 2) if seconds > 0 else None,
+                "bytes": size,
+            })
+    finally:
+        if sample_path.exists():
+            os.remove(sample_path)
+
+    return {
+        "created_at": time.time(),
+        "source": os.path.abspath(str(source)) if source else None,
+        "frames": frames,
+        "threads": get_encoder_threads(),
+        "results": sorted(results, key=lambda r: -(r.get("fps") or 0)),
+    }
+
+
+def save_benchmark(report: dict) -> Path:
+    path = Path(get_cache_dir("benchmarks")) / "encoders.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
+
+
+def format_benchmark(report: dict) -> list:
+    """Console lines of the comparison, fastest first."""
+    lines = [f"   {'Encoder':<8} {'Lossless':<9} {'FPS':>8} {'Size (MB)':>10} {'vs fastest':>11}"]
+    fastest = next((r["fps"] for r in report["results"] if r.get("fps")), None)
+    for r in report["results"]:
+        if not r["ok"]:
+            lines.append(f"   {r['encoder']:<8} {'':<9} {'failed':>8}")
+            continue
+        relative = f"{r['fps'] / fastest * 100:.0f}%" if fastest and r.get("fps") else "-"
+        lines.append(f"   {r['encoder']:<8} {r['lossless']:<9} "
+                     f"{r['fps'] or 0:>8.1f} {r['bytes'] / 1e6:>10.1f} {relative:>11}")
+    lines.append(f"   {report['frames']} frames per encoder, {report['threads']} threads")
+    return lines
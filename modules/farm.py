@@ -0,0 +1,308 @@
+import json
+import time
+import socket
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from modules.utils import log_info, log_debug, log_error
+from modules.config import CONFIG
+
+# ==============================================================================
+# RENDER FARM
+# ==============================================================================
+# A coordinator holds the queue and hands whole source files to worker processes
+# over a small JSON-over-HTTP protocol. Workers run the normal pipeline against
+# shared storage, send heartbeats while rendering and report throughput when a
+# job finishes. Jobs of workers that stop sending heartbeats are queued again.
+#
+#   POST /register   {"name"}                          -> {"worker_id", "worker_timeout"}
+#   POST /claim      {"worker_id"}                     -> {"job": {...} | null, "done": bool}
+#   POST /heartbeat  {"worker_id", "job_id"}           -> {"ok", "cancel"}
+#   POST /complete   {"worker_id", "job_id", "ok", "seconds", "media_seconds"}
+#   GET  /status                                       -> queue and worker overview
+
+DEFAULT_PORT = 8765
+
+
+class Coordinator:
+    """Job queue and worker registry. All methods are thread-safe."""
+
+    def __init__(self, paths, worker_timeout=None, max_attempts=None):
+        self.worker_timeout = float(worker_timeout or CONFIG.get("farm_worker_timeout", 60))
+        self.max_attempts = int(max_attempts or CONFIG.get("farm_max_attempts", 3))
+        self.jobs = {}
+        self.queue = []
+        self.workers = {}
+        self._next_worker = 1
+        self._lock = threading.Lock()
+        for i, path in enumerate(paths, 1):
+            job_id = f"job-{i}"
+            self.jobs[job_id] = {"id": job_id, "path": str(path), "state": "queued", "worker": None, "attempts": 0}
+            self.queue.append(job_id)
+
+    def register(self, name):
+        with self._lock:
+            worker_id = f"w{self._next_worker}-{name}"
+            self._next_worker += 1
+            self.workers[worker_id] = {
+                "name": name, "job": None, "last_seen": time.monotonic(), "alive": True,
+                "jobs_done": 0, "jobs_failed": 0, "busy_seconds": 0.0, "media_seconds": 0.0,
+            }
+        log_info(f"   [FARM] Worker joined: {worker_id}")
+        return worker_id
+
+    def _touch(self, worker_id):
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return None
+        worker["last_seen"] = time.monotonic()
+        worker["alive"] = True
+        return worker
+
+    def claim(self, worker_id):
+        with self._lock:
+            worker = self._touch(worker_id)
+            if worker is None:
+                return None
+            if not self.queue:
+                return None
+            job = self.jobs[self.queue.pop(0)]
+            job.update(state="running", worker=worker_id)
+            job["attempts"] += 1
+            worker["job"] = job["id"]
+        log_info(f"   [FARM] {job['id']} -> {worker_id}: {Path(job['path']).name}")
+        return {"id": job["id"], "path": job["path"], "attempt": job["attempts"]}
+
+    def heartbeat(self, worker_id, job_id):
+        """False tells the worker its job was taken away (e.g. it was declared dead)."""
+        with self._lock:
+            worker = self._touch(worker_id)
+            job = self.jobs.get(job_id)
+            return bool(worker and job and job["worker"] == worker_id and job["state"] == "running")
+
+    def complete(self, worker_id, job_id, ok, seconds=0.0, media_seconds=0.0):
+        with self._lock:
+            worker = self._touch(worker_id)
+            job = self.jobs.get(job_id)
+            if worker is None or job is None or job["worker"] != worker_id:
+                return False
+            worker["job"] = None
+            if ok:
+                # Throughput only counts finished renders; a failure may have stopped early
+                worker["jobs_done"] += 1
+                worker["busy_seconds"] += seconds
+                worker["media_seconds"] += media_seconds
+                job["state"] = "done"
+            else:
+                worker["jobs_failed"] += 1
+                self._requeue(job, "failed")
+        return True
+
+    def _requeue(self, job, reason):
+        job["worker"] = None
+        if job["attempts"] >= self.max_attempts:
+            job["state"] = "failed"
+            log_error(f"[ERROR] {job['id']} gave up after {job['attempts']} attempts ({reason}).")
+        else:
+            job["state"] = "queued"
+            self.queue.insert(0, job["id"])
+            log_info(f"   [FARM] {job['id']} queued again ({reason}).")
+
+    def reap(self, now=None):
+        """Declares silent workers dead and requeues their jobs. Returns the reaped worker ids."""
+        now = time.monotonic() if now is None else now
+        reaped = []
+        with self._lock:
+            for worker_id, worker in self.workers.items():
+                if worker["alive"] and now - worker["last_seen"] > self.worker_timeout:
+                    worker["alive"] = False
+                    reaped.append(worker_id)
+                    if worker["job"]:
+                        self._requeue(self.jobs[worker["job"]], f"worker {worker_id} lost")
+                        worker["job"] = None
+        return reaped
+
+    def finished(self):
+        with self._lock:
+            return all(job["state"] in ("done", "failed") for job in self.jobs.values())
+
+    def status(self):
+        with self._lock:
+            workers = {}
+            for worker_id, w in self.workers.items():
+                speed = w["media_seconds"] / w["busy_seconds"] if w["busy_seconds"] > 0 else None
+                workers[worker_id] = {"alive": w["alive"], "job": w["job"], "jobs_done": w["jobs_done"],
+                                      "jobs_failed": w["jobs_failed"], "speed": speed}
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["state"]] = counts.get(job["state"], 0) + 1
+            return {"jobs": counts, "workers": workers}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    coordinator = None
+
+    def log_message(self, format, *args):
+        log_debug(f"[FARM] {self.address_string()} {format % args}")
+
+    def _reply(self, payload, code=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(self.coordinator.status())
+        else:
+            self._reply({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply({"error": "bad json"}, 400)
+            return
+        c = self.coordinator
+        if self.path == "/register":
+            self._reply({"worker_id": c.register(str(data.get("name", "worker"))),
+                         "worker_timeout": c.worker_timeout})
+        elif self.path == "/claim":
+            job = c.claim(data.get("worker_id"))
+            self._reply({"job": job, "done": job is None and c.finished()})
+        elif self.path == "/heartbeat":
+            ok = c.heartbeat(data.get("worker_id"), data.get("job_id"))
+            self._reply({"ok": ok, "cancel": not ok})
+        elif self.path == "/complete":
+            ok = c.complete(data.get("worker_id"), data.get("job_id"), bool(data.get("ok")),
+                            float(data.get("seconds", 0)), float(data.get("media_seconds", 0)))
+            self._reply({"ok": ok})
+        else:
+            self._reply({"error": "not found"}, 404)
+
+
+def start_coordinator(paths, host=None, port=None, worker_timeout=None, max_attempts=None):
+    """Starts the HTTP coordinator in background threads. Returns (coordinator, server)."""
+    coordinator = Coordinator(paths, worker_timeout, max_attempts)
+    handler = type("FarmRequestHandler", (_RequestHandler,), {"coordinator": coordinator})
+    server = ThreadingHTTPServer((host or CONFIG.get("farm_host", "127.0.0.1"),
+                                  DEFAULT_PORT if port is None else port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def _reaper():
+        while not coordinator.finished():
+            coordinator.reap()
+            time.sleep(min(coordinator.worker_timeout / 4, 5.0))
+
+    threading.Thread(target=_reaper, daemon=True).start()
+    log_info(f">> Farm coordinator on {server.server_address[0]}:{server.server_address[1]} "
+             f"with {len(paths)} job(s)")
+    return coordinator, server
+
+
+def run_coordinator(paths, host=None, port=None):
+    """Serves the queue until every job is done or failed."""
+    coordinator, server = start_coordinator(paths, host, port)
+    try:
+        while not coordinator.finished():
+            time.sleep(1)
+    finally:
+        # Give workers one poll to learn that the queue is done
+        time.sleep(float(CONFIG.get("farm_poll_seconds", 5)))
+        server.shutdown()
+    status = coordinator.status()
+    for worker_id, w in status["workers"].items():
+        speed = f"{w['speed']:.2f}x realtime" if w["speed"] else "n/a"
+        log_info(f"   [FARM] {worker_id}: {w['jobs_done']} job(s), {w['jobs_failed']} failed, {speed}")
+    return status
+
+
+def _post(url, endpoint, payload, timeout=30):
+    request = urllib.request.Request(url.rstrip("/") + endpoint, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_worker(url, handler, media_duration=None, name=None, heartbeat_seconds=None, poll_seconds=None,
+               stop_event=None):
+    """
+    Claims and runs jobs until the coordinator reports the queue as done.
+    handler(path, cancel) -> bool renders one source and stops once the cancel event is
+    set (the coordinator gave the job to another worker); media_duration(path) gives
+    its length in seconds for the throughput report.
+    """
+    name = name or socket.gethostname()
+    heartbeat_seconds = float(heartbeat_seconds or CONFIG.get("farm_heartbeat_seconds", 10))
+    poll_seconds = float(poll_seconds or CONFIG.get("farm_poll_seconds", 5))
+    stop_event = stop_event or threading.Event()
+    registration = _post(url, "/register", {"name": name})
+    worker_id = registration["worker_id"]
+    # Past this many seconds without a heartbeat the coordinator hands the job to
+    # someone else, so a worker that cannot reach it must stop rendering too.
+    worker_timeout = float(registration.get("worker_timeout") or CONFIG.get("farm_worker_timeout", 60))
+    log_info(f">> Farm worker {worker_id} connected to {url}")
+
+    done = 0
+    while not stop_event.is_set():
+        try:
+            reply = _post(url, "/claim", {"worker_id": worker_id})
+        except (OSError, urllib.error.URLError) as e:
+            log_error(f"[ERROR] Coordinator unreachable: {e}")
+            stop_event.wait(poll_seconds)
+            continue
+        if reply.get("done"):
+            break
+        job = reply.get("job")
+        if not job:
+            stop_event.wait(poll_seconds)
+            continue
+
+        beating = threading.Event()
+        cancel = threading.Event()
+
+        def _heartbeat(job_id=job["id"]):
+            last_ok = time.monotonic()
+            while not beating.wait(heartbeat_seconds):
+                try:
+                    if _post(url, "/heartbeat", {"worker_id": worker_id, "job_id": job_id}, timeout=10).get("cancel"):
+                        log_error(f"[ERROR] Coordinator reassigned {job_id}. Stopping the job.")
+                        cancel.set()
+                        return
+                    last_ok = time.monotonic()
+                except (OSError, urllib.error.URLError) as e:
+                    log_debug(f"[FARM] Heartbeat failed: {e}")
+                    if time.monotonic() - last_ok > worker_timeout:
+                        log_error(f"[ERROR] No heartbeat for {job_id} reached the coordinator in "
+                                  f"{worker_timeout:.0f}s; it has been reassigned. Stopping the job.")
+                        cancel.set()
+                        return
+
+        t_beat = threading.Thread(target=_heartbeat, daemon=True)
+        t_beat.start()
+        started = time.monotonic()
+        try:
+            ok = bool(handler(Path(job["path"]), cancel)) and not cancel.is_set()
+        except Exception as e:
+            log_error(f"[ERROR] Job {job['id']} crashed: {e}")
+            ok = False
+        finally:
+            beating.set()
+            t_beat.join()
+        seconds = time.monotonic() - started
+        media = media_duration(Path(job["path"])) if (ok and media_duration) else 0.0
+        try:
+            _post(url, "/complete", {"worker_id": worker_id, "job_id": job["id"], "ok": ok,
+                                     "seconds": seconds, "media_seconds": media})
+        except (OSError, urllib.error.URLError) as e:
+            log_error(f"[ERROR] Could not report {job['id']}: {e}")
+        done += 1
+    log_info(f">> Farm worker {worker_id} finished ({done} job(s)).")
+    return done
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import subprocess
+from pathlib import Path
+
+from modules.utils import log_info, log_debug, log_error, get_vspipe_env
+from modules.config import CONFIG, HW_SETTINGS, get_cache_dir
+from modules.vspipe import get_qtgmc_args
+
+# ==============================================================================
+# FILTER PROFILE
+# ==============================================================================
+# '--profile' renders a sample range of the generated script with
+# 'vspipe --filter-time' (output discarded) and ranks the filters of the QTGMC
+# graph by the CPU time they used. The report is saved as JSON per source in
+# <cache_dir>/profiles, together with the QTGMC settings it was measured with.
+
+
+def get_sample_range(total_frames, sample_frames):
+    """Frame range (start, end inclusive) from the middle of the clip."""
+    total_frames = int(total_frames or 0)
+    if total_frames <= 0:
+        return 0, max(int(sample_frames) - 1, 0)
+    count = min(int(sample_frames), total_frames)
+    start = max((total_frames - count) // 2, 0)
+    return start, start + count - 1
+
+
+def build_profile_cmd(vspipe_exe, script_path, start, end) -> list:
+    # '.' discards the frames; only the timing table on stderr is of interest
+    return [vspipe_exe, "--filter-time", "-s", str(start), "-e", str(end), str(script_path), "."]
+
+
+def parse_filter_times(output: str) -> list:
+    """
+    Parses the '--filter-time' table (name, mode, %, seconds). Rows of the same
+    filter are summed. Returns dicts sorted by time, largest first.
+    """
+    filters: dict = {}
+    for line in output.splitlines():
+        tokens = line.split()
+        if len(tokens) < 4:
+            continue
+        try:
+            seconds = float(tokens[-1])
+            float(tokens[-2])
+        except ValueError:
+            continue
+        name = " ".join(tokens[:-3])
+        entry = filters.setdefault(name, {"filter": name, "mode": tokens[-3], "seconds": 0.0, "nodes": 0})
+        entry["seconds"] += seconds
+        entry["nodes"] += 1
+
+    ranked = sorted(filters.values(), key=lambda f: f["seconds"], reverse=True)
+    total = sum(f["seconds"] for f in ranked)
+    for entry in ranked:
+        entry["seconds"] = round(entry["seconds"], 3)
+        entry["share"] = round(entry["seconds"] / total * 100, 2) if total else 0.0
+    return ranked
+
+
+def profile_script(vspipe_exe, script_path, total_frames, sample_frames=None):
+    """Runs the timing pass. Returns the report dict, or None if vspipe failed."""
+    sample_frames = int(sample_frames or CONFIG.get("profile_frames", 300))
+    start, end = get_sample_range(total_frames, sample_frames)
+    cmd = build_profile_cmd(vspipe_exe, script_path, start, end)
+    log_info(f">> Profiling filters on frames {start}-{end}...")
+    log_debug(f"[PROFILE] CMD: {cmd}")
+    started = time.monotonic()
+    try:
+        p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=get_vspipe_env())
+    except OSError as e:
+        log_error(f"[ERROR] Profiling failed: {e}")
+        return None
+    wall = time.monotonic() - started
+    output = p.stderr.decode("utf-8", errors="replace")
+    filters = parse_filter_times(output)
+    if p.returncode != 0 or not filters:
+        log_error("[ERROR] vspipe returned no filter timings (needs VapourSynth R58 or newer).")
+        for line in output.strip().splitlines()[-5:]:
+            log_error(f"   {line}")
+        return None
+    frames = end - start + 1
+    return {
+        "created_at": time.time(),
+        "frames": frames,
+        "range": [start, end],
+        "wall_seconds": round(wall, 3),
+        "fps": round(frames / wall, 3) if wall > 0 else None,
+        "cpu_threads": HW_SETTINGS.get("cpu_threads"),
+        "qtgmc": get_qtgmc_args(HW_SETTINGS),
+        "filters": filters,
+    }
+
+
+def save_report(input_path: Path, report: dict) -> Path:
+    """Stores the report as <cache_dir>/profiles/<source stem>_filters.json."""
+    report = dict(report, source=os.path.abspath(str(input_path)))
+    path = Path(get_cache_dir("profiles")) / f"{input_path.stem}_filters.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
+
+
+def format_report(report: dict, top=None) -> list:
+    """Console lines of the ranked table."""
+    top = int(top or CONFIG.get("profile_top", 15))
+    lines = [f"   {'Filter':<32} {'Mode':<18} {'CPU (s)':>9} {'Share':>7}"]
+    for entry in report["filters"][:top]:
+        lines.append(f"   {entry['filter'][:32]:<32} {entry['mode'][:18]:<18} "
+                     f"{entry['seconds']:>9.3f} {entry['share']:>6.1f}%")
+    if report.get("fps"):
+        lines.append(f"   {report['frames']} frames in {report['wall_seconds']:.1f}s ({report['fps']:.2f} fps)")
+    return lines
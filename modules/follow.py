@@ -0,0 +1,138 @@
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+from modules.utils import log_debug, ACTIVE_PROCS
+from modules.config import CONFIG
+
+# ==============================================================================
+# FOLLOW MODE
+# ==============================================================================
+# Deinterlaces a capture while the capture software is still writing it. One
+# FFmpeg "feed" reads the growing file with the file protocol's follow option
+# (it waits at the write head instead of stopping) and decodes it into short
+# lossless FFV1 segments plus one audio file. A segment is rendered once the one
+# after it is closed, so the render always stays a full segment behind the write
+# head; QTGMC sees a few frames of both neighbours so the joins stay seamless.
+# When the file has not grown for 'follow_idle_seconds' the feed ends, the last
+# segments are rendered and the pieces are joined (-c copy) with the audio.
+
+SEGMENT_PATTERN = "feed_%05d.mkv"
+AUDIO_FILE = "feed_audio.mka"
+LOG_FILE = "feed.log"
+
+_SEGMENT_RE = re.compile(r"feed_(\d+)\.mkv$")
+
+
+def get_follow_settings():
+    return {
+        "segment_seconds": float(CONFIG.get("follow_segment_seconds", 60)),
+        "context_frames": int(CONFIG.get("follow_context_frames", 12)),
+        "idle_seconds": float(CONFIG.get("follow_idle_seconds", 30)),
+        "poll_seconds": float(CONFIG.get("follow_poll_seconds", 5)),
+    }
+
+
+def build_feed_cmd(capture, spool_dir, codec_args, segment_seconds, idle_seconds) -> list:
+    """
+    FFmpeg reading the growing capture: lossless segments (codec_args, the intra-only
+    mezzanine FFV1, so they split at any frame) and the audio as PCM. rw_timeout ends
+    the read once the file stops growing.
+    """
+    spool_dir = Path(spool_dir)
+    return [
+        shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-v", "error",
+        "-follow", "1", "-rw_timeout", str(int(idle_seconds * 1_000_000)), "-i", f"file:{capture}",
+        "-map", "0:v:0", "-an", *codec_args,
+        "-f", "segment", "-segment_time", f"{segment_seconds:g}", "-reset_timestamps", "1",
+        str(spool_dir / SEGMENT_PATTERN),
+        "-map", "0:a:0?", "-vn", "-c:a", "pcm_s16le", str(spool_dir / AUDIO_FILE),
+    ]
+
+
+def start_feed(capture, spool_dir, codec_args, settings=None):
+    settings = settings or get_follow_settings()
+    cmd = build_feed_cmd(capture, spool_dir, codec_args, settings["segment_seconds"], settings["idle_seconds"])
+    log_debug(f"[FOLLOW] Feed: {cmd}")
+    # Runs alongside the renders for hours: stderr goes to a file, not a pipe nobody drains
+    with open(Path(spool_dir) / LOG_FILE, "wb") as log_file:
+        p = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=log_file)
+    ACTIVE_PROCS.append(p)
+    return p
+
+
+def read_feed_error(spool_dir):
+    """Last line the feed logged, or ''."""
+    try:
+        with open(Path(spool_dir) / LOG_FILE, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().strip().splitlines()
+    except OSError:
+        return ""
+    return lines[-1] if lines else ""
+
+
+def stop_feed(p):
+    if p.poll() is None:
+        p.terminate()
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+    if p in ACTIVE_PROCS:
+        ACTIVE_PROCS.remove(p)
+
+
+def list_segments(spool_dir) -> list:
+    """Segments written so far, in order."""
+    try:
+        names = os.listdir(spool_dir)
+    except OSError:
+        return []
+    numbered = sorted((int(m.group(1)), n) for n in names for m in [_SEGMENT_RE.match(n)] if m)
+    return [Path(spool_dir) / name for _, name in numbered]
+
+
+def segment_number(path) -> int:
+    match = _SEGMENT_RE.search(str(path))
+    return int(match.group(1)) if match else -1
+
+
+def get_ready_count(segment_count, feed_done) -> int:
+    """
+    Segments that can be rendered. While the feed runs the newest segment is still
+    being written and the one before it needs it as context, so both wait.
+    """
+    return segment_count if feed_done else max(segment_count - 2, 0)
+
+
+def get_context(segments, index, frames) -> dict:
+    """Neighbour segments QTGMC reads around segment 'index' (see get_context_lines)."""
+    return {
+        "prev": str(segments[index - 1]) if index > 0 else None,
+        "next": str(segments[index + 1]) if index + 1 < len(segments) else None,
+        "frames": frames,
+    }
+
+
+def get_context_lines(context, source_args):
+    """
+    VapourSynth lines (before, after QTGMC): the last/first frames of the neighbour
+    segments are spliced around the clip and the QTGMC output (double rate) is
+    trimmed back to the segment.
+    """
+    frames = int(context["frames"])
+    before, after = ["lead = tail = 0"], []
+    if context.get("prev") and frames:
+        prev = context["prev"].replace("\\", "/")
+        before += [f"prev = core.ffms2.Source(r'{prev}'{source_args})",
+                   f"lead = min({frames}, prev.num_frames)",
+                   "clip = prev[prev.num_frames - lead:] + clip"]
+    if context.get("next") and frames:
+        nxt = context["next"].replace("\\", "/")
+        before += [f"nxt = core.ffms2.Source(r'{nxt}'{source_args})",
+                   f"tail = min({frames}, nxt.num_frames)",
+                   "clip = clip + nxt[:tail]"]
+    after.append("clip = clip[2 * lead:clip.num_frames - 2 * tail]")
+    return before, after
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import atexit
+import socket
+import threading
+import subprocess
+
+from modules.utils import log_info, log_debug, log_error, get_vspipe_env, get_project_root
+from modules.config import CONFIG, HW_SETTINGS
+from modules.vspipe import log_vspipe_output
+from modules.affinity import pin_process
+
+# ==============================================================================
+# FRAME SERVER
+# ==============================================================================
+# 'frame_server' keeps one 'vspipe_native.py --serve' process alive for the whole
+# run. vapoursynth, havsfunc and the plugins are loaded once; every job sends its
+# script over a loopback socket, gets the clip info back (instead of
+# 'vspipe --info') and then receives the raw frames, which are relayed to FFmpeg.
+# The core's thread count and cache size are process-wide, so they are passed once
+# at start-up (see create_vpy_script(shared_core=True)).
+
+# Marker used in place of a vspipe command line: [FRAME_SERVER, script_path]
+FRAME_SERVER = "frameserver"
+RELAY_CHUNK = 4 * 1024 * 1024
+
+_SERVER = {"process": None, "port": None}
+_SERVER_LOCK = threading.Lock()
+
+
+def frame_server_enabled():
+    return bool(CONFIG.get("frame_server", False))
+
+
+def _start_server():
+    script = os.path.join(get_project_root(), "vspipe_native.py")
+    env = get_vspipe_env()
+    # Same interpreter as ours: keep its own PYTHONHOME/PYTHONPATH
+    env.pop("PYTHONHOME", None)
+    env.pop("PYTHONPATH", None)
+    try:
+        process = subprocess.Popen([sys.executable, script, "--serve", "0",
+                                    "--threads", str(HW_SETTINGS["cpu_threads"]),
+                                    "--cache", str(HW_SETTINGS["ram_cache_mb"])],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    except OSError as e:
+        log_error(f"[ERROR] Frame server could not start: {e}")
+        return None
+    line = process.stdout.readline().decode("utf-8", errors="replace").strip()
+    if not line.startswith("PORT "):
+        log_error(f"[ERROR] Frame server did not start ({line or 'no output'}). Using vspipe.")
+        process.kill()
+        return None
+    # Scripts may print; an unread stdout pipe would block the server once it fills up
+    for stream in (process.stdout, process.stderr):
+        threading.Thread(target=log_vspipe_output, args=(stream,), daemon=True).start()
+    pin_process("vspipe", process.pid)
+    _SERVER.update(process=process, port=int(line.split()[1]))
+    log_info(f">> Frame server ready on port {_SERVER['port']} (VapourSynth stays loaded between jobs)")
+    return _SERVER["port"]
+
+
+def get_frame_server_port():
+    """Port of the running frame server, starting it on first use. None if it cannot start."""
+    with _SERVER_LOCK:
+        process = _SERVER["process"]
+        if process is not None and process.poll() is None:
+            return _SERVER["port"]
+        if process is not None:
+            log_info("   [INFO] Frame server exited. Restarting.")
+        return _start_server()
+
+
+def _read_line(conn) -> bytes:
+    """Reads the JSON reply line byte by byte, so no frame data is buffered away."""
+    data = bytearray()
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(1)
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def _request(cmd, script_path, timeout=None):
+    """Sends one request. Returns (connection, reply) or (None, None)."""
+    port = get_frame_server_port()
+    if port is None:
+        return None, None
+    conn = None
+    try:
+        conn = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        conn.sendall((json.dumps({"cmd": cmd, "script": os.path.abspath(script_path)}) + "\n").encode("utf-8"))
+        reply = json.loads(_read_line(conn) or b"{}")
+    except (OSError, ValueError) as e:
+        log_error(f"[ERROR] Frame server request failed: {e}")
+        if conn:
+            conn.close()
+        return None, None
+    if not reply.get("ok"):
+        log_error(f"[VSPIPE ERROR] {reply.get('error', 'Frame server returned no reply')}")
+        conn.close()
+        return None, None
+    return conn, reply
+
+
+def request_info(script_path):
+    """Clip info from the frame server in get_vpy_info() form, or None on failure."""
+    conn, reply = _request("info", script_path, timeout=float(CONFIG.get("frame_server_timeout", 300)))
+    if conn is None:
+        return None
+    conn.close()
+    fps = reply["fps_num"] / reply["fps_den"] if reply.get("fps_den") else None
+    return reply["frames"], fps, reply["width"], reply["height"], reply["format"]
+
+
+def open_render(script_path):
+    """
+    Starts rendering a script. Returns (socket, expected_bytes): the socket delivers the
+    raw frames, expected_bytes is the size of the complete stream (None if the server
+    does not report it). Returns (None, None) on failure.
+    """
+    conn, reply = _request("render", script_path, timeout=float(CONFIG.get("frame_server_timeout", 300)))
+    if conn is None:
+        return None, None
+    conn.settimeout(None)
+    expected = reply["frames"] * reply["frame_bytes"] if reply.get("frame_bytes") else None
+    return conn, expected
+
+
+def relay_frames(conn, dest) -> int:
+    """Copies the frame stream into dest (FFmpeg stdin) and closes both. Returns the bytes relayed."""
+    total = 0
+    buffer = bytearray(RELAY_CHUNK)
+    view = memoryview(buffer)
+    try:
+        while True:
+            n = conn.recv_into(buffer)
+            if not n:
+                break
+            dest.write(view[:n])
+            total += n
+    except (OSError, ValueError) as e:
+        log_debug(f"[FRAMESERVER] Relay stopped: {e}")
+    finally:
+        conn.close()
+        try:
+            dest.close()
+        except OSError:
+            pass
+    return total
+
+
+def stop_frame_server():
+    with _SERVER_LOCK:
+        process, port = _SERVER["process"], _SERVER["port"]
+        _SERVER.update(process=None, port=None)
+    if process is None or process.poll() is not None:
+        return
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+            conn.sendall(b'{"cmd": "quit"}\n')
+    except OSError:
+        pass
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+atexit.register(stop_frame_server)
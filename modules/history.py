@@ -0,0 +1,190 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from modules.utils import log_debug
+from modules.config import CONFIG, HW_SETTINGS, TV_STANDARD, get_cache_dir
+from modules.vspipe import get_qtgmc_args
+from modules.probe import probe_media
+
+# ==============================================================================
+# THROUGHPUT HISTORY
+# ==============================================================================
+# SQLite record of the measured render speed of every job, keyed by machine,
+# QTGMC preset, resolution and encoder set. '--plan' probes the queue (through
+# the shared probe cache, see modules/probe.py) and predicts render time and
+# output size per file from that history before anything renders. ThroughputMeter
+# smooths the live frame rate (EWMA) for the progress ETA.
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS runs (
+        machine TEXT,
+        preset TEXT,
+        width INTEGER,
+        height INTEGER,
+        encoders TEXT,
+        frames INTEGER,
+        seconds REAL,
+        fps REAL,
+        output_bytes INTEGER,
+        completed_at REAL
+    )
+    """,
+]
+
+# Runs averaged for a prediction (most recent first)
+RECENT_RUNS = 10
+
+_DB_LOCK = threading.Lock()
+
+
+def history_enabled():
+    return bool(CONFIG.get("throughput_history", False))
+
+
+def get_history_path():
+    return CONFIG.get("history_path") or os.path.join(get_cache_dir(), "history.sqlite")
+
+
+@contextmanager
+def _open_db():
+    with _DB_LOCK:
+        conn = sqlite3.connect(get_history_path(), timeout=30)
+        try:
+            conn.row_factory = sqlite3.Row
+            for statement in SCHEMA:
+                conn.execute(statement)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def get_machine():
+    return socket.gethostname()
+
+
+def get_preset(settings=None):
+    """QTGMC preset as it affects speed (OpenCL changes it a lot)."""
+    qtgmc = get_qtgmc_args(settings or HW_SETTINGS)
+    return f"{qtgmc['Preset']}{' +opencl' if qtgmc.get('opencl') else ''}"
+
+
+def get_encoders_key(encoders):
+    return "+".join(sorted(encoders))
+
+
+def record_run(encoders, frames, seconds, width, height, output_bytes=0):
+    """Stores one finished job. Jobs shorter than a second say nothing about throughput."""
+    if not frames or seconds < 1:
+        return
+    try:
+        with _open_db() as conn:
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (get_machine(), get_preset(), int(width), int(height), get_encoders_key(encoders),
+                 int(frames), float(seconds), frames / seconds, int(output_bytes or 0), time.time()))
+    except sqlite3.Error as e:
+        log_debug(f"[HISTORY] Could not record run: {e}")
+
+
+def _recent(conn, where, params):
+    return conn.execute(
+        f"SELECT fps, width, height, frames, output_bytes FROM runs WHERE {where} "
+        "ORDER BY completed_at DESC LIMIT ?", (*params, RECENT_RUNS)).fetchall()
+
+
+def predict(encoders, width, height):
+    """
+    Predicted {"fps", "bytes_per_frame", "basis"} for a job on this machine, or None
+    without any history. Runs of other resolutions are scaled by the pixel count.
+    """
+    machine, preset, key = get_machine(), get_preset(), get_encoders_key(encoders)
+    queries = [
+        ("exact", "machine = ? AND preset = ? AND encoders = ? AND width = ? AND height = ?",
+         (machine, preset, key, width, height)),
+        ("scaled", "machine = ? AND preset = ? AND encoders = ?", (machine, preset, key)),
+        ("machine", "machine = ?", (machine,)),
+    ]
+    try:
+        with _open_db() as conn:
+            for basis, where, params in queries:
+                rows = _recent(conn, where, params)
+                if rows:
+                    break
+            else:
+                return None
+    except sqlite3.Error as e:
+        log_debug(f"[HISTORY] Could not read history: {e}")
+        return None
+
+    pixels = width * height
+    fps = [row["fps"] * (row["width"] * row["height"]) / pixels for row in rows]
+    sized = [row for row in rows if row["output_bytes"] and row["frames"]]
+    bytes_per_frame = None
+    if basis != "machine" and sized:
+        bytes_per_frame = sum(row["output_bytes"] / row["frames"] * pixels / (row["width"] * row["height"])
+                              for row in sized) / len(sized)
+    return {"fps": sum(fps) / len(fps), "bytes_per_frame": bytes_per_frame, "basis": basis, "runs": len(rows)}
+
+
+def _output_fps(source_fps):
+    """QTGMC runs double-rate on the fixed PAL/NTSC grid (see create_vpy_script)."""
+    standard = TV_STANDARD if TV_STANDARD != "auto" else ("pal" if abs(source_fps - 25.0) < 0.5 else "ntsc")
+    return 50.0 if standard == "pal" else 60000 / 1001
+
+
+def probe_source(path):
+    """Output stream estimate (frames, fps, width, height) of a source, or None if it cannot be probed."""
+    facts = probe_media(path)
+    if not facts.get("duration_v"):
+        return None
+    fps = _output_fps(facts["fps"])
+    return {"frames": int(round(facts["duration_v"] * fps)), "fps": fps,
+            "width": int(facts.get("width") or 720), "height": int(facts.get("height") or 576)}
+
+
+def schedule(durations, slots):
+    """Finish offsets (seconds from now) of jobs run in order with `slots` at a time."""
+    running = [0.0] * max(int(slots), 1)
+    finishes = []
+    for duration in durations:
+        start = min(running)
+        index = running.index(start)
+        running[index] = start + duration
+        finishes.append(running[index])
+    return finishes
+
+
+class ThroughputMeter:
+    """EWMA of the frame rate from successive frame counters (frame= lines)."""
+
+    def __init__(self, alpha=None, min_interval=0.5):
+        self.alpha = float(alpha if alpha is not None else CONFIG.get("progress_ewma_alpha", 0.1))
+        self.min_interval = min_interval
+        self.fps = None
+        self._last = None
+
+    def update(self, frames, now=None):
+        now = time.monotonic() if now is None else now
+        if self._last is None:
+            self._last = (frames, now)
+            return self.fps
+        last_frames, last_time = self._last
+        elapsed = now - last_time
+        if elapsed <= 0 or elapsed < self.min_interval or frames <= last_frames:
+            return self.fps
+        rate = (frames - last_frames) / elapsed
+        self.fps = rate if self.fps is None else self.alpha * rate + (1 - self.alpha) * self.fps
+        self._last = (frames, now)
+        return self.fps
+
+    def eta(self, frames_done, total_frames):
+        """Seconds left, or None until a rate is known."""
+        if not self.fps or not total_frames:
+            return None
+        return max(total_frames - frames_done, 0) / self.fps
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import shutil
+import socket
+import subprocess
+
+from modules.utils import log_info, log_debug, get_vspipe_env
+from modules.config import CONFIG, HW_SETTINGS, PERF_PROFILE, get_cache_dir
+from modules.vspipe import create_probe_script, get_qtgmc_args, is_plugin_missing
+
+# ==============================================================================
+# INTERPOLATION BACKEND
+# ==============================================================================
+# QTGMC's spatial interpolation (NNEDI3) can run as znedi3 (SIMD CPU), the
+# classic nnedi3 plugin, or NNEDI3CL on an OpenCL device. Whether OpenCL works
+# depends on drivers, not on the GPU vendor, so with 'auto' every backend
+# renders a short synthetic clip with the configured preset; the fastest one
+# that works is used. The result (also a failed one) is cached per machine and
+# preset. znedi3 is left out when vsznedi3.dll is missing: havsfunc would
+# silently run nnedi3 instead.
+
+BACKENDS = ("znedi3", "nnedi3", "nnedi3cl")
+PROBE_VERSION = 1
+
+
+def get_backend_settings(backend, settings=None):
+    """HW settings that make create_vpy_script use the backend."""
+    return dict(settings or HW_SETTINGS, interpolation=backend, use_gpu_opencl=(backend == "nnedi3cl"))
+
+
+def _get_cache_path():
+    return os.path.join(get_cache_dir("probe"), f"interpolation_{socket.gethostname()}.json")
+
+
+def get_candidates() -> list:
+    return [backend for backend in BACKENDS if not (backend == "znedi3" and is_plugin_missing("vsznedi3.dll"))]
+
+
+def _get_probe_key(settings, candidates):
+    return {
+        "version": PROBE_VERSION,
+        "preset": get_qtgmc_args(settings)["Preset"],
+        "device": settings.get("gpu_device_index", 0),
+        "frames": int(CONFIG.get("interpolation_probe_frames", 30)),
+        "backends": list(candidates),
+        "vspipe": shutil.which("vspipe"),
+    }
+
+
+def probe_backend(backend, settings=None, frames=30):
+    """Output fps of a probe render with the backend, or None if it does not work."""
+    vspipe_exe = shutil.which("vspipe")
+    if not vspipe_exe:
+        return None
+    script = os.path.join(get_cache_dir("probe"), f"interpolation_{backend}.vpy")
+    create_probe_script(script, get_backend_settings(backend, settings), frames)
+    started = time.monotonic()
+    try:
+        result = subprocess.run([vspipe_exe, script, "-"], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                env=get_vspipe_env(), timeout=300)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        log_debug(f"[INTERPOLATION] {backend} probe failed: {e}")
+        return None
+    elapsed = time.monotonic() - started
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip().splitlines()
+        log_debug(f"[INTERPOLATION] {backend} probe failed: {error[-1] if error else result.returncode}")
+        return None
+    return frames * 2 / elapsed if elapsed > 0 else None  # QTGMC outputs double rate
+
+
+def measure_backends(settings=None):
+    """{backend: fps or None} for every backend, cached per machine."""
+    settings = settings or HW_SETTINGS
+    candidates = get_candidates()
+    key = _get_probe_key(settings, candidates)
+    path = _get_cache_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["results"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    log_info(f"  > Interpolation: timing {' / '.join(candidates)} (once per machine)...")
+    results = {backend: probe_backend(backend, settings, key["frames"]) for backend in candidates}
+    # Failures are cached too: installing vspipe or a plugin changes the key
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "results": results}, f, indent=2)
+    except OSError as e:
+        log_debug(f"[INTERPOLATION] Could not cache probe: {e}")
+    return results
+
+
+def choose_backend(results):
+    """Fastest working backend, or None if no probe worked."""
+    working = {backend: fps for backend, fps in results.items() if fps}
+    return max(working, key=working.get) if working else None
+
+
+def _get_default_backend(settings):
+    if settings.get("use_gpu_opencl"):
+        return "nnedi3cl"
+    return "znedi3" if "znedi3" in get_candidates() else "nnedi3"
+
+
+def _format_results(results):
+    return ", ".join(f"{backend} {f'{fps:.1f} fps' if fps else 'failed'}" for backend, fps in results.items())
+
+
+def select_interpolation_backend(settings=None):
+    """
+    Applies 'interpolation_backend' to the settings (HW_SETTINGS by default) and returns
+    the backend. Without a working probe (e.g. no vspipe yet) OpenCL is only kept for a
+    detected NVIDIA GPU.
+    """
+    settings = settings if settings is not None else HW_SETTINGS
+    configured = str(CONFIG.get("interpolation_backend", "auto")).lower()
+    if configured in BACKENDS:
+        backend = configured
+        log_info(f"  > Interpolation: {backend} (configured)")
+    elif PERF_PROFILE == "manual":
+        backend = _get_default_backend(settings)
+        log_info(f"  > Interpolation: {backend} (manual_settings)")
+    else:
+        results = measure_backends(settings)
+        backend = choose_backend(results)
+        if backend:
+            log_info(f"  > Interpolation: {backend} ({_format_results(results)})")
+        else:
+            backend = _get_default_backend(settings)
+            log_info(f"  > Interpolation: {backend} (no probe worked)")
+    settings.update(get_backend_settings(backend, settings))
+    return backend
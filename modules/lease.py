@@ -0,0 +1,180 @@
+import os
+import json
+import errno
+import time
+import uuid
+import socket
+import threading
+from pathlib import Path
+from typing import Optional
+
+from modules.utils import log_info, log_debug, log_error
+from modules.config import CONFIG
+
+# ==============================================================================
+# SHARED FOLDER LEASES
+# ==============================================================================
+# Serverless claims for several instances working on the same (NAS) folder. Before
+# a source is touched, '<source>.lease' is created with O_EXCL and holds hostname,
+# PID and a random token. The owner touches its mtime every
+# 'lease_heartbeat_seconds'; a lease whose mtime is older than 'lease_timeout' (or
+# whose PID is gone on this host) is stale and can be taken over.
+# Node clocks should be in sync (NTP), as the age is judged by the file mtime.
+
+
+def leases_enabled():
+    return bool(CONFIG.get("shared_folder_leases", False))
+
+
+def get_lease_path(source: Path) -> Path:
+    return source.with_name(source.name + ".lease")
+
+
+def read_lease(lease_path: Path):
+    """Returns the lease content as a dict, or None if missing or unreadable."""
+    try:
+        with open(lease_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid) -> bool:
+    if os.name != "posix":
+        return True  # Without a cheap check, rely on the heartbeat age
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError, TypeError):
+        return True
+    return True
+
+
+def is_stale(lease_path: Path, holder, timeout: float, now: Optional[float] = None) -> bool:
+    try:
+        age = (time.time() if now is None else now) - os.stat(lease_path).st_mtime
+    except OSError:
+        return True
+    if age > timeout:
+        return True
+    if holder and holder.get("host") == socket.gethostname() and not _pid_alive(holder.get("pid")):
+        return True
+    return False
+
+
+def _break_lease(lease_path: Path, token: str, timeout: float) -> bool:
+    """
+    Moves a stale lease out of the way. The rename is atomic, so only one instance
+    wins; if the file turns out to be fresh (another node took over in the meantime)
+    it is put back and never deleted. Returns False when the source must not be
+    claimed in this round.
+    """
+    private = lease_path.with_name(f"{lease_path.name}.{token}")
+    try:
+        os.rename(lease_path, private)
+    except OSError:
+        return True
+    is_stale_lease = is_stale(private, read_lease(private), timeout)
+    if is_stale_lease:
+        holder = read_lease(private) or {}
+        log_info(f"   [LEASE] Reclaimed stale lease of {holder.get('host', '?')} (PID {holder.get('pid', '?')}).")
+    else:
+        try:
+            os.link(private, lease_path)
+        except FileExistsError:
+            # A third instance created a new lease meanwhile. Renaming back would
+            # overwrite it, so both files stay and nobody gets a second claim.
+            log_info(f"   [WARNING] {lease_path.name} was claimed again during the takeover; "
+                     f"leaving {private.name} in place.")
+            return False
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV):
+                log_error(f"[ERROR] Could not put back the lease of another instance ({private.name}): {e}")
+                return False
+            # No hard links on this share: move it back instead
+            try:
+                os.rename(private, lease_path)
+            except OSError as e:
+                log_error(f"[ERROR] Could not put back the lease of another instance ({private.name}): {e}")
+            return False
+    try:
+        os.unlink(private)
+    except OSError:
+        pass
+    return is_stale_lease
+
+
+class SourceLease:
+    """
+    A held lease. A heartbeat thread keeps it fresh until release(); on_lost() runs
+    once if another instance takes it over, so the job can stop before promoting.
+    """
+
+    def __init__(self, path: Path, token: str, heartbeat_seconds: float, on_lost=None):
+        self.path = path
+        self.token = token
+        self.lost = False
+        self._on_lost = on_lost
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_seconds,), daemon=True)
+        self._thread.start()
+
+    def owned(self) -> bool:
+        holder = read_lease(self.path)
+        return bool(holder and holder.get("token") == self.token)
+
+    def _heartbeat_loop(self, interval):
+        while not self._stop.wait(interval):
+            if not self.owned():
+                self.lost = True
+                log_error(f"[ERROR] Lease lost: {self.path.name} was taken over by another instance.")
+                if self._on_lost:
+                    self._on_lost()
+                return
+            try:
+                os.utime(self.path)
+            except OSError as e:
+                log_debug(f"[LEASE] Heartbeat failed for {self.path}: {e}")
+
+    def release(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if self.owned():
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                log_debug(f"[LEASE] Could not remove {self.path}: {e}")
+
+
+def acquire_lease(source: Path, on_lost=None):
+    """
+    Claims a source for this instance. Returns a SourceLease, or None if another instance
+    holds it. on_lost() runs if the lease is taken over while it is held.
+    """
+    lease_path = get_lease_path(source)
+    timeout = float(CONFIG.get("lease_timeout", 300))
+    token = uuid.uuid4().hex
+    content = {"host": socket.gethostname(), "pid": os.getpid(), "token": token, "created": time.time()}
+
+    for _ in range(2):
+        try:
+            fd = os.open(str(lease_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            holder = read_lease(lease_path)
+            if not is_stale(lease_path, holder, timeout):
+                holder = holder or {}
+                log_info(f"   [SKIP] Claimed by {holder.get('host', 'another instance')} "
+                         f"(PID {holder.get('pid', '?')}): {source.name}")
+                return None
+            if not _break_lease(lease_path, token, timeout):
+                return None
+            continue
+        except OSError as e:
+            log_error(f"[ERROR] Cannot create lease {lease_path}: {e}")
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(content, f)
+        log_debug(f"[LEASE] Acquired {lease_path}")
+        return SourceLease(lease_path, token, float(CONFIG.get("lease_heartbeat_seconds", 30)), on_lost)
+    return None
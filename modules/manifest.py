@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from modules.utils import log_info, log_debug, file_fingerprint
+from modules.config import (
+    CONFIG, HW_SETTINGS, FIELD_ORDER, TV_STANDARD, AUDIO_CODEC, AUDIO_BITRATE, AUDIO_OFFSET, get_cache_dir
+)
+from modules.vspipe import get_qtgmc_args
+from modules.crop import auto_crop_enabled, get_crop_settings
+
+# ==============================================================================
+# COMPLETION MANIFEST
+# ==============================================================================
+# SQLite record of every finished output: source fingerprint, settings hash, size,
+# mtime and frame count. A re-run answers "is this output done?" with a single
+# stat() of the output; ffprobe only runs when the stat data disagrees.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    output_path TEXT PRIMARY KEY,
+    source_path TEXT,
+    source_fingerprint TEXT,
+    settings_hash TEXT,
+    encoder TEXT,
+    size INTEGER,
+    mtime REAL,
+    frames INTEGER,
+    completed_at REAL,
+    verification TEXT
+)
+"""
+
+_DB_LOCK = threading.Lock()
+
+
+def manifest_enabled():
+    return bool(CONFIG.get("completion_manifest", False))
+
+
+def get_manifest_path():
+    return CONFIG.get("manifest_path") or os.path.join(get_cache_dir(), "manifest.sqlite")
+
+
+@contextmanager
+def _open_db():
+    """Serialized connection that commits on success and is always closed."""
+    with _DB_LOCK:
+        conn = sqlite3.connect(get_manifest_path(), timeout=30)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outputs)")}
+            if "verification" not in columns:
+                conn.execute("ALTER TABLE outputs ADD COLUMN verification TEXT")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def _key(path):
+    return os.path.abspath(str(path))
+
+
+def get_settings_hash(encoder, codec_args):
+    """Hash of everything that shapes an output: QTGMC, field order, codec and audio settings."""
+    data = {
+        "qtgmc": get_qtgmc_args(HW_SETTINGS),
+        "field_order": FIELD_ORDER,
+        "tv_standard": TV_STANDARD,
+        "encoder": encoder,
+        "codec_args": codec_args,
+        "audio": [AUDIO_CODEC, str(AUDIO_BITRATE), AUDIO_OFFSET],
+    }
+    if auto_crop_enabled():
+        data["crop"] = get_crop_settings()
+    payload = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def lookup_output(output_path):
+    """Returns the manifest row for an output as a dict, or None."""
+    with _open_db() as conn:
+        row = conn.execute("SELECT * FROM outputs WHERE output_path = ?", (_key(output_path),)).fetchone()
+    return dict(row) if row else None
+
+
+def is_output_complete(output_path, settings_hash=None):
+    """
+    True if the manifest says the output is finished and one stat() confirms size and
+    mtime. None means unknown (missing entry or stat mismatch): the caller should probe.
+    False means the output failed verification and has to be rendered again. An output
+    rendered with other settings is kept (like any finished output) with a warning.
+    """
+    row = lookup_output(output_path)
+    if row is None:
+        return None
+    try:
+        st = os.stat(str(output_path))
+    except OSError:
+        return None
+    if st.st_size != row["size"] or st.st_mtime != row["mtime"]:
+        log_debug(f"[MANIFEST] Stat changed for {output_path}. Probing again.")
+        return None
+    if settings_hash and row["settings_hash"] != settings_hash:
+        log_info(f"   [WARNING] Rendered with different settings (delete it to render again): {output_path}")
+    if row["verification"] and not json.loads(row["verification"]).get("ok", True):
+        return False
+    return True
+
+
+def record_output(output_path, source_path, settings_hash, encoder, frames=None, fingerprint=None):
+    """Stores (or refreshes) the entry of a finished output."""
+    try:
+        st = os.stat(str(output_path))
+    except OSError as e:
+        log_debug(f"[MANIFEST] Not recorded, output missing: {e}")
+        return False
+    fingerprint = fingerprint or file_fingerprint(str(source_path))
+    with _open_db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+            (_key(output_path), _key(source_path), fingerprint, settings_hash, encoder,
+             st.st_size, st.st_mtime, frames, time.time()),
+        )
+    return True
+
+
+def refresh_output_stat(output_path):
+    """Updates size/mtime after an in-place change (e.g. an audio remux)."""
+    try:
+        st = os.stat(str(output_path))
+    except OSError:
+        return False
+    with _open_db() as conn:
+        cur = conn.execute("UPDATE outputs SET size = ?, mtime = ? WHERE output_path = ?",
+                           (st.st_size, st.st_mtime, _key(output_path)))
+    return cur.rowcount > 0
+
+
+def record_verification(output_path, result):
+    """Attaches a verification result; a passed check also stores the counted frames."""
+    with _open_db() as conn:
+        conn.execute("UPDATE outputs SET verification = ? WHERE output_path = ?",
+                     (json.dumps(result), _key(output_path)))
+        if result.get("ok") and result.get("packets"):
+            conn.execute("UPDATE outputs SET frames = ? WHERE output_path = ?",
+                         (result["packets"], _key(output_path)))
+
+
+def known_outputs():
+    """Absolute paths of every recorded output (so folder scans never treat them as sources)."""
+    with _open_db() as conn:
+        return {row[0] for row in conn.execute("SELECT output_path FROM outputs")}
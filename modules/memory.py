@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from typing import Dict
+
+from modules.utils import log_info, log_debug
+from modules.config import CONFIG
+
+# ==============================================================================
+# MEMORY GOVERNOR
+# ==============================================================================
+# 'ram_cache_mb' is sized once from total RAM. With 'memory_governor' every job
+# asks for its VapourSynth cache budget at start instead: the budget is cut to
+# what is actually available, minus the headroom still promised to running jobs
+# (their caches fill gradually) and an FFmpeg estimate. A job that cannot get
+# the minimum budget is held back until memory frees up. A monitor thread samples
+# MemAvailable and the RSS of every vspipe/FFmpeg child via /proc.
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_JOBS: Dict[str, dict] = {}  # job -> {"grant": MB promised (cache + encoder), "pids": {pid: name}}
+_STATS = {"peak_rss": {}, "pressure": False}
+_MONITOR = {"thread": None}
+
+
+def memory_governor_enabled():
+    return bool(CONFIG.get("memory_governor", False))
+
+
+def get_available_mb():
+    """MemAvailable in MB (Linux /proc, Windows GlobalMemoryStatusEx), or None if unknown."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+        meminfo = MEMORYSTATUSEX()
+        meminfo.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(meminfo))
+        return int(meminfo.ullAvailPhys // (1024 ** 2))
+    except Exception:
+        return None
+
+
+def get_rss_mb(pid):
+    """Resident set size of a process in MB from /proc/<pid>/status, or None."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _settings():
+    return (int(CONFIG.get("memory_min_free_mb", 4096)), int(CONFIG.get("memory_min_cache_mb", 1024)),
+            int(CONFIG.get("memory_encoder_mb", 1500)))
+
+
+def _job_rss(job_state):
+    return sum(get_rss_mb(pid) or 0 for pid in job_state["pids"])
+
+
+def _committed_mb(exclude=None):
+    """Memory promised to running jobs that they have not taken yet."""
+    return sum(max(state["grant"] - _job_rss(state), 0) for job, state in _JOBS.items() if job != exclude)
+
+
+def _encoder_estimate():
+    return max(_STATS["peak_rss"].get("ffmpeg", 0), _settings()[2])
+
+
+def reserve_memory(job, requested_mb):
+    """
+    Called when a job starts. Blocks while memory is too tight for another job, then
+    returns the VapourSynth cache budget (MB) for it. Processes started by the calling
+    thread afterwards are attributed to this job (see track_process).
+    """
+    _LOCAL.job = job
+    _start_monitor()
+    min_free, min_cache, _ = _settings()
+    poll = float(CONFIG.get("memory_poll_seconds", 5))
+    held_since = None
+    while True:
+        with _LOCK:
+            available = get_available_mb()
+            if available is None:
+                _JOBS[job] = {"grant": 0, "pids": {}}
+                log_info(f"   [MEMORY] Available memory unknown. Cache {requested_mb} MB as configured.")
+                return requested_mb
+            encoder = _encoder_estimate()
+            headroom = available - _committed_mb(exclude=job) - min_free - encoder
+            others = [name for name in _JOBS if name != job]
+            if headroom >= min_cache or not others:
+                budget = max(min(int(requested_mb), headroom), min_cache)
+                _JOBS[job] = {"grant": budget + encoder, "pids": {}}
+                break
+        if held_since is None:
+            held_since = time.monotonic()
+            log_info(f"   [MEMORY] Holding job: {available} MB available, {len(others)} job(s) still filling "
+                     f"their caches (needs {min_cache + encoder + min_free} MB).")
+        time.sleep(poll)
+
+    if held_since is not None:
+        log_info(f"   [MEMORY] Job released after {time.monotonic() - held_since:.0f}s.")
+    if budget < requested_mb:
+        log_info(f"   [MEMORY] Cache budget lowered to {budget} MB (configured {requested_mb} MB, "
+                 f"{available} MB available, FFmpeg estimate {encoder} MB).")
+    else:
+        log_info(f"   [MEMORY] Cache budget {budget} MB ({available} MB available).")
+    return budget
+
+
+def track_process(name, pid, job=None):
+    """Attributes a child process (vspipe/ffmpeg) to the current job for RSS sampling."""
+    job = job or getattr(_LOCAL, "job", None)
+    with _LOCK:
+        if job in _JOBS:
+            _JOBS[job]["pids"][pid] = name
+
+
+def get_process_tracker():
+    """track_process bound to the calling thread's job (for children started on another thread)."""
+    job = getattr(_LOCAL, "job", None)
+    if job is None:
+        return None
+    return lambda name, pid: track_process(name, pid, job)
+
+
+def release_memory(job):
+    with _LOCK:
+        state = _JOBS.pop(job, None)
+    if getattr(_LOCAL, "job", None) == job:
+        _LOCAL.job = None
+    if state is not None:
+        log_debug(f"[MEMORY] Released {state['grant']} MB promised to {job}")
+
+
+def sample():
+    """One monitor sample: available MB and the RSS of every tracked child. Updates the peaks."""
+    children = []
+    with _LOCK:
+        for job, state in _JOBS.items():
+            for pid, name in list(state["pids"].items()):
+                rss = get_rss_mb(pid)
+                if rss is None:
+                    del state["pids"][pid]  # exited
+                    continue
+                _STATS["peak_rss"][name] = max(_STATS["peak_rss"].get(name, 0), rss)
+                children.append((job, name, pid, rss))
+    return get_available_mb(), children
+
+
+def _check_pressure(available):
+    min_free = _settings()[0]
+    pressure = available is not None and available < min_free
+    if pressure != _STATS["pressure"]:
+        _STATS["pressure"] = pressure
+        if pressure:
+            log_info(f"\n   [MEMORY] Low memory: {available} MB available (minimum {min_free} MB). "
+                     "New jobs are held back.")
+        else:
+            log_info(f"\n   [MEMORY] Memory pressure over: {available} MB available.")
+
+
+def _monitor():
+    poll = float(CONFIG.get("memory_poll_seconds", 5))
+    while True:
+        available, children = sample()
+        _check_pressure(available)
+        for job, name, pid, rss in children:
+            log_debug(f"[MEMORY] {name} {pid} ({os.path.basename(str(job))}): {rss} MB")
+        time.sleep(poll)
+
+
+def _start_monitor():
+    with _LOCK:
+        if _MONITOR["thread"] is None:
+            _MONITOR["thread"] = threading.Thread(target=_monitor, daemon=True)
+            _MONITOR["thread"].start()
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from modules.utils import log_info, log_debug, log_error, file_fingerprint
+from modules.config import CONFIG, HW_SETTINGS, FIELD_ORDER, TV_STANDARD, get_cache_dir
+from modules.vspipe import get_qtgmc_args
+from modules.crop import auto_crop_enabled, get_crop_settings
+
+# ==============================================================================
+# LOSSLESS MEZZANINE CACHE
+# ==============================================================================
+# The QTGMC output is stored once as multi-slice FFV1. Later encodes with the same
+# source + deinterlace settings read it back and skip VapourSynth entirely, so
+# changing an audio codec, ProRes profile or AV1 CRF no longer reruns QTGMC.
+
+
+def mezzanine_enabled():
+    return bool(CONFIG.get("mezzanine_cache", False))
+
+
+def get_mezzanine_dir() -> Path:
+    """Cache folder ('mezzanine_dir' in config, e.g. a local scratch SSD)."""
+    custom_dir = CONFIG.get("mezzanine_dir")
+    if custom_dir:
+        os.makedirs(custom_dir, exist_ok=True)
+        return Path(custom_dir)
+    return Path(get_cache_dir("mezzanine"))
+
+
+def get_mezzanine_key(input_path, settings=None):
+    """Hash of the source fingerprint and every setting that changes the QTGMC output."""
+    settings = settings if settings else HW_SETTINGS
+    key_data = {
+        "source": file_fingerprint(str(input_path)),
+        "qtgmc": get_qtgmc_args(settings),
+        # znedi3 and nnedi3 interpolate differently (see modules/interpolation.py)
+        "interpolation": settings.get("interpolation"),
+        "field_order": FIELD_ORDER,
+        "tv_standard": TV_STANDARD,
+    }
+    if auto_crop_enabled():
+        key_data["crop"] = get_crop_settings()
+    payload = json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def _mezzanine_paths(key):
+    cache_dir = get_mezzanine_dir()
+    return cache_dir / f"{key}.mkv", cache_dir / f"{key}.json", cache_dir / f"{key}_part.mkv"
+
+
+def find_mezzanine(key):
+    """Returns the cached stream info (with 'path') for a key, or None on a miss."""
+    video_path, meta_path, _ = _mezzanine_paths(key)
+    if not (video_path.is_file() and meta_path.is_file()):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError) as e:
+        log_debug(f"   [MEZZANINE] Unreadable metadata for {key}: {e}")
+        return None
+
+    # Touch for LRU eviction
+    try:
+        os.utime(video_path, None)
+    except OSError:
+        pass
+    info["path"] = str(video_path)
+    return info
+
+
+def get_mezzanine_part_path(key) -> Path:
+    return _mezzanine_paths(key)[2]
+
+
+def get_mezzanine_codec_args():
+    """FFV1 level 3, intra-only, sliced for multi-threaded encode and decode."""
+    slices = int(CONFIG.get("mezzanine_slices", 16))
+    return [
+        "-c:v", "ffv1", "-level", "3", "-g", "1",
+        "-slices", str(slices), "-slicecrc", "0",
+        "-threads", str(HW_SETTINGS.get("cpu_threads", 16)),
+    ]
+
+
+def commit_mezzanine(key, stream_info):
+    """Atomically publishes a finished _part mezzanine and its metadata, then evicts."""
+    video_path, meta_path, part_path = _mezzanine_paths(key)
+    if not part_path.exists():
+        return None
+    try:
+        part_path.replace(video_path)
+        meta = dict(stream_info, created=time.time())
+        tmp_meta = meta_path.with_name(f"{key}_part.json")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        tmp_meta.replace(meta_path)
+    except OSError as e:
+        log_error(f"   [MEZZANINE] Failed to store cache entry: {e}")
+        return None
+
+    log_info(f"   [MEZZANINE] Stored lossless intermediate ({video_path.stat().st_size / 1024**3:.2f} GB)")
+    max_gb = float(CONFIG.get("mezzanine_max_gb", 500))
+    evict_mezzanines(int(max_gb * 1024**3), keep=video_path)
+    return video_path
+
+
+def evict_mezzanines(max_bytes, keep=None):
+    """Deletes least recently used entries until the cache fits in max_bytes."""
+    cache_dir = get_mezzanine_dir()
+    entries = []
+    for video_path in cache_dir.glob("*.mkv"):
+        if video_path.stem.endswith("_part"):
+            continue
+        try:
+            st = video_path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, video_path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, video_path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and video_path == keep:
+            continue
+        try:
+            video_path.unlink()
+            meta_path = video_path.with_suffix(".json")
+            if meta_path.exists():
+                meta_path.unlink()
+        except OSError as e:
+            log_debug(f"   [MEZZANINE] Could not evict {video_path.name}: {e}")
+            continue
+        total -= size
+        evicted.append(video_path)
+        log_info(f"   [MEZZANINE] Evicted {video_path.name} ({size / 1024**3:.2f} GB)")
+    return evicted
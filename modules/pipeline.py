@@ -1,50 +1,104 @@
 ﻿import os
 import sys
+import json
+import time
+import signal
 import shutil
 import threading
 import subprocess
-import io
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 from modules.utils import (
     log_info, log_debug, log_error, update_progress, cleanup_temp_files,
-    parse_ffmpeg_time, get_duration,
+    parse_ffmpeg_time, parse_ffmpeg_frame, get_duration, run_command,
     check_requirements, _show_banner, get_cpu_name, get_gpu_name,
-    setup_environment, get_vspipe_env, get_project_root
+    setup_environment, get_vspipe_env, get_project_root, ACTIVE_PROCS
 )
 
 import logging
 from modules.config import (
-    CONFIG, HW_SETTINGS, PERF_PROFILE, DEINTERLACE_MODE, ENCODER,
-    AUDIO_CODEC, AUDIO_BITRATE, AUDIO_OFFSET, DEBUG_MODE
+    CONFIG, HW_SETTINGS, PERF_PROFILE, DEINTERLACE_MODE, ENCODER, ENCODERS,
+    AUDIO_CODEC, AUDIO_BITRATE, AUDIO_OFFSET, DEBUG_MODE, get_cache_dir
+)
+from modules.vspipe import create_vpy_script, get_vpy_info, log_vspipe_line
+from modules.crop import auto_crop_enabled, get_auto_crop
+from modules.supervisor import StreamSupervisor
+from modules.encoders import (
+    ENCODER_BACKENDS, get_codec_args, get_output_name, run_benchmark, save_benchmark, format_benchmark
+)
+from modules.affinity import POLICIES, get_affinity_plan, get_stage_threads, pin_process
+from modules.interpolation import select_interpolation_backend
+from modules.memory import memory_governor_enabled, reserve_memory, get_process_tracker, release_memory
+from modules.history import (
+    ThroughputMeter, history_enabled, record_run, predict, probe_source, schedule
+)
+from modules.chunked import chunked_av1_enabled, encode_chunked_av1, build_concat_cmd, write_concat_list
+from modules.follow import (
+    get_follow_settings, start_feed, stop_feed, read_feed_error, list_segments, segment_number, get_ready_count,
+    get_context, AUDIO_FILE
+)
+from modules.preview import get_preview_settings, get_default_target, get_newest_complete, build_sink_cmd, prepare_fifo
+from modules.filterprofile import get_sample_range, profile_script, save_report, format_report
+from modules.aiorunner import AsyncPipeline, in_async_runner, run_jobs
+from modules.audio import (
+    audio_mode_separate, plan_audio_stage, get_audio_temp_path, get_video_temp_path, get_video_keep_path,
+    start_audio_encode, finish_audio_encode, mux_audio, can_copy_audio, build_mux_cmd
+)
+from modules.drift import analyze_drift_cached
+from modules.probe import probe_media
+from modules.readahead import get_readahead_mode, start_readahead, copy_source_local
+from modules.watch import is_source_name, watch_folders
+from modules.manifest import (
+    manifest_enabled, get_settings_hash, is_output_complete, record_output, refresh_output_stat, known_outputs,
+    record_verification
+)
+from modules.farm import run_coordinator, run_worker
+from modules.lease import leases_enabled, acquire_lease
+from modules.frameserver import FRAME_SERVER, frame_server_enabled, request_info, open_render, relay_frames
+from modules.verify import verification_enabled, queue_verification, wait_for_verifications
+from modules.staging import (
+    staging_enabled, get_stage_dir, get_staged_path, estimate_output_size, has_space,
+    queue_move, wait_for_moves
+)
+from modules.mezzanine import (
+    mezzanine_enabled, get_mezzanine_key, find_mezzanine, get_mezzanine_part_path,
+    get_mezzanine_codec_args, commit_mezzanine
 )
-from modules.vspipe import create_vpy_script, get_vpy_info, log_vspipe_output
 
 
 # ==============================================================================
 # MAIN PIPELINE
 # ==============================================================================
 
+VIDEO_EXTS = {".mp4", ".mkv", ".avi", ".mov", ".ts", ".m2ts", ".mpg", ".mpeg"}
+
 
 def _scan_directory(path: Path, video_exts: set) -> list:
     """Scans a directory for video files, excluding processed ones."""
     log_info(f">> Scanning folder: {path.name}")
+    recorded = known_outputs() if manifest_enabled() else set()
     return [
         f
         for f in path.iterdir()
-        if (f.is_file()
-            and f.suffix.lower() in video_exts
-            and "_deinterlaced" not in f.name
-            and "_intermediate" not in f.name)
+        if f.is_file() and is_source_name(f.name, video_exts) and os.path.abspath(f) not in recorded
     ]
 
 
+def _get_cli_flags() -> set:
+    """Returns the --options given on the command line (everything else is a path)."""
+    return {arg.lower() for arg in sys.argv[1:] if arg.startswith("--")}
+
+
 def _parse_cli_args(video_exts: set) -> list:
     """Parses command line arguments for input files or folders."""
     files = []
     if len(sys.argv) > 1:
         log_info(f">> Arguments Detected: {len(sys.argv) - 1} items")
         for arg in sys.argv[1:]:
+            if arg.startswith("--"):
+                continue
             path = Path(arg)
             if path.is_file() and path.suffix.lower() in video_exts:
                 files.append(path)
@@ -92,7 +146,7 @@ def _get_interactive_input(video_exts: set) -> list:
 
 def get_input_files():
     """Gathers input files from CLI args or interactive prompt."""
-    video_exts = {".mp4", ".mkv", ".avi", ".mov", ".ts", ".m2ts", ".mpg", ".mpeg"}
+    video_exts = VIDEO_EXTS
 
     # 1. Drag & Drop (CLI Args)
     files = _parse_cli_args(video_exts)
@@ -104,20 +158,29 @@ def get_input_files():
     return files
 
 
-def _get_output_path(input_path: Path) -> Path:
+def _get_output_path(input_path: Path, encoder: Optional[str] = None) -> Path:
     """Constructs the output file path based on config and encoder."""
-    stem = input_path.stem
-    work_dir = input_path.parent
-    suffix_out = CONFIG.get("output_suffix", "_deinterlaced_prores")
-    if ENCODER == "av1":
-        suffix_out = CONFIG.get("output_suffix_av1", "_deinterlaced_av1")
-    output_ext = ".mov" if ENCODER == "prores" else ".mkv"
-    return work_dir / f"{stem}{suffix_out}{output_ext}"
+    return input_path.parent / get_output_name(input_path.stem, encoder or ENCODER)
+
+
+def _get_part_path(output_file: Path) -> Path:
+    """Temp path for atomic writes (_part.ext so FFmpeg still detects the format)."""
+    return output_file.with_name(f"{output_file.stem}_part{output_file.suffix}")
+
+
+# Relative encode cost per frame. The most expensive output is listed first so that
+# FFmpeg's frame= counter (first video output) tracks the slowest encoder.
+ENCODER_COST = {name: backend["cost"] for name, backend in ENCODER_BACKENDS.items()}
+
+
+def _order_slowest_first(outputs: list) -> list:
+    """Sorts (encoder, path) pairs so the slowest encoder comes first."""
+    return sorted(outputs, key=lambda item: -ENCODER_COST.get(item[0], 1))
 
 
 def _calculate_audio_sync(input_path: Path, video_duration: float) -> float:
     """Calculates the atempo filter value for audio sync correction."""
-    audio_duration = get_duration(str(input_path), "a")
+    audio_duration = probe_media(input_path)["duration_a"]
 
     if not CONFIG.get("auto_drift_correction", True):
         log_info("   [SYNC] Auto-drift correction disabled by config.")
@@ -143,107 +206,268 @@ def _calculate_audio_sync(input_path: Path, video_duration: float) -> float:
     return 1.0
 
 
-def _build_ffmpeg_cmd(input_path: Path, output_file: Path, atempo: float, fps: float = 30000 / 1001, width: int = 720, height: int = 576, pixel_format: str = "yuv420p16le") -> list:
-    """Builds the FFmpeg command line."""
-    ffmpeg_exe = shutil.which("ffmpeg")
-    # Raw Video Input Args (Dynamic Pixel Format)
-    # -f rawvideo -vcodec rawvideo -pix_fmt {pixel_format} -s WxH -r FPS
-    cmd = [
-        ffmpeg_exe, "-y",
-        "-f", "rawvideo", "-vcodec", "rawvideo",
-        "-s", f"{width}x{height}", "-r", str(fps),
-        "-pix_fmt", pixel_format,
-        "-i", "-",
-        "-i", str(input_path), "-map", "0:v:0", "-map", "1:a:0"
-    ]
+def _get_video_codec_args(encoder: str, threads=None) -> list:
+    """Returns the FFmpeg video codec arguments for one output (see modules/encoders.py)."""
+    return get_codec_args(encoder, threads)
 
-    if ENCODER == "prores":
-        cmd.extend([
-            "-c:v", "prores_ks", "-profile:v", "3", "-vendor", "apl0",
-            "-bits_per_mb", "8000", "-pix_fmt", "yuv422p10le"
-        ])
-    else:
-        cmd.extend([
-            "-c:v", "libsvtav1", "-preset", "6", "-crf", "22", "-pix_fmt", "yuv420p10le"
-        ])
 
+def _get_audio_args(atempo: float, tempo_filter: Optional[str] = None, offset=None) -> list:
+    """
+    Returns the FFmpeg audio filter/codec arguments for one output. offset (seconds,
+    AUDIO_OFFSET by default) delays the audio when positive and advances it when negative.
+    """
+    args = []
     audio_filters = []
-    if atempo != 1.0:
+    offset = AUDIO_OFFSET if offset is None else offset
+    if tempo_filter:
+        audio_filters.append(tempo_filter)
+    elif atempo != 1.0:
         audio_filters.append(f"atempo={atempo:.6f}")
-    if AUDIO_OFFSET != 0:
-        delay_ms = int(AUDIO_OFFSET * 1000)
+    if offset > 0:
+        delay_ms = int(offset * 1000)
         audio_filters.append(f"adelay={delay_ms}|{delay_ms}")
+    elif offset < 0:
+        audio_filters.append(f"atrim=start={-offset:.3f},asetpts=PTS-STARTPTS")
 
     if audio_filters:
-        cmd.extend(["-af", ",".join(audio_filters)])
+        args.extend(["-af", ",".join(audio_filters)])
+
+    args.extend(["-c:a", AUDIO_CODEC, "-b:a", str(AUDIO_BITRATE)])
+    return args
+
+
+def _analyze_audio_sync(input_path: Path, video_duration: float):
+    """
+    Returns (atempo, tempo_filter, offset). With 'drift_analysis' enabled the drift is
+    measured from the streams themselves and the measured lag at the start is added to
+    AUDIO_OFFSET; otherwise (or if the measurement is inconclusive) the duration-based
+    _calculate_audio_sync() is used, tempo_filter is None and offset is AUDIO_OFFSET.
+    """
+    if CONFIG.get("drift_analysis", False) and CONFIG.get("auto_drift_correction", True):
+        result = analyze_drift_cached(input_path)
+        max_pct = CONFIG.get("drift_analysis_max_percent", 5.0)
+        if result and abs(result["tempo"] - 1.0) * 100 <= max_pct:
+            log_info(f"   [SYNC] Measured drift: tempo {result['tempo']:.6f}, offset {result['offset'] * 1000:+.0f} ms "
+                     f"({result['inliers']} matching windows{', piecewise' if result.get('filter') else ''}).")
+            # A positive lag means late audio; after atempo it is lag / tempo in output time
+            return result["tempo"], result.get("filter"), AUDIO_OFFSET - result["offset"] / result["tempo"]
+        if result:
+            log_info(f"   [SYNC] Measured drift {abs(result['tempo'] - 1.0) * 100:.2f}% exceeds limit. Ignoring.")
+    return _calculate_audio_sync(input_path, video_duration), None, AUDIO_OFFSET
+
+
+def _build_ffmpeg_cmd(input_path: Path, output_file, atempo: float, fps: float = 30000 / 1001, width: int = 720, height: int = 576, pixel_format: str = "yuv420p16le", encoders: Optional[list] = None,
+                      video_input=None, mezzanine_file=None, include_audio=True, tempo_filter=None, audio_offset=None) -> list:
+    """
+    Builds the FFmpeg command line.
+    output_file may be a single path or a list of paths matching 'encoders'; every
+    output is fed from the same raw vspipe input, so QTGMC only runs once.
+    video_input replaces the vspipe pipe with a cached mezzanine file; mezzanine_file
+    adds a lossless FFV1 output that stores the QTGMC result for later re-encodes.
+    include_audio=False writes video-only outputs for the separate audio stage.
+    tempo_filter (piecewise drift correction) replaces the single atempo filter;
+    audio_offset replaces AUDIO_OFFSET (measured drift, see _analyze_audio_sync).
+    """
+    ffmpeg_exe = shutil.which("ffmpeg")
+    output_files = list(output_file) if isinstance(output_file, (list, tuple)) else [output_file]
+    encoders = encoders or [ENCODER] * len(output_files)
 
-    cmd.extend(["-c:a", AUDIO_CODEC, "-b:a", str(AUDIO_BITRATE), str(output_file)])
+    if video_input:
+        cmd = [ffmpeg_exe, "-y", "-i", str(video_input)]
+    else:
+        # Raw Video Input Args (Dynamic Pixel Format)
+        # -f rawvideo -vcodec rawvideo -pix_fmt {pixel_format} -s WxH -r FPS
+        cmd = [
+            ffmpeg_exe, "-y",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-pix_fmt", pixel_format,
+            "-i", "-",
+        ]
+    if include_audio:
+        cmd.extend(["-i", str(input_path)])
+
+    # One output section per encoder (maps must be repeated for every output)
+    for encoder, out_path in zip(encoders, output_files):
+        if include_audio:
+            cmd.extend(["-map", "0:v:0", "-map", "1:a:0"])
+        else:
+            cmd.extend(["-map", "0:v:0", "-an"])
+        cmd.extend(_get_video_codec_args(encoder))
+        if include_audio:
+            cmd.extend(_get_audio_args(atempo, tempo_filter, audio_offset))
+        cmd.append(str(out_path))
+
+    if mezzanine_file:
+        cmd.extend(["-map", "0:v:0", "-an"])
+        cmd.extend(get_mezzanine_codec_args())
+        cmd.append(str(mezzanine_file))
     return cmd
 
 
-def _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec):
-    """Executes the VS->FFmpeg pipeline and monitors progress."""
+def _format_timestamp(seconds: float) -> str:
+    """Formats seconds as HH:MM:SS,mmm (progress bar style)."""
+    th, tr = divmod(max(seconds, 0.0), 3600)
+    tm, ts = divmod(tr, 60)
+    ts_int = int(ts)
+    ms_int = int(round((ts - ts_int) * 1000))
+    return f"{int(th):02d}:{int(tm):02d}:{ts_int:02d},{ms_int:03d}"
+
+
+def _stop_on_cancel(cancel, done, pids):
+    """Terminates the job's vspipe/FFmpeg once cancel is set (farm reassignment, lost lease)."""
+    while not done.wait(0.5):
+        if cancel.is_set():
+            log_error("\n[ERROR] Job cancelled. Stopping vspipe/FFmpeg.")
+            for pid in list(pids):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            return
+
+
+def _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec, fps=None, on_progress=None,
+                           total_frames=None, cancel=None):
+    """
+    Executes the VS->FFmpeg pipeline and monitors progress.
+    If fps is given, progress is capped by the frame= counter, which FFmpeg reports for
+    the first (slowest) video output, while time= follows the furthest muxed stream.
+    vspipe_cmd may be None when FFmpeg reads a cached mezzanine instead.
+    on_progress receives the completed fraction (0.0 - 1.0) with every progress line.
+    With total_frames the ETA follows an EWMA of the frame rate instead of FFmpeg's speed=.
+    Setting the cancel event stops both processes and fails the run.
+    """
+    pids: list = []
+    done = threading.Event()
+    if cancel is not None:
+        threading.Thread(target=_stop_on_cancel, args=(cancel, done, pids), daemon=True).start()
     try:
-        vspipe_env = get_vspipe_env()
-        # If running vspipe via python script, DO NOT override PYTHONHOME/PYTHONPATH
-        # as it will break the current python interpreter's startup (missing encodings)
-        if vspipe_cmd[0] == sys.executable:
-            vspipe_env.pop("PYTHONHOME", None)
-            vspipe_env.pop("PYTHONPATH", None)
-
-        p_vspipe = subprocess.Popen(vspipe_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=vspipe_env)
-        p_ffmpeg = subprocess.Popen(ffmpeg_cmd, stdin=p_vspipe.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        if p_vspipe.stdout:
-            p_vspipe.stdout.close()
-
-        t_vspipe = threading.Thread(target=log_vspipe_output, args=(p_vspipe.stderr,))
-        t_vspipe.daemon = True
-        t_vspipe.start()
-
-        if p_ffmpeg.stderr:
-            stderr_lines = []
-            stderr_reader = io.TextIOWrapper(p_ffmpeg.stderr, encoding="utf-8", errors="replace")
-            for line in stderr_reader:
-                line_str = line.strip()
-                stderr_lines.append(line_str)
-                if len(stderr_lines) > 20:
-                    stderr_lines.pop(0)
-
-                if "frame=" in line_str:
-                    sec, current_ts, speed = parse_ffmpeg_time(line_str)
-                    if sec and duration_sec > 0:
-                        pct = (sec / duration_sec) * 100
-
-                        # Calculate ETA and Total Duration String (HH:MM:SS,mmm)
-                        total_ts = "00:00:00,000"
-                        if duration_sec > 0:
-                            th, tr = divmod(duration_sec, 3600)
-                            tm, ts = divmod(tr, 60)
-                            ts_int = int(ts)
-                            ms_int = int(round((ts - ts_int) * 1000))
-                            total_ts = f"{int(th):02d}:{int(tm):02d}:{ts_int:02d},{ms_int:03d}"
-
-                        eta_str = "--:--:--"
-                        if speed:
-                            try:
-                                speed_val = float(speed.replace("x", ""))
-                                if speed_val > 0:
-                                    remaining_video_sec = duration_sec - sec
-                                    remaining_real_sec = remaining_video_sec / speed_val
-                                    m, s = divmod(int(remaining_real_sec), 60)
-                                    h, m = divmod(m, 60)
-                                    eta_str = f"{h:02d}:{m:02d}:{s:02d}"
-                            except ValueError:
-                                pass
-
-                        time_display = f"{current_ts} / {total_ts}"
-                        update_progress(pct, "Encoding", time_display, speed, eta_str, process_name="FFmpeg")
-
-        p_ffmpeg.wait()
-        p_vspipe.wait()
-
-        if p_ffmpeg.returncode == 0:
+        p_vspipe = None
+        vspipe_env = None
+        frame_socket = None
+        expected_bytes = None
+        relayed: list = []
+        if vspipe_cmd and vspipe_cmd[0] == FRAME_SERVER:
+            frame_socket, expected_bytes = open_render(vspipe_cmd[1])
+            if frame_socket is None:
+                return False
+        elif vspipe_cmd:
+            vspipe_env = get_vspipe_env()
+            # If running vspipe via python script, DO NOT override PYTHONHOME/PYTHONPATH
+            # as it will break the current python interpreter's startup (missing encodings)
+            if vspipe_cmd[0] == sys.executable:
+                vspipe_env.pop("PYTHONHOME", None)
+                vspipe_env.pop("PYTHONPATH", None)
+
+        # One supervisor drains every child stream; a stall or a failing child stops both.
+        # Jobs of the async runner hand the pair to its event loop instead.
+        stall_timeout = float(CONFIG.get("stall_timeout_seconds", 600)) or None
+        use_loop = in_async_runner() and not frame_socket
+        tracker = get_process_tracker()
+
+        def _on_start(name, pid):
+            pin_process(name, pid)
+            pids.append(pid)
+            if tracker:
+                tracker(name, pid)
+
+        supervisor = AsyncPipeline(stall_timeout, on_process=_on_start) if use_loop else StreamSupervisor(stall_timeout=stall_timeout)
+        stderr_lines = []
+        last_frames = [-1]
+        meter = ThroughputMeter()
+
+        def _on_ffmpeg_line(line_str):
+            stderr_lines.append(line_str)
+            if len(stderr_lines) > 20:
+                stderr_lines.pop(0)
+
+            if "frame=" in line_str:
+                sec, current_ts, speed = parse_ffmpeg_time(line_str)
+                frames_done = parse_ffmpeg_frame(line_str)
+                if frames_done is not None and frames_done > last_frames[0]:
+                    last_frames[0] = frames_done
+                    supervisor.progress()
+                if sec and fps and frames_done is not None and frames_done / fps < sec:
+                    sec = frames_done / fps
+                    current_ts = _format_timestamp(sec)
+                if sec and duration_sec > 0:
+                    pct = (sec / duration_sec) * 100
+                    if on_progress:
+                        on_progress(sec / duration_sec)
+
+                    # Calculate ETA and Total Duration String (HH:MM:SS,mmm)
+                    total_ts = _format_timestamp(duration_sec)
+
+                    eta_str = "--:--:--"
+                    remaining_real_sec = None
+                    if frames_done is not None and total_frames:
+                        remaining_real_sec = meter.eta(frames_done, total_frames) if meter.update(frames_done) else None
+                    if remaining_real_sec is not None:
+                        m, s = divmod(int(remaining_real_sec), 60)
+                        h, m = divmod(m, 60)
+                        eta_str = f"{h:02d}:{m:02d}:{s:02d}"
+                        speed = f"{meter.fps:.1f} fps"
+                    elif speed:
+                        try:
+                            speed_val = float(speed.replace("x", ""))
+                            if speed_val > 0:
+                                remaining_video_sec = duration_sec - sec
+                                remaining_real_sec = remaining_video_sec / speed_val
+                                m, s = divmod(int(remaining_real_sec), 60)
+                                h, m = divmod(m, 60)
+                                eta_str = f"{h:02d}:{m:02d}:{s:02d}"
+                        except ValueError:
+                            pass
+
+                    time_display = f"{current_ts} / {total_ts}"
+                    update_progress(pct, "Encoding", time_display, speed, eta_str, process_name="FFmpeg")
+
+        if use_loop:
+            ffmpeg_code = supervisor.run_in_job_loop(vspipe_cmd, vspipe_env, ffmpeg_cmd, log_vspipe_line, _on_ffmpeg_line)
+            group_ok = not (supervisor.stalled or supervisor.failed)
+        else:
+            if vspipe_cmd and not frame_socket:
+                p_vspipe = subprocess.Popen(vspipe_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=vspipe_env)
+
+            ffmpeg_stdin = p_vspipe.stdout if p_vspipe else (subprocess.PIPE if frame_socket else subprocess.DEVNULL)
+            p_ffmpeg = subprocess.Popen(ffmpeg_cmd, stdin=ffmpeg_stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            for name, process in (("vspipe", p_vspipe), ("ffmpeg", p_ffmpeg)):
+                if process:
+                    _on_start(name, process.pid)
+
+            t_relay = None
+            if frame_socket:
+                t_relay = threading.Thread(target=lambda: relayed.append(relay_frames(frame_socket, p_ffmpeg.stdin)),
+                                           daemon=True)
+                t_relay.start()
+
+            if p_vspipe and p_vspipe.stdout:
+                p_vspipe.stdout.close()
+
+            if p_vspipe:
+                supervisor.add_process("vspipe", p_vspipe)
+                supervisor.add_stream(p_vspipe.stderr, log_vspipe_line)
+            supervisor.add_process("ffmpeg", p_ffmpeg)
+            supervisor.add_stream(p_ffmpeg.stdout)
+            supervisor.add_stream(p_ffmpeg.stderr, _on_ffmpeg_line)
+            group_ok = supervisor.run()
+            if t_relay:
+                t_relay.join()
+            ffmpeg_code = p_ffmpeg.returncode
+
+        if supervisor.stalled or (cancel is not None and cancel.is_set()):
+            return False
+        if expected_bytes is not None and relayed and relayed[0] != expected_bytes:
+            # FFmpeg ends cleanly on a short stream, so an aborted render looks like a success
+            log_error(f"\n[ERROR] Frame server delivered {relayed[0]} of {expected_bytes} bytes. The render is incomplete.")
+            return False
+        if supervisor.failed and supervisor.failed != "ffmpeg":
+            # FFmpeg ends cleanly on a stream cut short by a crashed producer
+            log_error(f"\n[ERROR] {supervisor.failed} failed. The render is incomplete.")
+            return False
+        if ffmpeg_code == 0 and group_ok:
             log_info("\n\n[SUCCESS] Deinterlacing finished.")
             if temp_script.exists():
                 try:
@@ -252,7 +476,7 @@ def _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec):
                     pass
             return True
         else:
-            log_error(f"\n[ERROR] FFmpeg failed with exit code {p_ffmpeg.returncode}")
+            log_error(f"\n[ERROR] FFmpeg failed with exit code {ffmpeg_code}")
             log_error(">> Last 20 lines of FFmpeg Error Log:")
             for err_line in stderr_lines:
                 log_error(f"   {err_line}")
@@ -261,9 +485,164 @@ def _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec):
     except Exception as e:
         log_error(f"Unexpected error during processing: {e}")
         return False
+    finally:
+        done.set()
+
+
+# Map VS format to FFmpeg pix_fmt
+# VS format names: YUV420P8, YUV420P10, YUV420P16, YUV422P10, YUV444P10, etc.
+VS_TO_FFMPEG_PIX_FMT = {
+    "YUV420P8": "yuv420p",
+    "YUV420P10": "yuv420p10le",
+    "YUV420P12": "yuv420p12le",
+    "YUV420P14": "yuv420p14le",
+    "YUV420P16": "yuv420p16le",
+    "YUV422P8": "yuv422p",
+    "YUV422P10": "yuv422p10le",
+    "YUV422P16": "yuv422p16le",
+    "YUV444P8": "yuv444p",
+    "YUV444P10": "yuv444p10le",
+    "YUV444P16": "yuv444p16le"
+}
+
+
+def _prepare_vs_stream(input_path: Path, temp_script: Path, index_file: Optional[Path] = None, settings=None, crop="auto",
+                       context=None, qtgmc_overrides=None):
+    """
+    Generates the restoration script and probes it with vspipe --info.
+    settings overrides HW_SETTINGS for the script (e.g. a governed cache budget).
+    crop is detected from the source ("auto", with 'auto_crop') unless given; context
+    holds the neighbour segments in follow mode; qtgmc_overrides is the preview preset.
+    Returns (vspipe_cmd, stream_info) where stream_info holds frames, fps, width,
+    height, format and the matching FFmpeg pixel_format.
+    """
+    log_info(">> Generating VapourSynth Restoration Script...")
+    if crop == "auto":
+        crop = get_auto_crop(input_path) if auto_crop_enabled() else None
+    use_server = frame_server_enabled()
+
+    def _write_script(shared_core):
+        create_vpy_script(str(input_path), str(temp_script), DEINTERLACE_MODE, override_settings=settings,
+                          index_file=(str(index_file) if index_file else None), crop=crop, context=context,
+                          qtgmc_overrides=qtgmc_overrides, shared_core=shared_core)
+
+    _write_script(use_server)
+
+    vspipe_exe = shutil.which("vspipe")
+    server_info = request_info(temp_script) if use_server else None
+    if server_info:
+        total_frames, fps, width, height, fmt_name = server_info
+    else:
+        if use_server:
+            # vspipe runs the script on its own core: it needs the core settings back
+            _write_script(False)
+        log_info(">> Verifying Script with vspipe...")
+        script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        venv_root = os.path.join(script_dir, ".venv")
+        if not os.path.exists(venv_root):
+            venv_root = os.path.dirname(os.path.dirname(sys.executable))
+
+        total_frames, fps, width, height, fmt_name = get_vpy_info(vspipe_exe, str(temp_script), venv_root)
+
+    # If info failed, use defaults (unsafe, but better than crash)
+    if not width: width = 720
+    if not height: height = 576
 
+    # Default to 16-bit (safe fallback for high precision scripts)
+    pixel_format = VS_TO_FFMPEG_PIX_FMT.get(str(fmt_name).upper(), "yuv420p16le")
+    log_info(f"   [INFO] Stream Format: {fmt_name} -> {pixel_format}")
 
-def process_video(input_path: Path):
+    # vspipe.exe (C++ binary) for raw piping (Fastest) aka "The User Demand"
+    # Note: --y4m is NOT supported by all vspipe builds, using raw pipe which is safe now with dynamic format
+    vspipe_cmd = [FRAME_SERVER, str(temp_script)] if server_info else [vspipe_exe, str(temp_script), "-"]
+    stream_info = {
+        "frames": total_frames, "fps": fps, "width": width, "height": height,
+        "format": fmt_name, "pixel_format": pixel_format,
+    }
+    return vspipe_cmd, stream_info
+
+
+def _finish_separate_audio(video_ok, p_audio, audio_source, video_files, part_files, offset=None,
+                           keep_files=None) -> bool:
+    """
+    Waits for the audio stage and muxes it into every video-only output (-c copy).
+    If only the audio encode or the mux failed, the video-only files are moved to
+    keep_files, so the next attempt skips the QTGMC pass. Otherwise they are removed.
+    """
+    if p_audio and not video_ok and p_audio.poll() is None:
+        p_audio.terminate()
+    audio_ok = finish_audio_encode(p_audio) if p_audio else True
+    muxed = False
+    try:
+        if not (video_ok and audio_ok):
+            return False
+        log_info(">> Muxing audio...")
+        for video_file, part_file in zip(video_files, part_files):
+            if not mux_audio(video_file, audio_source, part_file, offset):
+                log_error(f"   Audio mux failed: {video_file.name}")
+                return False
+        muxed = True
+        return True
+    finally:
+        keep = video_ok and not muxed and keep_files
+        if keep:
+            log_info("   [AUDIO] Video-only render kept. The next attempt only redoes audio and mux.")
+        for i, video_file in enumerate(video_files):
+            try:
+                if keep:
+                    os.replace(video_file, keep_files[i])
+                else:
+                    video_file.unlink()
+            except OSError:
+                pass
+
+
+def _get_local_index(local_source: Path) -> Path:
+    """FFMS2 index of a read-ahead local copy."""
+    return local_source.with_name(f"{local_source.name}.ffindex")
+
+
+def _recover_staged_output(stage_dir: Path, output_file: Path) -> bool:
+    """Re-queues a finished render left on scratch by an interrupted run."""
+    staged = get_staged_path(stage_dir, output_file)
+    if output_file.exists() or not staged.exists() or get_duration(str(staged)) <= 0:
+        return False
+    log_info(f"   [STAGING] Finished render found on scratch. Moving: {output_file.name}")
+    queue_move(staged, output_file, _get_part_path(output_file))
+    return True
+
+
+def _plan_staging(stage_dir: Path, pending: list, stream: dict) -> bool:
+    """True if the outputs should be rendered on scratch (enough free space for the estimate)."""
+    needed = sum(estimate_output_size(encoder, stream["frames"] or 0, stream["width"], stream["height"])
+                 for encoder, _ in pending)
+    if has_space(stage_dir, needed):
+        log_info(f"   [STAGING] Rendering on scratch (~{needed / 1024 ** 3:.1f} GB): {stage_dir}")
+        return True
+    log_info(f"   [STAGING] Not enough scratch space for ~{needed / 1024 ** 3:.1f} GB. Writing next to the source.")
+    return False
+
+
+def _output_finished_callback(input_path: Path, encoder: str, settings_hash: Optional[str], stream: dict,
+                              expected_audio):
+    """
+    Callback for a finished output (after the rename or the staged move): records it in
+    the manifest and queues the background verification. None if both are disabled.
+    """
+    use_manifest, verify = manifest_enabled(), verification_enabled()
+    if not (use_manifest or verify):
+        return None
+
+    def _finished(output_file):
+        if use_manifest:
+            record_output(output_file, input_path, settings_hash, encoder, frames=stream["frames"])
+        if verify:
+            on_result = (lambda result: record_verification(output_file, result)) if use_manifest else None
+            queue_verification(output_file, stream["frames"], stream["fps"], expected_audio, on_result)
+    return _finished
+
+
+def process_video(input_path: Path, cancel=None):
     """Refined processing pipeline with restart handling and robust piping."""
     if DEBUG_MODE:
         logging.getLogger("AutoVHS").setLevel(logging.DEBUG)
@@ -275,104 +654,681 @@ def process_video(input_path: Path):
     log_info(f"\n[JOB START] Processing: {input_path.name}")
     log_info("-" * 40)
 
+    # Shared folders: claim the source first, so no other instance renders (or cleans up) the same tape.
+    # A lease lost mid-render cancels the job like a reassigned farm job.
+    cancel = cancel or threading.Event()
+    lease = None
+    if leases_enabled():
+        lease = acquire_lease(input_path, on_lost=cancel.set)
+        if lease is None:
+            return
+    try:
+        _process_claimed(input_path, cancel)
+    finally:
+        if lease:
+            lease.release()
+        release_memory(str(input_path))
+
+
+def _process_claimed(input_path: Path, cancel: threading.Event):
     work_dir = input_path.parent
     stem = input_path.stem
-    output_file = _get_output_path(input_path)
+    outputs = [(encoder, _get_output_path(input_path, encoder)) for encoder in ENCODERS]
+
+    # Temp files (script, index, audio, _part outputs) go to the scratch volume if configured
+    staging = staging_enabled()
+    if staging:
+        work_dir = get_stage_dir(input_path)
 
     temp_script = work_dir / f"{stem}_temp_script.vpy"
-    cleanup_temp_files(work_dir, stem)
-
-    # 1. Resume / Integrity Check
-    if output_file.exists():
-        # Check if previous output is valid (has duration)
-        existing_duration = get_duration(str(output_file))
-        if existing_duration > 0:
-            log_info(f"   [SKIP] Output exists and valid: {output_file.name}")
-            cleanup_temp_files(work_dir, stem)
-            return
-        else:
+    cleanup_temp_files(work_dir, stem, include_stray=not in_async_runner())
+
+    # 1. Resume / Integrity Check (per output, so a partial multi-encoder run only redoes what is missing)
+    use_manifest = manifest_enabled()
+    settings_hashes = {enc: get_settings_hash(enc, _get_video_codec_args(enc, threads=0)) for enc in ENCODERS} if use_manifest else {}
+    pending = []
+    for encoder, output_file in outputs:
+        if staging and _recover_staged_output(work_dir, output_file):
+            continue
+        complete = is_output_complete(output_file, settings_hashes[encoder]) if use_manifest else None
+        if complete:
+            log_info(f"   [SKIP] Output complete (manifest): {output_file.name}")
+            continue
+        if complete is False:
+            log_info(f"   [WARNING] Output failed verification. Rendering again: {output_file.name}")
+            pending.append((encoder, output_file))
+            continue
+        if output_file.exists():
+            # Check if previous output is valid (has duration)
+            existing_duration = get_duration(str(output_file))
+            if existing_duration > 0:
+                log_info(f"   [SKIP] Output exists and valid: {output_file.name}")
+                if use_manifest:
+                    record_output(output_file, input_path, settings_hashes[encoder], encoder)
+                continue
             log_info(f"   [WARNING] Output exists but seems corrupted (0 duration). Overwriting: {output_file.name}")
+        pending.append((encoder, output_file))
+
+    if not pending:
+        cleanup_temp_files(work_dir, stem, include_stray=not in_async_runner())
+        return
 
     # 2. Atomic Write Setup
     # Use _part.extension instead of .extension.part so FFmpeg detects format automatically
-    temp_output = output_file.with_name(f"{output_file.stem}_part{output_file.suffix}")
+    pending = _order_slowest_first(pending)
+    pending_encoders = [encoder for encoder, _ in pending]
+
+    # 3. Deinterlaced Video Source (cached mezzanine or a fresh VapourSynth pass)
+    mezzanine_key = get_mezzanine_key(input_path) if mezzanine_enabled() else None
+    mezzanine = find_mezzanine(mezzanine_key) if mezzanine_key else None
+
+    # Source reads: optional local copy (read-ahead 'copy' mode, only worth it for a VapourSynth pass)
+    read_path = input_path
+    local_source = None
+    if get_readahead_mode() == "copy" and not mezzanine:
+        local_source = copy_source_local(input_path, work_dir if staging else Path(get_cache_dir("readahead")))
+        read_path = local_source or input_path
+
+    # Memory governor: cache budget from what is free now (may wait for other jobs).
+    # Only reserved when VapourSynth runs (a mezzanine hit only encodes).
+    # CPU affinity: core.num_threads matches vspipe's CPU set.
+    vs_settings = None
+    if memory_governor_enabled() and not mezzanine:
+        vs_settings = dict(HW_SETTINGS, ram_cache_mb=reserve_memory(str(input_path), HW_SETTINGS["ram_cache_mb"]))
+    vs_threads = get_stage_threads("vspipe")
+    if vs_threads:
+        vs_settings = dict(vs_settings or HW_SETTINGS, cpu_threads=vs_threads)
+
+    if mezzanine:
+        log_info(">> Mezzanine cache hit: reusing deinterlaced stream (VapourSynth skipped)")
+        vspipe_cmd, stream = None, mezzanine
+    else:
+        index_file = work_dir / f"{stem}.ffindex" if staging else None
+        if local_source and not staging:
+            index_file = _get_local_index(local_source)  # Removed together with the local copy
+        vspipe_cmd, stream = _prepare_vs_stream(read_path, temp_script, index_file, settings=vs_settings)
+    mezzanine_part = get_mezzanine_part_path(mezzanine_key) if mezzanine_key and not mezzanine else None
+
+    total_frames, fps = stream["frames"], stream["fps"]
+    duration_sec = total_frames / (fps if fps else 29.97) if total_frames else probe_media(read_path)["duration_v"]
+
+    atempo, tempo_filter, audio_offset = _analyze_audio_sync(read_path, duration_sec)
+
+    stage_outputs = staging and _plan_staging(work_dir, pending, stream)
+    render_files = [get_staged_path(work_dir, f) if stage_outputs else f for _, f in pending]
+    temp_outputs = [_get_part_path(f) for f in render_files]
+
+    # 4. Audio: inline in the video FFmpeg process, or a separate stage muxed at the end
+    separate_audio = audio_mode_separate()
+    p_audio = None
+    audio_source = read_path
+    video_targets = temp_outputs
+    kept_video = [get_video_keep_path(f) for f in render_files]
+    reuse_video = False
+    if separate_audio:
+        video_targets = [get_video_temp_path(f) for f in render_files]
+        # A previous attempt rendered the video but failed in the audio stage
+        reuse_video = all(f.exists() and get_duration(str(f)) > 0 for f in kept_video)
+        if reuse_video:
+            log_info("   [AUDIO] Reusing the video-only render of the last attempt (QTGMC skipped)")
+            video_targets = kept_video
+            mezzanine_part = None
+        if tempo_filter or not plan_audio_stage(read_path, atempo, [output_file for _, output_file in pending]):
+            audio_source = get_audio_temp_path(work_dir, stem)
+            p_audio = start_audio_encode(read_path, audio_source, atempo, tempo_filter)
+
+    # Chunked AV1: the main pass writes a lossless intermediate (or the mezzanine) instead of AV1
+    chunk_index = None
+    if chunked_av1_enabled() and "av1" in pending_encoders and total_frames and fps:
+        chunk_index = pending_encoders.index("av1")
+    chunk_source = None
+    if chunk_index is not None:
+        chunk_source = Path(mezzanine["path"]) if mezzanine else (mezzanine_part or work_dir / f"{stem}_intermediate.mkv")
+    main_indices = [i for i in range(len(pending)) if i != chunk_index]
+    lossless_file = mezzanine_part or (chunk_source if chunk_index is not None and not mezzanine else None)
+
+    # Pass temp outputs to ffmpeg command (one invocation, one output per encoder)
+    ffmpeg_cmd = _build_ffmpeg_cmd(read_path, [video_targets[i] for i in main_indices], atempo, fps=(fps if fps else 29.97),
+                                   width=stream["width"], height=stream["height"], pixel_format=stream["pixel_format"],
+                                   encoders=[pending_encoders[i] for i in main_indices],
+                                   video_input=(mezzanine["path"] if mezzanine else None), mezzanine_file=lossless_file,
+                                   include_audio=not separate_audio and bool(main_indices), tempo_filter=tempo_filter,
+                                   audio_offset=audio_offset)
 
-    log_info(">> Generating VapourSynth Restoration Script...")
-    create_vpy_script(str(input_path), str(temp_script), DEINTERLACE_MODE)
+    log_debug(f"   [DEBUG] VSPIPE CMD: {vspipe_cmd}")
+    log_debug(f"   [DEBUG] FFMPEG CMD: {ffmpeg_cmd}")
 
-    log_info(">> Verifying Script with vspipe...")
-    vspipe_exe = shutil.which("vspipe")
-    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    venv_root = os.path.join(script_dir, ".venv")
-    if not os.path.exists(venv_root):
-        venv_root = os.path.dirname(os.path.dirname(sys.executable))
+    log_info(f"   [INFO] Source Duration: ~{duration_sec / 60:.2f} mins")
+    for _, output_file in pending:
+        log_info(f">> Encoding to: {output_file.name}")
+
+    render_started = time.monotonic()
+    if reuse_video:
+        success = True
+    elif main_indices or lossless_file:
+        readahead = None if local_source else start_readahead(read_path)
+        success = _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec,
+                                         fps=(fps if len(main_indices) > 1 else None),
+                                         on_progress=(readahead.update if readahead else None),
+                                         total_frames=total_frames, cancel=cancel)
+        if readahead:
+            readahead.stop()
+    else:
+        # Only chunked AV1 is pending and the mezzanine already holds the deinterlaced stream
+        success = True
+
+    if success and chunk_index is not None and not reuse_video and not cancel.is_set():
+        success = encode_chunked_av1(chunk_source, video_targets[chunk_index], total_frames, fps,
+                                     audio_source=(None if separate_audio else read_path),
+                                     audio_args=(None if separate_audio else _get_audio_args(atempo, tempo_filter, audio_offset)))
+
+    if separate_audio:
+        success = _finish_separate_audio(success, p_audio, audio_source, video_targets, temp_outputs, audio_offset,
+                                         keep_files=kept_video)
+        if p_audio and audio_source.exists():
+            try:
+                audio_source.unlink()
+            except OSError:
+                pass
+
+    if success and cancel.is_set():
+        # A cancelled job (reassigned farm job, lost lease) never promotes its outputs
+        log_error(f"[ERROR] Job cancelled. Discarding the render of {input_path.name}.")
+        success = False
+
+    if success and history_enabled() and not mezzanine and not reuse_video:
+        record_run(pending_encoders, total_frames, time.monotonic() - render_started, stream["width"],
+                   stream["height"], sum(f.stat().st_size for f in temp_outputs if f.exists()))
 
-    total_frames, fps, width, height, fmt_name = get_vpy_info(vspipe_exe, str(temp_script), venv_root)
-    duration_sec = total_frames / (fps if fps else 29.97) if total_frames else get_duration(str(input_path))
+    if success:
+        expected_audio = None
+        if verification_enabled():
+            expected_audio = duration_sec if (tempo_filter or atempo != 1.0) else probe_media(read_path)["duration_a"]
+            if expected_audio:
+                expected_audio += audio_offset
+
+        # Atomic Rename (each output individually)
+        for (encoder, output_file), render_file, temp_output in zip(pending, render_files, temp_outputs):
+            try:
+                if temp_output.exists():
+                    temp_output.replace(render_file)
+            except OSError as e:
+                log_error(f"Failed to rename temp output: {e}")
+                continue
+            on_done = _output_finished_callback(input_path, encoder, settings_hashes.get(encoder), stream, expected_audio)
+            if stage_outputs and render_file.exists():
+                queue_move(render_file, output_file, _get_part_path(output_file), on_done)
+            elif on_done:
+                on_done(output_file)
+        if mezzanine_part:
+            commit_mezzanine(mezzanine_key, stream)
+    elif mezzanine_part and mezzanine_part.exists():
+        try:
+            mezzanine_part.unlink()
+        except OSError:
+            pass
 
-    # Default to invalid/safe if failed
-    if not width: width = 720
-    if not height: height = 576
+    if local_source:
+        for local_file in (local_source, _get_local_index(local_source)):
+            try:
+                local_file.unlink()
+            except OSError:
+                pass
+    cleanup_temp_files(work_dir, stem, include_stray=not in_async_runner())
 
-    # Map VS format to FFmpeg pix_fmt
-    # VS format names: YUV420P8, YUV420P10, YUV420P16, YUV422P10, YUV444P10, etc.
-    vs_to_ffmpeg_map = {
-        "YUV420P8": "yuv420p",
-        "YUV420P10": "yuv420p10le",
-        "YUV420P12": "yuv420p12le",
-        "YUV420P14": "yuv420p14le",
-        "YUV420P16": "yuv420p16le",
-        "YUV422P8": "yuv422p",
-        "YUV422P10": "yuv422p10le",
-        "YUV422P16": "yuv422p16le",
-        "YUV444P8": "yuv444p",
-        "YUV444P10": "yuv444p10le",
-        "YUV444P16": "yuv444p16le"
-    }
 
-    # If info failed, use defaults (unsafe, but better than crash)
-    if not width: width = 720
-    if not height: height = 576
+# ==============================================================================
+# AUDIO REMUX
+# ==============================================================================
+# Rebuilds only the audio of finished outputs (new offset, drift correction or codec).
+# The deinterlaced video is stream-copied, so no VapourSynth or video encode runs.
 
-    # Default to 16-bit (safe fallback for high precision scripts)
-    pixel_format = vs_to_ffmpeg_map.get(str(fmt_name).upper(), "yuv420p16le")
-    log_info(f"   [INFO] Stream Format: {fmt_name} -> {pixel_format}")
 
-    atempo = _calculate_audio_sync(input_path, duration_sec)
+def _build_remux_cmd(input_path: Path, output_file: Path, part_file: Path, atempo: float, tempo_filter=None,
+                     offset=None) -> list:
+    """Video from the existing output (-c:v copy), audio freshly taken from the source."""
+    source_codec = probe_media(input_path)["audio_codec"]
+    if not tempo_filter and can_copy_audio(source_codec, atempo, [output_file.suffix]):
+        return build_mux_cmd(output_file, input_path, part_file, offset)
+    return [
+        shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin",
+        "-i", str(output_file), "-i", str(input_path),
+        "-map", "0:v:0", "-map", "1:a:0", "-map_metadata", "0",
+        "-c:v", "copy", *_get_audio_args(atempo, tempo_filter, offset), str(part_file)
+    ]
 
-    # Pass temp_output to ffmpeg command
-    ffmpeg_cmd = _build_ffmpeg_cmd(input_path, temp_output, atempo, fps=(fps if fps else 29.97), width=width, height=height, pixel_format=pixel_format)
 
-    # vspipe.exe (C++ binary) for raw piping (Fastest) aka "The User Demand"
-    # Note: --y4m is NOT supported by all vspipe builds, using raw pipe which is safe now with dynamic format
-    vspipe_cmd = [vspipe_exe, str(temp_script), "-"]
+def remux_video(input_path: Path) -> bool:
+    """Replaces the audio of every existing output of input_path. Returns False on any failure."""
+    outputs = [_get_output_path(input_path, encoder) for encoder in ENCODERS]
+    outputs = [f for f in outputs if f.exists() and get_duration(str(f)) > 0]
+    if not outputs:
+        log_info(f"   [REMUX] No finished output for {input_path.name}. Skipping.")
+        return True
+
+    video_duration = get_duration(str(outputs[0]), "v")
+    atempo, tempo_filter, audio_offset = _analyze_audio_sync(input_path, video_duration)
+    ok = True
+    for output_file in outputs:
+        part_file = _get_part_path(output_file)
+        cmd = _build_remux_cmd(input_path, output_file, part_file, atempo, tempo_filter, audio_offset)
+        log_debug(f"   [DEBUG] REMUX CMD: {cmd}")
+        p = run_command(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if p.returncode == 0 and part_file.exists() and get_duration(str(part_file)) > 0:
+            part_file.replace(output_file)
+            if manifest_enabled():
+                refresh_output_stat(output_file)
+            log_info(f"   [REMUX] Audio rebuilt: {output_file.name}")
+            continue
+        ok = False
+        log_error(f"[ERROR] Remux failed for {output_file.name} (exit code {p.returncode}). Original kept.")
+        if part_file.exists():
+            try:
+                part_file.unlink()
+            except OSError:
+                pass
+    return ok
+
+
+def remux_batch(input_files: list) -> int:
+    """Remuxes a batch with 'remux_workers' parallel jobs. Returns the number of failed sources."""
+    workers = max(int(CONFIG.get("remux_workers", 2)), 1)
+    log_info(f">> Remuxing audio for {len(input_files)} source(s) with {workers} worker(s)")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(remux_video, input_files))
+    return results.count(False)
 
-    log_debug(f"   [DEBUG] VSPIPE CMD: {vspipe_cmd}")
-    log_debug(f"   [DEBUG] FFMPEG CMD: {ffmpeg_cmd}")
 
-    log_info(f"   [INFO] Source Duration: ~{duration_sec / 60:.2f} mins")
-    log_info(f">> Encoding to: {output_file.name}")
+# ==============================================================================
+# FILTER PROFILE / ENCODER BENCHMARK
+# ==============================================================================
 
-    success = _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, duration_sec)
 
-    if success:
-        # Atomic Rename
+def profile_video(input_path: Path):
+    """Times every filter of the restoration script on a sample range. Returns the report path or None."""
+    log_info(f"\n[PROFILE] {input_path.name}")
+    work_dir = get_stage_dir(input_path) if staging_enabled() else input_path.parent
+    stem = input_path.stem
+    temp_script = work_dir / f"{stem}_temp_script.vpy"
+    try:
+        _, stream = _prepare_vs_stream(input_path, temp_script)
+        report = profile_script(shutil.which("vspipe") or "vspipe", temp_script, stream["frames"])
+        if not report:
+            return None
+        for line in format_report(report):
+            log_info(line)
+        report_path = save_report(input_path, report)
+        log_info(f"   Report saved: {report_path}")
+        return report_path
+    finally:
+        cleanup_temp_files(work_dir, stem)
+
+
+def _render_sample(vspipe_cmd, ffmpeg_cmd, plan) -> Optional[float]:
+    """Runs one vspipe | FFmpeg sample with the plan's pinning. Returns the wall time, or None on failure."""
+    started = time.monotonic()
+    p_vspipe = subprocess.Popen(vspipe_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=get_vspipe_env())
+    pin_process("vspipe", p_vspipe.pid, plan)
+    p_ffmpeg = subprocess.Popen(ffmpeg_cmd, stdin=p_vspipe.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pin_process("ffmpeg", p_ffmpeg.pid, plan)
+    if p_vspipe.stdout:
+        p_vspipe.stdout.close()
+    ffmpeg_code = p_ffmpeg.wait()
+    vspipe_code = p_vspipe.wait()
+    if ffmpeg_code != 0 or vspipe_code != 0:
+        return None
+    return time.monotonic() - started
+
+
+def benchmark_affinity(input_path: Path):
+    """Renders the same sample range with every CPU affinity policy. Returns the results."""
+    log_info(f"\n[BENCHMARK] CPU affinity policies: {input_path.name}")
+    work_dir = get_stage_dir(input_path) if staging_enabled() else input_path.parent
+    stem = input_path.stem
+    temp_script = work_dir / f"{stem}_temp_script.vpy"
+    results = []
+    try:
+        for policy in POLICIES:
+            plan = get_affinity_plan(policy) if policy != "off" else {}
+            if plan is None:
+                log_info(f"   {policy:<8} skipped (needs two L3 domains)")
+                continue
+            vs_threads = get_stage_threads("vspipe", plan) or HW_SETTINGS["cpu_threads"]
+            _, stream = _prepare_vs_stream(input_path, temp_script, settings=dict(HW_SETTINGS, cpu_threads=vs_threads))
+            start, end = get_sample_range(stream["frames"], CONFIG.get("profile_frames", 300))
+            vspipe_cmd = [shutil.which("vspipe") or "vspipe", "-s", str(start), "-e", str(end), str(temp_script), "-"]
+            ffmpeg_cmd = [shutil.which("ffmpeg") or "ffmpeg", "-y", "-v", "error", "-f", "rawvideo",
+                          "-pix_fmt", stream["pixel_format"], "-s", f"{stream['width']}x{stream['height']}",
+                          "-r", str(stream["fps"] or 29.97), "-i", "-"]
+            encoder_threads = get_stage_threads("ffmpeg", plan)
+            for encoder in ENCODERS:
+                ffmpeg_cmd += ["-map", "0:v:0", *_get_video_codec_args(encoder, encoder_threads), "-f", "null", "-"]
+            log_info(f"   Rendering frames {start}-{end} with '{policy}'...")
+            seconds = _render_sample(vspipe_cmd, ffmpeg_cmd, plan)
+            frames = end - start + 1
+            results.append({"policy": policy, "vspipe_threads": vs_threads, "encoder_threads": encoder_threads,
+                            "seconds": round(seconds, 3) if seconds else None,
+                            "fps": round(frames / seconds, 2) if seconds else None})
+    finally:
+        cleanup_temp_files(work_dir, stem)
+
+    baseline = next((r["fps"] for r in results if r["policy"] == "off" and r["fps"]), None)
+    for r in results:
+        relative = f"{r['fps'] / baseline * 100:.0f}%" if baseline and r["fps"] else "-"
+        log_info(f"   {r['policy']:<8} {(r['fps'] or 0):>8.2f} fps  {relative:>5} of 'off'"
+                 f"{'' if r['fps'] else '  (failed)'}")
+    report_path = Path(get_cache_dir("benchmarks")) / f"{stem}_affinity.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"source": str(input_path), "encoders": ENCODERS, "results": results}, f, indent=2)
+    log_info(f"   Report saved: {report_path}")
+    return results
+
+
+def benchmark_encoders():
+    """Compares every encoder backend on a sample of the first source given (or a test pattern)."""
+    sources = _parse_cli_args(VIDEO_EXTS)
+    log_info("\n[BENCHMARK] Encoder backends")
+    report = run_benchmark(sources[0] if sources else None)
+    if not report:
+        return None
+    for line in format_benchmark(report):
+        log_info(line)
+    report_path = save_benchmark(report)
+    log_info(f"   Report saved: {report_path}")
+    return report_path
+
+
+# ==============================================================================
+# QUEUE PLAN
+# ==============================================================================
+# Predicts render time and output size per file from the throughput history.
+
+
+def _format_duration(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h:d}:{m:02d}:{s:02d}"
+
+
+def plan_queue(input_files: list, show_files: bool = True):
+    """
+    Dry run: probes every source (cached) and predicts per-file and total render time
+    and output size. Outputs that already exist are not counted. Returns the plan rows.
+    """
+    rows = []
+    for path in input_files:
+        pending = [enc for enc in ENCODERS if not _get_output_path(path, enc).exists()]
+        info = probe_source(path) if pending else None
+        row = {"source": path, "encoders": pending, "info": info, "seconds": None, "bytes": None, "basis": None}
+        if info and info["frames"]:
+            prediction = predict(pending, info["width"], info["height"])
+            if prediction:
+                row["seconds"] = info["frames"] / prediction["fps"]
+                row["basis"] = prediction["basis"]
+            if prediction and prediction["bytes_per_frame"]:
+                row["bytes"] = int(prediction["bytes_per_frame"] * info["frames"])
+            else:
+                row["bytes"] = sum(estimate_output_size(enc, info["frames"], info["width"], info["height"])
+                                   for enc in pending)
+        rows.append(row)
+
+    slots = max(int(CONFIG.get("concurrent_jobs", 1)), 1)
+    known = [row for row in rows if row["seconds"]]
+    finishes = schedule([row["seconds"] for row in known], slots)
+    now = time.time()
+    for row, finish in zip(known, finishes):
+        row["finish"] = now + finish
+
+    if show_files:
+        log_info(f"\n[PLAN] {len(input_files)} source(s), {' + '.join(ENCODERS)}, {slots} job(s) at a time")
+        log_info(f"   {'Source':<36} {'Frames':>8} {'Render':>9} {'Size (GB)':>10}  Finish")
+        for row in rows:
+            name = row["source"].name[:36]
+            if not row["encoders"]:
+                log_info(f"   {name:<36} {'done':>8}")
+            elif not row["info"]:
+                log_info(f"   {name:<36} {'probe failed':>8}")
+            else:
+                render = _format_duration(row["seconds"]) if row["seconds"] else "unknown"
+                finish = time.strftime("%a %H:%M", time.localtime(row["finish"])) if row["seconds"] else "-"
+                log_info(f"   {name:<36} {row['info']['frames']:>8} {render:>9} {row['bytes'] / 1024 ** 3:>10.1f}  {finish}")
+    total_bytes = sum(row["bytes"] or 0 for row in rows)
+    if finishes:
+        unknown = len([row for row in rows if row["encoders"] and not row["seconds"]])
+        log_info(f"   Queue: ~{_format_duration(max(finishes))} render, ~{total_bytes / 1024 ** 3:.1f} GB, done around "
+                 f"{time.strftime('%a %H:%M', time.localtime(now + max(finishes)))}"
+                 f"{f' ({unknown} source(s) without history)' if unknown else ''}")
+    else:
+        log_info("   Queue: no throughput history for this machine yet (set 'throughput_history: true').")
+    return rows
+
+
+def _render_segment(segments, index, spool_dir: Path, crop, context_frames) -> bool:
+    """Renders one follow-mode segment to a video-only piece per encoder."""
+    segment = segments[index]
+    temp_script = spool_dir / f"{segment.stem}.vpy"
+    vspipe_cmd, stream = _prepare_vs_stream(segment, temp_script, crop=crop,
+                                            context=get_context(segments, index, context_frames))
+    fps = stream["fps"] or 29.97
+    pieces = [spool_dir / f"{segment.stem}_{encoder}{ENCODER_BACKENDS[encoder]['ext']}" for encoder in ENCODERS]
+    ffmpeg_cmd = _build_ffmpeg_cmd(segment, pieces, 1.0, fps=fps, width=stream["width"], height=stream["height"],
+                                   pixel_format=stream["pixel_format"], encoders=list(ENCODERS), include_audio=False)
+    log_info(f">> [FOLLOW] Segment {index + 1}: {stream['frames']} frames")
+    return _run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, temp_script, (stream["frames"] or 0) / fps,
+                                  fps=(fps if len(ENCODERS) > 1 else None), total_frames=stream["frames"])
+
+
+def follow_capture(input_path: Path) -> bool:
+    """
+    Follow mode (--follow): deinterlaces a capture that is still being recorded (see
+    modules/follow.py). The outputs are joined when the file has stopped growing.
+    Audio drift correction does not apply here; AUDIO_OFFSET does.
+    """
+    settings = get_follow_settings()
+    spool_dir = Path(get_cache_dir("follow")) / input_path.stem
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    spool_dir.mkdir(parents=True)
+    log_info(f">> [FOLLOW] Following {input_path.name} (finishes {settings['idle_seconds']:g}s after it stops growing)")
+
+    feed = start_feed(input_path, spool_dir, get_mezzanine_codec_args(), settings)
+    crop: Optional[str] = "auto"
+    rendered = 0
+    success = True
+    try:
+        while success:
+            feed_done = feed.poll() is not None
+            segments = list_segments(spool_dir)
+            ready = get_ready_count(len(segments), feed_done)
+            if rendered < ready and crop == "auto":
+                # Borders are measured once, on the first closed segment
+                crop = get_auto_crop(segments[0]) if auto_crop_enabled() else None
+            while success and rendered < ready:
+                success = _render_segment(segments, rendered, spool_dir, crop, settings["context_frames"])
+                rendered += 1
+            if feed_done and rendered >= len(segments):
+                break
+            if success:
+                time.sleep(settings["poll_seconds"])
+    finally:
+        stop_feed(feed)
+
+    if feed.returncode and not rendered:
+        log_error(f"   [ERROR] Follow feed failed: {read_feed_error(spool_dir) or feed.returncode}")
+        success = False
+    if not success or not rendered:
+        log_error(f"!! [FOLLOW] {input_path.name} was not finished. Segments kept in {spool_dir}")
+        return False
+
+    audio_file = spool_dir / AUDIO_FILE
+    audio_source = audio_file if audio_file.exists() and audio_file.stat().st_size > 0 else None
+    for encoder in ENCODERS:
+        output_file = _get_output_path(input_path, encoder)
+        part_file = _get_part_path(output_file)
+        pieces = [spool_dir / f"{segment.stem}_{encoder}{ENCODER_BACKENDS[encoder]['ext']}"
+                  for segment in list_segments(spool_dir)]
+        list_file = write_concat_list(pieces, spool_dir / f"{encoder}_pieces.txt")
+        cmd = build_concat_cmd(list_file, part_file, audio_source, _get_audio_args(1.0) if audio_source else None)
+        p = run_command(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if p.returncode != 0 or not part_file.exists():
+            log_error(f"!! [FOLLOW] Joining {output_file.name} failed. Segments kept in {spool_dir}")
+            return False
+        part_file.replace(output_file)
+        log_info(f">> [FOLLOW] Finished: {output_file.name}")
+
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    return True
+
+
+def _remove_segment(segment: Path):
+    for path in (segment, segment.with_name(f"{segment.name}.ffindex"), segment.with_suffix(".vpy")):
         try:
-            if temp_output.exists():
-                temp_output.replace(output_file)
-        except OSError as e:
-            log_error(f"Failed to rename temp output: {e}")
+            path.unlink()
+        except OSError:
+            pass
+
+
+def preview_source(input_path: Path) -> bool:
+    """
+    Live preview (--preview): renders the newest frames of a (growing) source with a fast
+    QTGMC preset to the configured sink (see modules/preview.py) until the source has
+    stopped growing.
+    """
+    settings = get_preview_settings()
+    target = settings["target"] or get_default_target(settings["sink"], input_path.stem)
+    if settings["sink"] == "fifo" and not prepare_fifo(target):
+        log_error("!! [PREVIEW] The 'fifo' sink needs a POSIX system. Use 'udp' or 'snapshot'.")
+        return False
+    vspipe_exe = shutil.which("vspipe")
+    if not vspipe_exe:
+        log_error("!! [PREVIEW] vspipe not found. Install VapourSynth or add it to PATH.")
+        return False
+    spool_dir = Path(get_cache_dir("preview")) / f"{input_path.stem}_segments"
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    spool_dir.mkdir(parents=True)
+    log_info(f">> [PREVIEW] {input_path.name} -> {settings['sink']}: {target} (QTGMC '{settings['preset']}')")
+
+    feed = start_feed(input_path, spool_dir, get_mezzanine_codec_args(), settings)
+    crop: Optional[str] = "auto"
+    shown = -1
+    sink: Optional[subprocess.Popen] = None
+    success = True
+    try:
+        while True:
+            feed_done = feed.poll() is not None
+            segments = list_segments(spool_dir)
+            newest = get_newest_complete(len(segments), feed_done)
+            if newest < 0 or segment_number(segments[newest]) <= shown:
+                if feed_done:
+                    break
+                time.sleep(settings["poll_seconds"])
+                continue
+
+            # Older complete segments are dropped: the preview shows the newest frames only
+            segment = segments[newest]
+            if newest:
+                log_debug(f"[PREVIEW] Skipped {newest} segment(s) to keep up")
+            closed_at = segment.stat().st_mtime
+            if crop == "auto":
+                crop = get_auto_crop(segment) if auto_crop_enabled() else None
+            temp_script = spool_dir / f"{segment.stem}.vpy"
+            _, stream = _prepare_vs_stream(segment, temp_script, crop=crop,
+                                           qtgmc_overrides={"Preset": settings["preset"]})
+            if sink is None:
+                sink = subprocess.Popen(build_sink_cmd(settings["sink"], target, stream, settings["snapshot_seconds"]),
+                                        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                ACTIVE_PROCS.append(sink)
+            result = subprocess.run([vspipe_exe, str(temp_script), "-"], stdout=sink.stdin,
+                                    stderr=subprocess.DEVNULL, env=get_vspipe_env())
+            if result.returncode != 0:
+                log_error(f"!! [PREVIEW] Rendering {segment.name} failed (or the sink was closed).")
+                success = False
+                break
+
+            latency = time.time() - closed_at
+            log_debug(f"[PREVIEW] {segment.name} shown {latency:.1f}s after it was captured")
+            if latency > settings["latency_seconds"]:
+                log_info(f"   [PREVIEW] {latency:.1f}s behind the capture (target {settings['latency_seconds']:g}s). "
+                         "Try a faster 'preview_preset' or shorter 'preview_segment_seconds'.")
+            shown = segment_number(segment)
+            for old in segments[:newest + 1]:
+                _remove_segment(old)
+    finally:
+        stop_feed(feed)
+        if sink:
+            try:
+                if sink.stdin:
+                    sink.stdin.close()
+            except OSError:
+                pass
+            sink.wait()
+            if sink in ACTIVE_PROCS:
+                ACTIVE_PROCS.remove(sink)
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    if success:
+        log_info(">> [PREVIEW] Source stopped growing. Preview finished.")
+    return success
 
-    cleanup_temp_files(work_dir, stem)
+
+def _run_watch_mode():
+    """Headless daemon: processes sources dropped into the watch folders until stopped."""
+    roots = [Path(arg) for arg in sys.argv[1:] if not arg.startswith("--") and Path(arg).is_dir()]
+    if not roots and CONFIG.get("watch_folder"):
+        roots = [Path(CONFIG["watch_folder"])]
+    if not roots:
+        log_error("!! Watch mode needs a folder (argument or 'watch_folder' in config.yaml).")
+        return
+
+    def _job(path):
+        process_video(path)
+        for staged in wait_for_moves():
+            log_error(f"   Output left on scratch: {staged}")
+
+    try:
+        watch_folders(roots, _job, VIDEO_EXTS)
+    except KeyboardInterrupt:
+        log_info("\nWatch mode stopped.")
+
+
+def _farm_job(input_path: Path, cancel=None) -> bool:
+    """Farm worker job: the normal pipeline, successful once every output is in place."""
+    process_video(input_path, cancel)
+    wait_for_moves()
+    return all(_get_output_path(input_path, encoder).exists() for encoder in ENCODERS)
+
+
+def _run_farm_worker():
+    """Connects to the coordinator given as argument (http://host:port) or 'farm_url'."""
+    urls = [arg for arg in sys.argv[1:] if arg.startswith("http://")]
+    url = urls[0] if urls else CONFIG.get("farm_url", "")
+    if not url:
+        log_error("!! Farm worker needs a coordinator URL (argument or 'farm_url' in config.yaml).")
+        return
+    run_worker(url, _farm_job, media_duration=lambda path: probe_media(path)["duration_v"])
+    wait_for_verifications()
 
 
 def main():
     setup_environment()
     cpu = get_cpu_name()
     gpu = get_gpu_name()
-    _show_banner(cpu, gpu, PERF_PROFILE, DEINTERLACE_MODE, ENCODER, HW_SETTINGS)
+    _show_banner(cpu, gpu, PERF_PROFILE, DEINTERLACE_MODE, " + ".join(ENCODERS), HW_SETTINGS)
 
     check_requirements()
+    get_affinity_plan()
+
+    # The interpolation backend is only chosen on paths that run QTGMC (it may time a probe render)
+    flags = _get_cli_flags()
+    if "--watch" in flags:
+        select_interpolation_backend()
+        _run_watch_mode()
+        return
+    if "--farm-worker" in flags:
+        select_interpolation_backend()
+        _run_farm_worker()
+        return
+    if "--benchmark" in flags:
+        benchmark_encoders()
+        return
 
     input_files = get_input_files()
     if not input_files:
@@ -384,10 +1340,48 @@ def main():
 
     log_info(f"Queue Size: {len(input_files)} videos")
 
-    for i, f in enumerate(input_files):
-        log_info(f"\nProcessing {i + 1}/{len(input_files)}...")
-        process_video(f)
+    if "--farm-coordinator" in flags:
+        run_coordinator([f.resolve() for f in input_files])
+        return
 
+    if "--remux" in flags:
+        failed = remux_batch(input_files)
+        log_info(f"\nRemux finished ({failed} failed).")
+        return
+    if "--plan" in flags:
+        plan_queue(input_files)
+        return
+
+    select_interpolation_backend()
+    if "--profile" in flags:
+        for f in input_files:
+            profile_video(f)
+        return
+    if "--benchmark-affinity" in flags:
+        benchmark_affinity(input_files[0])
+        return
+    if "--follow" in flags:
+        follow_capture(input_files[0])
+        return
+    if "--preview" in flags:
+        preview_source(input_files[0])
+        return
+
+    if history_enabled() and len(input_files) > 1:
+        plan_queue(input_files, show_files=False)
+
+    concurrent_jobs = int(CONFIG.get("concurrent_jobs", 1))
+    if concurrent_jobs > 1 and len(input_files) > 1:
+        run_jobs(input_files, process_video, concurrent_jobs)
+    else:
+        for i, f in enumerate(input_files):
+            log_info(f"\nProcessing {i + 1}/{len(input_files)}...")
+            process_video(f)
+
+    for staged in wait_for_moves():
+        log_error(f"   Output left on scratch: {staged}")
+    for failed in wait_for_verifications():
+        log_error(f"   Output failed verification: {failed}")
     log_info("\nAll tasks finished.")
     # Keep window open if double-clicked
     if len(sys.argv) == 1:
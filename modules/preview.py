@@ -0,0 +1,71 @@
+import os
+import shutil
+
+from modules.config import CONFIG, get_cache_dir
+
+# ==============================================================================
+# LIVE PREVIEW
+# ==============================================================================
+# Lets an operator check field order, tracking and crop while a tape is being
+# captured. The follow-mode feed cuts the growing file into short segments; only
+# the newest complete segment is rendered (older ones are dropped when the
+# preview falls behind, which bounds the latency) with the same script as the
+# archival render except for a fast QTGMC preset. The frames go to one
+# long-running FFmpeg sink: a localhost UDP stream, a FIFO or a JPEG snapshot
+# that is refreshed every few seconds.
+
+SINKS = ("snapshot", "udp", "fifo")
+
+
+def get_preview_settings():
+    sink = str(CONFIG.get("preview_sink", "snapshot")).lower()
+    return {
+        "sink": sink if sink in SINKS else "snapshot",
+        "target": CONFIG.get("preview_target") or None,
+        "preset": CONFIG.get("preview_preset", "Ultra Fast"),
+        "segment_seconds": float(CONFIG.get("preview_segment_seconds", 2)),
+        "latency_seconds": float(CONFIG.get("preview_latency_seconds", 5)),
+        "snapshot_seconds": float(CONFIG.get("preview_snapshot_seconds", 2)),
+        "idle_seconds": float(CONFIG.get("follow_idle_seconds", 30)),
+        "poll_seconds": 0.2,
+    }
+
+
+def get_default_target(sink, stem):
+    if sink == "udp":
+        return "udp://127.0.0.1:5000"
+    if sink == "fifo":
+        return os.path.join(get_cache_dir("preview"), f"{stem}.y4m")
+    return os.path.join(get_cache_dir("preview"), f"{stem}_preview.jpg")
+
+
+def get_newest_complete(segment_count, feed_done) -> int:
+    """Index of the newest segment the feed has finished writing, or -1."""
+    return segment_count - 1 if feed_done else segment_count - 2
+
+
+def build_sink_cmd(sink, target, stream, snapshot_seconds=2.0) -> list:
+    """FFmpeg reading raw frames (vspipe output) from stdin and writing them to the sink."""
+    cmd = [
+        shutil.which("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", stream["pixel_format"],
+        "-s", f"{stream['width']}x{stream['height']}", "-r", str(stream["fps"]), "-i", "-",
+    ]
+    if sink == "udp":
+        cmd += ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-pix_fmt", "yuv420p",
+                "-f", "mpegts", target]
+    elif sink == "fifo":
+        cmd += ["-pix_fmt", "yuv420p", "-f", "yuv4mpegpipe", target]
+    else:
+        cmd += ["-vf", f"fps=1/{snapshot_seconds:g}", "-update", "1", "-q:v", "3", target]
+    return cmd
+
+
+def prepare_fifo(path) -> bool:
+    """Creates the FIFO for the 'fifo' sink (POSIX only)."""
+    if os.path.exists(path):
+        return True
+    if not hasattr(os, "mkfifo"):
+        return False
+    os.mkfifo(path)
+    return True
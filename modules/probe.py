@@ -0,0 +1,69 @@
+import os
+import json
+
+from modules.utils import log_debug, file_fingerprint, get_duration, get_fps, get_codec_name, get_resolution
+from modules.config import get_cache_dir
+
+# ==============================================================================
+# PROBE CACHE
+# ==============================================================================
+# One small JSON document per source, keyed by its content fingerprint. Holds the
+# ffprobe results and any analysis that is expensive to repeat (e.g. the drift map).
+
+# Stream facts of probe_media(); entries missing any of them are probed again
+MEDIA_FACTS = ("duration_v", "duration_a", "fps", "audio_codec", "width", "height")
+
+
+def _entry_path(fingerprint):
+    return os.path.join(get_cache_dir("probe"), f"{fingerprint}.json")
+
+
+def load_probe_entry(fingerprint):
+    """Returns the cached entry for a fingerprint (empty dict when missing/corrupt)."""
+    try:
+        with open(_entry_path(fingerprint), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_probe_entry(fingerprint, **fields):
+    """Merges fields into the cached entry and writes it atomically."""
+    entry = load_probe_entry(fingerprint)
+    entry.update(fields)
+    path = _entry_path(fingerprint)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log_debug(f"[PROBE] Could not write cache entry: {e}")
+    return entry
+
+
+def probe_media(input_path, fingerprint=None):
+    """
+    Returns basic stream facts (durations, fps, audio codec, resolution) for a source,
+    probing it with ffprobe only on the first call. A file that cannot be read is
+    probed uncached.
+    """
+    try:
+        fingerprint = fingerprint or file_fingerprint(str(input_path))
+    except OSError:
+        fingerprint = None
+    entry = load_probe_entry(fingerprint) if fingerprint else {}
+    if all(key in entry for key in MEDIA_FACTS):
+        return entry
+    width, height = get_resolution(str(input_path))
+    facts = {
+        "duration_v": get_duration(str(input_path), "v"),
+        "duration_a": get_duration(str(input_path), "a"),
+        "fps": get_fps(str(input_path)),
+        "audio_codec": get_codec_name(str(input_path), "a"),
+        "width": width,
+        "height": height,
+    }
+    if not fingerprint:
+        return facts
+    return update_probe_entry(fingerprint, size=os.path.getsize(str(input_path)), **facts)
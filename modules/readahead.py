@@ -0,0 +1,139 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from modules.utils import log_info, log_debug
+from modules.config import CONFIG
+
+# ==============================================================================
+# SOURCE READ-AHEAD
+# ==============================================================================
+# vspipe (ffms2) and FFmpeg (audio) read the source at the same time with small
+# requests, which stalls on SMB/NFS. 'source_readahead' keeps the OS page cache
+# ahead of the decoder:
+#   - "fadvise":  posix_fadvise(WILLNEED) hints for the window ahead (Linux/macOS).
+#   - "prefetch": a background thread reads the window ahead in large blocks.
+#   - "copy":     the source is copied to local disk once before the job starts.
+# The decode position comes from the encoder progress (fraction of the duration).
+
+PREFETCH_BLOCK = 8 * 1024 * 1024
+
+
+def get_readahead_mode():
+    mode = str(CONFIG.get("source_readahead", "off")).lower()
+    if mode == "fadvise" and not hasattr(os, "posix_fadvise"):
+        log_debug("[READAHEAD] posix_fadvise not available. Using prefetch thread instead.")
+        return "prefetch"
+    return mode
+
+
+class SourceReadahead:
+    """Keeps the byte range just ahead of the decode position warm in the page cache."""
+
+    def __init__(self, path, mode, window_bytes):
+        self.path = str(path)
+        self.mode = mode
+        self.window = window_bytes
+        self.size = os.path.getsize(self.path)
+        self.position = 0        # Estimated decoder byte offset
+        self.prefetched = 0      # Bytes [0, prefetched) have been read/hinted
+        self.hits = 0            # Position updates that found the data already prefetched
+        self.stalls = 0          # Position updates that overtook the prefetcher
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        if mode == "fadvise":
+            os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            self._advise(0)
+        elif mode == "prefetch":
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+
+    def _advise(self, start):
+        end = min(start + self.window, self.size)
+        if end > self.prefetched:
+            offset = max(start, self.prefetched)
+            os.posix_fadvise(self._fd, offset, end - offset, os.POSIX_FADV_WILLNEED)
+            self.prefetched = end
+
+    def _prefetch_loop(self):
+        # The thread owns the fd in prefetch mode: a read stuck on a hung share must not
+        # find it closed (or reused by another open) under its feet
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopped and (self.prefetched >= self.size
+                                                 or self.prefetched >= self.position + self.window):
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    offset = self.prefetched
+                data = os.pread(self._fd, PREFETCH_BLOCK, offset) if hasattr(os, "pread") else self._read_at(offset)
+                with self._cond:
+                    self.prefetched = offset + len(data) if data else self.size
+        finally:
+            os.close(self._fd)
+
+    def _read_at(self, offset):
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        return os.read(self._fd, PREFETCH_BLOCK)
+
+    def update(self, fraction):
+        """Moves the decode position (0.0 - 1.0 of the source)."""
+        with self._cond:
+            self.position = int(self.size * min(max(fraction, 0.0), 1.0))
+            if self.position <= self.prefetched:
+                self.hits += 1
+            else:
+                self.stalls += 1
+            if self.mode == "fadvise":
+                self._advise(self.position)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            if self._thread.is_alive():
+                log_debug("[READAHEAD] Prefetch read still pending. It closes the source when it returns.")
+        else:
+            os.close(self._fd)
+        total = self.hits + self.stalls
+        if total:
+            log_info(f"   [READAHEAD] {self.prefetched / 1024 ** 2:.0f} MB ahead-read, "
+                     f"hit rate {self.hits / total * 100:.1f}%, {self.stalls} stall(s).")
+        return {"hits": self.hits, "stalls": self.stalls, "prefetched": self.prefetched}
+
+
+def start_readahead(path):
+    """Starts fadvise/prefetch read-ahead for a source. Returns None when disabled."""
+    mode = get_readahead_mode()
+    if mode not in ("fadvise", "prefetch"):
+        return None
+    window = int(CONFIG.get("readahead_mb", 256)) * 1024 * 1024
+    try:
+        return SourceReadahead(path, mode, window)
+    except OSError as e:
+        log_debug(f"[READAHEAD] Disabled for {path}: {e}")
+        return None
+
+
+def copy_source_local(input_path: Path, local_dir: Path):
+    """'copy' mode: copies the source to local_dir. Returns the local path or None."""
+    local_path = local_dir / f"{input_path.stem}_temp_source{input_path.suffix}"
+    log_info(f">> Copying source to local disk: {local_path}")
+    try:
+        shutil.copyfile(str(input_path), str(local_path))
+        return local_path
+    except OSError as e:
+        log_info(f"   [READAHEAD] Local copy failed ({e}). Reading the source in place.")
+        try:
+            if local_path.exists():
+                local_path.unlink()
+        except OSError:
+            pass
+        return None
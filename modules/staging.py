@@ -0,0 +1,160 @@
+import os
+import queue
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+from modules.utils import log_info, log_debug, log_error
+from modules.config import CONFIG
+from modules.encoders import ENCODER_BACKENDS
+
+# ==============================================================================
+# SCRATCH STAGING
+# ==============================================================================
+# With 'scratch_dir' set, temp scripts, source indexes and _part outputs live on a
+# fast local volume instead of next to the (possibly network) source. Finished
+# outputs are handed to a background mover that copies them to their destination,
+# verifies the copy and renames it into place while the next job renders.
+
+# Approximate bits per output pixel, used to estimate the output size
+BITS_PER_PIXEL = {name: backend["bits_per_pixel"] for name, backend in ENCODER_BACKENDS.items()}
+SPACE_MARGIN = 1.2
+COPY_BLOCK = 16 * 1024 * 1024
+
+
+def staging_enabled():
+    return bool(CONFIG.get("scratch_dir"))
+
+
+def get_stage_dir(input_path: Path) -> Path:
+    """Per-source folder on the scratch volume (the hash keeps equal names apart)."""
+    parent_hash = hashlib.sha1(str(input_path.resolve().parent).encode("utf-8")).hexdigest()[:8]
+    stage_dir = Path(CONFIG["scratch_dir"]) / f"{input_path.stem}-{parent_hash}"
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    return stage_dir
+
+
+def get_staged_path(stage_dir: Path, output_file: Path) -> Path:
+    return stage_dir / output_file.name
+
+
+def estimate_output_size(encoder, frames, width, height) -> int:
+    """Rough output size in bytes (video only) for space checks and logging."""
+    return int(frames * width * height * BITS_PER_PIXEL.get(encoder, 1.0) / 8)
+
+
+def has_space(path: Path, needed_bytes: int) -> bool:
+    try:
+        free = shutil.disk_usage(str(path)).free
+    except OSError:
+        return False
+    return free >= needed_bytes * SPACE_MARGIN
+
+
+def preallocate(f, size):
+    """Reserves size bytes for an open file in one extent where the OS supports it."""
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+        return True
+    except OSError as e:
+        log_debug(f"[STAGING] Preallocation not supported here: {e}")
+        return False
+
+
+def _copy_file(src: Path, dest: Path) -> str:
+    """Copies src to dest (preallocated to the final size). Returns the sha256 of the data."""
+    size = src.stat().st_size
+    digest = hashlib.sha256()
+    with open(src, "rb") as f_in, open(dest, "wb") as f_out:
+        preallocate(f_out, size)
+        while True:
+            block = f_in.read(COPY_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            f_out.write(block)
+        f_out.truncate(size)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    return digest.hexdigest()
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _same_volume(src: Path, dest_dir: Path) -> bool:
+    return os.stat(src).st_dev == os.stat(dest_dir).st_dev
+
+
+def move_output(src: Path, dest: Path, dest_part: Path) -> bool:
+    """
+    Copies a finished output to dest_part, verifies it and renames it to dest.
+    The staged file is only removed once the destination is complete.
+    """
+    try:
+        if _same_volume(src, dest.parent):
+            os.replace(src, dest)
+            return True
+        source_hash = _copy_file(src, dest_part)
+        if dest_part.stat().st_size != src.stat().st_size:
+            raise OSError("size mismatch after copy")
+        if CONFIG.get("scratch_verify", "hash") == "hash" and _file_hash(dest_part) != source_hash:
+            raise OSError("checksum mismatch after copy")
+        os.replace(dest_part, dest)
+        src.unlink()
+        return True
+    except OSError as e:
+        log_error(f"[ERROR] Moving {src.name} to {dest.parent} failed: {e}. Staged copy kept.")
+        try:
+            if dest_part.exists():
+                dest_part.unlink()
+        except OSError:
+            pass
+        return False
+
+
+_MOVE_QUEUE: queue.Queue = queue.Queue()
+_MOVER_LOCK = threading.Lock()
+_MOVER: Dict[str, Any] = {"thread": None, "failed": []}
+
+
+def _mover_loop():
+    while True:
+        src, dest, dest_part, on_done = _MOVE_QUEUE.get()
+        try:
+            if move_output(src, dest, dest_part):
+                log_info(f"   [STAGING] Moved to destination: {dest.name}")
+                if on_done:
+                    on_done(dest)
+            else:
+                _MOVER["failed"].append(src)
+        finally:
+            _MOVE_QUEUE.task_done()
+
+
+def queue_move(src: Path, dest: Path, dest_part: Path, on_done=None):
+    """Hands a finished staged output to the background mover. on_done(dest) runs after a successful move."""
+    with _MOVER_LOCK:
+        if _MOVER["thread"] is None or not _MOVER["thread"].is_alive():
+            _MOVER["thread"] = threading.Thread(target=_mover_loop, daemon=True)
+            _MOVER["thread"].start()
+    log_debug(f"[STAGING] Queued move: {src} -> {dest}")
+    _MOVE_QUEUE.put((src, dest, dest_part, on_done))
+
+
+def wait_for_moves() -> list:
+    """Blocks until every queued move is done. Returns the staged files that failed."""
+    if _MOVE_QUEUE.unfinished_tasks:
+        log_info(">> Waiting for staged outputs to reach their destination...")
+    _MOVE_QUEUE.join()
+    failed, _MOVER["failed"] = _MOVER["failed"], []
+    return failed
@@ -0,0 +1,176 @@
+import os
+import time
+import queue
+import selectors
+import threading
+import subprocess
+
+from modules.utils import log_debug, log_error
+
+# ==============================================================================
+# STREAM SUPERVISOR
+# ==============================================================================
+# Drains every pipe of the vspipe/FFmpeg pair from one loop, so no child can block
+# on a full pipe while we wait for another. Pipes are multiplexed with selectors
+# where the OS supports it (POSIX); other streams (Windows pipes, file-like
+# objects) get a small reader thread each that feeds the same loop. A stall
+# watchdog and a failing child tear the whole group down together.
+
+READ_SIZE = 64 * 1024
+
+
+def _split_lines(buffer: bytes):
+    """Splits on '\n' and '\r' (FFmpeg ends progress lines with '\r'). Returns (lines, rest)."""
+    parts = buffer.replace(b"\r", b"\n").split(b"\n")
+    return [line for line in parts[:-1] if line], parts[-1]
+
+
+class StreamSupervisor:
+    """
+    Runs a group of child processes to completion while draining their streams.
+    handler(line: str) is called for every line of a stream; None just discards it.
+    """
+
+    def __init__(self, stall_timeout=None, terminate_timeout=5.0, drain_timeout=5.0):
+        self.stall_timeout = stall_timeout
+        self.terminate_timeout = terminate_timeout
+        self.drain_timeout = drain_timeout
+        self.processes = []
+        self.stalled = False
+        self.failed = None
+        self._streams = []
+        self._last_progress = time.monotonic()
+        self._events = queue.Queue()
+
+    def add_process(self, name, process):
+        self.processes.append((name, process))
+
+    def add_stream(self, stream, handler=None):
+        if stream is not None:
+            self._streams.append((stream, handler))
+
+    def progress(self):
+        """Resets the stall watchdog (call whenever real work was observed)."""
+        self._last_progress = time.monotonic()
+
+    def _emit(self, handler, raw: bytes):
+        if handler:
+            handler(raw.decode("utf-8", errors="replace").strip())
+
+    def _reader(self, index, stream):
+        """Thread fallback for streams that cannot be registered with the selector."""
+        read = getattr(stream, "read1", None) or stream.read
+        try:
+            while True:
+                data = read(READ_SIZE)
+                if not isinstance(data, bytes) or not data:
+                    break
+                self._events.put((index, data))
+        except (OSError, ValueError):
+            pass
+        self._events.put((index, b""))
+
+    def _setup(self, selector):
+        for index, (stream, _) in enumerate(self._streams):
+            try:
+                fd = stream.fileno()
+                if os.name == "nt" or not isinstance(fd, int):
+                    raise ValueError("stream cannot be selected")
+                os.set_blocking(fd, False)
+                selector.register(fd, selectors.EVENT_READ, index)
+            except (OSError, ValueError, AttributeError):
+                threading.Thread(target=self._reader, args=(index, stream), daemon=True).start()
+
+    def _poll(self, selector, timeout):
+        """Returns [(stream index, data)]; empty data means EOF."""
+        events = []
+        if selector.get_map():
+            for key, _ in selector.select(timeout):
+                try:
+                    data = os.read(key.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    selector.unregister(key.fd)
+                events.append((key.data, data))
+            timeout = 0
+        try:
+            events.append(self._events.get(timeout=timeout))
+            while True:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    def _check_processes(self):
+        """Tears the group down if a child failed. Returns True once every child has exited."""
+        all_done = True
+        for name, process in self.processes:
+            code = process.poll()
+            if code is None:
+                all_done = False
+            elif code != 0 and self.failed is None:
+                self.failed = name
+                log_debug(f"[SUPERVISOR] {name} exited with code {code}. Stopping the other processes.")
+                self.terminate()
+        return all_done
+
+    def terminate(self):
+        """Stops every child still running: terminate, then kill after terminate_timeout."""
+        for _, process in self.processes:
+            if process.poll() is None:
+                try:
+                    process.terminate()
+                except OSError:
+                    pass
+        deadline = time.monotonic() + self.terminate_timeout
+        for _, process in self.processes:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run(self) -> bool:
+        """Blocks until every stream is drained and every child has exited. False on stall or failure."""
+        buffers = {index: b"" for index in range(len(self._streams))}
+        open_streams = set(buffers)
+        self._last_progress = time.monotonic()
+        exited_at = None
+        with selectors.DefaultSelector() as selector:
+            self._setup(selector)
+            while open_streams:
+                for index, data in self._poll(selector, 1.0):
+                    handler = self._streams[index][1]
+                    if not data:
+                        if buffers[index]:
+                            self._emit(handler, buffers[index])
+                        buffers[index] = b""
+                        open_streams.discard(index)
+                        continue
+                    if handler is None:
+                        continue
+                    lines, buffers[index] = _split_lines(buffers[index] + data)
+                    for line in lines:
+                        self._emit(handler, line)
+
+                if self._check_processes():
+                    # A grandchild may keep a pipe open after its parent exited
+                    exited_at = exited_at or time.monotonic()
+                    if time.monotonic() - exited_at > self.drain_timeout:
+                        log_debug("[SUPERVISOR] Streams still open after all processes exited. Giving up on them.")
+                        break
+                if (self.stall_timeout and not self.stalled
+                        and time.monotonic() - self._last_progress > self.stall_timeout):
+                    self.stalled = True
+                    log_error(f"\n[ERROR] No progress for {self.stall_timeout:.0f}s. Stopping the encode.")
+                    self.terminate()
+
+        for _, process in self.processes:
+            try:
+                process.wait(timeout=self.terminate_timeout)
+            except subprocess.TimeoutExpired:
+                self.terminate()
+                break
+        return not (self.stalled or self.failed)
@@ -7,6 +7,7 @@ import time
 import platform
 import logging
 import re
+import hashlib
 import subprocess
 from typing import List
 
@@ -297,16 +298,25 @@ def parse_ffmpeg_time(line_str):
     return seconds, time_s, speed_s
 
 
-def cleanup_temp_files(work_dir, stem):
-    """Robust cleanup of all temporary files."""
+def parse_ffmpeg_frame(line_str):
+    """Extracts the encoded frame count (frame=N) from FFmpeg output, or None."""
+    if not line_str:
+        return None
+    frame_match = re.search(r"frame=\s*(\d+)", line_str)
+    return int(frame_match.group(1)) if frame_match else None
+
+
+def cleanup_temp_files(work_dir, stem, include_stray=True):
+    """Robust cleanup of all temporary files. include_stray=False keeps other jobs' scripts (concurrent jobs)."""
     patterns = [
         f"{stem}_temp_script.vpy",
         f"{stem}_intermediate.mov",
         f"{stem}_intermediate.mkv",
         f"{stem}.*ffindex",  # Clean FFMS2 index files
         f"{stem}.*lwi",     # Clean LSMASH index files
-        "*.vpy",  # Safety: Clean stray VPYs
     ]
+    if include_stray:
+        patterns.append("*.vpy")  # Safety: Clean stray VPYs
 
     # Be careful with wildcards, only delete if confident
     for p_str in patterns:
@@ -444,6 +454,56 @@ def get_fps(file_path):
         return 29.97  # Fallback
 
 
+def get_resolution(file_path):
+    """Width and height of the first video stream, or (None, None)."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height",
+        "-of", "csv=p=0",
+        str(file_path),
+    ]
+    try:
+        out = subprocess.check_output(cmd).decode().strip()
+        width, height = out.splitlines()[0].split(",")[:2]
+        return int(width), int(height)
+    except Exception:
+        return None, None
+
+
+def get_codec_name(file_path, stream_type="a"):
+    """Get the codec name of the first stream of a type (e.g. 'pcm_s16le'), or None."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", f"{stream_type}:0",
+        "-show_entries", "stream=codec_name",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        str(file_path),
+    ]
+    try:
+        out = subprocess.check_output(cmd).decode().strip()
+        return out.splitlines()[0].strip() if out else None
+    except Exception:
+        return None
+
+
+def file_fingerprint(file_path, sample_bytes=1024 * 1024):
+    """
+    Content fingerprint of a (large) media file: size plus hashes of the first and last
+    sample_bytes. Survives copies/renames between shares without reading whole tapes.
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha256(str(size).encode("ascii"))
+    with open(file_path, "rb") as f:
+        digest.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(size - sample_bytes, sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
 def get_start_time(file_path, stream_type="v"):
     """Get stream start_time in seconds."""
     cmd = [
@@ -0,0 +1,127 @@
+import time
+import queue
+import random
+import shutil
+import threading
+import subprocess
+from typing import Any, Dict
+
+from modules.utils import log_info, log_debug, log_error, get_duration
+from modules.config import CONFIG
+
+# ==============================================================================
+# OUTPUT VERIFICATION
+# ==============================================================================
+# 'duration > 0' passes a truncated file with an intact index. After each encode a
+# background worker counts the video packets (demux only, no decode), compares the
+# audio duration with the expected one and optionally decodes a few random frames.
+# It overlaps the next job; results go to the completion manifest.
+
+
+def verification_enabled():
+    return bool(CONFIG.get("verify_outputs", False))
+
+
+def count_video_packets(file_path):
+    """Number of packets in the first video stream (ffprobe -count_packets), or None."""
+    cmd = [
+        shutil.which("ffprobe") or "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-count_packets", "-show_entries", "stream=nb_read_packets",
+        "-of", "default=noprint_wrappers=1:nokey=1", str(file_path),
+    ]
+    try:
+        out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode().strip()
+        return int(out.splitlines()[0])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+
+def decode_frame_at(file_path, seconds) -> bool:
+    """Decodes a single frame at the given position. True if FFmpeg reports no error."""
+    cmd = [
+        shutil.which("ffmpeg") or "ffmpeg", "-v", "error", "-nostdin", "-ss", f"{seconds:.3f}",
+        "-i", str(file_path), "-map", "0:v:0", "-frames:v", "1", "-f", "null", "-",
+    ]
+    try:
+        p = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError:
+        return False
+    return p.returncode == 0 and not p.stderr.strip()
+
+
+def verify_output(file_path, expected_frames, fps, expected_audio=None, samples=0):
+    """Runs all checks on one output. Returns a result dict with 'ok' and the measurements."""
+    result = {"checked_at": time.time(), "expected_frames": expected_frames}
+    problems = []
+
+    packets = count_video_packets(file_path)
+    result["packets"] = packets
+    if packets is None:
+        problems.append("video packets unreadable")
+    elif expected_frames and packets != expected_frames:
+        problems.append(f"{packets} video packets, expected {expected_frames}")
+
+    if expected_audio:
+        tolerance = float(CONFIG.get("verify_audio_tolerance", 0.5))
+        audio_duration = get_duration(str(file_path), "a")
+        result["audio_duration"] = audio_duration
+        result["expected_audio"] = expected_audio
+        if abs(audio_duration - expected_audio) > tolerance:
+            problems.append(f"audio {audio_duration:.2f}s, expected {expected_audio:.2f}s")
+
+    if samples and packets and fps:
+        duration = packets / fps
+        positions = sorted(random.uniform(0, max(duration - 1.0 / fps, 0)) for _ in range(samples))
+        failed = [p for p in positions if not decode_frame_at(file_path, p)]
+        result["sampled"] = len(positions)
+        result["sample_errors"] = len(failed)
+        if failed:
+            problems.append(f"{len(failed)}/{len(positions)} sampled frames failed to decode")
+
+    result["ok"] = not problems
+    result["problems"] = problems
+    return result
+
+
+_VERIFY_QUEUE: queue.Queue = queue.Queue()
+_VERIFY_LOCK = threading.Lock()
+_VERIFIER: Dict[str, Any] = {"thread": None, "failed": []}
+
+
+def _verify_loop():
+    while True:
+        job = _VERIFY_QUEUE.get()
+        try:
+            result = verify_output(job["path"], job["frames"], job["fps"], job.get("expected_audio"),
+                                   int(CONFIG.get("verify_sample_frames", 0)))
+            if result["ok"]:
+                log_info(f"   [VERIFY] OK: {job['path'].name} ({result['packets']} frames)")
+            else:
+                log_error(f"[ERROR] Verification failed for {job['path'].name}: {'; '.join(result['problems'])}")
+                _VERIFIER["failed"].append(job["path"])
+            if job.get("on_result"):
+                job["on_result"](result)
+        except Exception as e:
+            log_error(f"[ERROR] Verification crashed for {job['path']}: {e}")
+        finally:
+            _VERIFY_QUEUE.task_done()
+
+
+def queue_verification(file_path, frames, fps, expected_audio=None, on_result=None):
+    """Verifies an output in the background. on_result(result) receives the result dict."""
+    with _VERIFY_LOCK:
+        if _VERIFIER["thread"] is None or not _VERIFIER["thread"].is_alive():
+            _VERIFIER["thread"] = threading.Thread(target=_verify_loop, daemon=True)
+            _VERIFIER["thread"].start()
+    log_debug(f"[VERIFY] Queued: {file_path}")
+    _VERIFY_QUEUE.put({"path": file_path, "frames": frames, "fps": fps,
+                       "expected_audio": expected_audio, "on_result": on_result})
+
+
+def wait_for_verifications() -> list:
+    """Blocks until every queued verification is done. Returns the outputs that failed."""
+    if _VERIFY_QUEUE.unfinished_tasks:
+        log_info(">> Waiting for output verification...")
+    _VERIFY_QUEUE.join()
+    failed, _VERIFIER["failed"] = _VERIFIER["failed"], []
+    return failed
@@ -3,12 +3,24 @@ import sys
 import subprocess
 from modules.utils import log_debug, log_error, get_fps, get_vspipe_env, get_project_root
 from modules.config import CONFIG, HW_SETTINGS, FIELD_ORDER, TV_STANDARD
+from modules.crop import get_crop_lines, get_restore_mode
+from modules.follow import get_context_lines
 
 # ==============================================================================
 # VAPOURSYNTH SCRIPT GENERATOR
 # ==============================================================================
 
 
+def log_vspipe_line(line_str):
+    """Logs one vspipe stderr line (errors are also shown on the console)."""
+    if line_str:
+        # Log ALL vspipe output to file for debugging
+        log_debug(f"[VSPIPE] {line_str}")
+        # Also log errors explicitly
+        if any(x in line_str for x in ["Script execution failed", "Error", "Failed"]):
+            log_error(f"[VSPIPE ERROR] {line_str}")
+
+
 def log_vspipe_output(pipe):
     """Monitors vspipe stderr for errors and progress."""
     try:
@@ -21,12 +33,7 @@ def log_vspipe_output(pipe):
             else:
                 line_str = line.strip()
 
-            if line_str:
-                # Log ALL vspipe output to file for debugging
-                log_debug(f"[VSPIPE] {line_str}")
-                # Also log errors explicitly
-                if any(x in line_str for x in ["Script execution failed", "Error", "Failed"]):
-                    log_error(f"[VSPIPE ERROR] {line_str}")
+            log_vspipe_line(line_str)
     except (ValueError, RuntimeError, AttributeError):
         # Handle cases where logging fails during interpreter shutdown
         pass
@@ -66,11 +73,22 @@ def _get_vpy_header(venv_root, portable_root, site_paths, current_root):
     return lines
 
 
-def _get_plugin_loading_lines(venv_root):
-    """Generates plugin loading commands for the VPY script."""
+def _get_plugin_dir(venv_root):
     plugin_dir = os.path.join(venv_root, "vs", "plugins")
     if not os.path.exists(plugin_dir):
         plugin_dir = os.path.join(venv_root, "vs", "vs-plugins")
+    return plugin_dir
+
+
+def is_plugin_missing(p_name) -> bool:
+    """True if the portable plugin folder exists but lacks the plugin (system installs autoload theirs)."""
+    plugin_dir = _get_plugin_dir(os.path.join(get_project_root(), ".venv"))
+    return os.path.exists(plugin_dir) and not os.path.exists(os.path.join(plugin_dir, p_name))
+
+
+def _get_plugin_loading_lines(venv_root, skip=()):
+    """Generates plugin loading commands for the VPY script (without the plugins in skip)."""
+    plugin_dir = _get_plugin_dir(venv_root)
 
     essential = [
         "ffms2.dll", "libmvtools.dll", "libnnedi3.dll", "NNEDI3CL.dll", "LSMASHSource.dll",
@@ -87,16 +105,36 @@ def _get_plugin_loading_lines(venv_root):
             plugin_lines.append(f"try: core.std.LoadPlugin(r'{avs_compat_path}')\nexcept: pass")
 
     for p_name in essential:
+        if p_name in skip:
+            continue
         p_path = os.path.join(plugin_dir, p_name).replace("\\", "/")
         if os.path.exists(p_path):
             plugin_lines.append(f"try: core.std.LoadPlugin(r'{p_path}')\nexcept: pass")
     return plugin_lines
 
 
-def create_vpy_script(input_file, output_script, mode, override_settings=None):
-    """Generates a VapourSynth script based on the selected mode."""
-    current_settings = override_settings if override_settings else HW_SETTINGS
-    safe_input = os.path.abspath(input_file).replace("\\", "/").strip()
+def get_qtgmc_args(settings=None):
+    """Returns the effective QTGMC keyword arguments for the given hardware settings."""
+    current_settings = settings if settings else HW_SETTINGS
+    qtgmc_params = CONFIG.get("qtgmc_settings", {})
+    qtgmc_args = {
+        "Preset": qtgmc_params.get("Preset", "Very Slow"), "InputType": 0,
+        "TFF": (FIELD_ORDER == "tff"), "SourceMatch": qtgmc_params.get("SourceMatch", 3),
+        "Lossless": qtgmc_params.get("Lossless", 2), "TR2": 3,
+        "EZDenoise": qtgmc_params.get("EZDenoise", 0.0), "NoiseProcess": qtgmc_params.get("NoiseProcess", 0),
+        "Sharpness": qtgmc_params.get("Sharpness", 0.0), "FPSDivisor": 1,
+    }
+    if current_settings["use_gpu_opencl"]:
+        qtgmc_args["opencl"] = True
+        qtgmc_args["device"] = current_settings.get("gpu_device_index", 0)
+    return qtgmc_args
+
+
+def _get_script_preamble(current_settings, shared_core=False):
+    """
+    Imports, core settings and plugins shared by every generated script. With
+    shared_core the core settings are left to the host process (the frame server).
+    """
     current_root = os.getcwd().replace("\\", "/").strip()
     base_dir = get_project_root()
     venv_root = os.path.join(base_dir, ".venv").replace("\\", "/")
@@ -107,32 +145,66 @@ def create_vpy_script(input_file, output_script, mode, override_settings=None):
         site_paths.append(f"{portable_root}/Lib/site-packages")
 
     lines = _get_vpy_header(venv_root, portable_root, site_paths, current_root)
-    lines.append(f"core.num_threads = {current_settings['cpu_threads']}")
-    lines.append(f"core.max_cache_size = {current_settings['ram_cache_mb']}\n")
-    lines.extend(_get_plugin_loading_lines(venv_root))
+    if not shared_core:
+        lines.append(f"core.num_threads = {current_settings['cpu_threads']}")
+        lines.append(f"core.max_cache_size = {current_settings['ram_cache_mb']}\n")
+    # havsfunc prefers znedi3 whenever it is loaded; the 'nnedi3' backend leaves it out
+    skip = ("vsznedi3.dll",) if current_settings.get("interpolation") == "nnedi3" else ()
+    lines.extend(_get_plugin_loading_lines(venv_root, skip))
 
     lines.append("if hasattr(core, 'eedi3') and not hasattr(core, 'eedi3m'):")
     lines.append("    core.eedi3m = core.eedi3\n")
+    return lines
+
+
+def create_probe_script(output_script, settings, frames, width=720, height=576):
+    """
+    Script rendering QTGMC on a synthetic textured clip (no source needed), used to
+    time the interpolation backends (see modules/interpolation.py).
+    """
+    lines = _get_script_preamble(settings)
+    lines.append(f"clip = core.std.BlankClip(format=vs.YUV420P16, width={width}, height={height}, "
+                 f"length={int(frames)}, fpsnum=30000, fpsden=1001)")
+    # Texture keeps the NNEDI3 prescreener from skipping flat areas
+    lines.append("clip = core.std.Expr(clip, 'X Y * N + sin 16384 * 32768 +')")
+    lines.append("clip = haf.QTGMC(clip, **" + str(get_qtgmc_args(settings)) + ")")
+    lines.append("clip.set_output()")
+    with open(output_script, "wb") as f:
+        f.write("\n".join(lines).encode("utf-8") + b"\n")
+
+
+def create_vpy_script(input_file, output_script, mode, override_settings=None, index_file=None, crop=None,
+                      context=None, qtgmc_overrides=None, shared_core=False):
+    """
+    Generates a VapourSynth script based on the selected mode. index_file relocates the FFMS2 index;
+    crop (see modules.crop) is applied before QTGMC. context adds the neighbour frames of a
+    follow-mode segment (see modules.follow). qtgmc_overrides replaces QTGMC arguments
+    (e.g. the fast preset of the live preview). shared_core leaves out the process-wide
+    core settings, for scripts run inside the frame server.
+    """
+    current_settings = override_settings if override_settings else HW_SETTINGS
+    safe_input = os.path.abspath(input_file).replace("\\", "/").strip()
+    lines = _get_script_preamble(current_settings, shared_core)
 
     fps_logic = TV_STANDARD if TV_STANDARD != "auto" else ("pal" if abs(get_fps(safe_input) - 25.0) < 0.5 else "ntsc")
     fps_num, fps_den = (25, 1) if fps_logic == "pal" else (30000, 1001)
 
-    lines.append(f"clip = core.ffms2.Source(r'{safe_input}', fpsnum={fps_num}, fpsden={fps_den})")
+    cache_arg = ""
+    if index_file:
+        safe_index = os.path.abspath(index_file).replace("\\", "/").strip()
+        cache_arg = f", cachefile=r'{safe_index}'"
+    lines.append(f"clip = core.ffms2.Source(r'{safe_input}', fpsnum={fps_num}, fpsden={fps_den}{cache_arg})")
+    context_before, context_after = (get_context_lines(context, f", fpsnum={fps_num}, fpsden={fps_den}")
+                                     if context else ([], []))
+    lines.extend(context_before)
     lines.append("clip = core.resize.Point(clip, format=vs.YUV420P16)\n")
 
-    qtgmc_params = CONFIG.get("qtgmc_settings", {})
-    qtgmc_args = {
-        "Preset": qtgmc_params.get("Preset", "Very Slow"), "InputType": 0,
-        "TFF": (FIELD_ORDER == "tff"), "SourceMatch": qtgmc_params.get("SourceMatch", 3),
-        "Lossless": qtgmc_params.get("Lossless", 2), "TR2": 3,
-        "EZDenoise": qtgmc_params.get("EZDenoise", 0.0), "NoiseProcess": qtgmc_params.get("NoiseProcess", 0),
-        "Sharpness": qtgmc_params.get("Sharpness", 0.0), "FPSDivisor": 1,
-    }
-    if current_settings["use_gpu_opencl"]:
-        qtgmc_args["opencl"] = True
-        qtgmc_args["device"] = current_settings.get("gpu_device_index", 0)
-
+    crop_before, crop_after = get_crop_lines(crop, get_restore_mode(), FIELD_ORDER == "tff") if crop else ([], [])
+    lines.extend(crop_before)
+    qtgmc_args = dict(get_qtgmc_args(current_settings), **(qtgmc_overrides or {}))
     lines.append("clip = haf.QTGMC(clip, **" + str(qtgmc_args) + ")")
+    lines.extend(crop_after)
+    lines.extend(context_after)
     lines.append("clip.set_output()")
 
     with open(output_script, "wb") as f:
@@ -0,0 +1,209 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+
+from modules.utils import log_info, log_debug, log_error
+from modules.config import CONFIG
+
+# ==============================================================================
+# WATCH FOLDER DAEMON
+# ==============================================================================
+# Headless mode for render nodes: hot folders are watched (inotify on Linux, a
+# recursive os.scandir poll elsewhere) and every new source is processed in this
+# same process once its size has stopped changing. Hardware detection and config
+# loading happen once at startup.
+
+# Names that are outputs, never sources
+EXCLUDED_MARKERS = ("_deinterlaced", "_intermediate")
+# Watch mode also skips temp files a job is still writing into the hot folder
+WATCH_EXCLUDED_MARKERS = ("_temp_",)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = getattr(os, "O_NONBLOCK", 0)  # Same value as O_NONBLOCK; absent on Windows
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_source_name(name: str, video_exts: set, watch=False) -> bool:
+    stem, ext = os.path.splitext(name)
+    if ext.lower() not in video_exts or any(marker in name for marker in EXCLUDED_MARKERS):
+        return False
+    return not watch or not (stem.endswith("_part") or any(marker in name for marker in WATCH_EXCLUDED_MARKERS))
+
+
+def scan_tree(root, video_exts: set):
+    """Yields (path, stat) for every source below root (recursive os.scandir)."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError as e:
+        log_debug(f"[WATCH] Cannot scan {root}: {e}")
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith("."):
+                    yield from scan_tree(entry.path, video_exts)
+            elif entry.is_file() and is_source_name(entry.name, video_exts, watch=True):
+                yield Path(entry.path), entry.stat()
+        except OSError:
+            continue
+
+
+class InotifyWatcher:
+    """Minimal recursive inotify wrapper (ctypes, no extra dependencies)."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name or not hasattr(select, "select"):
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify not supported")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def add_tree(self, root):
+        """Watches root and every sub-folder below it."""
+        for current, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = current
+
+    def read(self, timeout):
+        """Returns the paths touched since the last call (waits up to timeout seconds)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                self.add_tree(path)
+            paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _create_watcher(roots):
+    if not CONFIG.get("watch_use_inotify", True):
+        return None
+    try:
+        watcher = InotifyWatcher()
+    except (OSError, AttributeError) as e:
+        log_info(f"   [WATCH] inotify unavailable ({e}). Polling every {CONFIG.get('watch_poll_seconds', 10)}s.")
+        return None
+    for root in roots:
+        watcher.add_tree(root)
+    return watcher
+
+
+class StabilityTracker:
+    """A file is ready once size and mtime have not changed for stable_seconds."""
+
+    def __init__(self, stable_seconds):
+        self.stable_seconds = stable_seconds
+        self._pending = {}   # path -> (size, mtime, unchanged_since)
+        self._done = {}      # path -> (size, mtime) already handed out
+
+    def observe(self, path, st, now):
+        signature = (st.st_size, st.st_mtime)
+        if self._done.get(path) == signature:
+            return
+        previous = self._pending.get(path)
+        if previous is None or previous[:2] != signature:
+            self._pending[path] = (*signature, now)
+
+    def refresh(self, now):
+        """Re-stats pending files and returns the ones that became stable."""
+        ready = []
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (st.st_size, st.st_mtime) != (size, mtime):
+                self._pending[path] = (st.st_size, st.st_mtime, now)
+            elif st.st_size > 0 and now - since >= self.stable_seconds:
+                del self._pending[path]
+                self._done[path] = (size, mtime)
+                ready.append(path)
+        return sorted(ready)
+
+
+def watch_folders(roots, handler, video_exts, stop_event=None):
+    """
+    Processes sources dropped into roots until stop_event is set. handler(path) runs
+    the job in this process; errors in one job do not stop the daemon.
+    """
+    stop_event = stop_event or threading.Event()
+    roots = [str(r) for r in roots]
+    poll_seconds = float(CONFIG.get("watch_poll_seconds", 10))
+    check_seconds = float(CONFIG.get("watch_check_seconds", 2))
+    tracker = StabilityTracker(float(CONFIG.get("watch_stable_seconds", 30)))
+    watcher = _create_watcher(roots)
+    log_info(f">> Watching {', '.join(roots)} ({'inotify' if watcher else 'polling'}). Press Ctrl+C to stop.")
+
+    def _scan():
+        now = time.monotonic()
+        for root in roots:
+            for path, st in scan_tree(root, video_exts):
+                tracker.observe(str(path), st, now)
+
+    _scan()
+    last_scan = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            if watcher:
+                now = time.monotonic()
+                for path in watcher.read(check_seconds):
+                    if os.path.isdir(path):
+                        for found, st in scan_tree(path, video_exts):
+                            tracker.observe(str(found), st, now)
+                    elif is_source_name(os.path.basename(path), video_exts, watch=True):
+                        try:
+                            tracker.observe(path, os.stat(path), now)
+                        except OSError:
+                            pass
+            else:
+                stop_event.wait(check_seconds)
+                if time.monotonic() - last_scan >= poll_seconds:
+                    _scan()
+                    last_scan = time.monotonic()
+
+            for path in tracker.refresh(time.monotonic()):
+                if stop_event.is_set():
+                    break
+                log_info(f"\n[WATCH] New source ready: {path}")
+                try:
+                    handler(Path(path))
+                except Exception as e:
+                    log_error(f"[ERROR] Job failed for {path}: {e}")
+    finally:
+        if watcher:
+            watcher.close()
@@ -43,3 +43,10 @@ def ad():
 
     import auto_deinterlancer
     return auto_deinterlancer
+
+
+@pytest.fixture(autouse=True)
+def isolated_probe_cache(tmp_path, monkeypatch):
+    """probe_media() results of one test never leak into another (or into the real cache)."""
+    import modules.probe
+    monkeypatch.setattr(modules.probe, "get_cache_dir", lambda name: str(tmp_path))
@@ -0,0 +1,116 @@
+import json
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import affinity, encoders
+
+
+def make_sysfs(root, ccds, offline=()):
+    """Fixture tree like /sys/devices/system/cpu: ccds = [(cpu list, L3 size)]."""
+    for cpus, l3_size in ccds:
+        shared = f"{cpus[0]}-{cpus[-1]}"
+        for cpu in cpus:
+            base = root / f"cpu{cpu}"
+            (base / "topology").mkdir(parents=True)
+            (base / "topology" / "physical_package_id").write_text("0\n")
+            if cpu:
+                (base / "online").write_text("0\n" if cpu in offline else "1\n")
+            for index, (level, size, shared_list) in enumerate([(1, "48K", str(cpu)), (2, "1024K", str(cpu)),
+                                                                (3, l3_size, shared)]):
+                cache = base / "cache" / f"index{index}"
+                cache.mkdir(parents=True)
+                (cache / "level").write_text(f"{level}\n")
+                (cache / "size").write_text(f"{size}\n")
+                (cache / "shared_cpu_list").write_text(f"{shared_list}\n")
+    (root / "online").write_text("0-15\n")
+    return root
+
+
+@pytest.fixture
+def x3d(tmp_path):
+    # 9950X3D-like: V-Cache on the second CCD to make sure size (not order) decides
+    return make_sysfs(tmp_path, [(list(range(0, 8)), "32768K"), (list(range(8, 16)), "98304K")], offline=(15,))
+
+
+def test_parse_helpers():
+    assert affinity.parse_cpu_list("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert affinity._parse_size_kb("96M") == 98304 and affinity._parse_size_kb("2048") == 2
+    assert affinity._format_cpus([0, 1, 2, 5, 7, 8]) == "0-2,5,7-8"
+
+
+def test_read_topology_groups_l3_domains(x3d):
+    domains = affinity.read_topology(str(x3d))
+    assert [d["cpus"] for d in domains] == [list(range(0, 8)), list(range(8, 15))]
+    assert [d["l3_kb"] for d in domains] == [32768, 98304]
+    assert affinity.read_topology(str(x3d / "missing")) == []
+
+
+def test_plans(x3d, tmp_path):
+    domains = affinity.read_topology(str(x3d))
+    split = affinity.plan_affinity(domains, "split")
+    assert split == {"vspipe": list(range(8, 15)), "ffmpeg": list(range(0, 8))}
+    assert affinity.plan_affinity(domains, "vcache")["ffmpeg"] is None
+    assert affinity.plan_affinity(domains, "off") is None
+
+    single = make_sysfs(tmp_path / "single", [(list(range(0, 8)), "32768K")])
+    assert affinity.plan_affinity(affinity.read_topology(str(single)), "split") is None
+
+
+def test_configured_plan_sizes_threads(x3d):
+    with patch.dict(affinity._PLAN, {"loaded": False, "plan": None}), \
+         patch.dict(affinity.CONFIG, {"cpu_affinity": "split"}), \
+         patch('modules.affinity.os.sched_setaffinity', create=True), \
+         patch('modules.affinity.log_info') as mock_log:
+        plan = affinity.get_affinity_plan(root=str(x3d))
+        assert plan["vspipe"] == list(range(8, 15))
+        assert "8-14" in mock_log.call_args[0][0]
+        assert affinity.get_stage_threads("vspipe") == 7
+        with patch.dict(encoders.CONFIG, {"encoder_threads": 0}):
+            assert encoders.get_encoder_threads() == 8
+
+
+def test_pin_process_pins_every_thread(x3d):
+    plan = {"vspipe": [8, 9], "ffmpeg": None}
+    with patch('modules.affinity.os.sched_setaffinity', create=True) as mock_pin, \
+         patch('modules.affinity.os.listdir', return_value=["100", "101", "102"]):
+        assert affinity.pin_process("vspipe", 100, plan)
+        assert not affinity.pin_process("ffmpeg", 100, plan)
+    assert [c[0][0] for c in mock_pin.call_args_list] == [100, 101, 102]
+    assert mock_pin.call_args[0][1] == [8, 9]
+
+    with patch('modules.affinity.os.sched_setaffinity', create=True, side_effect=OSError("gone")), \
+         patch('modules.affinity.os.listdir', side_effect=OSError):
+        assert not affinity.pin_process("vspipe", 100, plan)
+
+
+def test_benchmark_affinity_compares_policies(tmp_path):
+    source = tmp_path / "tape.avi"
+    source.write_bytes(b"x")
+    plans = {"split": {"vspipe": [0, 1], "ffmpeg": [2, 3]}, "vcache": None}
+    stream = {"frames": 1000, "fps": 50.0, "width": 720, "height": 576, "pixel_format": "yuv420p16le"}
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.get_affinity_plan', side_effect=lambda policy: plans[policy]), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(None, stream)) as mock_prepare, \
+         patch('modules.pipeline._render_sample', side_effect=[10.0, 5.0]) as mock_render, \
+         patch('modules.pipeline.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.pipeline.cleanup_temp_files'), patch('modules.pipeline.log_info'):
+        results = pipeline.benchmark_affinity(source)
+
+    assert [r["policy"] for r in results] == ["off", "split"]
+    assert results[1]["vspipe_threads"] == 2 and results[1]["fps"] == 2 * results[0]["fps"]
+    assert mock_prepare.call_args[1]["settings"]["cpu_threads"] == 2
+    ffmpeg_cmd = mock_render.call_args[0][1]
+    assert ffmpeg_cmd[ffmpeg_cmd.index("-threads") + 1] == "2"
+    assert json.loads((tmp_path / "tape_affinity.json").read_text())["results"][1]["policy"] == "split"
+
+
+def test_render_sample_pins_both_stages():
+    p_vspipe, p_ffmpeg = MagicMock(pid=1), MagicMock(pid=2)
+    p_vspipe.wait.return_value = p_ffmpeg.wait.return_value = 0
+    with patch('modules.pipeline.subprocess.Popen', side_effect=[p_vspipe, p_ffmpeg]), \
+         patch('modules.pipeline.get_vspipe_env', return_value={}), \
+         patch('modules.pipeline.pin_process') as mock_pin:
+        assert pipeline._render_sample(["vspipe"], ["ffmpeg"], {"vspipe": [0]}) is not None
+    assert [c[0][:2] for c in mock_pin.call_args_list] == [("vspipe", 1), ("ffmpeg", 2)]
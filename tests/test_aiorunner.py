@@ -0,0 +1,163 @@
+import sys
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import aiorunner
+from modules.aiorunner import AsyncPipeline, run_jobs
+from modules.utils import cleanup_temp_files
+
+PY = sys.executable
+PRODUCER = [PY, "-c", "import sys\nfor i in range(50):\n    sys.stderr.write('vs %d\\n' % i)\n    sys.stdout.buffer.write(b'\\0' * 65536)\n"]
+CONSUMER = [PY, "-c", "import sys, time\nn = 0\nwhile sys.stdin.buffer.read(65536):\n    n += 1\n    sys.stderr.write('frame=%d time=00:00:01.00\\r' % n)\n"]
+
+
+def test_jobs_share_one_event_loop():
+    active = []
+    peak = []
+    lock = threading.Lock()
+    results = {}
+
+    def _job(name):
+        assert aiorunner.in_async_runner()
+        with lock:
+            active.append(name)
+            peak.append(len(active))
+        vs_lines, ff_lines = [], []
+        code = AsyncPipeline().run_in_job_loop(PRODUCER, None, CONSUMER, vs_lines.append, ff_lines.append)
+        with lock:
+            active.remove(name)
+        results[name] = (code, len(vs_lines), ff_lines[-1])
+        return code
+
+    with patch('modules.aiorunner.log_info'):
+        assert run_jobs(["a", "b", "c", "d"], _job, 3) == [0, 0, 0, 0]
+    assert max(peak) > 1
+    assert all(r == (0, 50, "frame=50 time=00:00:01.00") for r in results.values())
+    assert not aiorunner.in_async_runner()
+
+
+def test_failing_job_does_not_stop_the_others():
+    def _job(name):
+        if name == "bad":
+            raise RuntimeError("boom")
+        return name
+
+    with patch('modules.aiorunner.log_info'), patch('modules.aiorunner.log_error') as mock_err:
+        assert run_jobs(["ok", "bad"], _job, 2) == ["ok", None]
+    assert "boom" in mock_err.call_args[0][0]
+
+
+def test_failing_child_stops_partner():
+    pipe = AsyncPipeline(terminate_timeout=2)
+    failing = [PY, "-c", "import sys; sys.exit(3)"]
+    sleeper = [PY, "-c", "import time; time.sleep(30)"]
+    started = time.monotonic()
+    with patch('modules.aiorunner.log_debug'):
+        code = asyncio.run(pipe.run(failing, None, sleeper))
+    assert pipe.failed == "vspipe" and code != 0
+    assert time.monotonic() - started < 15
+
+
+def test_stall_watchdog():
+    pipe = AsyncPipeline(stall_timeout=0.4, terminate_timeout=2)
+    with patch('modules.aiorunner.log_error') as mock_err, patch('modules.aiorunner.log_debug'):
+        asyncio.run(pipe.run(None, None, [PY, "-c", "import time; time.sleep(30)"]))
+    assert pipe.stalled
+    assert "No progress" in mock_err.call_args[0][0]
+
+
+def test_cancellation_terminates_children():
+    pipe = AsyncPipeline(terminate_timeout=2)
+
+    async def _scenario():
+        task = asyncio.ensure_future(pipe.run(None, None, [PY, "-c", "import time; time.sleep(30)"]))
+        while not pipe.processes:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_scenario())
+    assert pipe.processes[0][1].returncode is not None
+
+
+def test_keyboard_interrupt_blocks_new_encodes():
+    def _interrupt(coro):
+        coro.close()
+        raise KeyboardInterrupt
+
+    with patch('modules.aiorunner.asyncio.run', side_effect=_interrupt), \
+         patch('modules.aiorunner.log_info'), patch('modules.aiorunner.log_error'):
+        with pytest.raises(KeyboardInterrupt):
+            run_jobs(["a"], lambda x: x, 2)
+    assert aiorunner._STATE["cancelled"]
+    with pytest.raises(RuntimeError):
+        AsyncPipeline().run_in_job_loop(None, None, ["ffmpeg"])
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(AsyncPipeline().run(None, None, ["ffmpeg"]))
+    aiorunner._STATE["cancelled"] = False
+
+
+def test_pipeline_hands_encode_to_runner_loop():
+    with patch('modules.pipeline.in_async_runner', return_value=True), \
+         patch('modules.pipeline.get_vspipe_env', return_value={"A": "1"}), \
+         patch.object(AsyncPipeline, 'run_in_job_loop', return_value=0) as mock_run, \
+         patch('modules.pipeline.subprocess.Popen') as mock_popen, \
+         patch('pathlib.Path.exists', return_value=False), patch('modules.pipeline.log_info'):
+        assert pipeline._run_encoding_pipeline(["vspipe", "s.vpy", "-"], ["ffmpeg"], Path("t.vpy"), 10.0)
+    assert not mock_popen.called
+    assert mock_run.call_args[0][:3] == (["vspipe", "s.vpy", "-"], {"A": "1"}, ["ffmpeg"])
+
+    with patch('modules.pipeline.in_async_runner', return_value=True), \
+         patch.object(AsyncPipeline, 'run_in_job_loop', return_value=1), \
+         patch('modules.pipeline.log_error'):
+        assert not pipeline._run_encoding_pipeline(None, ["ffmpeg"], Path("t.vpy"), 10.0)
+
+
+def test_main_runs_concurrent_jobs(tmp_path):
+    files = [tmp_path / "a.mp4", tmp_path / "b.mp4"]
+    with patch('modules.pipeline.setup_environment'), patch('modules.pipeline.get_cpu_name'), \
+         patch('modules.pipeline.get_gpu_name'), patch('modules.pipeline._show_banner'), \
+         patch('modules.pipeline.check_requirements'), patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline.get_input_files', return_value=files), \
+         patch.dict('modules.pipeline.CONFIG', {"concurrent_jobs": 2}), \
+         patch('modules.pipeline.run_jobs') as mock_run, patch('modules.pipeline.process_video') as mock_process, \
+         patch('sys.argv', ['script.py', 'x']):
+        pipeline.main()
+    assert mock_run.call_args[0] == (files, mock_process, 2)
+    assert not mock_process.called
+
+
+def test_cleanup_keeps_other_jobs_scripts(tmp_path):
+    (tmp_path / "a_temp_script.vpy").write_text("a")
+    (tmp_path / "b_temp_script.vpy").write_text("b")
+    cleanup_temp_files(tmp_path, "a", include_stray=False)
+    assert [p.name for p in tmp_path.iterdir()] == ["b_temp_script.vpy"]
+    cleanup_temp_files(tmp_path, "a")
+    assert not list(tmp_path.iterdir())
+
+
+def test_failing_producer_fails_the_encode(tmp_path):
+    # vspipe dies mid-stream while FFmpeg ends cleanly on the short input
+    producer = [PY, "-c", "import sys\nsys.stdout.buffer.write(b'\\0' * 65536)\nsys.exit(2)\n"]
+    consumer = [PY, "-c", "import sys\nwhile sys.stdin.buffer.read(65536):\n    pass\n"]
+    script = tmp_path / "t.vpy"
+
+    def _job(name):
+        return pipeline._run_encoding_pipeline(producer, consumer, script, 10.0)
+
+    with patch('modules.pipeline.log_info'), patch('modules.pipeline.log_error') as mock_err, \
+         patch('modules.aiorunner.log_info'), patch('modules.supervisor.log_debug'), \
+         patch('modules.aiorunner.log_debug'):
+        # Synchronous path (StreamSupervisor) and the runner's event loop (AsyncPipeline)
+        assert _job("sync") is False
+        assert "vspipe failed" in mock_err.call_args[0][0]
+        mock_err.reset_mock()
+        assert run_jobs(["async"], _job, 1) == [False]
+        assert "vspipe failed" in mock_err.call_args[0][0]
@@ -0,0 +1,188 @@
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import audio
+
+
+def test_can_copy_audio_rules():
+    with patch('modules.audio.AUDIO_CODEC', 'flac'):
+        assert audio.can_copy_audio("flac", 1.0, [".mkv"])
+        # Lossless source into a lossless target: copy unchanged samples
+        assert audio.can_copy_audio("pcm_s24le", 1.0, [".mov", ".mkv"])
+        # .mov cannot carry FLAC
+        assert not audio.can_copy_audio("flac", 1.0, [".mov"])
+        # Drift correction needs a filter
+        assert not audio.can_copy_audio("flac", 1.002, [".mkv"])
+        assert not audio.can_copy_audio(None, 1.0, [".mkv"])
+        with patch.dict('modules.audio.CONFIG', {"audio_copy_lossless": False}):
+            assert not audio.can_copy_audio("pcm_s24le", 1.0, [".mkv"])
+    with patch('modules.audio.AUDIO_CODEC', 'aac'):
+        assert audio.can_copy_audio("aac", 1.0, [".mov"])
+        assert not audio.can_copy_audio("pcm_s16le", 1.0, [".mov"])
+
+
+def test_plan_audio_stage_logs_decision():
+    with patch('modules.audio.probe_media', return_value={"audio_codec": "aac"}), \
+         patch('modules.audio.AUDIO_CODEC', 'aac'), patch('modules.audio.log_info') as mock_log:
+        assert audio.plan_audio_stage(Path("t.mp4"), 1.0, [Path("o.mov")]) is True
+        assert "Stream copy" in mock_log.call_args[0][0]
+    with patch('modules.audio.probe_media', return_value={"audio_codec": None}), patch('modules.audio.log_info') as mock_log:
+        assert audio.plan_audio_stage(Path("t.mp4"), 1.0, [Path("o.mov")]) is False
+        assert "unknown" in mock_log.call_args[0][0]
+
+
+def test_build_audio_and_mux_cmds():
+    with patch('modules.audio.shutil.which', return_value="ffmpeg"), \
+         patch('modules.audio.AUDIO_CODEC', 'flac'), patch('modules.audio.AUDIO_BITRATE', '320k'):
+        enc = audio.build_audio_encode_cmd(Path("t.mp4"), Path("a.mka"), 1.002)
+        assert "atempo=1.002000" in enc and "-vn" in enc and enc[-1] == "a.mka"
+        # stderr is only read at the end: no progress stats that could fill the pipe
+        assert "-nostats" in enc and enc[enc.index("-v") + 1] == "error"
+        assert "-af" not in audio.build_audio_encode_cmd(Path("t.mp4"), Path("a.mka"), 1.0)
+
+        mux = audio.build_mux_cmd(Path("v.mov"), Path("t.mp4"), Path("o_part.mov"), offset=-0.2)
+        assert mux[mux.index("-itsoffset") + 1] == "-0.200"
+        assert mux.index("-itsoffset") < mux.index("t.mp4")
+        assert mux[mux.index("-c") + 1] == "copy"
+        with patch('modules.audio.AUDIO_OFFSET', 0.0):
+            assert "-itsoffset" not in audio.build_mux_cmd(Path("v.mov"), Path("t.mp4"), Path("o.mov"))
+
+
+def test_temp_paths():
+    assert audio.get_audio_temp_path(Path("/w"), "tape") == Path("/w/tape_temp_audio.mka")
+    assert audio.get_video_temp_path(Path("/w/t_d.mov")) == Path("/w/t_d_temp_video.mov")
+
+
+def test_low_priority_kwargs():
+    with patch('modules.audio.platform.system', return_value="Windows"):
+        assert "creationflags" in audio._low_priority_kwargs()
+    with patch('modules.audio.platform.system', return_value="Linux"):
+        assert audio._low_priority_kwargs() == {}
+        with patch('modules.audio.os.setpriority', create=True) as mock_setpriority, \
+             patch('modules.audio.os.PRIO_PROCESS', 0, create=True):
+            audio._lower_priority(MagicMock(pid=42))
+            mock_setpriority.assert_called_with(0, 42, 10)
+
+
+def test_start_and_finish_audio_encode():
+    proc = MagicMock()
+    proc.returncode = 0
+    proc.communicate.return_value = (None, b"")
+    with patch('modules.audio.subprocess.Popen', return_value=proc) as mock_popen, \
+         patch('modules.audio.shutil.which', return_value="ffmpeg"):
+        p = audio.start_audio_encode(Path("t.mp4"), Path("a.mka"), 1.0)
+    assert p is proc and p in audio.ACTIVE_PROCS
+    assert mock_popen.call_args[1]["stdin"] == audio.subprocess.DEVNULL
+    assert audio.finish_audio_encode(proc) is True
+    assert proc not in audio.ACTIVE_PROCS
+
+    proc.returncode = 1
+    proc.communicate.return_value = (None, b"boom\n")
+    with patch('modules.audio.log_error') as mock_err:
+        assert audio.finish_audio_encode(proc) is False
+        assert any("boom" in c[0][0] for c in mock_err.call_args_list)
+
+
+def test_mux_audio_result():
+    ok = MagicMock(returncode=0)
+    bad = MagicMock(returncode=1)
+    with patch('modules.audio.run_command', side_effect=[ok, bad]), \
+         patch('modules.audio.shutil.which', return_value="ffmpeg"), patch('modules.audio.log_error'):
+        assert audio.mux_audio(Path("v.mov"), Path("t.mp4"), Path("o_part.mov")) is True
+        assert audio.mux_audio(Path("v.mov"), Path("t.mp4"), Path("o_part.mov")) is False
+
+
+def test_video_cmd_without_audio():
+    with patch('modules.pipeline.shutil.which', return_value="ffmpeg"):
+        cmd = pipeline._build_ffmpeg_cmd(Path("t.mp4"), [Path("v.mov")], 1.002, encoders=["prores"], include_audio=False)
+    assert "t.mp4" not in cmd
+    assert "-an" in cmd and "1:a:0" not in cmd and "atempo=1.002000" not in " ".join(cmd)
+
+
+def _process(tmp_path, copy, video_ok=True, mux_ok=True):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    p_audio = MagicMock()
+    p_audio.poll.return_value = None
+    with patch.dict('modules.pipeline.CONFIG', {}), \
+         patch('modules.pipeline.audio_mode_separate', return_value=True), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.plan_audio_stage', return_value=copy), \
+         patch('modules.pipeline.start_audio_encode', return_value=p_audio) as mock_start, \
+         patch('modules.pipeline.finish_audio_encode', return_value=True) as mock_finish, \
+         patch('modules.pipeline.mux_audio', return_value=mux_ok) as mock_mux, \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), patch('modules.pipeline.log_error'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=video_ok) as mock_run:
+        pipeline.process_video(src)
+    return mock_run, mock_start, mock_finish, mock_mux, p_audio
+
+
+def test_process_video_separate_audio_copy(tmp_path):
+    mock_run, mock_start, _, mock_mux, _ = _process(tmp_path, copy=True)
+    assert not mock_start.called
+    ffmpeg_cmd = mock_run.call_args[0][1]
+    assert "-an" in ffmpeg_cmd
+    assert ffmpeg_cmd[-1].endswith("_temp_video.mov")
+    video_file, audio_source, part_file, offset = mock_mux.call_args[0]
+    assert part_file.name.endswith("_part.mov")
+    assert offset == pipeline.AUDIO_OFFSET
+    assert part_file.name.endswith("_part.mov")
+
+
+def test_process_video_separate_audio_encode(tmp_path):
+    _, mock_start, mock_finish, mock_mux, p_audio = _process(tmp_path, copy=False)
+    assert mock_start.called
+    mock_finish.assert_called_once_with(p_audio)
+    assert mock_mux.call_args[0][1] == tmp_path / "tape_temp_audio.mka"
+
+
+def test_process_video_separate_audio_video_failure(tmp_path):
+    _, _, _, mock_mux, p_audio = _process(tmp_path, copy=False, video_ok=False)
+    p_audio.terminate.assert_called_once()
+    assert not mock_mux.called
+
+
+def test_finish_separate_audio_keeps_video_on_mux_failure(tmp_path):
+    video = tmp_path / "o_temp_video.mov"
+    kept = tmp_path / "o_video_only.mov"
+    video.write_bytes(b"v")
+    with patch('modules.pipeline.mux_audio', return_value=False), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_error'):
+        ok = pipeline._finish_separate_audio(True, None, Path("t.mp4"), [video], [tmp_path / "o_part.mov"],
+                                             keep_files=[kept])
+    assert ok is False
+    assert not video.exists() and kept.read_bytes() == b"v"
+
+    # A failed video stage leaves nothing behind
+    video.write_bytes(b"v")
+    with patch('modules.pipeline.log_info'):
+        assert not pipeline._finish_separate_audio(False, None, Path("t.mp4"), [video], [tmp_path / "o_part.mov"],
+                                                   keep_files=[tmp_path / "other.mov"])
+    assert not video.exists() and not (tmp_path / "other.mov").exists()
+
+
+def test_retry_reuses_kept_video(tmp_path):
+    kept = tmp_path / "tape_deinterlaced_prores_video_only.mov"
+    kept.write_bytes(b"v")
+    with patch('modules.pipeline.get_duration', return_value=10.0):
+        mock_run, _, _, mock_mux, _ = _process(tmp_path, copy=True)
+    assert not mock_run.called
+    assert mock_mux.call_args[0][0] == kept
+    assert not kept.exists()
+
+
+def test_get_codec_name():
+    from modules import utils
+    with patch('subprocess.check_output', return_value=b"pcm_s16le\n"):
+        assert utils.get_codec_name("t.mp4") == "pcm_s16le"
+    with patch('subprocess.check_output', return_value=b""):
+        assert utils.get_codec_name("t.mp4") is None
+    with patch('subprocess.check_output', side_effect=OSError):
+        assert utils.get_codec_name("t.mp4") is None
@@ -56,6 +56,12 @@ def test_get_vpy_info():
         assert pytest.approx(fps, 0.001) == 29.970
 
 
+def test_parse_encoders_drops_duplicates():
+    from modules.config import _parse_encoders
+    assert _parse_encoders(["av1", "prores", "av1"]) == ["av1", "prores"]
+    assert _parse_encoders("prores") == ["prores"]
+
+
 def test_detect_hardware_logic():
     """Test hardware detection profiles and NVIDIA prioritization."""
     from modules.config import detect_hardware_settings
@@ -173,7 +179,8 @@ def test_process_video_resume_final():
 def test_process_video_pipeline():
     """Test Single-Pass Pipeline (Mocked)."""
     from modules.pipeline import process_video
-    with patch('modules.pipeline.get_duration', return_value=100.0):
+    with patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.probe_media', return_value={"duration_v": 100.0, "duration_a": 100.0}):
         with patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, "YUV420P8")):  # 100s
             with patch('modules.pipeline.create_vpy_script'):
                 with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
@@ -189,7 +196,7 @@ def test_process_video_pipeline():
                                     p2 = MagicMock()
                                     progress_msg = "frame= 100 fps=30 time=00:00:10.00 speed=1.0x"
                                     p2.stderr.readline.side_effect = [progress_msg, "", ""]
-                                    p2.poll.side_effect = [None, 0, 0]
+                                    p2.poll.return_value = 0
                                     p2.returncode = 0
                                     p2.stderr = MagicMock()
 
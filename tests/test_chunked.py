@@ -0,0 +1,107 @@
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import chunked
+
+SHOWINFO_OUTPUT = """[Parsed_showinfo_2 @ 0x1] config in time_base: 1/1000, frame_rate: 50/1
+[Parsed_showinfo_2 @ 0x1] n:   0 pts:  12000 pts_time:12      duration: 20 fmt:yuv420p16le
+[Parsed_showinfo_2 @ 0x1] n:   1 pts:  12020 pts_time:12.02   duration: 20 fmt:yuv420p16le
+[Parsed_showinfo_2 @ 0x1] n:   2 pts: 250000 pts_time:250     duration: 20 fmt:yuv420p16le
+frame= 9000 fps=900 q=-0.0 Lsize=N/A time=00:03:00.00
+"""
+
+
+def test_parse_scene_cuts():
+    assert chunked.parse_scene_cuts(SHOWINFO_OUTPUT, 50.0) == [600, 601, 12500]
+    assert chunked.parse_scene_cuts("no cuts here", 50.0) == []
+
+
+def test_plan_chunks_aligns_to_cuts_and_limits_length():
+    # 50 fps: min 10 s = 500 frames, max 60 s = 3000 frames
+    chunks = chunked.plan_chunks([600, 601, 12500, 14800], 15000, 50.0, min_seconds=10, max_seconds=60)
+    assert chunks[0] == (0, 600)
+    assert chunks[-1][1] == 15000
+    # Contiguous and complete
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert (600, 601) not in chunks and any(start == 12500 for start, _ in chunks)
+    # 14800 is too close to the end; the long scene 601..12500 is split evenly
+    assert all(start != 14800 for start, _ in chunks)
+    assert max(end - start for start, end in chunks) <= 3000
+    assert chunked.plan_chunks([], 100, 25.0, min_seconds=10, max_seconds=60) == [(0, 100)]
+
+
+def test_chunk_and_concat_commands():
+    with patch('modules.chunked.shutil.which', return_value="ffmpeg"):
+        first = chunked.build_chunk_cmd("src.mkv", "c0.mkv", 0, 600, 50.0, 8)
+        later = chunked.build_chunk_cmd("src.mkv", "c1.mkv", 600, 1200, 50.0, 8)
+        joined = chunked.build_concat_cmd("list.txt", "out.mkv", "tape.avi", ["-c:a", "aac"])
+        video_only = chunked.build_concat_cmd("list.txt", "out.mkv")
+    assert "-ss" not in first and first[first.index("-frames:v") + 1] == "600"
+    assert later[later.index("-ss") + 1] == "11.990000"
+    assert "libsvtav1" in later and "lp=8" in later
+    assert joined[joined.index("-c:v") + 1] == "copy" and "1:a:0" in joined and joined[-1] == "out.mkv"
+    assert "-an" in video_only
+
+
+def test_concat_list_escapes_quotes(tmp_path):
+    list_file = chunked.write_concat_list([tmp_path / "Bob's tape.mkv"], tmp_path / "list.txt")
+    line = list_file.read_text(encoding="utf-8")
+    assert line.startswith("file '") and line.endswith("Bob'\\''s tape.mkv'\n")
+
+
+def test_encode_chunked_av1(tmp_path):
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return MagicMock(returncode=0, stderr=None)
+
+    with patch('modules.chunked.detect_scene_cuts', return_value=[1000]), \
+         patch('modules.chunked.run_command', side_effect=fake_run), \
+         patch('modules.chunked.HW_SETTINGS', {"cpu_threads": 16}), \
+         patch('modules.chunked.CONFIG', {"av1_chunk_min_seconds": 10, "av1_chunk_max_seconds": 60}), \
+         patch('modules.chunked.log_info'):
+        assert chunked.encode_chunked_av1(tmp_path / "src.mkv", tmp_path / "out_part.mkv", 2000, 50.0,
+                                          audio_source="tape.avi", audio_args=["-c:a", "flac"])
+
+    chunk_cmds, concat = calls[:-1], calls[-1]
+    assert len(chunk_cmds) == 2 and all("lp=8" in cmd for cmd in chunk_cmds)
+    assert "concat" in concat and "flac" in concat
+    assert not (tmp_path / "out_part_chunks").exists()
+
+
+def test_encode_chunked_av1_failure(tmp_path):
+    with patch('modules.chunked.detect_scene_cuts', return_value=[]), \
+         patch('modules.chunked.run_command',
+               return_value=MagicMock(returncode=1, stderr=MagicMock(read=lambda: b"Unknown encoder"))), \
+         patch('modules.chunked.log_info'), patch('modules.chunked.log_error') as mock_err:
+        assert not chunked.encode_chunked_av1("src.mkv", tmp_path / "out_part.mkv", 100, 25.0)
+    assert "Unknown encoder" in mock_err.call_args[0][0]
+
+
+def test_process_video_routes_av1_through_chunks():
+    """The main pass writes prores plus the lossless intermediate; AV1 is encoded in chunks."""
+    input_p = Path("tape.mp4")
+
+    with patch('modules.pipeline.ENCODERS', ["prores", "av1"]), \
+         patch.dict(pipeline.CONFIG, {"av1_chunked": True}), \
+         patch.object(Path, 'exists', lambda self: self == input_p), \
+         patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True) as mock_run, \
+         patch('modules.pipeline.encode_chunked_av1', return_value=True) as mock_chunks:
+        pipeline.process_video(input_p)
+
+    ffmpeg_cmd = mock_run.call_args[0][1]
+    assert "libsvtav1" not in ffmpeg_cmd and "prores_ks" in ffmpeg_cmd and "ffv1" in ffmpeg_cmd
+    assert ffmpeg_cmd[-1] == "tape_intermediate.mkv"
+    source, target, frames, fps = mock_chunks.call_args[0]
+    assert source == Path("tape_intermediate.mkv") and target.name == "tape_deinterlaced_av1_part.mkv"
+    assert (frames, fps) == (3000, 30.0)
+    assert mock_chunks.call_args[1]["audio_source"] == input_p
@@ -56,7 +56,7 @@ def test_process_video_sync_trim(ad):
                                     p1.stderr = MagicMock()
                                     p1.stderr.readline.return_value = None
                                     p2 = MagicMock()
-                                    p2.poll.side_effect = [None, 0]
+                                    p2.poll.return_value = 0
                                     p2.stderr.readline.side_effect = ["", ""]
                                     p2.returncode = 0
                                     mock_popen.side_effect = [p1, p2]
@@ -92,7 +92,7 @@ def test_intermediate_failure(ad):
                 p1.stderr = MagicMock()
                 p1.stderr.readline.return_value = None
                 p2 = MagicMock()
-                p2.poll.side_effect = [None, 0]
+                p2.poll.return_value = 0
                 p2.stderr.readline.side_effect = ["", ""]
                 p2.returncode = 1  # FAILURE
                 mock_popen.side_effect = [p1, p2]
@@ -530,8 +530,8 @@ def test_detect_hardware_gpu_found_no_nvidia(ad):
         with patch('subprocess.check_output', return_value=b'AMD Radeon'):
             with patch('auto_deinterlancer.PERF_PROFILE', 'auto'):
                 settings = ad.detect_hardware_settings()
-                # Expect True (Generic OpenCL), because we only explicit enable for NVIDIA but default is True
-                assert settings['use_gpu_opencl'] is True
+                # No NVIDIA: CPU interpolation until a probe proves an OpenCL device works
+                assert settings['use_gpu_opencl'] is False
 
 
 def test_detect_hardware_gpu_exception(ad):
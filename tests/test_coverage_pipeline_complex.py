@@ -1,3 +1,4 @@
+import io
 import pytest
 from unittest.mock import patch, MagicMock
 from pathlib import Path
@@ -42,27 +43,21 @@ def test_run_encoding_pipeline_progress_parsing():
     p_ffmpeg = MagicMock()
     p_ffmpeg.returncode = 0
     p_ffmpeg.wait.return_value = None
+    p_vspipe.poll.return_value = p_ffmpeg.poll.return_value = 0
     
-    # Simulate stderr lines from ffmpeg
-    # We need to mock iteration over p_ffmpeg.stderr
-    # pipeline.py uses: stderr_reader = io.TextIOWrapper(p_ffmpeg.stderr, ...)
-    # But checking the code: 
-    #   if p_ffmpeg.stderr:
-    #       stderr_reader = io.TextIOWrapper(p_ffmpeg.stderr...)
-    # We can mock TextIOWrapper or just make p_ffmpeg.stderr iterable if we mock io.TextIOWrapper?
-    # Easier: Mock io.TextIOWrapper
-    
+    # Simulate stderr lines from ffmpeg (progress lines end with '\r')
     lines = [
         "frame=  100 fps= 25 q=-1.0 size= 1024kB time=00:00:04.00 bitrate=2000.0kbits/s speed= 1.0x",
         "frame=  200 fps= 30 q=-1.0 size= 2048kB time=00:00:08.00 bitrate=2000.0kbits/s speed= 2.0x",
         "some other line",
         "frame=  300 fps= 30 q=-1.0 size= 3072kB time=00:00:12.00 bitrate=2000.0kbits/s speed=N/A" # coverage for speed exceptions
     ]
+    p_ffmpeg.stderr = io.BytesIO("\r".join(lines).encode())
+    p_ffmpeg.stdout = io.BytesIO(b"")
+    p_vspipe.stderr = io.BytesIO(b"")
     
     with patch('subprocess.Popen', side_effect=[p_vspipe, p_ffmpeg]):
         with patch('modules.pipeline.get_vspipe_env', return_value={}):
-            with patch('threading.Thread'):
-                with patch('io.TextIOWrapper', return_value=lines): # Make it iterable
                     with patch('modules.pipeline.update_progress') as mock_update:
                         with patch('os.remove'):
                              with patch('pathlib.Path.exists', return_value=True):
@@ -0,0 +1,83 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from modules import crop, mezzanine
+from modules.vspipe import create_vpy_script
+
+PARAMS = {"version": 1, "samples": 3, "sample_frames": 25, "limit": 24, "head_switching_lines": 8,
+          "min_area": 0.5, "restore": "none"}
+
+CROPDETECT_LOG = """
+[Parsed_cropdetect_0 @ 0x1] x1:9 x2:709 y1:3 y2:569 w:700 h:566 x:10 y:4 pts:40 t:0.04 crop=700:566:10:4
+[Parsed_cropdetect_0 @ 0x1] x1:8 x2:711 y1:2 y2:571 w:702 h:568 x:8 y:2 pts:80 t:0.08 crop=702:568:8:2
+"""
+
+
+def test_parse_cropdetect():
+    assert crop.parse_cropdetect(CROPDETECT_LOG) == (702, 568, 8, 2)
+    assert crop.parse_cropdetect("no detection") is None
+
+
+def test_plan_crop_is_union_and_mod_aligned():
+    areas = [(702, 568, 8, 2), (700, 570, 11, 1), (100, 80, 300, 250)]  # last: dark scene
+    result = crop.plan_crop((720, 576), areas, PARAMS)
+    # left 8, right 720-711=9 -> 10, top 1 -> 4, bottom max(5, 8) -> 8
+    assert (result["left"], result["right"], result["top"], result["bottom"]) == (8, 10, 4, 8)
+    assert (result["width"], result["height"]) == (702, 564)
+    assert crop.get_saved_percent(result) == pytest.approx(100 * (1 - 702 * 564 / (720 * 576)))
+
+
+def test_plan_crop_rejects_nothing_to_do():
+    assert crop.plan_crop((720, 576), [(720, 576, 0, 0)], dict(PARAMS, head_switching_lines=0)) is None
+    assert crop.plan_crop((720, 576), [(100, 80, 0, 0)], PARAMS) is None
+
+
+def test_detect_crop_samples_the_tape():
+    result = MagicMock(stderr=CROPDETECT_LOG.encode())
+    with patch('modules.crop._probe_size', return_value=(720, 576)), \
+         patch('modules.crop.probe_media', return_value={"duration_v": 400.0}), \
+         patch('modules.crop.subprocess.run', return_value=result) as mock_run:
+        planned = crop.detect_crop("tape.avi", PARAMS)
+    starts = [c[0][0][c[0][0].index("-ss") + 1] for c in mock_run.call_args_list]
+    assert starts == ["100.000", "200.000", "300.000"]
+    assert planned["bottom"] == 8 and planned["left"] == 8
+
+
+def test_auto_crop_is_cached(tmp_path):
+    source = tmp_path / "tape.avi"
+    source.write_bytes(b"video")
+    planned = crop.plan_crop((720, 576), [(702, 568, 8, 2)], PARAMS)
+    with patch('modules.probe.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.crop.detect_crop', return_value=planned) as mock_detect, \
+         patch('modules.crop.log_info') as mock_log:
+        assert crop.get_auto_crop(source) == planned
+        assert crop.get_auto_crop(source) == planned
+    assert mock_detect.call_count == 1
+    assert "fewer pixels" in mock_log.call_args[0][0]
+
+
+@pytest.mark.parametrize("restore", ["none", "pad", "mask"])
+def test_script_crops_before_qtgmc(tmp_path, restore):
+    planned = crop.plan_crop((720, 576), [(702, 568, 8, 2)], PARAMS)
+    out = tmp_path / "s.vpy"
+    with patch('modules.vspipe.get_fps', return_value=25.0), \
+         patch.dict(crop.CONFIG, {"auto_crop_restore": restore}):
+        create_vpy_script(str(tmp_path / "in.mp4"), str(out), "QTGMC", crop=planned)
+    lines = out.read_text().splitlines()
+    crop_line = next(i for i, line in enumerate(lines) if "core.std.Crop(clip" in line)
+    qtgmc_line = next(i for i, line in enumerate(lines) if "haf.QTGMC" in line)
+    assert crop_line < qtgmc_line
+    assert "left=8, right=10, top=4, bottom=8" in lines[crop_line]
+    after = "\n".join(lines[qtgmc_line + 1:])
+    assert ("AddBorders" in after) == (restore == "pad")
+    assert ("StackVertical" in after and "StackHorizontal" in after) == (restore == "mask")
+    compile("\n".join(lines), "s.vpy", "exec")
+
+
+def test_crop_settings_change_mezzanine_key(tmp_path):
+    source = tmp_path / "tape.avi"
+    source.write_bytes(b"video")
+    plain = mezzanine.get_mezzanine_key(source)
+    with patch.dict(crop.CONFIG, {"auto_crop": True}):
+        assert mezzanine.get_mezzanine_key(source) != plain
@@ -0,0 +1,196 @@
+import io
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import modules.pipeline as pipeline
+from modules import audio, drift, probe
+
+
+def _synthetic_tracks(seconds=600, lag_of=lambda t: 0.3, seed=1):
+    """Random picture events; audio repeats each of them after lag_of(t) seconds."""
+    rng = np.random.default_rng(seed)
+    size = seconds * drift.ANALYSIS_RATE
+    video = np.zeros(size, dtype=np.float32)
+    audio = np.zeros(size, dtype=np.float32)
+    for slot in rng.choice(size - 400, size // 200, replace=False):
+        video[slot] = 1.0
+        shifted = int(round(slot + lag_of(slot / drift.ANALYSIS_RATE) * drift.ANALYSIS_RATE))
+        if 0 <= shifted < size:
+            audio[shifted] = 1.0
+    return video, audio
+
+
+def _params(window=60):
+    return {"version": 1, "window": window, "max_lag": 2.0, "min_confidence": 4.0}
+
+
+def test_window_lag_finds_shift():
+    video, audio = _synthetic_tracks(seconds=60, lag_of=lambda t: 0.25)
+    max_lag = 200
+    lag, confidence = drift.window_lag(video[max_lag:4000], audio[0:4000 + max_lag], max_lag)
+    assert lag == 25
+    assert confidence > 4.0
+    assert drift.window_lag(np.zeros(100), np.ones(140), 20) == (0, 0.0)
+
+
+def test_constant_offset_gives_unit_tempo():
+    video, audio = _synthetic_tracks(lag_of=lambda t: 0.3)
+    points = drift.build_drift_map(video, audio, _params())
+    assert len(points) >= 5
+    tempo, offset, inliers = drift.fit_drift(points)
+    assert abs(tempo - 1.0) < 1e-4
+    assert abs(offset - 0.3) < 0.02
+    assert drift.build_tempo_filter(inliers, tempo, 0.04) is None
+
+
+def test_linear_drift_and_outlier_rejection():
+    points = [{"t": t, "lag": 0.001 * t, "confidence": 8.0} for t in range(30, 600, 60)]
+    points[4]["lag"] = 1.5  # bad window
+    tempo, offset, inliers = drift.fit_drift(points)
+    assert abs(tempo - 1.001) < 1e-6
+    assert abs(offset) < 1e-6
+    assert len(inliers) == len(points) - 1
+    assert drift.fit_drift(points[:1]) is None
+
+
+def test_piecewise_drift_builds_filter():
+    # Tape speeds up halfway: no single tempo fits within 40 ms
+    points = [{"t": t, "lag": 0.0 if t < 300 else 0.002 * (t - 300), "confidence": 8.0}
+              for t in range(30, 900, 60)]
+    tempo, _, inliers = drift.fit_drift(points)
+    chain = drift.build_tempo_filter(inliers, tempo, 0.04)
+    assert chain.startswith("asendcmd=c='")
+    assert "atempo tempo 1.002000" in chain
+    assert chain.endswith("atempo=1.000000")
+    assert drift.build_tempo_filter(points[:2], tempo, 0.04) is None
+
+
+def test_streaming_blocks_match_whole_file():
+    rng = np.random.default_rng(3)
+    samples = rng.normal(size=drift.AUDIO_SAMPLE_RATE * 3).astype("<f4")
+    with patch('modules.drift.BLOCK_SECONDS', 1):
+        blocks = list(drift._audio_onset_blocks(io.BytesIO(samples.tobytes())))
+    assert len(blocks) == 3
+    assert sum(len(b) for b in blocks) == 3 * drift.ANALYSIS_RATE
+
+    frame = drift.LUMA_WIDTH * drift.LUMA_HEIGHT
+    frames = np.zeros((5, frame), dtype=np.uint8)
+    frames[3:] = 200  # cut at frame 3
+    with patch('modules.drift.BLOCK_SECONDS', 1):
+        chunks = list(drift._video_cut_blocks(io.BytesIO(frames.tobytes()), fps=2))
+    indices = np.concatenate([c[0] for c in chunks])
+    values = np.concatenate([c[1] for c in chunks])
+    assert list(indices) == [0, 1, 2, 3, 4]
+    assert values[3] == 200 and values[2] == 0 and values[4] == 0
+    grid = drift.video_events_to_grid(indices, values, fps=2)
+    assert grid[150] == 200
+
+
+def test_analyze_drift_streams_both_decoders():
+    video, audio = _synthetic_tracks(seconds=300, lag_of=lambda t: 0.2)
+    with patch('modules.drift._stream_event_grids', return_value=(video, audio)), \
+         patch('modules.drift.probe_media', return_value={"fps": 25.0, "duration_a": 300.0}), \
+         patch('modules.drift.log_info'):
+        result = drift.analyze_drift(Path("t.mp4"), _params())
+        assert abs(result["offset"] - 0.2) < 0.02
+        assert result["filter"] is None
+        with patch('modules.drift.build_drift_map', return_value=[]):
+            assert drift.analyze_drift(Path("t.mp4"), _params()) is None
+
+
+def test_stream_event_grids_uses_pipes():
+    audio_bytes = np.zeros(drift.AUDIO_SAMPLE_RATE, dtype="<f4").tobytes()
+    video_bytes = np.zeros(drift.LUMA_WIDTH * drift.LUMA_HEIGHT * 25, dtype=np.uint8).tobytes()
+    procs = []
+
+    def _popen(cmd, **kwargs):
+        p = MagicMock()
+        p.stdout = io.BytesIO(audio_bytes if "f32le" in cmd else video_bytes)
+        p.poll.return_value = 0
+        procs.append(p)
+        return p
+
+    with patch('modules.drift.subprocess.Popen', side_effect=_popen), \
+         patch('modules.drift.update_progress') as mock_progress:
+        video_grid, audio_grid = drift._stream_event_grids(Path("t.mp4"), 25.0, 1.0)
+    assert len(audio_grid) == drift.ANALYSIS_RATE
+    assert len(video_grid) > 90
+    assert mock_progress.called
+    assert all(p not in drift.ACTIVE_PROCS for p in procs)
+
+
+def test_analyze_drift_cached(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v" * 100)
+    result = {"tempo": 1.001, "offset": 0.1, "filter": None, "points": [], "inliers": 3}
+    with patch('modules.probe.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.drift.analyze_drift', return_value=result) as mock_analyze:
+        assert drift.analyze_drift_cached(src) == result
+        assert drift.analyze_drift_cached(src) == result
+        assert mock_analyze.call_count == 1
+        # Changed analysis settings invalidate the stored result
+        with patch.dict('modules.drift.CONFIG', {"drift_window_seconds": 30}):
+            drift.analyze_drift_cached(src)
+        assert mock_analyze.call_count == 2
+    with patch('modules.drift.np', None), patch('modules.drift.log_info'):
+        assert drift.analyze_drift_cached(src) is None
+
+
+def test_probe_media_cached(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v" * 100)
+    with patch('modules.probe.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.probe.get_duration', return_value=60.0) as mock_dur, \
+         patch('modules.probe.get_fps', return_value=29.97), \
+         patch('modules.probe.get_codec_name', return_value="pcm_s16le"):
+        info = probe.probe_media(src)
+        assert info["duration_v"] == 60.0 and info["audio_codec"] == "pcm_s16le" and info["size"] == 100
+        probe.probe_media(src)
+        assert mock_dur.call_count == 2  # video + audio, first call only
+        # An unreadable file is probed without a cache entry
+        assert probe.probe_media(tmp_path / "gone.mp4")["audio_codec"] == "pcm_s16le"
+        assert "size" not in probe.probe_media(tmp_path / "gone.mp4")
+    with patch('modules.probe.get_cache_dir', return_value=str(tmp_path / "missing")), \
+         patch('modules.probe.log_debug') as mock_debug:
+        probe.update_probe_entry("abc", x=1)
+        assert mock_debug.called
+
+
+def test_analyze_audio_sync_selection():
+    measured = {"tempo": 1.0005, "offset": 0.12, "filter": "asendcmd=c='...',atempo=1.0", "inliers": 9}
+    with patch.dict('modules.pipeline.CONFIG', {"drift_analysis": True}), \
+         patch('modules.pipeline.analyze_drift_cached', return_value=measured), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.01) as mock_fallback, \
+         patch('modules.pipeline.log_info'):
+        with patch('modules.pipeline.AUDIO_OFFSET', 0.2):
+            atempo, tempo_filter, offset = pipeline._analyze_audio_sync(Path("t.mp4"), 60.0)
+        assert (atempo, tempo_filter) == (1.0005, measured["filter"])
+        assert offset == pytest.approx(0.2 - 0.12 / 1.0005)
+        assert not mock_fallback.called
+        with patch.dict('modules.pipeline.CONFIG', {"drift_analysis_max_percent": 0.01}):
+            assert pipeline._analyze_audio_sync(Path("t.mp4"), 60.0) == (1.01, None, pipeline.AUDIO_OFFSET)
+    with patch.dict('modules.pipeline.CONFIG', {"drift_analysis": False}), \
+         patch('modules.pipeline.analyze_drift_cached') as mock_measure, \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0):
+        assert pipeline._analyze_audio_sync(Path("t.mp4"), 60.0) == (1.0, None, pipeline.AUDIO_OFFSET)
+        assert not mock_measure.called
+
+
+def test_audio_offset_delays_or_trims():
+    af = pipeline._get_audio_args(1.0, None, 0.25)
+    assert af[af.index("-af") + 1] == "adelay=250|250"
+    af = pipeline._get_audio_args(1.0, None, -0.12)
+    assert af[af.index("-af") + 1] == "atrim=start=0.120,asetpts=PTS-STARTPTS"
+    assert "-af" not in pipeline._get_audio_args(1.0, None, 0.0)
+
+
+def test_tempo_filter_replaces_atempo():
+    args = pipeline._get_audio_args(1.002, "asendcmd=c='1.0 atempo tempo 1.1',atempo=1.0")
+    af = args[args.index("-af") + 1]
+    assert af.startswith("asendcmd=") and "atempo=1.002000" not in af
+    with patch('modules.audio.shutil.which', return_value="ffmpeg"):
+        cmd = audio.build_audio_encode_cmd(Path("t.mp4"), Path("a.mka"), 1.0, "atempo=1.01")
+    assert cmd[cmd.index("-af") + 1] == "atempo=1.01"
@@ -101,8 +101,7 @@ def test_pipeline_run_encoding_read_error():
         mock_popen.side_effect = [p_vs, p_ff]
         
         with patch('modules.pipeline.get_vspipe_env', return_value={}):
-            with patch('threading.Thread'):
-                 pipeline._run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, Path('t.vpy'), 100)
+            assert pipeline._run_encoding_pipeline(vspipe_cmd, ffmpeg_cmd, Path('t.vpy'), 100) is False
 
 def test_vspipe_log_errors_specific():
     """Test vspipe logging specific exceptions."""
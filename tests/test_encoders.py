@@ -0,0 +1,106 @@
+import json
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import encoders
+from modules.encoders import VALID_ENCODERS
+
+
+def test_registry_matches_valid_encoders():
+    assert set(encoders.ENCODER_BACKENDS) == set(VALID_ENCODERS)
+    for name in VALID_ENCODERS:
+        args = encoders.get_codec_args(name, threads=8)
+        assert args[0] == "-c:v" and "-pix_fmt" in args
+
+
+def test_existing_outputs_unchanged():
+    assert encoders.get_codec_args("prores", threads=0) == [
+        "-c:v", "prores_ks", "-profile:v", "3", "-vendor", "apl0", "-bits_per_mb", "8000", "-pix_fmt", "yuv422p10le"]
+    assert encoders.get_codec_args("av1", threads=0) == [
+        "-c:v", "libsvtav1", "-preset", "6", "-crf", "22", "-pix_fmt", "yuv420p10le"]
+    with patch.dict(encoders.CONFIG, {}, clear=True):
+        assert pipeline._get_output_path(Path("/v/tape.avi"), "prores") == Path("/v/tape_deinterlaced_prores.mov")
+        assert pipeline._get_output_path(Path("/v/tape.avi"), "av1") == Path("/v/tape_deinterlaced_av1.mkv")
+        assert pipeline._get_output_path(Path("/v/tape.avi"), "ffv1") == Path("/v/tape_deinterlaced_ffv1.mkv")
+
+
+def test_threading_follows_hardware_settings():
+    with patch.dict(encoders.HW_SETTINGS, {"cpu_threads": 10}), patch.dict(encoders.CONFIG, {}, clear=True):
+        ffv1 = encoders.get_codec_args("ffv1")
+        assert ffv1[ffv1.index("-slices") + 1] == "12" and ffv1[ffv1.index("-threads") + 1] == "10"
+        x265 = encoders.get_codec_args("x265")
+        assert "pools=10" in x265[-1] and "lossless=1" in x265[-1]
+        assert "-threads" not in encoders.get_codec_args("x264", threads=0)
+    with patch.dict(encoders.CONFIG, {"encoder_threads": 3, "lossless_intra_only": True}):
+        x264 = encoders.get_codec_args("x264")
+        assert x264[x264.index("-threads") + 1] == "3" and "-g" in x264 and "-qp" in x264
+    assert encoders.get_ffv1_slices(64) == 24
+    with patch.dict(encoders.CONFIG, {"ffv1_slices": 30}):
+        assert encoders.get_ffv1_slices(4) == 30
+
+
+def test_lossless_formats_and_labels():
+    with patch.dict(encoders.CONFIG, {}, clear=True):
+        ffv1 = encoders.get_codec_args("ffv1", threads=0)
+        assert ffv1[ffv1.index("-pix_fmt") + 1] == "yuv420p16le"
+        assert [encoders.get_lossless_label(name) for name in ("ffv1", "x264", "x265", "prores")] == \
+            ["yes", "10-bit", "10-bit", "no"]
+    with patch.dict(encoders.CONFIG, {"lossless_pix_fmt": "yuv420p10le"}):
+        assert encoders.get_lossless_label("ffv1") == "10-bit"
+    with pytest.raises(KeyError):
+        encoders.get_backend("h264")
+
+
+def test_settings_hash_ignores_thread_count():
+    with patch.dict(encoders.HW_SETTINGS, {"cpu_threads": 4}):
+        low = pipeline._get_video_codec_args("ffv1", threads=0)
+    with patch.dict(encoders.HW_SETTINGS, {"cpu_threads": 32}):
+        high = pipeline._get_video_codec_args("ffv1", threads=0)
+    assert low == high and "-threads" not in low
+
+
+def _fake_ffmpeg(cmd, **kwargs):
+    Path(cmd[-1]).write_bytes(b"x" * 1000)
+    if "libx265" in cmd:
+        return MagicMock(returncode=1, stderr=b"Unknown encoder 'libx265'")
+    return MagicMock(returncode=0, stderr=b"frame=  100 fps=50\rframe=  250 fps=60 q=-0.0 Lsize=1kB\n")
+
+
+def test_benchmark_ranks_backends(tmp_path):
+    ticks = iter(range(0, 1000, 1))
+    with patch('modules.encoders.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.encoders.subprocess.run', side_effect=_fake_ffmpeg) as mock_run, \
+         patch('modules.encoders.time.monotonic', side_effect=lambda: next(ticks)), \
+         patch('modules.encoders.get_duration', return_value=100.0), \
+         patch('modules.encoders.log_info'), patch('modules.encoders.log_error') as mock_err:
+        report = encoders.run_benchmark("/v/tape.avi", frames=250, encoders=["ffv1", "x265", "prores"])
+
+    sample_cmd = mock_run.call_args_list[0][0][0]
+    assert sample_cmd[sample_cmd.index("-ss") + 1] == "40.000" and "yuv420p16le" in sample_cmd
+    assert [r["encoder"] for r in report["results"]] == ["ffv1", "prores", "x265"]
+    assert report["results"][0]["frames"] == 250 and report["results"][0]["bytes"] == 1000
+    assert not report["results"][-1]["ok"] and "x265" in mock_err.call_args[0][0]
+    assert list(tmp_path.iterdir()) == []
+
+    lines = encoders.format_benchmark(report)
+    assert "ffv1" in lines[1] and "failed" in lines[3]
+    with patch('modules.encoders.get_cache_dir', return_value=str(tmp_path)):
+        path = encoders.save_benchmark(report)
+    assert json.loads(path.read_text())["frames"] == 250
+
+
+def test_benchmark_without_sample(tmp_path):
+    with patch('modules.encoders.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.encoders.subprocess.run', return_value=MagicMock(returncode=1, stderr=b"bad")) as mock_run, \
+         patch('modules.encoders.log_info'), patch('modules.encoders.log_error'):
+        assert encoders.run_benchmark(None, frames=10, encoders=["ffv1"]) is None
+    assert "lavfi" in mock_run.call_args[0][0]
+
+    with patch.object(pipeline, "_parse_cli_args", return_value=[]), \
+         patch.object(pipeline, "run_benchmark", return_value={"frames": 1, "threads": 2, "results": []}), \
+         patch.object(pipeline, "save_benchmark", return_value=tmp_path / "encoders.json"), \
+         patch.object(pipeline, "log_info"):
+        assert pipeline.benchmark_encoders() == tmp_path / "encoders.json"
@@ -33,7 +33,7 @@ def test_process_video_happy_path_execution(ad):
                                         p1.stderr.readline.side_effect = [b"Frame 100/1000", b"Frame 500/1000", None]
 
                                         p2 = MagicMock()
-                                        p2.poll.side_effect = [None, None, 0]
+                                        p2.poll.return_value = 0
                                         # Simulate FFmpeg progress output
                                         p2.stderr.readline.side_effect = [
                                             "frame=100 time=00:17:02.28 speed=2.57x\n",
@@ -0,0 +1,270 @@
+import json
+import time
+import threading
+import urllib.request
+from unittest.mock import patch
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import farm
+
+
+def _url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def test_coordinator_requeues_lost_and_failed_jobs():
+    c = farm.Coordinator(["a.mp4", "b.mp4"], worker_timeout=10, max_attempts=2)
+    with patch('modules.farm.log_info'), patch('modules.farm.log_error') as mock_err:
+        w1 = c.register("box1")
+        w2 = c.register("box2")
+        job = c.claim(w1)
+        assert job["path"] == "a.mp4" and job["attempt"] == 1
+        assert c.heartbeat(w1, job["id"])
+
+        # w1 goes silent: its job goes back to the front of the queue
+        c.workers[w2]["last_seen"] = time.monotonic() + 100
+        assert c.reap(now=time.monotonic() + 20) == [w1]
+        assert not c.heartbeat("unknown", job["id"])
+        assert c.claim(w2)["id"] == job["id"]
+        assert c.complete(w1, job["id"], True) is False  # stale result is ignored
+
+        # Second failure exhausts the attempts
+        assert c.complete(w2, job["id"], False)
+        assert c.jobs[job["id"]]["state"] == "failed"
+        assert "gave up" in mock_err.call_args[0][0]
+
+        other = c.claim(w2)
+        assert c.complete(w2, other["id"], True, seconds=10, media_seconds=25)
+    assert c.finished()
+    status = c.status()
+    assert status["jobs"] == {"failed": 1, "done": 1}
+    # The failed attempt counts as a failure, not as throughput
+    assert status["workers"][w2]["jobs_done"] == 1 and status["workers"][w2]["jobs_failed"] == 1
+    assert status["workers"][w2]["speed"] == 2.5
+    assert c.claim("nobody") is None
+
+
+def test_http_protocol_errors():
+    with patch('modules.farm.log_info'), patch('modules.farm.log_debug'):
+        coordinator, server = farm.start_coordinator(["a.mp4"], host="127.0.0.1", port=0)
+        try:
+            with urllib.request.urlopen(_url(server) + "/status") as r:
+                assert json.loads(r.read())["jobs"] == {"queued": 1}
+            for endpoint, method, body in (("/nope", "GET", None), ("/nope", "POST", b"{}"),
+                                           ("/claim", "POST", b"{bad")):
+                req = urllib.request.Request(_url(server) + endpoint, data=body, method=method)
+                try:
+                    urllib.request.urlopen(req)
+                    assert False, "expected an HTTP error"
+                except urllib.error.HTTPError as e:
+                    assert e.code in (400, 404)
+        finally:
+            server.shutdown()
+
+
+def test_multi_worker_localhost_farm():
+    """Three workers share six jobs; one dies mid-job and its job is reassigned."""
+    paths = [f"/shared/tape{i}.mp4" for i in range(6)]
+    rendered = []
+    lock = threading.Lock()
+    dead_started = threading.Event()
+    hang = threading.Event()
+
+    def _good(path, cancel):
+        time.sleep(0.05)
+        with lock:
+            rendered.append(path.name)
+        return True
+
+    def _dying(path, cancel):
+        # Claims a job, then stops heartbeating without ever reporting back
+        dead_started.set()
+        hang.wait(10)
+        return True
+
+    with patch('modules.farm.log_info'), patch('modules.farm.log_debug'), patch('modules.farm.log_error'):
+        coordinator, server = farm.start_coordinator(paths, host="127.0.0.1", port=0, worker_timeout=0.5)
+        url = _url(server)
+        try:
+            dead_stop = threading.Event()
+            dead = threading.Thread(target=farm.run_worker, daemon=True,
+                                    args=(url, _dying), kwargs={"name": "dead", "heartbeat_seconds": 60,
+                                                               "poll_seconds": 0.05, "stop_event": dead_stop})
+            dead.start()
+            assert dead_started.wait(5)
+
+            results = {}
+            workers = []
+            for i in range(2):
+                def _run(i=i):
+                    results[i] = farm.run_worker(url, _good, media_duration=lambda p: 60.0, name=f"box{i}",
+                                                 heartbeat_seconds=0.1, poll_seconds=0.05)
+                t = threading.Thread(target=_run, daemon=True)
+                t.start()
+                workers.append(t)
+            for t in workers:
+                t.join(15)
+            assert coordinator.finished()
+        finally:
+            dead_stop.set()
+            hang.set()
+            server.shutdown()
+
+    assert sorted(rendered) == sorted(Path(p).name for p in paths)
+    assert sum(results.values()) == 6
+    status = coordinator.status()
+    assert status["jobs"] == {"done": 6}
+    dead_id = next(w for w in status["workers"] if w.endswith("dead"))
+    assert status["workers"][dead_id]["alive"] is False
+    assert all(w["speed"] for k, w in status["workers"].items() if k != dead_id)
+
+
+def test_worker_handles_crashing_job_and_unreachable_coordinator():
+    replies = [{"job": {"id": "job-1", "path": "a.mp4"}, "done": False}, {"done": True}]
+    posted = []
+
+    def _post(url, endpoint, payload, timeout=30):
+        posted.append((endpoint, payload))
+        if endpoint == "/register":
+            return {"worker_id": "w1"}
+        if endpoint == "/claim":
+            if len([p for p in posted if p[0] == "/claim"]) == 1:
+                raise OSError("down")
+            return replies.pop(0)
+        return {"ok": True}
+
+    def _crash(path, cancel):
+        raise RuntimeError("boom")
+
+    with patch('modules.farm._post', side_effect=_post), patch('modules.farm.log_info'), \
+         patch('modules.farm.log_error'):
+        assert farm.run_worker("http://x", _crash, heartbeat_seconds=60, poll_seconds=0.01) == 1
+    complete = [p for e, p in posted if e == "/complete"][0]
+    assert complete["ok"] is False
+
+
+def test_worker_stops_reassigned_job():
+    posted = []
+    replies = [{"job": {"id": "job-1", "path": "a.mp4"}, "done": False}, {"done": True}]
+
+    def _post(url, endpoint, payload, timeout=30):
+        posted.append((endpoint, payload))
+        if endpoint == "/register":
+            return {"worker_id": "w1"}
+        if endpoint == "/claim":
+            return replies.pop(0)
+        if endpoint == "/heartbeat":
+            return {"ok": False, "cancel": True}
+        return {"ok": True}
+
+    def _render(path, cancel):
+        assert cancel.wait(5)
+        return True
+
+    with patch('modules.farm._post', side_effect=_post), patch('modules.farm.log_info'), \
+         patch('modules.farm.log_error'):
+        assert farm.run_worker("http://x", _render, heartbeat_seconds=0.01, poll_seconds=0.01) == 1
+    complete = [p for e, p in posted if e == "/complete"][0]
+    assert complete["ok"] is False
+
+
+def test_main_farm_modes(tmp_path):
+    common = [patch('modules.pipeline.setup_environment'), patch('modules.pipeline.get_cpu_name'),
+              patch('modules.pipeline.get_gpu_name'), patch('modules.pipeline._show_banner'),
+              patch('modules.pipeline.check_requirements'), patch('modules.pipeline.log_info')]
+    for p in common:
+        p.start()
+    try:
+        src = tmp_path / "a.mp4"
+        src.write_bytes(b"v")
+        with patch('modules.pipeline.run_coordinator') as mock_coord, \
+             patch('sys.argv', ['script.py', '--farm-coordinator', str(src)]):
+            pipeline.main()
+        assert mock_coord.call_args[0][0] == [src.resolve()]
+
+        with patch('modules.pipeline.run_worker') as mock_worker, \
+             patch('modules.pipeline.wait_for_verifications'), \
+             patch('sys.argv', ['script.py', '--farm-worker', 'http://node:8765']):
+            pipeline.main()
+        assert mock_worker.call_args[0][0] == "http://node:8765"
+
+        with patch.dict('modules.pipeline.CONFIG', {"farm_url": ""}), \
+             patch('modules.pipeline.run_worker') as mock_worker, patch('modules.pipeline.log_error'), \
+             patch('sys.argv', ['script.py', '--farm-worker']):
+            pipeline.main()
+        assert not mock_worker.called
+    finally:
+        for p in common:
+            p.stop()
+
+
+def test_farm_job_reports_outputs(tmp_path):
+    src = tmp_path / "tape.mp4"
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.process_video') as mock_process, \
+         patch('modules.pipeline.wait_for_moves', return_value=[]):
+        assert pipeline._farm_job(src) is False
+        (tmp_path / "tape_deinterlaced_prores.mov").write_bytes(b"o")
+        assert pipeline._farm_job(src) is True
+    assert mock_process.call_count == 2
+
+
+def test_cancelled_job_keeps_part_output(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    cancel = threading.Event()
+
+    def _render(*args, **kwargs):
+        (tmp_path / "tape_deinterlaced_prores_part.mov").write_bytes(b"o")
+        cancel.set()  # reassigned while the render finished
+        return True
+
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline.log_error') as mock_error, \
+         patch('modules.pipeline._run_encoding_pipeline', side_effect=_render) as mock_run:
+        pipeline.process_video(src, cancel)
+    assert mock_run.call_args[1]["cancel"] is cancel
+    assert not (tmp_path / "tape_deinterlaced_prores.mov").exists()
+    assert any("cancelled" in c[0][0] for c in mock_error.call_args_list)
+
+
+def test_stop_on_cancel_terminates_children():
+    cancel, done = threading.Event(), threading.Event()
+    cancel.set()
+    with patch('modules.pipeline.os.kill') as mock_kill, patch('modules.pipeline.log_error'):
+        pipeline._stop_on_cancel(cancel, done, [11, 12])
+    assert [c[0][0] for c in mock_kill.call_args_list] == [11, 12]
+
+
+def test_worker_stops_job_when_heartbeats_fail_past_timeout():
+    posted = []
+    replies = [{"job": {"id": "job-1", "path": "a.mp4"}, "done": False}, {"done": True}]
+
+    def _post(url, endpoint, payload, timeout=30):
+        posted.append((endpoint, payload))
+        if endpoint == "/register":
+            return {"worker_id": "w1", "worker_timeout": 0.05}
+        if endpoint == "/claim":
+            return replies.pop(0)
+        if endpoint == "/heartbeat":
+            raise OSError("unreachable")
+        return {"ok": True}
+
+    def _render(path, cancel):
+        assert cancel.wait(5)
+        return True
+
+    with patch('modules.farm._post', side_effect=_post), patch('modules.farm.log_info'), \
+         patch('modules.farm.log_error') as mock_err:
+        assert farm.run_worker("http://x", _render, heartbeat_seconds=0.01, poll_seconds=0.01) == 1
+    assert any("No heartbeat" in c.args[0] for c in mock_err.call_args_list)
+    complete = [p for e, p in posted if e == "/complete"][0]
+    assert complete["ok"] is False
@@ -0,0 +1,91 @@
+import json
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import filterprofile
+
+FILTER_TIME_OUTPUT = """Output 300 frames in 41.20 seconds (7.28 fps)
+
+Filtername           Filter mode   Time (%)   Time (s)
+nnedi3               parallel         48.10     39.874
+Analyse              parallel         21.00     17.410
+Degrain2             parallel         11.50      9.534
+Analyse              parallel          5.00      4.145
+Point                parallel          0.40      0.332
+Expr                 parallel          3.00      2.487
+"""
+
+
+def test_parse_filter_times_ranks_and_merges_nodes():
+    filters = filterprofile.parse_filter_times(FILTER_TIME_OUTPUT)
+    assert [f["filter"] for f in filters] == ["nnedi3", "Analyse", "Degrain2", "Expr", "Point"]
+    analyse = filters[1]
+    assert analyse["nodes"] == 2 and analyse["seconds"] == 21.555
+    assert abs(sum(f["share"] for f in filters) - 100) < 0.1
+    assert filterprofile.parse_filter_times("Error: no such option --filter-time") == []
+
+
+def test_sample_range_centres_on_clip():
+    assert filterprofile.get_sample_range(1000, 300) == (350, 649)
+    assert filterprofile.get_sample_range(100, 300) == (0, 99)
+    assert filterprofile.get_sample_range(None, 50) == (0, 49)
+
+
+def test_profile_script_runs_vspipe(tmp_path):
+    result = MagicMock(returncode=0, stderr=FILTER_TIME_OUTPUT.encode())
+    with patch('modules.filterprofile.subprocess.run', return_value=result) as mock_run, \
+         patch('modules.filterprofile.get_vspipe_env', return_value={}), \
+         patch('modules.filterprofile.log_info'):
+        report = filterprofile.profile_script("vspipe", tmp_path / "s.vpy", 1000, sample_frames=100)
+    cmd = mock_run.call_args[0][0]
+    assert cmd == ["vspipe", "--filter-time", "-s", "450", "-e", "549", str(tmp_path / "s.vpy"), "."]
+    assert report["frames"] == 100 and report["filters"][0]["filter"] == "nnedi3"
+    assert "Preset" in report["qtgmc"]
+
+    lines = filterprofile.format_report(report, top=2)
+    assert len(lines) == 4 and "nnedi3" in lines[1] and "fps" in lines[-1]
+
+
+def test_profile_script_failures(tmp_path):
+    with patch('modules.filterprofile.log_info'), patch('modules.filterprofile.log_error') as mock_err, \
+         patch('modules.filterprofile.get_vspipe_env', return_value={}):
+        with patch('modules.filterprofile.subprocess.run',
+                   return_value=MagicMock(returncode=1, stderr=b"Unknown argument: --filter-time")):
+            assert filterprofile.profile_script("vspipe", "s.vpy", 100) is None
+        assert "Unknown argument" in mock_err.call_args[0][0]
+        with patch('modules.filterprofile.subprocess.run', side_effect=OSError("missing")):
+            assert filterprofile.profile_script("vspipe", "s.vpy", 100) is None
+
+
+def test_save_report(tmp_path):
+    with patch.dict('modules.config.CONFIG', {"cache_dir": str(tmp_path)}):
+        path = filterprofile.save_report(Path("/tapes/tape1.mp4"), {"filters": []})
+    assert path == tmp_path / "profiles" / "tape1_filters.json"
+    assert json.loads(path.read_text())["source"].endswith("tape1.mp4")
+
+
+def test_profile_mode_in_main(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    report = {"filters": [{"filter": "nnedi3", "mode": "parallel", "seconds": 1.0, "share": 100.0}],
+              "frames": 10, "wall_seconds": 1.0, "fps": 10.0}
+    with patch('modules.pipeline.setup_environment'), patch('modules.pipeline.get_cpu_name'), \
+         patch('modules.pipeline.get_gpu_name'), patch('modules.pipeline._show_banner'), \
+         patch('modules.pipeline.check_requirements'), patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline.staging_enabled', return_value=False), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(None, {"frames": 500})), \
+         patch('modules.pipeline.profile_script', return_value=report) as mock_profile, \
+         patch('modules.pipeline.save_report', return_value=tmp_path / "r.json") as mock_save, \
+         patch('modules.pipeline.process_video') as mock_process, \
+         patch('sys.argv', ['script.py', '--profile', str(src)]):
+        pipeline.main()
+    assert mock_profile.call_args[0][2] == 500
+    assert mock_save.call_args[0] == (src, report)
+    assert not mock_process.called
+
+    with patch('modules.pipeline.staging_enabled', return_value=False), patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(None, {"frames": 500})), \
+         patch('modules.pipeline.profile_script', return_value=None):
+        assert pipeline.profile_video(src) is None
+    assert not (tmp_path / "tape_temp_script.vpy").exists()
@@ -0,0 +1,87 @@
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+import modules.pipeline as pipeline
+from modules import follow
+from modules.vspipe import create_vpy_script
+
+STREAM = {"frames": 3000, "fps": 50.0, "width": 720, "height": 576, "format": "YUV420P16",
+          "pixel_format": "yuv420p16le"}
+
+
+def test_feed_cmd_follows_growing_file(tmp_path):
+    cmd = follow.build_feed_cmd("cap.avi", tmp_path, ["-c:v", "ffv1"], 60, 30)
+    assert cmd[cmd.index("-follow") + 1] == "1"
+    assert cmd[cmd.index("-rw_timeout") + 1] == "30000000"
+    assert cmd[cmd.index("-i") + 1] == "file:cap.avi"
+    assert str(tmp_path / follow.SEGMENT_PATTERN) in cmd and cmd[-1] == str(tmp_path / follow.AUDIO_FILE)
+
+
+def test_segments_and_readiness(tmp_path):
+    for name in ["feed_00010.mkv", "feed_00002.mkv", "feed_audio.mka", "feed_00002.mkv.ffindex"]:
+        (tmp_path / name).write_bytes(b"x")
+    assert [p.name for p in follow.list_segments(tmp_path)] == ["feed_00002.mkv", "feed_00010.mkv"]
+    assert follow.list_segments(tmp_path / "missing") == []
+    assert follow.get_ready_count(5, False) == 3
+    assert follow.get_ready_count(1, False) == 0
+    assert follow.get_ready_count(5, True) == 5
+
+
+def test_script_splices_neighbour_frames(tmp_path):
+    segments = [tmp_path / f"feed_{i:05d}.mkv" for i in range(3)]
+    out = tmp_path / "s.vpy"
+    with patch('modules.vspipe.get_fps', return_value=25.0):
+        create_vpy_script(str(segments[1]), str(out), "QTGMC", context=follow.get_context(segments, 1, 12))
+    lines = out.read_text().splitlines()
+    qtgmc = next(i for i, line in enumerate(lines) if "haf.QTGMC" in line)
+    assert any("feed_00000.mkv" in line for line in lines[:qtgmc])
+    assert any("feed_00002.mkv" in line for line in lines[:qtgmc])
+    assert lines[qtgmc + 1] == "clip = clip[2 * lead:clip.num_frames - 2 * tail]"
+    compile("\n".join(lines), "s.vpy", "exec")
+
+    assert follow.get_context(segments, 0, 12)["prev"] is None
+    assert follow.get_context(segments, 2, 12)["next"] is None
+
+
+def test_follow_capture_renders_behind_the_write_head(tmp_path):
+    spool = tmp_path / "follow" / "tape"
+    feed = MagicMock(returncode=0)
+    polls = iter([None, None, 0])
+    feed.poll.side_effect = lambda: next(polls, 0)
+    written = iter([3, 4])
+
+    def _grow(*args, **kwargs):
+        for i in range(next(written, 4)):
+            (spool / f"feed_{i:05d}.mkv").write_bytes(b"x")
+
+    def _concat(cmd, **kwargs):
+        Path(cmd[-1]).write_bytes(b"joined")
+        return MagicMock(returncode=0)
+
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.get_cache_dir', return_value=str(tmp_path / "follow")), \
+         patch('modules.pipeline.start_feed', return_value=feed), patch('modules.pipeline.stop_feed'), \
+         patch('modules.pipeline.time.sleep', side_effect=_grow), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(["vspipe"], STREAM)) as mock_prepare, \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True), \
+         patch('modules.pipeline.run_command', side_effect=_concat) as mock_concat, \
+         patch('modules.pipeline.log_info'):
+        assert pipeline.follow_capture(tmp_path / "tape.avi")
+
+    rendered = [c[0][0].name for c in mock_prepare.call_args_list]
+    assert rendered == [f"feed_{i:05d}.mkv" for i in range(4)]
+    # The first segment was rendered while the feed was still running, with its neighbour as context
+    assert mock_prepare.call_args_list[0][1]["context"]["next"].endswith("feed_00001.mkv")
+    assert (tmp_path / "tape_deinterlaced_prores.mov").read_bytes() == b"joined"
+    assert mock_concat.call_count == 1 and not spool.exists()
+
+
+def test_follow_capture_keeps_segments_on_failure(tmp_path):
+    feed = MagicMock(returncode=1)
+    feed.poll.return_value = 1
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.pipeline.start_feed', return_value=feed), patch('modules.pipeline.stop_feed'), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_error') as mock_error:
+        assert not pipeline.follow_capture(tmp_path / "tape.avi")
+    assert "not finished" in mock_error.call_args[0][0]
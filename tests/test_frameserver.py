@@ -0,0 +1,278 @@
+import sys
+import types
+import threading
+import importlib
+import subprocess
+import concurrent.futures
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import frameserver
+
+
+class _Format:
+    name = "YUV420P8"
+    num_planes = 3
+    bytes_per_sample = 1
+    subsampling_w = subsampling_h = 1
+
+
+class _Fps:
+    numerator = 25
+    denominator = 1
+
+
+class _Clip:
+    def __init__(self, frames, gated=False):
+        self.num_frames = frames
+        self.gated = gated
+        self.requested = []
+        self.width, self.height = 4, 2
+        self.fps = _Fps()
+        self.format = _Format()
+
+    def get_frame(self, n):
+        if self.gated:
+            assert _FAKE_VS.gate.wait(5)
+        frame = MagicMock()
+        frame.format = self.format
+        frame.__getitem__.side_effect = lambda p: bytes([n]) * (8 if p == 0 else 2)
+        return frame
+
+    def get_frame_async(self, n):
+        self.requested.append(n)
+        future = concurrent.futures.Future()
+        future.set_result(self.get_frame(n))
+        return future
+
+    def set_output(self):
+        _FAKE_VS._outputs[0] = self
+
+
+_FAKE_VS = types.ModuleType("vapoursynth")
+_FAKE_VS._outputs = {}
+_FAKE_VS.VideoNode = _Clip
+_FAKE_VS.VideoOutputTuple = type("VideoOutputTuple", (), {})
+_FAKE_VS.get_outputs = lambda: dict(_FAKE_VS._outputs)
+_FAKE_VS.clear_outputs = lambda: _FAKE_VS._outputs.clear()
+_FAKE_VS.make_clip = _Clip
+_FAKE_VS.core = SimpleNamespace(num_threads=2)
+_FAKE_VS.gate = threading.Event()
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Runs vspipe_native's frame server in a thread, with a stand-in vapoursynth module."""
+    with patch.dict(sys.modules, {"vapoursynth": _FAKE_VS}):
+        sys.modules.pop("vspipe_native", None)
+        native = importlib.import_module("vspipe_native")
+        ready = threading.Event()
+        port = {}
+
+        class _Stdout:
+            def write(self, text):
+                port["value"] = int(text.split()[1])
+                ready.set()
+
+            def flush(self):
+                pass
+
+        with patch.object(native.sys, "stdout", _Stdout()), patch.object(native.sys, "stderr", MagicMock()):
+            thread = threading.Thread(target=native.serve, args=(0,), daemon=True)
+            thread.start()
+            assert ready.wait(5)
+            process = MagicMock()
+            process.poll.return_value = None
+            process.wait.side_effect = lambda timeout=None: thread.join(timeout)
+            with patch.dict(frameserver._SERVER, {"process": process, "port": port["value"]}):
+                yield native
+                frameserver.stop_frame_server()
+            assert not thread.is_alive()
+        sys.modules.pop("vspipe_native", None)
+
+
+def _script(tmp_path, name, body):
+    path = tmp_path / name
+    path.write_text("import vapoursynth as vs\n" + body)
+    return path
+
+
+def test_info_and_render_roundtrip(server, tmp_path):
+    script = _script(tmp_path, "a.vpy", "leak = 'job-a'\nvs.make_clip(3).set_output()\n")
+    assert frameserver.request_info(script) == (3, 25.0, 4, 2, "YUV420P8")
+
+    conn, expected = frameserver.open_render(script)
+    assert expected == 3 * 12
+    sink = MagicMock()
+    written = []
+    sink.write.side_effect = lambda data: written.append(bytes(data))
+    assert frameserver.relay_frames(conn, sink) == 3 * 12
+    assert b"".join(written) == b"".join(bytes([n]) * 12 for n in range(3))
+    assert sink.close.called
+    # Outputs are reset after every render
+    assert _FAKE_VS._outputs == {}
+
+
+def test_jobs_do_not_share_state(server, tmp_path):
+    first = _script(tmp_path, "a.vpy", "leak = 1\nvs.make_clip(2).set_output()\n")
+    second = _script(tmp_path, "b.vpy", "assert 'leak' not in globals()\nvs.make_clip(5).set_output()\n")
+    assert frameserver.request_info(first)[0] == 2
+    assert frameserver.request_info(second)[0] == 5
+
+
+def test_connections_are_served_in_parallel(server, tmp_path):
+    _FAKE_VS.gate.clear()
+    slow = _script(tmp_path, "slow.vpy", "vs.make_clip(3, gated=True).set_output()\n")
+    fast = _script(tmp_path, "fast.vpy", "vs.make_clip(2).set_output()\n")
+    conn, _ = frameserver.open_render(slow)
+    # The slow render waits for its frames; another job is still answered meanwhile
+    assert frameserver.request_info(fast)[0] == 2
+    _FAKE_VS.gate.set()
+    written = []
+    sink = MagicMock()
+    sink.write.side_effect = lambda data: written.append(bytes(data))
+    assert frameserver.relay_frames(conn, sink) == 3 * 12
+    assert b"".join(written) == b"".join(bytes([n]) * 12 for n in range(3))
+
+
+def test_frames_requested_ahead_in_order(server):
+    clip = _Clip(5)
+    frames = server._frames_in_order(clip)
+    first = next(frames)
+    # core.num_threads requests are in flight before the first frame is used
+    assert clip.requested == [0, 1]
+    assert [first[0]] + [frame[0] for frame in frames] == [bytes([n]) * 8 for n in range(5)]
+    assert clip.requested == list(range(5))
+
+
+def test_script_errors_are_reported(server, tmp_path):
+    broken = _script(tmp_path, "bad.vpy", "raise ValueError('no plugin')\n")
+    empty = _script(tmp_path, "empty.vpy", "x = 1\n")
+    with patch('modules.frameserver.log_error') as mock_err:
+        assert frameserver.request_info(broken) is None
+        assert "no plugin" in mock_err.call_args[0][0]
+        assert frameserver.open_render(empty) == (None, None)
+        assert "No output node" in mock_err.call_args[0][0]
+    # The server keeps running after a failed job
+    good = _script(tmp_path, "good.vpy", "vs.make_clip(1).set_output()\n")
+    assert frameserver.request_info(good)[0] == 1
+
+
+def test_server_start_and_restart():
+    process = MagicMock()
+    process.stdout.readline.return_value = b"PORT 4242\n"
+    process.poll.return_value = None
+    with patch.dict(frameserver._SERVER, {"process": None, "port": None}), \
+         patch('modules.frameserver.subprocess.Popen', return_value=process) as mock_popen, \
+         patch('modules.frameserver.threading.Thread'), patch('modules.frameserver.log_info'):
+        assert frameserver.get_frame_server_port() == 4242
+        assert frameserver.get_frame_server_port() == 4242
+        assert mock_popen.call_count == 1
+        assert mock_popen.call_args[0][0][2:4] == ["--serve", "0"]
+        assert "--threads" in mock_popen.call_args[0][0] and "--cache" in mock_popen.call_args[0][0]
+
+        process.poll.return_value = 1
+        frameserver.get_frame_server_port()
+        assert mock_popen.call_count == 2
+
+
+def test_server_start_failures():
+    process = MagicMock()
+    process.stdout.readline.return_value = b"ModuleNotFoundError: vapoursynth\n"
+    with patch.dict(frameserver._SERVER, {"process": None, "port": None}), patch('modules.frameserver.log_error'):
+        with patch('modules.frameserver.subprocess.Popen', return_value=process):
+            assert frameserver.get_frame_server_port() is None
+        assert process.kill.called
+        with patch('modules.frameserver.subprocess.Popen', side_effect=OSError("nope")):
+            assert frameserver._request("info", "x.vpy") == (None, None)
+
+
+def test_stop_kills_unresponsive_server():
+    process = MagicMock()
+    process.poll.return_value = None
+    process.wait.side_effect = subprocess.TimeoutExpired("x", 5)
+    with patch.dict(frameserver._SERVER, {"process": process, "port": 1}), \
+         patch('modules.frameserver.socket.create_connection', side_effect=OSError):
+        frameserver.stop_frame_server()
+    assert process.kill.called
+    frameserver.stop_frame_server()  # Nothing running
+
+
+def test_relay_survives_closed_encoder():
+    conn = MagicMock()
+    conn.recv_into.return_value = 10
+    dest = MagicMock()
+    dest.write.side_effect = BrokenPipeError
+    dest.close.side_effect = OSError
+    assert frameserver.relay_frames(conn, dest) == 0
+    assert conn.close.called
+
+
+def test_pipeline_uses_frame_server(tmp_path):
+    script = tmp_path / "s.vpy"
+    with patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.frame_server_enabled', return_value=True), \
+         patch('modules.pipeline.request_info', return_value=(100, 25.0, 720, 576, "YUV420P16")), \
+         patch('modules.pipeline.get_vpy_info') as mock_info:
+        cmd, stream = pipeline._prepare_vs_stream(tmp_path / "a.mp4", script)
+    assert not mock_info.called
+    assert cmd == [frameserver.FRAME_SERVER, str(script)]
+    assert stream["frames"] == 100 and stream["pixel_format"] == "yuv420p16le"
+
+    p_ffmpeg = MagicMock()
+    p_ffmpeg.stderr = None
+    p_ffmpeg.returncode = p_ffmpeg.poll.return_value = 0
+    with patch('modules.pipeline.open_render', return_value=(MagicMock(), 400)), \
+         patch('modules.pipeline.relay_frames', return_value=400) as mock_relay, \
+         patch('modules.pipeline.subprocess.Popen', return_value=p_ffmpeg) as mock_popen, \
+         patch('modules.pipeline.log_info'):
+        assert pipeline._run_encoding_pipeline(cmd, ["ffmpeg"], script, 4.0)
+    assert mock_popen.call_count == 1
+    assert mock_popen.call_args[1]["stdin"] == subprocess.PIPE
+    assert mock_relay.call_args[0][1] is p_ffmpeg.stdin
+
+    # A stream cut short by a server error fails the job even though FFmpeg exits 0
+    with patch('modules.pipeline.open_render', return_value=(MagicMock(), 400)), \
+         patch('modules.pipeline.relay_frames', return_value=120), \
+         patch('modules.pipeline.subprocess.Popen', return_value=p_ffmpeg), \
+         patch('modules.pipeline.log_error') as mock_err:
+        assert not pipeline._run_encoding_pipeline(cmd, ["ffmpeg"], script, 4.0)
+    assert "120 of 400 bytes" in mock_err.call_args[0][0]
+
+    with patch('modules.pipeline.open_render', return_value=(None, None)), \
+         patch('modules.pipeline.subprocess.Popen') as mock_popen:
+        assert not pipeline._run_encoding_pipeline(cmd, ["ffmpeg"], script, 4.0)
+    assert not mock_popen.called
+
+
+def test_server_scripts_leave_core_settings_to_the_server(tmp_path):
+    script = tmp_path / "s.vpy"
+    with patch('modules.pipeline.create_vpy_script') as mock_create, \
+         patch('modules.pipeline.frame_server_enabled', return_value=True), \
+         patch('modules.pipeline.request_info', return_value=None), \
+         patch('modules.pipeline.get_vpy_info', return_value=(100, 25.0, 720, 576, "YUV420P16")):
+        cmd, _ = pipeline._prepare_vs_stream(tmp_path / "a.mp4", script)
+    # The server could not take the job: the vspipe fallback gets a script with core settings
+    assert [c[1]["shared_core"] for c in mock_create.call_args_list] == [True, False]
+    assert cmd[0] != frameserver.FRAME_SERVER
+
+    from modules.vspipe import _get_script_preamble
+    settings = {"cpu_threads": 3, "ram_cache_mb": 100, "use_gpu_opencl": False}
+    assert "core.num_threads = 3" in _get_script_preamble(settings)
+    assert not any("core.num_threads" in line for line in _get_script_preamble(settings, shared_core=True))
+
+
+def test_server_applies_core_settings_once(tmp_path):
+    with patch.dict(sys.modules, {"vapoursynth": _FAKE_VS}):
+        sys.modules.pop("vspipe_native", None)
+        native = importlib.import_module("vspipe_native")
+        with patch.object(native.socket, "create_server", side_effect=OSError("stop")), \
+             patch.object(native.sys, "argv", ["vspipe_native.py", "--serve", "0", "--threads", "6", "--cache", "512"]):
+            with pytest.raises(OSError):
+                native.main()
+        assert (_FAKE_VS.core.num_threads, _FAKE_VS.core.max_cache_size) == (6, 512)
+        _FAKE_VS.core.num_threads = 2
+    sys.modules.pop("vspipe_native", None)
@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+from unittest.mock import patch
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import history
+
+@contextmanager
+def _ffprobe(duration=600.0):
+    """A 25 fps PAL source of the given length, as ffprobe would report it."""
+    with patch('modules.probe.get_duration', return_value=duration) as mock_duration, \
+         patch('modules.probe.get_fps', return_value=25.0), \
+         patch('modules.probe.get_codec_name', return_value="pcm_s16le"), \
+         patch('modules.probe.get_resolution', return_value=(720, 576)):
+        yield mock_duration
+
+
+@pytest.fixture(autouse=True)
+def history_db(tmp_path):
+    with patch.dict(history.CONFIG, {"history_path": str(tmp_path / "history.sqlite")}), \
+         patch('modules.history.get_machine', return_value="node1"), \
+         patch('modules.history.get_preset', return_value="Very Slow"):
+        yield
+
+
+def test_record_and_predict():
+    assert history.predict(["prores"], 720, 576) is None
+    history.record_run(["prores"], 3000, 100.0, 720, 576, output_bytes=3000 * 1000)
+    history.record_run(["prores"], 3000, 300.0, 720, 576)
+    history.record_run(["prores"], 10, 0.5, 720, 576)  # too short to count
+
+    exact = history.predict(["prores"], 720, 576)
+    assert exact["basis"] == "exact" and exact["runs"] == 2
+    assert exact["fps"] == pytest.approx(20.0) and exact["bytes_per_frame"] == pytest.approx(1000)
+
+    # Twice the pixels: half the speed, twice the size
+    scaled = history.predict(["prores"], 1440, 576)
+    assert scaled["basis"] == "scaled" and scaled["fps"] == pytest.approx(10.0)
+    assert scaled["bytes_per_frame"] == pytest.approx(2000)
+
+    other = history.predict(["av1", "prores"], 720, 576)
+    assert other["basis"] == "machine" and other["bytes_per_frame"] is None
+
+
+def test_probe_is_cached_by_fingerprint(tmp_path):
+    source = tmp_path / "tape.avi"
+    source.write_bytes(b"video")
+    with _ffprobe() as mock_duration:
+        first = history.probe_source(source)
+        second = history.probe_source(source)
+    assert first == second == {"frames": 30000, "fps": 50.0, "width": 720, "height": 576}
+    assert mock_duration.call_count == 2  # video + audio, first call only
+
+    source.write_bytes(b"other video")
+    with _ffprobe(duration=0.0):
+        assert history.probe_source(source) is None
+
+
+def test_get_resolution():
+    from modules import utils
+    with patch('subprocess.check_output', return_value=b"720,576\n"):
+        assert utils.get_resolution("t.avi") == (720, 576)
+    with patch('subprocess.check_output', return_value=b""):
+        assert utils.get_resolution("t.avi") == (None, None)
+
+
+def test_schedule():
+    assert history.schedule([10, 20, 30], 1) == [10, 30, 60]
+    assert history.schedule([10, 20, 30], 2) == [10, 20, 40]
+
+
+def test_throughput_meter_smooths_rate():
+    meter = history.ThroughputMeter(alpha=0.5, min_interval=0)
+    assert meter.update(0, now=0.0) is None
+    assert meter.update(100, now=1.0) == 100
+    assert meter.update(150, now=2.0) == 75  # 0.5 * 50 + 0.5 * 100
+    assert meter.update(150, now=3.0) == 75  # no new frames
+    assert meter.eta(150, 900) == 10
+    assert history.ThroughputMeter().eta(0, 100) is None
+
+
+def test_plan_queue_predicts_per_file(tmp_path):
+    a, b, done = tmp_path / "a.avi", tmp_path / "b.avi", tmp_path / "done.avi"
+    for path in (a, b, done):
+        path.write_bytes(path.name.encode())
+    (tmp_path / "done_deinterlaced_prores.mov").write_bytes(b"x")
+    history.record_run(["prores"], 5000, 100.0, 720, 576, output_bytes=5000 * 2000)
+
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch.dict(pipeline.CONFIG, {"concurrent_jobs": 1}), \
+         _ffprobe(), patch('modules.pipeline.log_info') as mock_log:
+        rows = pipeline.plan_queue([a, b, done])
+
+    assert rows[0]["seconds"] == pytest.approx(600.0) and rows[0]["bytes"] == 30000 * 2000
+    assert rows[1]["finish"] - rows[0]["finish"] == pytest.approx(600.0)
+    assert rows[2]["encoders"] == []
+    output = "\n".join(call[0][0] for call in mock_log.call_args_list)
+    assert "0:10:00" in output and "0:20:00 render" in output and "done" in output
+
+
+def test_plan_queue_without_history(tmp_path):
+    source = tmp_path / "a.avi"
+    source.write_bytes(b"a")
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         _ffprobe(), patch('modules.pipeline.log_info') as mock_log:
+        rows = pipeline.plan_queue([source])
+    assert rows[0]["seconds"] is None and rows[0]["bytes"] > 0
+    assert "no throughput history" in mock_log.call_args[0][0]
+
+
+def test_process_video_records_throughput():
+    input_p = Path("tape.mp4")
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch.dict(pipeline.CONFIG, {"throughput_history": True}), \
+         patch.object(Path, 'exists', lambda self: self == input_p), \
+         patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_debug'), patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True) as mock_run, \
+         patch('modules.pipeline.record_run') as mock_record:
+        pipeline.process_video(input_p)
+
+    assert mock_run.call_args[1]["total_frames"] == 3000
+    encoders, frames, _, width, height, _ = mock_record.call_args[0]
+    assert (encoders, frames, width, height) == (["prores"], 3000, 720, 576)
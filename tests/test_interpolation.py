@@ -0,0 +1,105 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from modules import interpolation
+from modules.vspipe import create_probe_script, create_vpy_script, is_plugin_missing
+
+SETTINGS = {"cpu_threads": 4, "ram_cache_mb": 2000, "use_gpu_opencl": True, "gpu_device_index": 1}
+
+
+@pytest.fixture(autouse=True)
+def probe_cache(tmp_path):
+    with patch('modules.interpolation.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.interpolation.is_plugin_missing', return_value=False), \
+         patch('modules.interpolation.log_info'):
+        yield tmp_path
+
+
+def test_choose_fastest_working_backend():
+    assert interpolation.choose_backend({"znedi3": 40.0, "nnedi3": 25.0, "nnedi3cl": None}) == "znedi3"
+    assert interpolation.choose_backend({"znedi3": 40.0, "nnedi3cl": 90.0}) == "nnedi3cl"
+    assert interpolation.choose_backend({"znedi3": None}) is None
+
+
+def test_probe_backend_times_render():
+    with patch('modules.interpolation.shutil.which', return_value="/bin/vspipe"), \
+         patch('modules.interpolation.create_probe_script') as mock_script, \
+         patch('modules.interpolation.get_vspipe_env', return_value={}), \
+         patch('modules.interpolation.time.monotonic', side_effect=[0.0, 2.0]), \
+         patch('modules.interpolation.subprocess.run', return_value=MagicMock(returncode=0)):
+        assert interpolation.probe_backend("nnedi3cl", SETTINGS, frames=30) == 30.0
+    assert mock_script.call_args[0][1]["use_gpu_opencl"] is True
+
+    failed = MagicMock(returncode=1, stderr=b"No OpenCL platform found")
+    with patch('modules.interpolation.shutil.which', return_value="/bin/vspipe"), \
+         patch('modules.interpolation.create_probe_script'), \
+         patch('modules.interpolation.get_vspipe_env', return_value={}), \
+         patch('modules.interpolation.subprocess.run', return_value=failed):
+        assert interpolation.probe_backend("nnedi3cl", SETTINGS) is None
+    with patch('modules.interpolation.shutil.which', return_value=None):
+        assert interpolation.probe_backend("znedi3", SETTINGS) is None
+
+
+def test_auto_selection_is_measured_once(probe_cache):
+    fps = {"znedi3": 40.0, "nnedi3": 20.0, "nnedi3cl": None}
+    settings = dict(SETTINGS)
+    with patch.dict(interpolation.CONFIG, {"interpolation_backend": "auto"}), \
+         patch('modules.interpolation.PERF_PROFILE', "auto"), \
+         patch('modules.interpolation.probe_backend', side_effect=lambda b, s, f: fps[b]) as mock_probe:
+        assert interpolation.select_interpolation_backend(settings) == "znedi3"
+        assert interpolation.select_interpolation_backend(dict(SETTINGS)) == "znedi3"
+    assert mock_probe.call_count == 3
+    assert settings["use_gpu_opencl"] is False and settings["interpolation"] == "znedi3"
+
+
+def test_fallback_and_configured_backend():
+    settings = dict(SETTINGS, use_gpu_opencl=False)
+    with patch.dict(interpolation.CONFIG, {"interpolation_backend": "auto"}), \
+         patch('modules.interpolation.PERF_PROFILE', "auto"), \
+         patch('modules.interpolation.probe_backend', return_value=None) as mock_probe:
+        assert interpolation.select_interpolation_backend(settings) == "znedi3"
+        # The failed probe is cached like a successful one
+        assert interpolation.select_interpolation_backend(dict(settings)) == "znedi3"
+    assert mock_probe.call_count == 3
+
+    settings = dict(SETTINGS, use_gpu_opencl=False)
+    with patch.dict(interpolation.CONFIG, {"interpolation_backend": "nnedi3cl"}):
+        assert interpolation.select_interpolation_backend(settings) == "nnedi3cl"
+    assert settings["use_gpu_opencl"] is True
+
+
+def test_znedi3_skipped_without_plugin():
+    settings = dict(SETTINGS, use_gpu_opencl=False)
+    with patch.dict(interpolation.CONFIG, {"interpolation_backend": "auto"}), \
+         patch('modules.interpolation.PERF_PROFILE', "auto"), \
+         patch('modules.interpolation.is_plugin_missing', return_value=True), \
+         patch('modules.interpolation.probe_backend', return_value=None) as mock_probe:
+        assert interpolation.select_interpolation_backend(settings) == "nnedi3"
+    assert [c[0][0] for c in mock_probe.call_args_list] == ["nnedi3", "nnedi3cl"]
+
+
+def test_plugin_check_only_for_portable_install(tmp_path):
+    with patch('modules.vspipe.get_project_root', return_value=str(tmp_path)):
+        assert not is_plugin_missing("vsznedi3.dll")  # No portable folder: plugins autoload
+        plugins = tmp_path / ".venv" / "vs" / "plugins"
+        plugins.mkdir(parents=True)
+        assert is_plugin_missing("vsznedi3.dll")
+        (plugins / "vsznedi3.dll").write_bytes(b"")
+        assert not is_plugin_missing("vsznedi3.dll")
+
+
+def test_scripts_follow_backend(tmp_path):
+    probe = tmp_path / "probe.vpy"
+    create_probe_script(str(probe), interpolation.get_backend_settings("nnedi3cl", SETTINGS), 30)
+    text = probe.read_text()
+    assert "length=30" in text and "'opencl': True" in text and "'device': 1" in text
+    compile(text, "probe.vpy", "exec")
+
+    out = tmp_path / "s.vpy"
+    with patch('modules.vspipe.get_fps', return_value=25.0), \
+         patch('modules.vspipe.os.path.exists', return_value=True):
+        create_vpy_script(str(tmp_path / "in.mp4"), str(out), "QTGMC",
+                          override_settings=interpolation.get_backend_settings("nnedi3", SETTINGS))
+    text = out.read_text()
+    assert "vsznedi3.dll" not in text and "libnnedi3.dll" in text and "'opencl'" not in text
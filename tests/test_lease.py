@@ -0,0 +1,171 @@
+import os
+import json
+import errno
+import time
+import threading
+from unittest.mock import patch
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import lease
+
+
+def _source(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    return src
+
+
+def test_acquire_and_release(tmp_path):
+    src = _source(tmp_path)
+    with patch.dict('modules.lease.CONFIG', {"lease_heartbeat_seconds": 60}):
+        held = lease.acquire_lease(src)
+    lease_path = tmp_path / "tape.mp4.lease"
+    content = json.loads(lease_path.read_text())
+    assert content["pid"] == os.getpid() and content["token"] == held.token
+    assert held.owned()
+    held.release()
+    assert not lease_path.exists()
+
+
+def test_only_one_instance_wins(tmp_path):
+    src = _source(tmp_path)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def _claim():
+        barrier.wait()
+        results.append(lease.acquire_lease(src))
+
+    with patch.dict('modules.lease.CONFIG', {"lease_heartbeat_seconds": 60}), patch('modules.lease.log_info'):
+        threads = [threading.Thread(target=_claim) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    held = [r for r in results if r]
+    assert len(held) == 1
+    held[0].release()
+
+
+def test_fresh_foreign_lease_is_respected(tmp_path):
+    src = _source(tmp_path)
+    lease_path = tmp_path / "tape.mp4.lease"
+    lease_path.write_text(json.dumps({"host": "other-box", "pid": 1, "token": "x"}))
+    with patch('modules.lease.log_info') as mock_log:
+        assert lease.acquire_lease(src) is None
+    assert "other-box" in mock_log.call_args[0][0]
+    assert json.loads(lease_path.read_text())["token"] == "x"
+
+
+def test_stale_lease_is_reclaimed(tmp_path):
+    src = _source(tmp_path)
+    lease_path = tmp_path / "tape.mp4.lease"
+    lease_path.write_text(json.dumps({"host": "crashed-box", "pid": 1, "token": "x"}))
+    old = time.time() - 1000
+    os.utime(lease_path, (old, old))
+    with patch.dict('modules.lease.CONFIG', {"lease_timeout": 300, "lease_heartbeat_seconds": 60}), \
+         patch('modules.lease.log_info') as mock_log:
+        held = lease.acquire_lease(src)
+    assert held and "crashed-box" in mock_log.call_args[0][0]
+    assert json.loads(lease_path.read_text())["token"] == held.token
+    assert [p.name for p in tmp_path.iterdir() if "lease" in p.name] == ["tape.mp4.lease"]
+    held.release()
+
+
+def test_dead_local_pid_is_stale(tmp_path):
+    lease_path = tmp_path / "a.lease"
+    lease_path.write_text("{}")
+    holder = {"host": lease.socket.gethostname(), "pid": 12345}
+    with patch('modules.lease._pid_alive', return_value=False):
+        assert lease.is_stale(lease_path, holder, timeout=300)
+    with patch('modules.lease._pid_alive', return_value=True):
+        assert not lease.is_stale(lease_path, holder, timeout=300)
+    assert lease.is_stale(tmp_path / "missing", None, timeout=300)
+    assert lease._pid_alive(os.getpid())
+
+
+def test_break_lease_puts_back_a_fresh_lease(tmp_path):
+    # Another node took the lease over between our staleness check and the rename
+    lease_path = tmp_path / "tape.mp4.lease"
+    lease_path.write_text(json.dumps({"host": "fast-box", "pid": 1, "token": "new"}))
+    assert lease._break_lease(lease_path, "mine", timeout=300) is False
+    assert json.loads(lease_path.read_text())["token"] == "new"
+    assert len(list(tmp_path.iterdir())) == 1
+    lease._break_lease(tmp_path / "gone.lease", "mine", timeout=300)
+
+    # Shares without hard links: the fresh lease is renamed back, never deleted
+    with patch('modules.lease.os.link', side_effect=OSError(errno.EPERM, "not supported")):
+        assert lease._break_lease(lease_path, "mine", timeout=300) is False
+    assert json.loads(lease_path.read_text())["token"] == "new"
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Any other link failure leaves the moved lease where it is
+    with patch('modules.lease.os.link', side_effect=OSError(errno.EIO, "io")), \
+         patch('modules.lease.log_error'):
+        assert lease._break_lease(lease_path, "mine", timeout=300) is False
+    assert not lease_path.exists()
+    (tmp_path / "tape.mp4.lease.mine").rename(lease_path)
+
+
+def test_break_lease_keeps_a_lease_created_during_takeover(tmp_path):
+    lease_path = tmp_path / "tape.mp4.lease"
+    lease_path.write_text(json.dumps({"host": "fast-box", "pid": 1, "token": "new"}))
+    real_rename = os.rename
+
+    def _rename(src, dst):
+        real_rename(src, dst)
+        if Path(dst).name.endswith(".mine"):
+            # A third node claims the source right after our rename
+            lease_path.write_text(json.dumps({"host": "third-box", "pid": 2, "token": "third"}))
+
+    with patch('modules.lease.os.rename', side_effect=_rename), patch('modules.lease.log_info'):
+        assert lease._break_lease(lease_path, "mine", timeout=300) is False
+    assert json.loads(lease_path.read_text())["token"] == "third"
+    assert json.loads((tmp_path / "tape.mp4.lease.mine").read_text())["token"] == "new"
+
+
+def test_heartbeat_refreshes_and_detects_takeover(tmp_path):
+    src = _source(tmp_path)
+    lost = threading.Event()
+    with patch.dict('modules.lease.CONFIG', {"lease_heartbeat_seconds": 0.05}):
+        held = lease.acquire_lease(src, on_lost=lost.set)
+    old = time.time() - 100
+    os.utime(held.path, (old, old))
+    time.sleep(0.2)
+    assert time.time() - os.stat(held.path).st_mtime < 50
+
+    held.path.write_text(json.dumps({"token": "thief"}))
+    with patch('modules.lease.log_error') as mock_err:
+        time.sleep(0.2)
+        held.release()
+    assert held.lost and lost.is_set() and "Lease lost" in mock_err.call_args[0][0]
+    assert held.path.exists()  # Not ours any more, so not deleted
+
+
+def test_unwritable_folder(tmp_path):
+    with patch('modules.lease.os.open', side_effect=PermissionError("ro")), patch('modules.lease.log_error'):
+        assert lease.acquire_lease(tmp_path / "tape.mp4") is None
+
+
+def test_process_video_skips_claimed_source(tmp_path):
+    src = _source(tmp_path)
+    with patch('modules.pipeline.leases_enabled', return_value=True), \
+         patch('modules.pipeline.acquire_lease', return_value=None), \
+         patch('modules.pipeline._process_claimed') as mock_job:
+        pipeline.process_video(src)
+    assert not mock_job.called
+
+    held = lease.SourceLease(Path(tmp_path / "x.lease"), "t", 60)
+    with patch('modules.pipeline.leases_enabled', return_value=True), \
+         patch('modules.pipeline.acquire_lease', return_value=held) as mock_acquire, \
+         patch.object(held, 'release') as mock_release, \
+         patch('modules.pipeline._process_claimed', side_effect=RuntimeError("boom")) as mock_job:
+        try:
+            pipeline.process_video(src)
+        except RuntimeError:
+            pass
+    assert mock_release.called
+    # Losing the lease cancels the job
+    mock_acquire.call_args[1]["on_lost"]()
+    assert mock_job.call_args[0][1].is_set()
@@ -0,0 +1,125 @@
+import os
+from unittest.mock import patch
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import manifest
+
+
+@pytest.fixture
+def db(tmp_path):
+    with patch.dict('modules.manifest.CONFIG', {"completion_manifest": True,
+                                                "manifest_path": str(tmp_path / "manifest.sqlite")}):
+        yield tmp_path
+
+
+def test_settings_hash_tracks_settings():
+    base = manifest.get_settings_hash("prores", ["-c:v", "prores_ks"])
+    assert base == manifest.get_settings_hash("prores", ["-c:v", "prores_ks"])
+    assert base != manifest.get_settings_hash("av1", ["-c:v", "prores_ks"])
+    with patch('modules.manifest.AUDIO_CODEC', 'flac'):
+        assert base != manifest.get_settings_hash("prores", ["-c:v", "prores_ks"])
+
+
+def test_record_and_stat_check(db):
+    src = db / "tape.mp4"
+    src.write_bytes(b"s" * 100)
+    out = db / "tape_deinterlaced_prores.mov"
+    assert manifest.record_output(out, src, "h1", "prores") is False  # nothing to record yet
+    out.write_bytes(b"o" * 100)
+
+    assert manifest.is_output_complete(out, "h1") is None
+    assert manifest.record_output(out, src, "h1", "prores", frames=300) is True
+    row = manifest.lookup_output(out)
+    assert row["frames"] == 300 and row["source_path"] == str(src) and row["size"] == 100
+    assert manifest.is_output_complete(out, "h1") is True
+    with patch('modules.manifest.log_info') as mock_info:
+        assert manifest.is_output_complete(out, "other") is True
+        assert "different settings" in mock_info.call_args[0][0]
+
+    out.write_bytes(b"o" * 50)  # changed behind our back
+    assert manifest.is_output_complete(out, "h1") is None
+    assert manifest.refresh_output_stat(out) is True
+    assert manifest.is_output_complete(out, "h1") is True
+    out.unlink()
+    assert manifest.is_output_complete(out, "h1") is None
+    assert manifest.refresh_output_stat(out) is False
+    assert manifest.known_outputs() == {str(out)}
+
+
+def _process(src):
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.get_duration', return_value=60.0) as mock_probe, \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline') as mock_run:
+        def _render(vspipe_cmd, ffmpeg_cmd, *args, **kwargs):
+            Path(ffmpeg_cmd[-1]).write_bytes(b"rendered")
+            return True
+        mock_run.side_effect = _render
+        pipeline.process_video(src)
+    return mock_run, mock_probe
+
+
+def test_process_video_records_and_skips_without_probe(db):
+    src = db / "tape.mp4"
+    src.write_bytes(b"v" * 100)
+    mock_run, _ = _process(src)
+    assert mock_run.called
+    out = db / "tape_deinterlaced_prores.mov"
+    assert manifest.lookup_output(out)["frames"] == 300
+
+    mock_run, mock_probe = _process(src)
+    assert not mock_run.called
+    assert not mock_probe.called  # decided from the manifest + one stat
+
+
+def test_process_video_backfills_existing_output(db):
+    src = db / "tape.mp4"
+    src.write_bytes(b"v" * 100)
+    out = db / "tape_deinterlaced_prores.mov"
+    out.write_bytes(b"old render")
+    mock_run, mock_probe = _process(src)
+    assert not mock_run.called and mock_probe.called
+    assert manifest.lookup_output(out)["frames"] is None
+    _, mock_probe = _process(src)
+    assert not mock_probe.called
+
+
+def test_scan_directory_skips_recorded_outputs(db):
+    src = db / "tape.mp4"
+    src.write_bytes(b"v")
+    renamed = db / "tape_final.mp4"  # output renamed by the user: no name heuristic matches
+    renamed.write_bytes(b"o")
+    manifest.record_output(renamed, src, "h", "prores")
+    with patch('modules.pipeline.log_info'):
+        found = pipeline._scan_directory(db, {".mp4"})
+    assert found == [src]
+
+
+def test_remux_refreshes_manifest(db):
+    src = db / "tape.mp4"
+    src.write_bytes(b"v")
+    out = db / "tape_deinterlaced_prores.mov"
+    out.write_bytes(b"old")
+    manifest.record_output(out, src, "h", "prores")
+
+    def _run(cmd, **kwargs):
+        Path(cmd[-1]).write_bytes(b"new audio")
+        return type("P", (), {"returncode": 0})()
+
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.get_duration', return_value=10.0), \
+         patch('modules.pipeline._analyze_audio_sync', return_value=(1.0, None, 0.0)), \
+         patch('modules.pipeline._build_remux_cmd', side_effect=lambda i, o, p, *a: ["ffmpeg", str(p)]), \
+         patch('modules.pipeline.run_command', side_effect=_run), \
+         patch('modules.pipeline.log_info'):
+        assert pipeline.remux_video(src) is True
+    assert manifest.lookup_output(out)["size"] == os.path.getsize(out)
+    assert manifest.is_output_complete(out) is True
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import memory
+
+SETTINGS = {"memory_min_free_mb": 2000, "memory_min_cache_mb": 1000, "memory_encoder_mb": 1500,
+            "memory_poll_seconds": 0.05}
+
+
+@pytest.fixture(autouse=True)
+def governor_state():
+    memory._JOBS.clear()
+    memory._STATS.update(peak_rss={}, pressure=False)
+    with patch.dict(memory.CONFIG, SETTINGS), patch('modules.memory._start_monitor'), \
+         patch('modules.memory.log_info'):
+        yield
+    memory._JOBS.clear()
+    memory._LOCAL.job = None
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+def test_proc_readers():
+    assert memory.get_available_mb() > 0
+    assert memory.get_rss_mb(os.getpid()) > 0
+    assert memory.get_rss_mb(999999999) is None
+
+
+def test_budget_follows_available_memory():
+    with patch('modules.memory.get_available_mb', return_value=40000):
+        assert memory.reserve_memory("a", 16000) == 16000
+    assert memory._JOBS["a"]["grant"] == 16000 + 1500
+
+    # Job a has not filled its cache yet: its promise counts against job b
+    with patch('modules.memory.get_available_mb', return_value=40000), \
+         patch('modules.memory.get_rss_mb', return_value=None):
+        budget = memory.reserve_memory("b", 48000)
+    assert budget == 40000 - 17500 - 2000 - 1500
+
+    memory.release_memory("a")
+    memory.release_memory("b")
+    assert memory._JOBS == {}
+
+
+def test_single_job_never_waits():
+    with patch('modules.memory.get_available_mb', return_value=500):
+        assert memory.reserve_memory("only", 8000) == 1000
+
+
+def test_unknown_memory_keeps_configured_cache():
+    with patch('modules.memory.get_available_mb', return_value=None):
+        assert memory.reserve_memory("x", 8000) == 8000
+
+
+def test_new_job_is_held_until_memory_frees():
+    available = {"mb": 3000}
+    memory._JOBS["running"] = {"grant": 0, "pids": {}}
+    result = {}
+
+    def _start():
+        result["budget"] = memory.reserve_memory("waiting", 8000)
+
+    with patch('modules.memory.get_available_mb', side_effect=lambda: available["mb"]):
+        thread = threading.Thread(target=_start)
+        thread.start()
+        time.sleep(0.2)
+        assert thread.is_alive()
+        available["mb"] = 9000
+        thread.join(timeout=2)
+    assert result["budget"] == 9000 - 2000 - 1500
+
+
+def test_tracking_and_sampling():
+    with patch('modules.memory.get_available_mb', return_value=40000):
+        memory.reserve_memory("job", 4000)
+    memory.track_process("ffmpeg", 111)
+    memory.get_process_tracker()("vspipe", 222)
+    with patch('modules.memory.get_rss_mb', side_effect=lambda pid: {111: 2500}.get(pid)), \
+         patch('modules.memory.get_available_mb', return_value=1000):
+        available, children = memory.sample()
+    assert available == 1000 and children == [("job", "ffmpeg", 111, 2500)]
+    assert memory._JOBS["job"]["pids"] == {111: "ffmpeg"}  # vspipe exited
+    assert memory._encoder_estimate() == 2500
+
+    memory._check_pressure(1000)
+    assert memory._STATS["pressure"] is True
+    memory._check_pressure(5000)
+    assert memory._STATS["pressure"] is False
+
+    memory.release_memory("job")
+    assert memory.get_process_tracker() is None
+
+
+def test_process_video_uses_governed_cache():
+    input_p = Path("tape.mp4")
+    with patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch.dict(pipeline.CONFIG, {"memory_governor": True}), \
+         patch.object(Path, 'exists', lambda self: self == input_p), \
+         patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script') as mock_script, \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_debug'), patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True), \
+         patch('modules.pipeline.reserve_memory', return_value=1234) as mock_reserve, \
+         patch('modules.pipeline.release_memory') as mock_release:
+        pipeline.process_video(input_p)
+
+    assert mock_reserve.call_args[0][0] == str(input_p)
+    assert mock_script.call_args[1]["override_settings"]["ram_cache_mb"] == 1234
+    mock_release.assert_called_once_with(str(input_p))
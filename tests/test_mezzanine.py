@@ -0,0 +1,156 @@
+import os
+import json
+from unittest.mock import patch
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import mezzanine
+from modules.config import get_cache_dir
+from modules.utils import file_fingerprint
+
+
+def _settings(opencl=False):
+    return {"cpu_threads": 4, "ram_cache_mb": 2000, "use_gpu_opencl": opencl, "gpu_device_index": 0}
+
+
+def test_file_fingerprint_content_based(tmp_path):
+    a = tmp_path / "a.mp4"
+    b = tmp_path / "b.mp4"
+    a.write_bytes(b"x" * 5000)
+    b.write_bytes(b"x" * 5000)
+    assert file_fingerprint(str(a), sample_bytes=1024) == file_fingerprint(str(b), sample_bytes=1024)
+    b.write_bytes(b"x" * 4999 + b"y")
+    assert file_fingerprint(str(a), sample_bytes=1024) != file_fingerprint(str(b), sample_bytes=1024)
+
+
+def test_get_cache_dir_uses_config(tmp_path):
+    with patch.dict('modules.config.CONFIG', {"cache_dir": str(tmp_path)}):
+        path = get_cache_dir("mezzanine")
+    assert path == os.path.join(str(tmp_path), "mezzanine")
+    assert os.path.isdir(path)
+
+
+def test_mezzanine_key_tracks_deinterlace_settings(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v" * 2048)
+    key_cpu = mezzanine.get_mezzanine_key(src, _settings(False))
+    assert key_cpu == mezzanine.get_mezzanine_key(src, _settings(False))
+    assert key_cpu != mezzanine.get_mezzanine_key(src, _settings(True))
+    assert key_cpu != mezzanine.get_mezzanine_key(src, dict(_settings(False), interpolation="nnedi3"))
+    with patch('modules.mezzanine.FIELD_ORDER', "bff"):
+        assert key_cpu != mezzanine.get_mezzanine_key(src, _settings(False))
+    with patch.dict('modules.config.CONFIG', {"qtgmc_settings": {"Preset": "Slower"}}):
+        assert key_cpu != mezzanine.get_mezzanine_key(src, _settings(False))
+
+
+def test_commit_find_and_evict(tmp_path):
+    with patch.dict('modules.mezzanine.CONFIG', {"mezzanine_dir": str(tmp_path), "mezzanine_max_gb": 1}):
+        assert mezzanine.find_mezzanine("k1") is None
+        assert mezzanine.commit_mezzanine("k1", {"frames": 10}) is None  # no part file yet
+
+        mezzanine.get_mezzanine_part_path("k1").write_bytes(b"0" * 100)
+        stored = mezzanine.commit_mezzanine("k1", {"frames": 10, "fps": 30.0})
+        assert stored == tmp_path / "k1.mkv"
+        info = mezzanine.find_mezzanine("k1")
+        assert info["frames"] == 10 and info["path"] == str(stored)
+
+        # Older entry gets evicted first, the newest is kept
+        (tmp_path / "old.mkv").write_bytes(b"0" * 100)
+        (tmp_path / "old.json").write_text("{}")
+        os.utime(tmp_path / "old.mkv", (1, 1))
+        (tmp_path / "x_part.mkv").write_bytes(b"0" * 100)
+        evicted = mezzanine.evict_mezzanines(150, keep=stored)
+        assert evicted == [tmp_path / "old.mkv"]
+        assert not (tmp_path / "old.json").exists()
+        assert (tmp_path / "x_part.mkv").exists()
+
+
+def test_find_mezzanine_bad_metadata(tmp_path):
+    with patch.dict('modules.mezzanine.CONFIG', {"mezzanine_dir": str(tmp_path)}):
+        (tmp_path / "bad.mkv").write_bytes(b"0")
+        (tmp_path / "bad.json").write_text("{not json")
+        assert mezzanine.find_mezzanine("bad") is None
+
+
+def test_mezzanine_codec_args():
+    with patch.dict('modules.mezzanine.CONFIG', {"mezzanine_slices": 24}):
+        args = mezzanine.get_mezzanine_codec_args()
+    assert args[args.index("-c:v") + 1] == "ffv1"
+    assert args[args.index("-slices") + 1] == "24"
+
+
+def _run_process(tmp_path, cached_info, run_result=True):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v" * 4096)
+    with patch('modules.pipeline.mezzanine_enabled', return_value=True), \
+         patch('modules.pipeline.get_mezzanine_key', return_value="key"), \
+         patch('modules.pipeline.find_mezzanine', return_value=cached_info), \
+         patch('modules.pipeline.get_mezzanine_part_path', return_value=tmp_path / "key_part.mkv"), \
+         patch('modules.pipeline.commit_mezzanine') as mock_commit, \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script') as mock_script, \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=run_result) as mock_run:
+        pipeline.process_video(src)
+    return mock_run, mock_script, mock_commit
+
+
+def test_process_video_mezzanine_hit_skips_vapoursynth(tmp_path):
+    cached = {"frames": 300, "fps": 30.0, "width": 720, "height": 576,
+              "pixel_format": "yuv420p16le", "path": str(tmp_path / "key.mkv")}
+    with patch('modules.pipeline.memory_governor_enabled', return_value=True), \
+         patch('modules.pipeline.reserve_memory') as mock_reserve:
+        mock_run, mock_script, mock_commit = _run_process(tmp_path, cached)
+
+    assert not mock_script.called and not mock_reserve.called
+    vspipe_cmd, ffmpeg_cmd = mock_run.call_args[0][0], mock_run.call_args[0][1]
+    assert vspipe_cmd is None
+    assert ffmpeg_cmd[ffmpeg_cmd.index("-i") + 1] == str(tmp_path / "key.mkv")
+    assert "rawvideo" not in ffmpeg_cmd
+    assert "ffv1" not in ffmpeg_cmd
+    assert not mock_commit.called
+
+
+def test_process_video_mezzanine_miss_writes_cache(tmp_path):
+    mock_run, mock_script, mock_commit = _run_process(tmp_path, None)
+
+    assert mock_script.called
+    ffmpeg_cmd = mock_run.call_args[0][1]
+    assert "ffv1" in ffmpeg_cmd
+    assert ffmpeg_cmd[-1] == str(tmp_path / "key_part.mkv")
+    mock_commit.assert_called_once()
+    assert mock_commit.call_args[0][1]["frames"] == 300
+
+
+def test_process_video_mezzanine_failure_drops_part(tmp_path):
+    part = tmp_path / "key_part.mkv"
+    part.write_bytes(b"partial")
+    _, _, mock_commit = _run_process(tmp_path, None, run_result=False)
+    assert not mock_commit.called
+    assert not part.exists()
+
+
+def test_run_pipeline_without_vspipe():
+    """Mezzanine input: only FFmpeg runs and reads nothing from stdin."""
+    from unittest.mock import MagicMock
+    p_ffmpeg = MagicMock()
+    p_ffmpeg.returncode = p_ffmpeg.poll.return_value = 0
+    with patch('subprocess.Popen', return_value=p_ffmpeg) as mock_popen:
+        with patch('io.TextIOWrapper', return_value=[]):
+            with patch('pathlib.Path.exists', return_value=False):
+                with patch('modules.pipeline.log_info'):
+                    assert pipeline._run_encoding_pipeline(None, ["ffmpeg"], Path("t.vpy"), 10.0) is True
+    assert mock_popen.call_count == 1
+    assert mock_popen.call_args[1]["stdin"] is pipeline.subprocess.DEVNULL
+
+
+def test_mezzanine_json_roundtrip(tmp_path):
+    with patch.dict('modules.mezzanine.CONFIG', {"mezzanine_dir": str(tmp_path)}):
+        mezzanine.get_mezzanine_part_path("k2").write_bytes(b"1")
+        mezzanine.commit_mezzanine("k2", {"frames": 5})
+    meta = json.loads((tmp_path / "k2.json").read_text())
+    assert meta["frames"] == 5 and "created" in meta
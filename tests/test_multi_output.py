@@ -0,0 +1,107 @@
+import io
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules.utils import parse_ffmpeg_frame
+
+
+def test_build_ffmpeg_cmd_multiple_outputs():
+    """One FFmpeg invocation with an output section per encoder."""
+    with patch('modules.pipeline.shutil.which', return_value="ffmpeg"):
+        with patch('modules.pipeline.AUDIO_OFFSET', 0.0):
+            cmd = pipeline._build_ffmpeg_cmd(
+                Path("tape.mp4"), [Path("a_part.mkv"), Path("p_part.mov")], 1.0,
+                encoders=["av1", "prores"])
+
+    assert cmd.count("-i") == 2
+    assert cmd.count("0:v:0") == 2
+    assert cmd.count("1:a:0") == 2
+    assert "libsvtav1" in cmd and "prores_ks" in cmd
+    # Each output path directly follows its own codec section
+    assert cmd.index("libsvtav1") < cmd.index("a_part.mkv") < cmd.index("prores_ks") < cmd.index("p_part.mov")
+    assert cmd[-1] == "p_part.mov"
+
+
+def test_build_ffmpeg_cmd_single_output_unchanged():
+    """A plain path still produces a single output."""
+    with patch('modules.pipeline.shutil.which', return_value="ffmpeg"):
+        with patch('modules.pipeline.ENCODER', 'prores'):
+            cmd = pipeline._build_ffmpeg_cmd(Path("tape.mp4"), Path("out_part.mov"), 1.002)
+    assert cmd.count("0:v:0") == 1
+    assert "atempo=1.002000" in cmd
+    assert cmd[-1] == "out_part.mov"
+
+
+def test_order_slowest_first():
+    outputs = [("prores", Path("p.mov")), ("av1", Path("a.mkv"))]
+    ordered = pipeline._order_slowest_first(outputs)
+    assert [enc for enc, _ in ordered] == ["av1", "prores"]
+
+
+def test_part_path():
+    assert pipeline._get_part_path(Path("/x/t_deint.mov")) == Path("/x/t_deint_part.mov")
+
+
+def test_parse_ffmpeg_frame():
+    assert parse_ffmpeg_frame("frame=  120 fps= 30 time=00:00:04.00") == 120
+    assert parse_ffmpeg_frame("no stats") is None
+    assert parse_ffmpeg_frame(None) is None
+
+
+def test_process_video_only_renders_missing_outputs():
+    """Existing valid outputs are skipped; the rest share one vspipe pass."""
+    input_p = Path("tape.mp4")
+    prores_out = pipeline._get_output_path(input_p, "prores")
+
+    def fake_exists(self):
+        return self in (input_p, prores_out)
+
+    with patch('modules.pipeline.ENCODERS', ["prores", "av1"]), \
+         patch.object(Path, 'exists', fake_exists), \
+         patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P10')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True) as mock_run:
+        pipeline.process_video(input_p)
+
+    ffmpeg_cmd = mock_run.call_args[0][1]
+    assert "libsvtav1" in ffmpeg_cmd
+    assert "prores_ks" not in ffmpeg_cmd
+    assert any(str(arg).endswith("_deinterlaced_av1_part.mkv") for arg in ffmpeg_cmd)
+
+
+def test_process_video_all_outputs_valid_skips():
+    input_p = Path("tape.mp4")
+    with patch('modules.pipeline.ENCODERS', ["prores", "av1"]), \
+         patch.object(Path, 'exists', return_value=True), \
+         patch('modules.pipeline.get_duration', return_value=100.0), \
+         patch('modules.pipeline.cleanup_temp_files'), \
+         patch('modules.pipeline.log_info'), \
+         patch('modules.pipeline.create_vpy_script') as mock_script:
+        pipeline.process_video(input_p)
+    assert not mock_script.called
+
+
+def test_run_pipeline_progress_tracks_slowest_output():
+    """frame= (slowest output) caps time= (furthest stream) when fps is known."""
+    p_vspipe = MagicMock()
+    p_ffmpeg = MagicMock()
+    p_ffmpeg.returncode = 0
+    p_vspipe.poll.return_value = p_ffmpeg.poll.return_value = 0
+    p_ffmpeg.stderr = io.BytesIO(b"frame=  60 fps= 30 q=-1.0 size= 1024kB time=00:00:08.00 bitrate=1.0kbits/s speed= 1.0x\r")
+
+    with patch('subprocess.Popen', side_effect=[p_vspipe, p_ffmpeg]):
+        with patch('modules.pipeline.get_vspipe_env', return_value={}):
+                    with patch('modules.pipeline.update_progress') as mock_update:
+                        with patch('pathlib.Path.exists', return_value=False):
+                            with patch('modules.pipeline.log_info'):
+                                ok = pipeline._run_encoding_pipeline(["vspipe"], ["ffmpeg"], Path("t.vpy"), 100.0, fps=30.0)
+
+    assert ok is True
+    pct = mock_update.call_args[0][0]
+    assert abs(pct - 2.0) < 0.01  # 60 frames / 30 fps = 2s of 100s
@@ -0,0 +1,84 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import preview
+from modules.vspipe import create_vpy_script
+
+STREAM = {"frames": 100, "fps": 50.0, "width": 720, "height": 576, "format": "YUV420P16",
+          "pixel_format": "yuv420p16le"}
+
+
+@pytest.mark.parametrize("sink, expected", [("snapshot", "-update"), ("udp", "mpegts"), ("fifo", "yuv4mpegpipe")])
+def test_sink_cmd(sink, expected):
+    cmd = preview.build_sink_cmd(sink, "target", STREAM)
+    assert expected in cmd and cmd[-1] == "target"
+    assert cmd[cmd.index("-s") + 1] == "720x576" and cmd[cmd.index("-pix_fmt") + 1] == "yuv420p16le"
+
+
+def test_settings_and_newest_segment():
+    with patch.dict(preview.CONFIG, {"preview_sink": "bogus"}):
+        assert preview.get_preview_settings()["sink"] == "snapshot"
+    assert preview.get_newest_complete(3, False) == 1
+    assert preview.get_newest_complete(3, True) == 2
+    assert preview.get_newest_complete(1, False) == -1
+
+
+def test_preview_script_only_changes_preset(tmp_path):
+    out = tmp_path / "s.vpy"
+    with patch('modules.vspipe.get_fps', return_value=25.0):
+        create_vpy_script(str(tmp_path / "in.mp4"), str(out), "QTGMC", qtgmc_overrides={"Preset": "Ultra Fast"})
+    qtgmc = next(line for line in out.read_text().splitlines() if "haf.QTGMC" in line)
+    assert "'Preset': 'Ultra Fast'" in qtgmc and "'SourceMatch'" in qtgmc
+
+
+def test_preview_shows_newest_segment_only(tmp_path):
+    spool = tmp_path / "tape_segments"
+    feed = MagicMock()
+    polls = iter([None, 0])
+    feed.poll.side_effect = lambda: next(polls, 0)
+
+    def _capture(*args, **kwargs):
+        for i in range(4):
+            (spool / f"feed_{i:05d}.mkv").write_bytes(b"x")
+
+    with patch.dict(pipeline.CONFIG, {"preview_sink": "udp"}), \
+         patch('modules.pipeline.get_cache_dir', return_value=str(tmp_path)), \
+         patch('modules.pipeline.start_feed', side_effect=lambda *a: _capture() or feed), \
+         patch('modules.pipeline.stop_feed'), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(None, STREAM)) as mock_prepare, \
+         patch('modules.pipeline.subprocess.Popen') as mock_sink, \
+         patch('modules.pipeline.subprocess.run', return_value=MagicMock(returncode=0)) as mock_vspipe, \
+         patch('modules.pipeline.get_vspipe_env', return_value={}), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/vspipe"), \
+         patch('modules.pipeline.log_info'):
+        assert pipeline.preview_source(tmp_path / "tape.avi")
+        assert mock_sink.return_value not in pipeline.ACTIVE_PROCS
+
+    # Feed running: segment 2 is the newest complete one (0 and 1 are skipped); then 3 after the feed ended
+    assert [c[0][0].name for c in mock_prepare.call_args_list] == ["feed_00002.mkv", "feed_00003.mkv"]
+    assert mock_prepare.call_args[1]["qtgmc_overrides"] == {"Preset": "Ultra Fast"}
+    assert mock_sink.call_count == 1 and "udp://127.0.0.1:5000" in mock_sink.call_args[0][0]
+    assert mock_vspipe.call_args[0][0][0] == "/bin/vspipe"
+    assert mock_vspipe.call_args[1]["stdout"] is mock_sink.return_value.stdin
+    assert not spool.exists()
+
+
+def test_preview_needs_vspipe(tmp_path):
+    with patch('modules.pipeline.shutil.which', return_value=None), \
+         patch('modules.pipeline.start_feed') as mock_feed, \
+         patch('modules.pipeline.log_error') as mock_error:
+        assert not pipeline.preview_source(tmp_path / "tape.avi")
+    assert not mock_feed.called and "vspipe" in mock_error.call_args[0][0]
+
+
+def test_preview_fifo_needs_posix(tmp_path):
+    with patch.dict(pipeline.CONFIG, {"preview_sink": "fifo", "preview_target": str(tmp_path / "p.y4m")}), \
+         patch('modules.preview.os.mkfifo', create=True, side_effect=lambda p: open(p, "w").close()):
+        assert preview.prepare_fifo(str(tmp_path / "p.y4m"))
+    with patch.dict(pipeline.CONFIG, {"preview_sink": "fifo", "preview_target": str(tmp_path / "q.y4m")}), \
+         patch('modules.pipeline.prepare_fifo', return_value=False), \
+         patch('modules.pipeline.log_error') as mock_error:
+        assert not pipeline.preview_source(tmp_path / "tape.avi")
+    assert "POSIX" in mock_error.call_args[0][0]
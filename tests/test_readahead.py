@@ -0,0 +1,180 @@
+import io
+import os
+import time
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import readahead
+
+
+def _source(tmp_path, size=4 * 1024 * 1024):
+    path = tmp_path / "tape.mp4"
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_mode_selection():
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "Prefetch"}):
+        assert readahead.get_readahead_mode() == "prefetch"
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "fadvise"}), \
+         patch('modules.readahead.os', MagicMock(spec=[])), patch('modules.readahead.log_debug'):
+        assert readahead.get_readahead_mode() == "prefetch"
+    with patch.dict('modules.readahead.CONFIG', {}, clear=True):
+        assert readahead.start_readahead("x.mp4") is None
+
+
+def test_prefetch_follows_decode_position(tmp_path):
+    src = _source(tmp_path)
+    with patch('modules.readahead.PREFETCH_BLOCK', 256 * 1024):
+        ra = readahead.SourceReadahead(src, "prefetch", window_bytes=1024 * 1024)
+        # The thread fills the first window, then waits for the decoder
+        assert _wait_for(lambda: ra.prefetched >= 1024 * 1024)
+        time.sleep(0.05)
+        assert ra.prefetched < 2 * 1024 * 1024
+        ra.update(0.1)
+        assert ra.hits == 1
+        ra.update(1.0)
+        assert _wait_for(lambda: ra.prefetched == ra.size)
+        with patch('modules.readahead.log_info') as mock_log:
+            stats = ra.stop()
+    assert stats["hits"] + stats["stalls"] == 2
+    assert "hit rate" in mock_log.call_args[0][0]
+
+
+def test_stop_leaves_fd_to_pending_read(tmp_path):
+    src = _source(tmp_path, size=1024 * 1024)
+    ra = readahead.SourceReadahead(src, "none", window_bytes=1024)
+    ra._thread = MagicMock()
+    ra._thread.is_alive.return_value = True
+    with patch('modules.readahead.os.close') as mock_close, \
+         patch('modules.readahead.log_info'), patch('modules.readahead.log_debug') as mock_debug:
+        ra.stop()
+    assert not mock_close.called and mock_debug.called
+    os.close(ra._fd)
+
+
+def test_stall_counted_when_decoder_overtakes(tmp_path):
+    src = _source(tmp_path, size=1024 * 1024)
+    ra = readahead.SourceReadahead(src, "none", window_bytes=1024)
+    ra.update(0.5)
+    assert ra.stalls == 1 and ra.hits == 0
+    with patch('modules.readahead.log_info'):
+        ra.stop()
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise not available")
+def test_fadvise_hints_window(tmp_path):
+    src = _source(tmp_path)
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "fadvise", "readahead_mb": 1}):
+        ra = readahead.start_readahead(src)
+    assert ra.mode == "fadvise" and ra.prefetched == 1024 * 1024
+    ra.update(0.5)
+    assert ra.prefetched == 3 * 1024 * 1024
+    with patch('modules.readahead.log_info'):
+        ra.stop()
+
+
+def test_start_readahead_missing_file(tmp_path):
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "prefetch"}), \
+         patch('modules.readahead.log_debug') as mock_debug:
+        assert readahead.start_readahead(tmp_path / "missing.mp4") is None
+    assert mock_debug.called
+
+
+def test_copy_source_local(tmp_path):
+    src = _source(tmp_path, size=1000)
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+    with patch('modules.readahead.log_info'):
+        local = readahead.copy_source_local(src, local_dir)
+        assert local == local_dir / "tape_temp_source.mp4"
+        assert local.read_bytes() == src.read_bytes()
+        with patch('modules.readahead.shutil.copyfile', side_effect=OSError("full")):
+            assert readahead.copy_source_local(src, local_dir) is None
+
+
+def test_pipeline_reports_progress_fraction():
+    p_ffmpeg = MagicMock()
+    p_ffmpeg.returncode = 0
+    p_ffmpeg.stderr = io.BytesIO(b"frame=  100 fps=30 time=00:00:05.00 bitrate=N/A speed=1.0x\n")
+    seen = []
+    with patch('subprocess.Popen', return_value=p_ffmpeg), \
+         patch('modules.pipeline.update_progress'), patch('modules.pipeline.log_info'):
+        pipeline._run_encoding_pipeline(None, ["ffmpeg"], Path("t.vpy"), 10.0, on_progress=seen.append)
+    assert seen == [0.5]
+
+
+def _process(tmp_path, mode):
+    src = _source(tmp_path, size=1000)
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": mode}), \
+         patch.dict('modules.pipeline.CONFIG', {"cache_dir": str(tmp_path / "cache")}), \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.create_vpy_script') as mock_script, \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.readahead.log_info'), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True) as mock_run:
+        pipeline.process_video(src)
+    return src, mock_script, mock_run
+
+
+def test_process_video_copy_mode_reads_local(tmp_path):
+    src, mock_script, mock_run = _process(tmp_path, "copy")
+    local = tmp_path / "cache" / "readahead" / "tape_temp_source.mp4"
+    assert mock_script.call_args[0][0] == str(local)
+    ffmpeg_cmd = mock_run.call_args[0][1]
+    assert str(local) in ffmpeg_cmd and str(src) not in ffmpeg_cmd
+    assert mock_run.call_args[1]["on_progress"] is None
+    assert not local.exists()
+
+
+def test_process_video_prefetch_mode(tmp_path):
+    _, _, mock_run = _process(tmp_path, "prefetch")
+    assert callable(mock_run.call_args[1]["on_progress"])
+
+
+def test_process_video_copy_mode_index_and_mezzanine(tmp_path):
+    src = _source(tmp_path, size=1000)
+    local = tmp_path / "cache" / "readahead" / "tape_temp_source.mp4"
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "copy"}), \
+         patch.dict('modules.pipeline.CONFIG', {"cache_dir": str(tmp_path / "cache")}), \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline._prepare_vs_stream', return_value=(["vspipe"], {
+             "frames": 300, "fps": 30.0, "width": 720, "height": 576, "pixel_format": "yuv420p16le"})) as mock_prepare, \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.readahead.log_info'), patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', side_effect=lambda *a, **k: (
+             (local.parent / "tape_temp_source.mp4.ffindex").write_bytes(b"i") or True)):
+        pipeline.process_video(src)
+    assert mock_prepare.call_args[0][2] == local.parent / "tape_temp_source.mp4.ffindex"
+    assert not list(local.parent.iterdir())
+
+    mezzanine = {"path": str(tmp_path / "m.mkv"), "frames": 300, "fps": 30.0, "width": 720, "height": 576,
+                 "pixel_format": "yuv420p16le"}
+    with patch.dict('modules.readahead.CONFIG', {"source_readahead": "copy"}), \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=True), \
+         patch('modules.pipeline.get_mezzanine_key', return_value="k"), \
+         patch('modules.pipeline.find_mezzanine', return_value=mezzanine), \
+         patch('modules.pipeline.copy_source_local') as mock_copy, \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline', return_value=True):
+        pipeline.process_video(src)
+    assert not mock_copy.called
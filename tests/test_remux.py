@@ -0,0 +1,104 @@
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+
+
+def test_cli_flags_are_not_inputs(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    with patch('sys.argv', ['script.py', '--REMUX', str(src)]), patch('modules.pipeline.log_info'):
+        assert pipeline._get_cli_flags() == {"--remux"}
+        assert pipeline._parse_cli_args({".mp4"}) == [src]
+
+
+def test_build_remux_cmd_copies_video():
+    with patch('modules.pipeline.shutil.which', return_value="ffmpeg"), \
+         patch('modules.pipeline.probe_media', return_value={"audio_codec": "pcm_s24le"}), \
+         patch('modules.pipeline.AUDIO_CODEC', 'aac'), patch('modules.pipeline.AUDIO_OFFSET', 0.0):
+        cmd = pipeline._build_remux_cmd(Path("t.mp4"), Path("o.mov"), Path("o_part.mov"), 1.001)
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+    assert "atempo=1.001000" in cmd[cmd.index("-af") + 1]
+    assert cmd.index("o.mov") < cmd.index("t.mp4") and cmd[-1] == "o_part.mov"
+
+
+def test_build_remux_cmd_stream_copy_audio():
+    with patch('modules.pipeline.probe_media', return_value={"audio_codec": "aac"}), \
+         patch('modules.audio.AUDIO_CODEC', 'aac'), \
+         patch('modules.audio.shutil.which', return_value="ffmpeg"):
+        cmd = pipeline._build_remux_cmd(Path("t.mp4"), Path("o.mov"), Path("o_part.mov"), 1.0)
+        assert cmd[cmd.index("-c") + 1] == "copy"
+        # A piecewise tempo chain always needs an audio encode
+        with patch('modules.pipeline.shutil.which', return_value="ffmpeg"):
+            cmd = pipeline._build_remux_cmd(Path("t.mp4"), Path("o.mov"), Path("o_part.mov"), 1.0, "atempo=1.01")
+        assert "-c:v" in cmd
+
+
+def _remux(tmp_path, returncode=0, part_duration=10.0):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    out = tmp_path / "tape_deinterlaced_prores.mov"
+    out.write_bytes(b"old")
+    part = tmp_path / "tape_deinterlaced_prores_part.mov"
+
+    def _run(cmd, **kwargs):
+        part.write_bytes(b"new")
+        return MagicMock(returncode=returncode)
+
+    def _duration(path, stream="v"):
+        return part_duration if path == str(part) else 10.0
+
+    with patch('modules.pipeline.ENCODERS', ["prores", "av1"]), \
+         patch('modules.pipeline.get_duration', side_effect=_duration), \
+         patch('modules.pipeline._analyze_audio_sync', return_value=(1.0, None, 0.0)), \
+         patch('modules.pipeline._build_remux_cmd', return_value=["ffmpeg"]), \
+         patch('modules.pipeline.run_command', side_effect=_run) as mock_run, \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_error'):
+        ok = pipeline.remux_video(src)
+    return ok, out, part, mock_run
+
+
+def test_remux_video_replaces_output(tmp_path):
+    ok, out, part, mock_run = _remux(tmp_path)
+    assert ok is True
+    assert mock_run.call_count == 1  # the av1 output does not exist
+    assert out.read_bytes() == b"new" and not part.exists()
+
+
+def test_remux_video_keeps_original_on_failure(tmp_path):
+    ok, out, part, _ = _remux(tmp_path, returncode=1)
+    assert ok is False
+    assert out.read_bytes() == b"old" and not part.exists()
+    ok, out, _, _ = _remux(tmp_path, part_duration=0.0)
+    assert ok is False and out.read_bytes() == b"old"
+
+
+def test_remux_video_without_outputs(tmp_path):
+    with patch('modules.pipeline.run_command') as mock_run, patch('modules.pipeline.log_info'):
+        assert pipeline.remux_video(tmp_path / "none.mp4") is True
+    assert not mock_run.called
+
+
+def test_remux_batch_counts_failures():
+    with patch.dict('modules.pipeline.CONFIG', {"remux_workers": 3}), \
+         patch('modules.pipeline.remux_video', side_effect=[True, False, True]), \
+         patch('modules.pipeline.log_info'):
+        assert pipeline.remux_batch([Path("a"), Path("b"), Path("c")]) == 1
+
+
+def test_main_remux_mode():
+    with patch('modules.pipeline.setup_environment'), patch('modules.pipeline.get_cpu_name'), \
+         patch('modules.pipeline.get_gpu_name'), patch('modules.pipeline._show_banner'), \
+         patch('modules.pipeline.check_requirements'), \
+         patch('modules.pipeline.get_input_files', return_value=[Path("a.mp4")]), \
+         patch('modules.pipeline.remux_batch', return_value=0) as mock_batch, \
+         patch('modules.pipeline.process_video') as mock_process, \
+         patch('modules.pipeline.select_interpolation_backend') as mock_select, \
+         patch('modules.pipeline.log_info'), \
+         patch('sys.argv', ['script.py', '--remux', 'a.mp4']):
+        pipeline.main()
+    mock_batch.assert_called_once_with([Path("a.mp4")])
+    assert not mock_process.called
+    # Remuxing runs no QTGMC: no backend probe
+    assert not mock_select.called
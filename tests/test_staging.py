@@ -0,0 +1,153 @@
+import os
+from unittest.mock import patch
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import staging
+
+
+def test_stage_dir_separates_equal_names(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    with patch.dict('modules.staging.CONFIG', {"scratch_dir": str(tmp_path / "scratch")}):
+        assert staging.staging_enabled()
+        dir_a = staging.get_stage_dir(tmp_path / "a" / "tape.mp4")
+        dir_b = staging.get_stage_dir(tmp_path / "b" / "tape.mp4")
+    assert dir_a != dir_b and dir_a.is_dir() and dir_a.name.startswith("tape-")
+    with patch.dict('modules.staging.CONFIG', {"scratch_dir": ""}):
+        assert not staging.staging_enabled()
+
+
+def test_estimate_and_space_check(tmp_path):
+    # One hour of 50p SD ProRes HQ is in the tens of GB
+    size = staging.estimate_output_size("prores", 180000, 720, 576)
+    assert 20 * 1024 ** 3 < size < 50 * 1024 ** 3
+    assert staging.estimate_output_size("av1", 180000, 720, 576) < size / 10
+    assert staging.has_space(tmp_path, 1)
+    assert not staging.has_space(tmp_path, 1024 ** 5)
+    assert not staging.has_space(tmp_path / "missing", 1)
+
+
+def test_preallocate(tmp_path):
+    with open(tmp_path / "f.bin", "wb") as f:
+        assert staging.preallocate(f, 0) is False
+        if hasattr(os, "posix_fallocate"):
+            assert staging.preallocate(f, 4096) is True
+            with patch('modules.staging.os.posix_fallocate', side_effect=OSError("no")), \
+                 patch('modules.staging.log_debug'):
+                assert staging.preallocate(f, 4096) is False
+
+
+def _paths(tmp_path):
+    src = tmp_path / "scratch" / "o.mov"
+    src.parent.mkdir()
+    src.write_bytes(b"x" * 5000)
+    dest = tmp_path / "nas" / "o.mov"
+    dest.parent.mkdir()
+    return src, dest, dest.with_name("o_part.mov")
+
+
+def test_move_output_copies_and_verifies(tmp_path):
+    src, dest, part = _paths(tmp_path)
+    with patch('modules.staging._same_volume', return_value=False):
+        assert staging.move_output(src, dest, part) is True
+    assert dest.read_bytes() == b"x" * 5000
+    assert not src.exists() and not part.exists()
+
+
+def test_move_output_same_volume_renames(tmp_path):
+    src, dest, part = _paths(tmp_path)
+    with patch('modules.staging._copy_file') as mock_copy:
+        assert staging.move_output(src, dest, part) is True
+    assert not mock_copy.called and dest.exists()
+
+
+def test_move_output_checksum_failure_keeps_source(tmp_path):
+    src, dest, part = _paths(tmp_path)
+    with patch('modules.staging._same_volume', return_value=False), \
+         patch('modules.staging._file_hash', return_value="bad"), \
+         patch('modules.staging.log_error') as mock_err:
+        assert staging.move_output(src, dest, part) is False
+    assert "checksum" in mock_err.call_args[0][0]
+    assert src.exists() and not dest.exists() and not part.exists()
+
+
+def test_background_mover_queue(tmp_path):
+    src, dest, part = _paths(tmp_path)
+    with patch('modules.staging.move_output', side_effect=[True, False]) as mock_move, \
+         patch('modules.staging.log_info'):
+        staging.queue_move(src, dest, part)
+        staging.queue_move(src, dest, part)
+        failed = staging.wait_for_moves()
+    assert mock_move.call_count == 2
+    assert failed == [src]
+    assert staging.wait_for_moves() == []
+
+
+def _process(tmp_path, space=True):
+    src = tmp_path / "src" / "tape.mp4"
+    src.parent.mkdir()
+    src.write_bytes(b"v")
+    scratch = tmp_path / "scratch"
+    with patch.dict('modules.staging.CONFIG', {"scratch_dir": str(scratch)}), \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.audio_mode_separate', return_value=False), \
+         patch('modules.pipeline.has_space', return_value=space), \
+         patch('modules.pipeline.queue_move') as mock_move, \
+         patch('modules.pipeline.create_vpy_script') as mock_script, \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline') as mock_run:
+        def _render(vspipe_cmd, ffmpeg_cmd, *args, **kwargs):
+            Path(ffmpeg_cmd[-1]).write_bytes(b"rendered")
+            return True
+        mock_run.side_effect = _render
+        pipeline.process_video(src)
+    return src, scratch, mock_run, mock_script, mock_move
+
+
+def test_process_video_renders_on_scratch(tmp_path):
+    src, scratch, mock_run, mock_script, mock_move = _process(tmp_path)
+    stage_dir = next(scratch.iterdir())
+    script_path = Path(mock_script.call_args[0][1])
+    assert script_path.parent == stage_dir
+    assert mock_script.call_args[1]["index_file"] == str(stage_dir / "tape.ffindex")
+    assert Path(mock_run.call_args[0][1][-1]).parent == stage_dir
+    staged, dest, dest_part, on_done = mock_move.call_args[0]
+    assert on_done is None
+    assert staged == stage_dir / "tape_deinterlaced_prores.mov" and staged.exists()
+    assert dest == src.parent / "tape_deinterlaced_prores.mov"
+    assert dest_part.name == "tape_deinterlaced_prores_part.mov"
+
+
+def test_process_video_scratch_full_falls_back(tmp_path):
+    src, _, mock_run, _, mock_move = _process(tmp_path, space=False)
+    assert Path(mock_run.call_args[0][1][-1]).parent == src.parent
+    assert not mock_move.called
+    assert (src.parent / "tape_deinterlaced_prores.mov").exists()
+
+
+def test_process_video_recovers_staged_render(tmp_path):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    with patch.dict('modules.staging.CONFIG', {"scratch_dir": str(tmp_path / "scratch")}):
+        stage_dir = staging.get_stage_dir(src)
+        (stage_dir / "tape_deinterlaced_prores.mov").write_bytes(b"done")
+        with patch('modules.pipeline.ENCODERS', ["prores"]), \
+             patch('modules.pipeline.get_duration', return_value=60.0), \
+             patch('modules.pipeline.queue_move') as mock_move, \
+             patch('modules.pipeline._run_encoding_pipeline') as mock_run, \
+             patch('modules.pipeline.log_info'):
+            pipeline.process_video(src)
+    assert mock_move.called and not mock_run.called
+
+
+def test_create_vpy_script_index_file(tmp_path):
+    from modules.vspipe import create_vpy_script
+    out = tmp_path / "s.vpy"
+    with patch('modules.vspipe.get_fps', return_value=25.0):
+        create_vpy_script(str(tmp_path / "in.mp4"), str(out), "QTGMC", index_file=str(tmp_path / "in.ffindex"))
+    assert "cachefile=r'" in out.read_text()
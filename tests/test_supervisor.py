@@ -0,0 +1,135 @@
+import io
+import sys
+import time
+import threading
+import subprocess
+from unittest.mock import patch
+
+from modules.supervisor import StreamSupervisor, _split_lines
+
+PY = sys.executable
+
+
+def _spawn(code, **kwargs):
+    return subprocess.Popen([PY, "-c", code], stdout=kwargs.pop("stdout", subprocess.PIPE),
+                            stderr=subprocess.PIPE, **kwargs)
+
+
+def _run_with_deadline(supervisor, seconds=30):
+    """Runs the supervisor in a thread; a deadlock shows up as a timeout instead of a hung suite."""
+    result = {}
+    t = threading.Thread(target=lambda: result.update(ok=supervisor.run()), daemon=True)
+    t.start()
+    t.join(seconds)
+    assert not t.is_alive(), "supervisor deadlocked"
+    return result["ok"]
+
+
+def test_split_lines_handles_cr_and_partial_lines():
+    assert _split_lines(b"frame=1\rframe=2\r\nlog\npart") == ([b"frame=1", b"frame=2", b"log"], b"part")
+
+
+def test_stress_chatty_pipeline_never_deadlocks():
+    """Stand-ins for vspipe and FFmpeg that flood every pipe far beyond the OS buffer size."""
+    producer = _spawn(
+        "import sys\n"
+        "for i in range(2000):\n"
+        "    sys.stderr.write('vs log line %d ' % i + 'x' * 200 + '\\n')\n"
+        "    sys.stdout.buffer.write(b'\\0' * 4096)\n"
+    )
+    consumer = _spawn(
+        "import sys\n"
+        "n = 0\n"
+        "while True:\n"
+        "    chunk = sys.stdin.buffer.read(4096)\n"
+        "    if not chunk: break\n"
+        "    n += 1\n"
+        "    sys.stderr.write('frame=%d fps=1 time=00:00:01.00 speed=1x\\r' % n)\n"
+        "    sys.stdout.write('y' * 512)\n",
+        stdin=producer.stdout,
+    )
+    producer.stdout.close()
+
+    vs_lines, ff_lines = [], []
+    supervisor = StreamSupervisor(stall_timeout=20)
+    supervisor.add_process("vspipe", producer)
+    supervisor.add_stream(producer.stderr, vs_lines.append)
+    supervisor.add_process("ffmpeg", consumer)
+    supervisor.add_stream(consumer.stdout)
+    supervisor.add_stream(consumer.stderr, ff_lines.append)
+
+    assert _run_with_deadline(supervisor) is True
+    assert len(vs_lines) == 2000
+    assert ff_lines[-1].startswith("frame=2000")
+    assert producer.returncode == 0 and consumer.returncode == 0
+
+
+def test_stall_timeout_tears_down_both_processes():
+    sleeper = _spawn("import time; time.sleep(60)")
+    waiter = _spawn("import sys; sys.stdin.read()", stdin=subprocess.PIPE)
+    supervisor = StreamSupervisor(stall_timeout=0.5, terminate_timeout=2)
+    for name, p in (("vspipe", sleeper), ("ffmpeg", waiter)):
+        supervisor.add_process(name, p)
+        supervisor.add_stream(p.stdout)
+        supervisor.add_stream(p.stderr)
+    started = time.monotonic()
+    with patch('modules.supervisor.log_error') as mock_err:
+        assert _run_with_deadline(supervisor) is False
+    assert supervisor.stalled and time.monotonic() - started < 15
+    assert "No progress" in mock_err.call_args[0][0]
+    assert sleeper.poll() is not None and waiter.poll() is not None
+    waiter.stdin.close()
+
+
+def test_progress_keeps_watchdog_quiet():
+    ticker = _spawn("import sys, time\nfor i in range(6):\n    print('tick', flush=True)\n    time.sleep(0.2)\n")
+    supervisor = StreamSupervisor(stall_timeout=0.5)
+    supervisor.add_process("ffmpeg", ticker)
+    supervisor.add_stream(ticker.stdout, lambda line: supervisor.progress())
+    supervisor.add_stream(ticker.stderr)
+    assert _run_with_deadline(supervisor) is True
+    assert not supervisor.stalled
+
+
+def test_failing_child_stops_its_partner():
+    failing = _spawn("import sys; sys.stderr.write('Script execution failed\\n'); sys.exit(1)")
+    partner = _spawn("import time; time.sleep(60)")
+    errors = []
+    supervisor = StreamSupervisor(terminate_timeout=2)
+    supervisor.add_process("vspipe", failing)
+    supervisor.add_stream(failing.stderr, errors.append)
+    supervisor.add_process("ffmpeg", partner)
+    supervisor.add_stream(partner.stderr)
+    assert _run_with_deadline(supervisor) is False
+    assert supervisor.failed == "vspipe"
+    assert errors == ["Script execution failed"]
+    assert partner.poll() is not None
+
+
+def test_grandchild_holding_pipe_does_not_block():
+    parent = _spawn(f"import subprocess; subprocess.Popen([{PY!r}, '-c', 'import time; time.sleep(3)'])")
+    supervisor = StreamSupervisor(drain_timeout=0.5)
+    supervisor.add_process("ffmpeg", parent)
+    supervisor.add_stream(parent.stderr)
+    with patch('modules.supervisor.log_debug'):
+        assert _run_with_deadline(supervisor, seconds=15) is True
+
+
+def test_file_like_streams_use_reader_threads():
+    lines = []
+
+    class _Done:
+        returncode = 0
+
+        def poll(self):
+            return 0
+
+        def wait(self, timeout=None):
+            return 0
+
+    supervisor = StreamSupervisor()
+    supervisor.add_process("ffmpeg", _Done())
+    supervisor.add_stream(io.BytesIO(b"a\r\nb\nlast"), lines.append)
+    supervisor.add_stream(None)
+    assert _run_with_deadline(supervisor) is True
+    assert lines == ["a", "b", "last"]
@@ -7,7 +7,7 @@ def test_drift_logic_negligible(ad):
     input_p = Path("test.mp4")
 
     with patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P10')):  # 100.0s NEW video
-        with patch('modules.pipeline.get_duration', return_value=100.005):  # 100.005s SRC audio (Drift 0.005)
+        with patch('modules.pipeline.probe_media', return_value={"duration_v": 100.005, "duration_a": 100.005}):  # 100.005s SRC audio (Drift 0.005)
             with patch('modules.pipeline.create_vpy_script'):
                     with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
                         with patch('modules.pipeline.cleanup_temp_files'):
@@ -17,13 +17,13 @@ def test_drift_logic_negligible(ad):
                                 p1.stderr.readline.return_value = b""
                                 p2 = MagicMock()
                                 p2.stderr.readline.side_effect = ["", "", ""]
-                                p2.poll.side_effect = [None, 0, 0]
+                                p2.poll.return_value = 0
                                 p2.returncode = 0
                                 mock_popen.side_effect = [p1, p2]
 
                                 with patch('os.path.exists', return_value=True):  # vspipe exists
                                     # input check, output check
-                                    with patch('modules.pipeline.Path.exists', side_effect=[True, False, False]):
+                                    with patch('modules.pipeline.Path.exists', side_effect=[True] + [False] * 10):
                                         with patch('modules.pipeline.Path.stat') as mock_stat:
                                             import stat
                                             mock_stat.return_value.st_mode = stat.S_IFREG
@@ -66,7 +66,7 @@ def test_drift_logic_negative_ignored(ad):
     # NEW BEHAVIOR: Should IGNORE and use 1.0.
 
     with patch('modules.pipeline.get_vpy_info', return_value=(3006, 30.0, 720, 576, 'YUV420P10')):  # 100.2s
-        with patch('modules.pipeline.get_duration', return_value=100.0):  # 100.0s
+        with patch('modules.pipeline.probe_media', return_value={"duration_v": 100.0, "duration_a": 100.0}):  # 100.0s
             with patch('modules.pipeline.create_vpy_script'):
                     with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
                         with patch('modules.pipeline.cleanup_temp_files'):
@@ -75,12 +75,12 @@ def test_drift_logic_negative_ignored(ad):
                                 p1.stderr.readline.return_value = b""
                                 p2 = MagicMock()
                                 p2.stderr.readline.side_effect = ["", "", ""]
-                                p2.poll.side_effect = [None, 0, 0]
+                                p2.poll.return_value = 0
                                 p2.returncode = 0
                                 mock_popen.side_effect = [p1, p2]
 
                                 with patch('os.path.exists', return_value=True):
-                                    with patch('modules.pipeline.Path.exists', side_effect=[True, False, False]):
+                                    with patch('modules.pipeline.Path.exists', side_effect=[True] + [False] * 10):
 
                                         with patch('modules.config.CONFIG', {
                                             "auto_drift_correction": True,
@@ -117,7 +117,7 @@ def test_drift_logic_positive_correction(ad):
     # SHOULD CORRECT.
 
     with patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P10')):  # 100.0s
-        with patch('modules.pipeline.get_duration', return_value=100.2):  # 100.2s
+        with patch('modules.pipeline.probe_media', return_value={"duration_v": 100.2, "duration_a": 100.2}):  # 100.2s
             with patch('modules.pipeline.create_vpy_script'):
                     with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
                         with patch('modules.pipeline.cleanup_temp_files'):
@@ -126,12 +126,12 @@ def test_drift_logic_positive_correction(ad):
                                 p1.stderr.readline.return_value = b""
                                 p2 = MagicMock()
                                 p2.stderr.readline.side_effect = ["", "", ""]
-                                p2.poll.side_effect = [None, 0, 0]
+                                p2.poll.return_value = 0
                                 p2.returncode = 0
                                 mock_popen.side_effect = [p1, p2]
 
                                 with patch('os.path.exists', return_value=True):
-                                    with patch('modules.pipeline.Path.exists', side_effect=[True, False, False]):
+                                    with patch('modules.pipeline.Path.exists', side_effect=[True] + [False] * 10):
 
                                         with patch('modules.config.CONFIG', {
                                             "auto_drift_correction": True,
@@ -166,7 +166,7 @@ def test_drift_guard_excessive(ad):
     # Drift 2% (Speed factor 1.02)
 
     with patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P10')):  # 100.0s
-        with patch('modules.pipeline.get_duration', return_value=102.0):  # 102.0s
+        with patch('modules.pipeline.probe_media', return_value={"duration_v": 102.0, "duration_a": 102.0}):  # 102.0s
             with patch('modules.pipeline.create_vpy_script'):
                     with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
                         with patch('modules.pipeline.cleanup_temp_files'):
@@ -175,12 +175,12 @@ def test_drift_guard_excessive(ad):
                                 p1.stderr.readline.return_value = b""
                                 p2 = MagicMock()
                                 p2.stderr.readline.side_effect = ["", "", ""]
-                                p2.poll.side_effect = [None, 0, 0]
+                                p2.poll.return_value = 0
                                 p2.returncode = 0
                                 mock_popen.side_effect = [p1, p2]
 
                                 with patch('os.path.exists', return_value=True):
-                                    with patch('modules.pipeline.Path.exists', side_effect=[True, False, False]):
+                                    with patch('modules.pipeline.Path.exists', side_effect=[True] + [False] * 10):
 
                                         with patch('modules.config.CONFIG', {
                                             "auto_drift_correction": True,
@@ -211,7 +211,7 @@ def test_drift_disabled(ad):
     input_p = Path("test.mp4")
 
     with patch('modules.pipeline.get_vpy_info', return_value=(3000, 30.0, 720, 576, 'YUV420P10')):  # 100.0s
-        with patch('modules.pipeline.get_duration', return_value=100.5):  # 0.5s drift (Valid but disabled)
+        with patch('modules.pipeline.probe_media', return_value={"duration_v": 100.5, "duration_a": 100.5}):  # 0.5s drift (Valid but disabled)
             with patch('modules.pipeline.create_vpy_script'):
                     with patch('modules.pipeline.shutil.which', return_value="/bin/tool"):
                         with patch('modules.pipeline.cleanup_temp_files'):
@@ -220,12 +220,12 @@ def test_drift_disabled(ad):
                                 p1.stderr.readline.return_value = b""
                                 p2 = MagicMock()
                                 p2.stderr.readline.side_effect = ["", "", ""]
-                                p2.poll.side_effect = [None, 0, 0]
+                                p2.poll.return_value = 0
                                 p2.returncode = 0
                                 mock_popen.side_effect = [p1, p2]
 
                                 with patch('os.path.exists', return_value=True):
-                                    with patch('modules.pipeline.Path.exists', side_effect=[True, False, False]):
+                                    with patch('modules.pipeline.Path.exists', side_effect=[True] + [False] * 10):
                                         with patch('modules.pipeline.Path.stat') as mock_stat:
                                             import stat
                                             mock_stat.return_value.st_mode = stat.S_IFREG
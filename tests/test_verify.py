@@ -0,0 +1,129 @@
+import json
+from unittest.mock import patch, MagicMock
+from pathlib import Path
+
+import modules.pipeline as pipeline
+from modules import verify, manifest
+
+
+def test_count_video_packets():
+    with patch('modules.verify.subprocess.check_output', return_value=b"1234\n") as mock_out, \
+         patch('modules.verify.shutil.which', return_value="ffprobe"):
+        assert verify.count_video_packets("o.mov") == 1234
+    cmd = mock_out.call_args[0][0]
+    assert "-count_packets" in cmd and "stream=nb_read_packets" in cmd
+    with patch('modules.verify.subprocess.check_output', return_value=b"N/A\n"):
+        assert verify.count_video_packets("o.mov") is None
+    with patch('modules.verify.subprocess.check_output', side_effect=OSError):
+        assert verify.count_video_packets("o.mov") is None
+
+
+def test_decode_frame_at():
+    with patch('modules.verify.subprocess.run', return_value=MagicMock(returncode=0, stderr=b"")) as mock_run:
+        assert verify.decode_frame_at("o.mov", 12.5) is True
+    cmd = mock_run.call_args[0][0]
+    assert cmd[cmd.index("-ss") + 1] == "12.500" and cmd[cmd.index("-frames:v") + 1] == "1"
+    with patch('modules.verify.subprocess.run', return_value=MagicMock(returncode=0, stderr=b"corrupt")):
+        assert verify.decode_frame_at("o.mov", 1.0) is False
+    with patch('modules.verify.subprocess.run', side_effect=OSError):
+        assert verify.decode_frame_at("o.mov", 1.0) is False
+
+
+def test_verify_output_checks():
+    with patch('modules.verify.count_video_packets', return_value=300), \
+         patch('modules.verify.get_duration', return_value=10.0), \
+         patch('modules.verify.decode_frame_at', return_value=True) as mock_decode:
+        result = verify.verify_output("o.mov", 300, 30.0, expected_audio=10.2, samples=3)
+    assert result["ok"] and result["sampled"] == 3 and mock_decode.call_count == 3
+    assert all(0 <= c[0][1] < 10.0 for c in mock_decode.call_args_list)
+
+    # Truncated file: fewer packets than frames rendered
+    with patch('modules.verify.count_video_packets', return_value=250):
+        result = verify.verify_output("o.mov", 300, 30.0)
+    assert not result["ok"] and "expected 300" in result["problems"][0]
+
+    with patch('modules.verify.count_video_packets', return_value=300), \
+         patch('modules.verify.get_duration', return_value=7.0), \
+         patch('modules.verify.decode_frame_at', side_effect=[True, False]):
+        result = verify.verify_output("o.mov", 300, 30.0, expected_audio=10.0, samples=2)
+    assert len(result["problems"]) == 2 and result["sample_errors"] == 1
+
+    with patch('modules.verify.count_video_packets', return_value=None):
+        assert verify.verify_output("o.mov", 300, 30.0)["problems"] == ["video packets unreadable"]
+
+
+def test_background_verification_queue():
+    results = []
+    outcomes = [{"ok": True, "packets": 10, "problems": []}, {"ok": False, "packets": 5, "problems": ["short"]}]
+    with patch('modules.verify.verify_output', side_effect=outcomes + [RuntimeError("x")]), \
+         patch('modules.verify.log_info'), patch('modules.verify.log_error') as mock_err:
+        verify.queue_verification(Path("a.mov"), 10, 30.0, on_result=results.append)
+        verify.queue_verification(Path("b.mov"), 10, 30.0)
+        verify.queue_verification(Path("c.mov"), 10, 30.0)
+        failed = verify.wait_for_verifications()
+    assert failed == [Path("b.mov")]
+    assert results == [outcomes[0]]
+    assert "crashed" in mock_err.call_args[0][0]
+
+
+def test_manifest_stores_verification(tmp_path):
+    src = tmp_path / "s.mp4"
+    src.write_bytes(b"s")
+    out = tmp_path / "o.mov"
+    out.write_bytes(b"o")
+    with patch.dict('modules.manifest.CONFIG', {"manifest_path": str(tmp_path / "m.sqlite")}):
+        manifest.record_output(out, src, "h", "prores", frames=300)
+        manifest.record_verification(out, {"ok": True, "packets": 299})
+        row = manifest.lookup_output(out)
+        assert row["frames"] == 299 and json.loads(row["verification"])["ok"]
+        assert manifest.is_output_complete(out) is True
+        manifest.record_verification(out, {"ok": False, "packets": 12})
+        assert manifest.is_output_complete(out) is False
+
+
+def _process(tmp_path, verified_ok=None):
+    src = tmp_path / "tape.mp4"
+    src.write_bytes(b"v")
+    config = {"verify_outputs": True, "completion_manifest": True, "manifest_path": str(tmp_path / "m.sqlite")}
+    with patch.dict('modules.pipeline.CONFIG', config), \
+         patch('modules.pipeline.ENCODERS', ["prores"]), \
+         patch('modules.pipeline.mezzanine_enabled', return_value=False), \
+         patch('modules.pipeline.get_duration', return_value=9.5), \
+         patch('modules.probe.get_duration', return_value=9.5), \
+         patch('modules.pipeline.queue_verification') as mock_queue, \
+         patch('modules.pipeline.create_vpy_script'), \
+         patch('modules.pipeline.shutil.which', return_value="/bin/tool"), \
+         patch('modules.pipeline.get_vpy_info', return_value=(300, 30.0, 720, 576, 'YUV420P16')), \
+         patch('modules.pipeline._calculate_audio_sync', return_value=1.0), \
+         patch('modules.pipeline.AUDIO_OFFSET', 0.2), \
+         patch('modules.pipeline.log_info'), patch('modules.pipeline.log_debug'), \
+         patch('modules.pipeline._run_encoding_pipeline') as mock_run:
+        def _render(vspipe_cmd, ffmpeg_cmd, *args, **kwargs):
+            Path(ffmpeg_cmd[-1]).write_bytes(b"rendered")
+            return True
+        mock_run.side_effect = _render
+        pipeline.process_video(src)
+        if mock_queue.called and verified_ok is not None:
+            on_result = mock_queue.call_args[0][4]
+            on_result({"ok": verified_ok, "packets": 300})
+            pipeline.process_video(src)
+    return mock_queue, mock_run
+
+
+def test_process_video_queues_verification(tmp_path):
+    mock_queue, _ = _process(tmp_path)
+    path, frames, fps, expected_audio, on_result = mock_queue.call_args[0]
+    assert path == tmp_path / "tape_deinterlaced_prores.mov"
+    assert (frames, fps) == (300, 30.0)
+    assert abs(expected_audio - 9.7) < 1e-9  # source audio + positive sync offset
+    assert callable(on_result)
+
+
+def test_failed_verification_triggers_rerender(tmp_path):
+    _, mock_run = _process(tmp_path, verified_ok=False)
+    assert mock_run.call_count == 2
+
+
+def test_passed_verification_skips(tmp_path):
+    _, mock_run = _process(tmp_path, verified_ok=True)
+    assert mock_run.call_count == 1
@@ -0,0 +1,159 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+from pathlib import Path
+
+import pytest
+
+import modules.pipeline as pipeline
+from modules import watch
+
+EXTS = {".mp4", ".mkv"}
+
+
+def test_is_source_name():
+    assert watch.is_source_name("tape.MP4", EXTS)
+    assert watch.is_source_name("my_party.mp4", EXTS)
+    assert not watch.is_source_name("tape_deinterlaced_av1.mkv", EXTS)
+    assert not watch.is_source_name("tape_deinterlaced_prores_part.mkv", EXTS)
+    assert not watch.is_source_name("notes.txt", EXTS)
+    # In-progress temp names are only skipped by the watcher
+    assert watch.is_source_name("tape_temp_source.mp4", EXTS)
+    assert watch.is_source_name("my_part.mp4", EXTS)
+    assert not watch.is_source_name("tape_temp_source.mp4", EXTS, watch=True)
+    assert not watch.is_source_name("my_part.mp4", EXTS, watch=True)
+
+
+def test_import_without_o_nonblock(monkeypatch):
+    import importlib
+    monkeypatch.delattr(os, "O_NONBLOCK")
+    try:
+        assert importlib.reload(watch).IN_NONBLOCK == 0
+    finally:
+        monkeypatch.undo()
+        importlib.reload(watch)
+
+
+def test_scan_tree_recursive(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / "a" / "b" / "deep.mp4").write_bytes(b"1")
+    (tmp_path / "top.mkv").write_bytes(b"1")
+    (tmp_path / ".hidden" / "x.mp4").write_bytes(b"1")
+    (tmp_path / "top_deinterlaced_prores.mkv").write_bytes(b"1")
+    found = sorted(p.name for p, _ in watch.scan_tree(str(tmp_path), EXTS))
+    assert found == ["deep.mp4", "top.mkv"]
+    with patch('modules.watch.log_debug'):
+        assert list(watch.scan_tree(str(tmp_path / "missing"), EXTS)) == []
+
+
+def test_stability_tracker_waits_for_growth_to_stop(tmp_path):
+    f = tmp_path / "cap.mp4"
+    f.write_bytes(b"1")
+    tracker = watch.StabilityTracker(stable_seconds=10)
+    tracker.observe(str(f), os.stat(f), now=0)
+    assert tracker.refresh(now=5) == []
+    f.write_bytes(b"12")  # still growing: timer restarts
+    assert tracker.refresh(now=12) == []
+    assert tracker.refresh(now=20) == []
+    assert tracker.refresh(now=22) == [str(f)]
+    # Handed out once; a re-scan with unchanged size does not re-queue it
+    tracker.observe(str(f), os.stat(f), now=30)
+    assert tracker.refresh(now=100) == []
+    f.unlink()
+    tracker.observe(str(f), SimpleNamespace(st_size=9, st_mtime=1), now=0)
+    assert tracker.refresh(now=100) == []
+
+
+def _run_daemon(tmp_path, config, drop):
+    processed = []
+    stop = threading.Event()
+
+    def _handler(path):
+        processed.append(path)
+        stop.set()
+
+    timer = threading.Timer(0.2, drop)
+    timer.start()
+    guard = threading.Timer(10, stop.set)
+    guard.start()
+    with patch.dict('modules.watch.CONFIG', config), patch('modules.watch.log_info'):
+        watch.watch_folders([tmp_path], _handler, EXTS, stop_event=stop)
+    guard.cancel()
+    return processed
+
+
+def test_watch_folders_polling(tmp_path):
+    config = {"watch_use_inotify": False, "watch_poll_seconds": 0.05, "watch_check_seconds": 0.05,
+              "watch_stable_seconds": 0.2}
+    (tmp_path / "sub").mkdir()
+    processed = _run_daemon(tmp_path, config, lambda: (tmp_path / "sub" / "new.mp4").write_bytes(b"data"))
+    assert processed == [tmp_path / "sub" / "new.mp4"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_watch_folders_inotify_new_subfolder(tmp_path):
+    config = {"watch_check_seconds": 0.05, "watch_stable_seconds": 0.2, "watch_poll_seconds": 3600}
+
+    def _drop():
+        (tmp_path / "new_dir").mkdir()
+        (tmp_path / "new_dir" / "cap.mkv").write_bytes(b"data")
+
+    processed = _run_daemon(tmp_path, config, _drop)
+    assert processed == [tmp_path / "new_dir" / "cap.mkv"]
+
+
+def test_watch_folders_survives_job_errors(tmp_path):
+    (tmp_path / "a.mp4").write_bytes(b"1")
+    (tmp_path / "b.mp4").write_bytes(b"1")
+    stop = threading.Event()
+    calls = []
+
+    def _handler(path):
+        calls.append(path.name)
+        if len(calls) == 2:
+            stop.set()
+        raise RuntimeError("boom")
+
+    config = {"watch_use_inotify": False, "watch_check_seconds": 0.01, "watch_stable_seconds": 0}
+    with patch.dict('modules.watch.CONFIG', config), patch('modules.watch.log_info'), \
+         patch('modules.watch.log_error') as mock_err:
+        watch.watch_folders([tmp_path], _handler, EXTS, stop_event=stop)
+    assert calls == ["a.mp4", "b.mp4"]
+    assert "boom" in mock_err.call_args[0][0]
+
+
+def test_create_watcher_fallback():
+    with patch('modules.watch.InotifyWatcher', side_effect=OSError("nope")), patch('modules.watch.log_info') as mock_log:
+        assert watch._create_watcher(["/tmp"]) is None
+    assert "Polling" in mock_log.call_args[0][0]
+
+
+def test_main_watch_mode(tmp_path):
+    with patch('modules.pipeline.setup_environment') as mock_setup, patch('modules.pipeline.get_cpu_name'), \
+         patch('modules.pipeline.get_gpu_name'), patch('modules.pipeline._show_banner'), \
+         patch('modules.pipeline.check_requirements'), \
+         patch('modules.pipeline.get_input_files') as mock_inputs, \
+         patch('modules.pipeline.watch_folders') as mock_watch, \
+         patch('modules.pipeline.process_video') as mock_process, \
+         patch('modules.pipeline.wait_for_moves', return_value=[]), \
+         patch('modules.pipeline.log_info'), \
+         patch('sys.argv', ['script.py', '--watch', str(tmp_path)]):
+        pipeline.main()
+        roots, job, exts = mock_watch.call_args[0]
+        job(Path("x.mp4"))
+    assert roots == [tmp_path] and exts == pipeline.VIDEO_EXTS
+    mock_process.assert_called_once_with(Path("x.mp4"))
+    assert mock_setup.call_count == 1
+    assert not mock_inputs.called
+
+
+def test_watch_mode_needs_folder():
+    with patch.dict('modules.pipeline.CONFIG', {"watch_folder": ""}), \
+         patch('modules.pipeline.watch_folders') as mock_watch, \
+         patch('modules.pipeline.log_error') as mock_err, \
+         patch('sys.argv', ['script.py', '--watch']):
+        pipeline._run_watch_mode()
+    assert not mock_watch.called and mock_err.called
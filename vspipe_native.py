@@ -1,8 +1,25 @@
 import sys
 import os
+import gc
+import json
+import socket
+import threading
+import collections
 import vapoursynth as vs  # type: ignore
 
 
+def _frames_in_order(clip):
+    """Yields the frames in order with core.num_threads requests in flight."""
+    window = max(int(getattr(vs.core, "num_threads", 1)), 1)
+    pending = collections.deque()
+    requested = 0
+    while pending or requested < clip.num_frames:
+        while requested < clip.num_frames and len(pending) < window:
+            pending.append(clip.get_frame_async(requested))
+            requested += 1
+        yield pending.popleft().result()
+
+
 def _write_y4m_output(clip, header):
     """Writes the video clip to stdout in Y4M format."""
     try:
@@ -28,9 +45,7 @@ def _write_y4m_output(clip, header):
         frame_marker = b"FRAME\n"
         sys.stderr.write("Starting frame encoding loop...\n")
 
-        for n in range(clip.num_frames):
-            frame = clip.get_frame(n)
-            
+        for n, frame in enumerate(_frames_in_order(clip)):
             # Write 'FRAME\n'
             os.write(fd, frame_marker)
 
@@ -62,9 +77,146 @@ def _write_y4m_output(clip, header):
         sys.exit(1)
 
 
+# ==============================================================================
+# FRAME SERVER MODE (--serve PORT)
+# ==============================================================================
+# One long-lived process keeps vapoursynth, havsfunc and the loaded plugins warm
+# across jobs. Each connection sends one JSON line:
+#   {"cmd": "info",   "script": path}  -> JSON line with the clip info
+#   {"cmd": "render", "script": path}  -> JSON line, then raw frames until EOF
+#   {"cmd": "quit"}
+# Every connection is served by its own thread, so concurrent jobs render in
+# parallel. Scripts run in fresh globals and are evaluated one at a time; outputs
+# and sys.path are reset right after, so jobs never see each other's state.
+# core.num_threads and core.max_cache_size belong to the whole process: they are
+# set once from --threads/--cache and the scripts leave them alone.
+
+MAX_CACHED_CLIPS = 4  # Clips of 'info' requests still waiting for their 'render'
+
+
+def _load_clip(script_path, state):
+    """Evaluates a script (or reuses the clip of the preceding 'info' request). Returns (key, clip)."""
+    key = (os.path.abspath(script_path), os.path.getmtime(script_path))
+    with state["lock"]:
+        if key in state["clips"]:
+            return key, state["clips"][key]
+        sys.path.append(os.path.dirname(key[0]))
+        try:
+            with open(script_path, "r", encoding="utf-8") as f:
+                script_content = f.read()
+            exec(compile(script_content, script_path, "exec"), {"__name__": "__vapoursynth__", "__file__": script_path})
+            outputs = vs.get_outputs()
+            if not outputs:
+                raise RuntimeError("No output node set in script!")
+            clip = outputs[0]
+        finally:
+            # Outputs and sys.path are process-wide: the next script must start clean
+            vs.clear_outputs()
+            sys.path[:] = state["sys_path"]
+        if isinstance(clip, vs.VideoOutputTuple):
+            clip = clip.clip
+        if not isinstance(clip, vs.VideoNode):
+            raise RuntimeError("Output is not a video clip.")
+        state["clips"][key] = clip
+        while len(state["clips"]) > MAX_CACHED_CLIPS:
+            state["clips"].pop(next(iter(state["clips"])))
+    return key, clip
+
+
+def _release_clip(state, key):
+    """Drops the clip of a finished render (plugins stay loaded in the core)."""
+    with state["lock"]:
+        state["clips"].pop(key, None)
+    gc.collect()
+
+
+def _frame_bytes(clip):
+    """Size of one raw frame (all planes, chroma subsampled)."""
+    fmt = clip.format
+    luma = clip.width * clip.height
+    chroma = (clip.width >> fmt.subsampling_w) * (clip.height >> fmt.subsampling_h)
+    return (luma + chroma * (fmt.num_planes - 1)) * fmt.bytes_per_sample
+
+
+def _clip_info(clip):
+    # frame_bytes lets the client tell a complete stream from one cut short by an error
+    return {
+        "frames": clip.num_frames, "fps_num": clip.fps.numerator, "fps_den": clip.fps.denominator,
+        "width": clip.width, "height": clip.height, "format": clip.format.name,
+        "frame_bytes": _frame_bytes(clip),
+    }
+
+
+def _send_frames(conn, clip):
+    for n, frame in enumerate(_frames_in_order(clip)):
+        for p in range(frame.format.num_planes):
+            conn.sendall(bytes(frame[p]))
+        if n % 100 == 0:
+            sys.stderr.write(f"Wrote frame {n}/{clip.num_frames}\n")
+            sys.stderr.flush()
+
+
+def _handle_request(conn, request, state):
+    """Serves one 'info' or 'render' request."""
+    try:
+        key, clip = _load_clip(request["script"], state)
+    except Exception as e:
+        gc.collect()
+        conn.sendall((json.dumps({"ok": False, "error": str(e)}) + "\n").encode("utf-8"))
+        return
+    conn.sendall((json.dumps(dict(ok=True, **_clip_info(clip))) + "\n").encode("utf-8"))
+    if request.get("cmd") == "render":
+        try:
+            _send_frames(conn, clip)
+        except OSError:
+            sys.stderr.write("Broken Pipe - Consumer closed connection.\n")
+        finally:
+            _release_clip(state, key)
+
+
+def _serve_connection(conn, request, state):
+    with conn:
+        try:
+            _handle_request(conn, request, state)
+        except Exception as e:
+            sys.stderr.write(f"Error serving request: {e}\n")
+
+
+def serve(port, threads=None, cache_mb=None):
+    if threads:
+        vs.core.num_threads = threads
+    if cache_mb:
+        vs.core.max_cache_size = cache_mb
+    server = socket.create_server(("127.0.0.1", port))
+    # The parent reads the port from the first stdout line
+    sys.stdout.write(f"PORT {server.getsockname()[1]}\n")
+    sys.stdout.flush()
+    state = {"sys_path": list(sys.path), "lock": threading.Lock(), "clips": {}}
+    while True:
+        conn, _ = server.accept()
+        try:
+            request = json.loads(conn.makefile("rb").readline() or b"{}")
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Error serving request: {e}\n")
+            conn.close()
+            continue
+        if request.get("cmd") == "quit":
+            conn.close()
+            break
+        threading.Thread(target=_serve_connection, args=(conn, request, state), daemon=True).start()
+    server.close()
+
+
 def main():
     args = sys.argv[1:]
     raw_mode = False
+
+    if "--serve" in args:
+        def _option(name):
+            index = args.index(name) if name in args else -1
+            return int(args[index + 1]) if 0 <= index < len(args) - 1 else 0
+        serve(_option("--serve"), _option("--threads"), _option("--cache"))
+        return
     
     if "--raw" in args:
         raw_mode = True
@@ -126,9 +278,7 @@ def _write_raw_output(clip):
         
         sys.stderr.write("Starting RAW frame encoding loop (using sys.stdout.buffer)...\n")
 
-        for n in range(clip.num_frames):
-            frame = clip.get_frame(n)
-            
+        for n, frame in enumerate(_frames_in_order(clip)):
             for p in range(frame.format.num_planes):
                 # Write plane data directly
                 out.write(bytes(frame[p]))